@@ -0,0 +1,206 @@
+//! Building blocks for Grimp's versioned binary file formats.
+//!
+//! All integers are little-endian u32s. Files start with an eight byte magic string followed by a
+//! format version, and strings are stored once each in a string table, so that records can refer
+//! to them by a fixed-width id. Decoding works directly on the file's bytes (typically
+//! memory-mapped), so strings are only copied out if they are needed.
+
+use std::collections::HashMap;
+
+pub const HEADER_SIZE: usize = 12;
+
+/// Accumulates the bytes of a binary file.
+pub struct Encoder {
+    buffer: Vec<u8>,
+}
+
+impl Encoder {
+    /// Starts a new file with the supplied header.
+    pub fn new(magic: &[u8; 8], version: u32) -> Self {
+        let mut encoder = Encoder { buffer: vec![] };
+        encoder.buffer.extend_from_slice(magic);
+        encoder.put_u32(version);
+        encoder
+    }
+
+    pub fn put_u32(&mut self, value: u32) {
+        self.buffer.extend_from_slice(&value.to_le_bytes());
+    }
+
+    pub fn put_usize(&mut self, value: usize) {
+        self.put_u32(u32::try_from(value).expect("Value too large for the binary format."));
+    }
+
+    /// Writes a string table containing the supplied strings, in id order.
+    ///
+    /// Layout: count, then (offset, length) for each string, then the concatenated strings.
+    pub fn put_string_table(&mut self, strings: &StringTableBuilder) {
+        self.put_usize(strings.strings.len());
+        let mut offset = 0;
+        for string in &strings.strings {
+            self.put_usize(offset);
+            self.put_usize(string.len());
+            offset += string.len();
+        }
+        for string in &strings.strings {
+            self.buffer.extend_from_slice(string.as_bytes());
+        }
+    }
+
+    pub fn finish(self) -> Vec<u8> {
+        self.buffer
+    }
+}
+
+/// Assigns each distinct string an id, for writing into a string table.
+#[derive(Default)]
+pub struct StringTableBuilder<'a> {
+    ids: HashMap<&'a str, u32>,
+    strings: Vec<&'a str>,
+}
+
+impl<'a> StringTableBuilder<'a> {
+    pub fn intern(&mut self, string: &'a str) -> u32 {
+        if let Some(id) = self.ids.get(string) {
+            return *id;
+        }
+        let id =
+            u32::try_from(self.strings.len()).expect("Too many strings for the binary format.");
+        self.ids.insert(string, id);
+        self.strings.push(string);
+        id
+    }
+}
+
+/// Reads values out of the bytes of a binary file, checking they are in bounds.
+#[derive(Clone, Copy)]
+pub struct Decoder<'a> {
+    bytes: &'a [u8],
+}
+
+impl<'a> Decoder<'a> {
+    pub fn new(bytes: &'a [u8]) -> Self {
+        Decoder { bytes }
+    }
+
+    /// Returns whether the file starts with the supplied magic string and version.
+    pub fn has_header(&self, magic: &[u8; 8], version: u32) -> bool {
+        has_magic(self.bytes, magic) && self.u32_at(magic.len()) == Some(version)
+    }
+
+    pub fn u32_at(&self, offset: usize) -> Option<u32> {
+        let bytes = self.bytes.get(offset..offset.checked_add(4)?)?;
+        Some(u32::from_le_bytes(bytes.try_into().ok()?))
+    }
+
+    pub fn usize_at(&self, offset: usize) -> Option<usize> {
+        self.u32_at(offset).map(|value| value as usize)
+    }
+
+    /// Reads a string table starting at the supplied offset.
+    pub fn string_table_at(&self, offset: usize) -> Option<StringTable<'a>> {
+        let count = self.usize_at(offset)?;
+        let entries_start = offset.checked_add(4)?;
+        let blob_start = entries_start.checked_add(count.checked_mul(8)?)?;
+        if blob_start > self.bytes.len() {
+            return None;
+        }
+        Some(StringTable {
+            decoder: *self,
+            count,
+            entries_start,
+            blob: &self.bytes[blob_start..],
+        })
+    }
+}
+
+/// Returns whether the bytes start with the supplied magic string.
+pub fn has_magic(bytes: &[u8], magic: &[u8; 8]) -> bool {
+    bytes.starts_with(magic)
+}
+
+/// A view onto a string table within a binary file.
+#[derive(Clone, Copy)]
+pub struct StringTable<'a> {
+    decoder: Decoder<'a>,
+    count: usize,
+    entries_start: usize,
+    blob: &'a [u8],
+}
+
+impl<'a> StringTable<'a> {
+    /// Returns the raw bytes of the string, without checking that they are valid UTF-8.
+    ///
+    /// This is cheaper than get, so is useful for comparisons.
+    pub fn get_bytes(&self, id: u32) -> Option<&'a [u8]> {
+        let id = id as usize;
+        if id >= self.count {
+            return None;
+        }
+        let entry = self.entries_start + id * 8;
+        let offset = self.decoder.usize_at(entry)?;
+        let length = self.decoder.usize_at(entry + 4)?;
+        self.blob.get(offset..offset.checked_add(length)?)
+    }
+
+    pub fn get(&self, id: u32) -> Option<&'a str> {
+        std::str::from_utf8(self.get_bytes(id)?).ok()
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const MAGIC: &[u8; 8] = b"GRIMPTST";
+
+    #[test]
+    fn test_round_trip() {
+        let mut strings = StringTableBuilder::default();
+        let foo = strings.intern("foo");
+        let bar = strings.intern("bär");
+        assert_eq!(strings.intern("foo"), foo);
+
+        let mut encoder = Encoder::new(MAGIC, 3);
+        encoder.put_u32(bar);
+        encoder.put_u32(foo);
+        encoder.put_string_table(&strings);
+        let bytes = encoder.finish();
+
+        let decoder = Decoder::new(&bytes);
+        assert!(decoder.has_header(MAGIC, 3));
+        let table = decoder.string_table_at(HEADER_SIZE + 8).unwrap();
+        assert_eq!(table.get(decoder.u32_at(HEADER_SIZE).unwrap()), Some("bär"));
+        assert_eq!(
+            table.get(decoder.u32_at(HEADER_SIZE + 4).unwrap()),
+            Some("foo")
+        );
+        assert_eq!(table.get(2), None);
+    }
+
+    #[test]
+    fn test_rejects_wrong_header() {
+        let bytes = Encoder::new(MAGIC, 3).finish();
+        assert!(Decoder::new(&bytes).has_header(MAGIC, 3));
+        assert!(!Decoder::new(&bytes).has_header(MAGIC, 4));
+        assert!(!Decoder::new(&bytes).has_header(b"GRIMPXXX", 3));
+        assert!(!Decoder::new(&bytes[..6]).has_header(MAGIC, 3));
+    }
+
+    #[test]
+    fn test_out_of_bounds_reads_return_none() {
+        let mut strings = StringTableBuilder::default();
+        strings.intern("foo");
+        let mut encoder = Encoder::new(MAGIC, 1);
+        encoder.put_string_table(&strings);
+        let mut bytes = encoder.finish();
+        // Truncate the string's contents.
+        bytes.truncate(bytes.len() - 1);
+
+        let decoder = Decoder::new(&bytes);
+        let table = decoder.string_table_at(HEADER_SIZE).unwrap();
+        assert_eq!(table.get(0), None);
+        assert!(decoder.u32_at(bytes.len() - 2).is_none());
+        assert!(decoder.string_table_at(bytes.len()).is_none());
+    }
+}
@@ -1,99 +1,659 @@
+use crate::binary_format::{
+    Decoder, Encoder, HEADER_SIZE, StringTable, StringTableBuilder, has_magic,
+};
 use crate::errors::{GrimpError, GrimpResult};
-use crate::filesystem::get_file_system_boxed;
-use crate::import_scanning::{DirectImport, imports_by_module_to_py};
-use crate::module_finding::Module;
-use pyo3::types::PyAnyMethods;
-use pyo3::types::{PyDict, PySet};
-use pyo3::types::{PyDictMethods, PySetMethods};
-use pyo3::{Bound, FromPyObject, PyAny, PyResult, Python, pyfunction};
+use crate::filesystem::{FileBytes, get_file_system_boxed};
+use crate::graph::snapshot::decode_snapshot_fingerprints;
+use crate::graph::{Graph, GraphWrapper};
+use crate::import_parsing::ImportedObject;
+use crate::import_scanning::{
+    DirectImport, ImportsByModule, ParsedImportsByModule, ParsedModule, PyValueObjectClasses,
+    get_found_packages_by_module, get_module_file_filename, py_found_packages_to_rust,
+    to_py_direct_imports,
+};
+use crate::module_finding::{Module, ModuleFile};
+use crate::workers;
+use pyo3::exceptions::PyKeyError;
+use pyo3::prelude::*;
+use pyo3::types::{PyBytes, PySet};
+use rayon::prelude::*;
+use std::cmp::Ordering;
 use std::collections::{HashMap, HashSet};
+use xxhash_rust::xxh3::xxh3_64;
+
+const DATA_FILE_MAGIC: &[u8; 8] = b"GRIMPDAT";
+const DATA_FILE_VERSION: u32 = 1;
+// Both module index entries and import records are three u32s.
+const RECORD_SIZE: usize = 12;
+
+const PARSE_FILE_MAGIC: &[u8; 8] = b"GRIMPPRS";
+const PARSE_FILE_VERSION: u32 = 1;
+// Both module index entries and imported object records are four u32s.
+const PARSE_RECORD_SIZE: usize = 16;
 
 /// Writes the cache file containing all the imports for a given package.
 /// Args:
 /// - filename: str
-/// - imports_by_module: dict[Module, Set[DirectImport]]
+/// - imports_by_module: ImportsByModule
 /// - file_system: The file system interface to use. (A BasicFileSystem.)
 #[pyfunction]
 pub fn write_cache_data_map_file<'py>(
+    py: Python<'py>,
     filename: &str,
-    imports_by_module: Bound<'py, PyDict>,
+    imports_by_module: PyRef<'py, ImportsByModule>,
     file_system: Bound<'py, PyAny>,
 ) -> PyResult<()> {
     let mut file_system_boxed = get_file_system_boxed(&file_system)?;
 
-    let ImportsByModule(imports_by_module_rust) = imports_by_module.extract()?;
+    let imports_by_module = imports_by_module.as_map();
+    let file_contents = py.detach(|| encode_imports_by_module(imports_by_module));
 
-    let file_contents = serialize_imports_by_module(&imports_by_module_rust);
-
-    file_system_boxed.write(filename, &file_contents)?;
+    file_system_boxed.write_bytes(filename, &file_contents)?;
 
     Ok(())
 }
 
 /// Reads the cache file containing all the imports for a given package.
+///
+/// The file is memory-mapped rather than decoded up front: imports are only decoded for the
+/// modules that are asked for. Data files in the JSON format used by earlier versions of Grimp
+/// can also be read.
 /// Args:
 /// - filename: str
 /// - file_system: The file system interface to use. (A BasicFileSystem.)
-/// Returns Dict[Module, Set[DirectImport]]
+/// Returns CachedImportsByModule
 #[pyfunction]
 pub fn read_cache_data_map_file<'py>(
+    filename: &str,
+    file_system: Bound<'py, PyAny>,
+) -> PyResult<CachedImportsByModule> {
+    let file_system_boxed = get_file_system_boxed(&file_system)?;
+
+    let file_bytes = file_system_boxed.read_bytes(filename)?;
+
+    if has_magic(&file_bytes, DATA_FILE_MAGIC) {
+        return Ok(CachedImportsByModule::open(file_bytes, filename)?);
+    }
+    let file_contents = std::str::from_utf8(&file_bytes)
+        .map_err(|_| GrimpError::CorruptCache(filename.to_string()))?;
+    let imports_by_module = parse_json_to_map(file_contents, filename)?;
+    let encoded = encode_imports_by_module(&imports_by_module);
+    Ok(CachedImportsByModule::open(
+        FileBytes::Owned(encoded),
+        filename,
+    )?)
+}
+
+/// Encodes the imports of each of the supplied modules separately, so they can be stored
+/// individually, e.g. as rows in a database.
+/// Args:
+/// - imports_by_module: ImportsByModule
+/// - module_names:      The names of the modules to encode (where present).
+/// Returns list[tuple[str, bytes]] of module names and their encoded imports.
+#[pyfunction]
+pub fn encode_module_imports<'py>(
+    py: Python<'py>,
+    imports_by_module: PyRef<'py, ImportsByModule>,
+    module_names: HashSet<String>,
+) -> PyResult<Vec<(String, Bound<'py, PyBytes>)>> {
+    let imports_by_module = imports_by_module.as_map();
+    let encoded: Vec<(String, Vec<u8>)> = py.detach(|| {
+        workers::install(None, || {
+            module_names
+                .into_par_iter()
+                .filter_map(|module_name| {
+                    let (module, direct_imports) =
+                        imports_by_module.get_key_value(module_name.as_str())?;
+                    let single_module = HashMap::from([(module.clone(), direct_imports.clone())]);
+                    Some((module_name, encode_imports_by_module(&single_module)))
+                })
+                .collect()
+        })
+    })?;
+    Ok(encoded
+        .into_iter()
+        .map(|(module_name, bytes)| (module_name, PyBytes::new(py, &bytes)))
+        .collect())
+}
+
+/// Decodes imports encoded by encode_module_imports into a single ImportsByModule.
+/// Args:
+/// - filename: The file the encoded imports were read from, for reporting corruption.
+/// - encoded:  list[bytes]
+/// Returns ImportsByModule
+#[pyfunction]
+pub fn decode_module_imports(
+    py: Python<'_>,
+    filename: &str,
+    encoded: Vec<Bound<'_, PyBytes>>,
+) -> PyResult<ImportsByModule> {
+    let encoded: Vec<Vec<u8>> = encoded
+        .iter()
+        .map(|bytes| bytes.as_bytes().to_vec())
+        .collect();
+    let imports_by_module = py.detach(|| {
+        workers::install(None, || {
+            encoded
+                .into_par_iter()
+                .map(|bytes| {
+                    CachedImportsByModule::open(FileBytes::Owned(bytes), filename)?.decode_all()
+                })
+                .try_reduce(HashMap::new, |mut a, b| {
+                    a.extend(b);
+                    Ok(a)
+                })
+        })
+    })??;
+    Ok(ImportsByModule::new(imports_by_module))
+}
+
+/// Writes a cache file containing the imported objects parsed from some modules.
+/// Args:
+/// - filename: str
+/// - parsed_imports: ParsedImportsByModule
+/// - file_system: The file system interface to use. (A BasicFileSystem.)
+#[pyfunction]
+pub fn write_parse_cache_file<'py>(
     py: Python<'py>,
     filename: &str,
+    parsed_imports: PyRef<'py, ParsedImportsByModule>,
     file_system: Bound<'py, PyAny>,
-) -> PyResult<Bound<'py, PyDict>> {
+) -> PyResult<()> {
+    let mut file_system_boxed = get_file_system_boxed(&file_system)?;
+
+    let parsed_imports = parsed_imports.as_map();
+    let file_contents = py.detach(|| encode_parsed_imports(parsed_imports));
+
+    file_system_boxed.write_bytes(filename, &file_contents)?;
+
+    Ok(())
+}
+
+/// Reads a cache file written by write_parse_cache_file.
+/// Args:
+/// - filename: str
+/// - file_system: The file system interface to use. (A BasicFileSystem.)
+/// Returns ParsedImportsByModule
+#[pyfunction]
+pub fn read_parse_cache_file<'py>(
+    py: Python<'py>,
+    filename: &str,
+    file_system: Bound<'py, PyAny>,
+) -> PyResult<ParsedImportsByModule> {
     let file_system_boxed = get_file_system_boxed(&file_system)?;
 
-    let file_contents = file_system_boxed.read(filename)?;
+    let file_bytes = file_system_boxed.read_bytes(filename)?;
+    let parsed_imports =
+        py.detach(|| workers::install(None, || decode_parsed_imports(&file_bytes, filename)))??;
+
+    Ok(ParsedImportsByModule::new(parsed_imports))
+}
+
+/// Writes a snapshot of a graph, so it can be loaded again without being rebuilt.
+/// Args:
+/// - filename: str
+/// - graph: Graph
+/// - fingerprints: list[str] identifying what the graph was built from.
+/// - file_system: The file system interface to use. (A BasicFileSystem.)
+#[pyfunction]
+pub fn write_graph_snapshot<'py>(
+    py: Python<'py>,
+    filename: &str,
+    graph: PyRef<'py, GraphWrapper>,
+    fingerprints: Vec<String>,
+    file_system: Bound<'py, PyAny>,
+) -> PyResult<()> {
+    let mut file_system_boxed = get_file_system_boxed(&file_system)?;
+
+    let graph = graph.graph();
+    let file_contents = py.detach(|| graph.encode_snapshot(&fingerprints));
 
-    let imports_by_module = parse_json_to_map(&file_contents, filename)?;
+    file_system_boxed.write_bytes(filename, &file_contents)?;
 
-    Ok(imports_by_module_to_py(py, imports_by_module))
+    Ok(())
 }
 
-/// A newtype wrapper for HashMap<Module, HashSet<DirectImport>> that implements FromPyObject.
-pub struct ImportsByModule(pub HashMap<Module, HashSet<DirectImport>>);
+/// Opens a graph snapshot written by write_graph_snapshot.
+///
+/// Only the fingerprints are read: the graph isn't decoded until it is loaded.
+/// Args:
+/// - filename: str
+/// - file_system: The file system interface to use. (A BasicFileSystem.)
+/// Returns GraphSnapshot
+#[pyfunction]
+pub fn open_graph_snapshot<'py>(
+    filename: &str,
+    file_system: Bound<'py, PyAny>,
+) -> PyResult<GraphSnapshot> {
+    let file_system_boxed = get_file_system_boxed(&file_system)?;
+
+    let bytes = file_system_boxed.read_bytes(filename)?;
+    let fingerprints = decode_snapshot_fingerprints(&bytes)
+        .ok_or_else(|| GrimpError::CorruptCache(filename.to_string()))?;
 
-impl<'py> FromPyObject<'py> for ImportsByModule {
-    fn extract_bound(ob: &Bound<'py, PyAny>) -> PyResult<Self> {
-        let py_dict = ob.downcast::<PyDict>()?;
-        let mut imports_by_module_rust = HashMap::new();
+    Ok(GraphSnapshot {
+        bytes,
+        filename: filename.to_string(),
+        fingerprints,
+    })
+}
 
-        for (py_key, py_value) in py_dict.iter() {
-            let module: Module = py_key.extract()?;
-            let py_set = py_value.downcast::<PySet>()?;
-            let mut hashset: HashSet<DirectImport> = HashSet::new();
-            for element in py_set.iter() {
-                let direct_import: DirectImport = element.extract()?;
-                hashset.insert(direct_import);
+/// A graph snapshot file that has been opened, but not yet loaded.
+#[pyclass]
+pub struct GraphSnapshot {
+    bytes: FileBytes,
+    filename: String,
+    fingerprints: Vec<String>,
+}
+
+#[pymethods]
+impl GraphSnapshot {
+    /// The fingerprints identifying what the graph was built from.
+    #[getter]
+    fn fingerprints(&self) -> Vec<String> {
+        self.fingerprints.clone()
+    }
+
+    /// Decodes the graph.
+    fn load(&self, py: Python<'_>) -> PyResult<GraphWrapper> {
+        let graph = py
+            .detach(|| Graph::decode_snapshot(&self.bytes))
+            .ok_or_else(|| GrimpError::CorruptCache(self.filename.clone()))?;
+        Ok(GraphWrapper::from_graph(graph))
+    }
+}
+
+/// A read-only view of the imports in a cache data file, which decodes modules on demand.
+///
+/// The file is laid out as:
+/// - header: magic string, version, module count, import count;
+/// - module index, sorted by module name: (name id, first import, import count);
+/// - imports, grouped by importer: (imported name id, line number, line contents id);
+/// - string table.
+#[pyclass]
+pub struct CachedImportsByModule {
+    bytes: FileBytes,
+    filename: String,
+    module_count: usize,
+    modules_start: usize,
+    imports_start: usize,
+    strings_start: usize,
+}
+
+impl CachedImportsByModule {
+    fn open(bytes: FileBytes, filename: &str) -> GrimpResult<Self> {
+        let corrupt = || GrimpError::CorruptCache(filename.to_string());
+        let decoder = Decoder::new(&bytes);
+        if !decoder.has_header(DATA_FILE_MAGIC, DATA_FILE_VERSION) {
+            return Err(corrupt());
+        }
+        let module_count = decoder.usize_at(HEADER_SIZE).ok_or_else(corrupt)?;
+        let import_count = decoder.usize_at(HEADER_SIZE + 4).ok_or_else(corrupt)?;
+        let modules_start = HEADER_SIZE + 8;
+        let imports_start = module_count
+            .checked_mul(RECORD_SIZE)
+            .and_then(|size| size.checked_add(modules_start))
+            .ok_or_else(corrupt)?;
+        let strings_start = import_count
+            .checked_mul(RECORD_SIZE)
+            .and_then(|size| size.checked_add(imports_start))
+            .ok_or_else(corrupt)?;
+        decoder.string_table_at(strings_start).ok_or_else(corrupt)?;
+
+        Ok(CachedImportsByModule {
+            filename: filename.to_string(),
+            module_count,
+            modules_start,
+            imports_start,
+            strings_start,
+            bytes,
+        })
+    }
+
+    fn corrupt(&self) -> GrimpError {
+        GrimpError::CorruptCache(self.filename.clone())
+    }
+
+    fn decoder(&self) -> Decoder<'_> {
+        Decoder::new(&self.bytes)
+    }
+
+    fn strings(&self) -> GrimpResult<StringTable<'_>> {
+        self.decoder()
+            .string_table_at(self.strings_start)
+            .ok_or_else(|| self.corrupt())
+    }
+
+    /// Returns the (name id, first import, import count) of the nth module in the index.
+    fn module_entry(&self, index: usize) -> GrimpResult<(u32, usize, usize)> {
+        let decoder = self.decoder();
+        let offset = self.modules_start + index * RECORD_SIZE;
+        match (
+            decoder.u32_at(offset),
+            decoder.usize_at(offset + 4),
+            decoder.usize_at(offset + 8),
+        ) {
+            (Some(name_id), Some(first_import), Some(import_count)) => {
+                Ok((name_id, first_import, import_count))
             }
-            imports_by_module_rust.insert(module, hashset);
+            _ => Err(self.corrupt()),
+        }
+    }
+
+    /// Binary searches the module index, returning the position of the module if present.
+    fn find_module(&self, module_name: &str) -> GrimpResult<Option<usize>> {
+        let strings = self.strings()?;
+        let (mut low, mut high) = (0, self.module_count);
+        while low < high {
+            let middle = low + (high - low) / 2;
+            let (name_id, ..) = self.module_entry(middle)?;
+            let name = strings.get_bytes(name_id).ok_or_else(|| self.corrupt())?;
+            match name.cmp(module_name.as_bytes()) {
+                Ordering::Less => low = middle + 1,
+                Ordering::Greater => high = middle,
+                Ordering::Equal => return Ok(Some(middle)),
+            }
+        }
+        Ok(None)
+    }
+
+    fn decode_direct_imports(
+        &self,
+        module_name: &str,
+        index: usize,
+    ) -> GrimpResult<HashSet<DirectImport>> {
+        let decoder = self.decoder();
+        let strings = self.strings()?;
+        let (_, first_import, import_count) = self.module_entry(index)?;
+        (first_import..first_import + import_count)
+            .map(|import_index| {
+                let offset = self.imports_start + import_index * RECORD_SIZE;
+                let imported = decoder.u32_at(offset).and_then(|id| strings.get(id));
+                let line_number = decoder.usize_at(offset + 4);
+                let line_contents = decoder.u32_at(offset + 8).and_then(|id| strings.get(id));
+                match (imported, line_number, line_contents) {
+                    (Some(imported), Some(line_number), Some(line_contents))
+                        if offset + RECORD_SIZE <= self.strings_start =>
+                    {
+                        Ok(DirectImport {
+                            importer: module_name.to_string(),
+                            imported: imported.to_string(),
+                            line_number,
+                            line_contents: line_contents.to_string(),
+                        })
+                    }
+                    _ => Err(self.corrupt()),
+                }
+            })
+            .collect()
+    }
+
+    fn get(&self, module_name: &str) -> GrimpResult<Option<HashSet<DirectImport>>> {
+        match self.find_module(module_name)? {
+            Some(index) => Ok(Some(self.decode_direct_imports(module_name, index)?)),
+            None => Ok(None),
         }
+    }
 
-        Ok(ImportsByModule(imports_by_module_rust))
+    fn module_name(&self, index: usize) -> GrimpResult<&str> {
+        let (name_id, ..) = self.module_entry(index)?;
+        self.strings()?.get(name_id).ok_or_else(|| self.corrupt())
+    }
+
+    fn decode_all(&self) -> GrimpResult<HashMap<Module, HashSet<DirectImport>>> {
+        (0..self.module_count)
+            .map(|index| {
+                let module_name = self.module_name(index)?;
+                Ok((
+                    Module {
+                        name: module_name.to_string(),
+                    },
+                    self.decode_direct_imports(module_name, index)?,
+                ))
+            })
+            .collect()
     }
 }
 
-fn serialize_imports_by_module(
-    imports_by_module: &HashMap<Module, HashSet<DirectImport>>,
-) -> String {
-    let raw_map: HashMap<&str, Vec<(&str, usize, &str)>> = imports_by_module
-        .iter()
-        .map(|(module, imports)| {
-            let imports_vec: Vec<(&str, usize, &str)> = imports
-                .iter()
-                .map(|import| {
-                    (
-                        import.imported.as_str(),
-                        import.line_number,
-                        import.line_contents.as_str(),
+#[pymethods]
+impl CachedImportsByModule {
+    /// Returns the set[DirectImport] for the supplied module.
+    ///
+    /// Raises KeyError if the module is not present.
+    fn direct_imports<'py>(
+        &self,
+        py: Python<'py>,
+        module_name: &str,
+    ) -> PyResult<Bound<'py, PySet>> {
+        match self.get(module_name)? {
+            Some(direct_imports) => {
+                to_py_direct_imports(py, &PyValueObjectClasses::import(py)?, &direct_imports)
+            }
+            None => Err(PyKeyError::new_err(module_name.to_owned())),
+        }
+    }
+
+    fn module_names(&self) -> PyResult<HashSet<String>> {
+        (0..self.module_count)
+            .map(|index| Ok(self.module_name(index)?.to_string()))
+            .collect()
+    }
+
+    /// Decodes just the supplied modules (where present) into an ImportsByModule.
+    fn subset(&self, py: Python<'_>, module_names: HashSet<String>) -> PyResult<ImportsByModule> {
+        let imports_by_module = py.detach(|| {
+            workers::install(None, || {
+                module_names
+                    .par_iter()
+                    .filter_map(|module_name| match self.get(module_name) {
+                        Ok(Some(direct_imports)) => Some(Ok((
+                            Module {
+                                name: module_name.clone(),
+                            },
+                            direct_imports,
+                        ))),
+                        Ok(None) => None,
+                        Err(error) => Some(Err(error)),
+                    })
+                    .collect::<GrimpResult<HashMap<_, _>>>()
+            })
+        })??;
+        Ok(ImportsByModule::new(imports_by_module))
+    }
+
+    fn __len__(&self) -> usize {
+        self.module_count
+    }
+
+    fn __contains__(&self, module_name: &str) -> PyResult<bool> {
+        Ok(self.find_module(module_name)?.is_some())
+    }
+}
+
+/// Computes a digest of the contents of each module file, reading the files in parallel.
+///
+/// The digest is fast to compute but not cryptographic: it is only for telling whether a
+/// file has changed since it was cached.
+///
+/// Args:
+/// - module_files:  The ModuleFiles to compute digests for.
+/// - found_packages: Set of FoundPackages containing the module files.
+/// - file_system:   The file system interface to use. (A BasicFileSystem.)
+///
+/// Returns dict[str, str] of hex digests, keyed by module name. Any modules whose files could
+/// not be read are left out.
+#[pyfunction]
+pub fn compute_content_digests<'py>(
+    py: Python<'py>,
+    module_files: Vec<ModuleFile>,
+    found_packages: Bound<'py, PyAny>,
+    file_system: Bound<'py, PyAny>,
+) -> PyResult<HashMap<String, String>> {
+    let file_system_boxed = get_file_system_boxed(&file_system)?;
+    let found_packages_rust = py_found_packages_to_rust(&found_packages);
+
+    py.detach(|| {
+        let found_packages_by_module = get_found_packages_by_module(&found_packages_rust);
+        workers::install(None, || {
+            module_files
+                .par_iter()
+                .filter_map(|module_file| {
+                    let filename = get_module_file_filename(
+                        module_file,
+                        &found_packages_by_module,
+                        &file_system_boxed,
                     )
+                    .ok()?;
+                    // Source files may be edited while they're hashed, so aren't mapped.
+                    let contents = file_system_boxed.read_bytes_into_memory(&filename).ok()?;
+                    Some((
+                        module_file.module.name.clone(),
+                        format!("{:016x}", xxh3_64(&contents)),
+                    ))
                 })
-                .collect();
-            (module.name.as_str(), imports_vec)
+                .collect()
+        })
+    })
+}
+
+fn encode_imports_by_module(imports_by_module: &HashMap<Module, HashSet<DirectImport>>) -> Vec<u8> {
+    let mut modules: Vec<(&Module, Vec<&DirectImport>)> = imports_by_module
+        .iter()
+        .map(|(module, direct_imports)| {
+            // Sort the imports too, so that the same imports always produce the same file.
+            let mut direct_imports: Vec<&DirectImport> = direct_imports.iter().collect();
+            direct_imports.sort_by_key(|direct_import| {
+                (
+                    &direct_import.imported,
+                    direct_import.line_number,
+                    &direct_import.line_contents,
+                )
+            });
+            (module, direct_imports)
         })
         .collect();
+    modules.sort_by(|(a, _), (b, _)| a.name.cmp(&b.name));
+
+    let mut strings = StringTableBuilder::default();
+    let mut encoder = Encoder::new(DATA_FILE_MAGIC, DATA_FILE_VERSION);
+    encoder.put_usize(modules.len());
+    encoder.put_usize(modules.iter().map(|(_, imports)| imports.len()).sum());
+
+    let mut first_import = 0;
+    for (module, direct_imports) in &modules {
+        encoder.put_u32(strings.intern(&module.name));
+        encoder.put_usize(first_import);
+        encoder.put_usize(direct_imports.len());
+        first_import += direct_imports.len();
+    }
+    for (_, direct_imports) in &modules {
+        for direct_import in direct_imports {
+            encoder.put_u32(strings.intern(&direct_import.imported));
+            encoder.put_usize(direct_import.line_number);
+            encoder.put_u32(strings.intern(&direct_import.line_contents));
+        }
+    }
+    encoder.put_string_table(&strings);
+    encoder.finish()
+}
+
+/// Encodes parsed imports in a similar layout to the data file:
+/// - header: magic string, version, module count, imported object count;
+/// - module index, sorted by module name: (name id, first object, object count, is package);
+/// - imported objects, grouped by module: (name id, line number, line contents id,
+///   type checking only);
+/// - string table.
+fn encode_parsed_imports(parsed_imports: &HashMap<Module, ParsedModule>) -> Vec<u8> {
+    let mut modules: Vec<(&Module, &ParsedModule)> = parsed_imports.iter().collect();
+    modules.sort_by(|(a, _), (b, _)| a.name.cmp(&b.name));
+
+    let mut strings = StringTableBuilder::default();
+    let mut encoder = Encoder::new(PARSE_FILE_MAGIC, PARSE_FILE_VERSION);
+    encoder.put_usize(modules.len());
+    encoder.put_usize(
+        modules
+            .iter()
+            .map(|(_, parsed_module)| parsed_module.imported_objects.len())
+            .sum(),
+    );
+
+    let mut first_object = 0;
+    for (module, parsed_module) in &modules {
+        encoder.put_u32(strings.intern(&module.name));
+        encoder.put_usize(first_object);
+        encoder.put_usize(parsed_module.imported_objects.len());
+        encoder.put_u32(parsed_module.is_package.into());
+        first_object += parsed_module.imported_objects.len();
+    }
+    for (_, parsed_module) in &modules {
+        for imported_object in &parsed_module.imported_objects {
+            encoder.put_u32(strings.intern(&imported_object.name));
+            encoder.put_usize(imported_object.line_number);
+            encoder.put_u32(strings.intern(&imported_object.line_contents));
+            encoder.put_u32(imported_object.typechecking_only.into());
+        }
+    }
+    encoder.put_string_table(&strings);
+    encoder.finish()
+}
+
+fn decode_parsed_imports(
+    bytes: &[u8],
+    filename: &str,
+) -> GrimpResult<HashMap<Module, ParsedModule>> {
+    let corrupt = || GrimpError::CorruptCache(filename.to_string());
+    let decoder = Decoder::new(bytes);
+    if !decoder.has_header(PARSE_FILE_MAGIC, PARSE_FILE_VERSION) {
+        return Err(corrupt());
+    }
+    let module_count = decoder.usize_at(HEADER_SIZE).ok_or_else(corrupt)?;
+    let object_count = decoder.usize_at(HEADER_SIZE + 4).ok_or_else(corrupt)?;
+    let modules_start = HEADER_SIZE + 8;
+    let objects_start = module_count
+        .checked_mul(PARSE_RECORD_SIZE)
+        .and_then(|size| size.checked_add(modules_start))
+        .ok_or_else(corrupt)?;
+    let strings_start = object_count
+        .checked_mul(PARSE_RECORD_SIZE)
+        .and_then(|size| size.checked_add(objects_start))
+        .ok_or_else(corrupt)?;
+    let strings = decoder.string_table_at(strings_start).ok_or_else(corrupt)?;
 
-    serde_json::to_string(&raw_map).expect("Failed to serialize to JSON")
+    let decode_object = |index: usize| -> Option<ImportedObject> {
+        let offset = objects_start.checked_add(index.checked_mul(PARSE_RECORD_SIZE)?)?;
+        if offset.checked_add(PARSE_RECORD_SIZE)? > strings_start {
+            return None;
+        }
+        Some(ImportedObject {
+            name: strings.get(decoder.u32_at(offset)?)?.to_string(),
+            line_number: decoder.usize_at(offset + 4)?,
+            line_contents: strings.get(decoder.u32_at(offset + 8)?)?.to_string(),
+            typechecking_only: decoder.u32_at(offset + 12)? != 0,
+        })
+    };
+    let decode_module = |index: usize| -> Option<(Module, ParsedModule)> {
+        let offset = modules_start + index * PARSE_RECORD_SIZE;
+        let name = strings.get(decoder.u32_at(offset)?)?;
+        let first_object = decoder.usize_at(offset + 4)?;
+        let object_count = decoder.usize_at(offset + 8)?;
+        let imported_objects = (first_object..first_object.checked_add(object_count)?)
+            .map(decode_object)
+            .collect::<Option<Vec<_>>>()?;
+        Some((
+            Module {
+                name: name.to_string(),
+            },
+            ParsedModule {
+                is_package: decoder.u32_at(offset + 12)? != 0,
+                imported_objects,
+            },
+        ))
+    };
+
+    (0..module_count)
+        .into_par_iter()
+        .map(|index| decode_module(index).ok_or_else(corrupt))
+        .collect()
 }
 
 pub fn parse_json_to_map(
@@ -123,3 +683,133 @@ pub fn parse_json_to_map(
 
     Ok(parsed_map)
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn make_imports_by_module() -> HashMap<Module, HashSet<DirectImport>> {
+        HashMap::from([
+            (
+                Module {
+                    name: "mypackage.foo".to_string(),
+                },
+                HashSet::from([
+                    DirectImport {
+                        importer: "mypackage.foo".to_string(),
+                        imported: "mypackage.bar".to_string(),
+                        line_number: 1,
+                        line_contents: "from . import bar".to_string(),
+                    },
+                    DirectImport {
+                        importer: "mypackage.foo".to_string(),
+                        imported: "os".to_string(),
+                        line_number: 2,
+                        line_contents: "import os".to_string(),
+                    },
+                ]),
+            ),
+            (
+                Module {
+                    name: "mypackage.bar".to_string(),
+                },
+                HashSet::new(),
+            ),
+        ])
+    }
+
+    #[test]
+    fn test_encoded_imports_are_decoded_on_demand() {
+        let imports_by_module = make_imports_by_module();
+        let encoded = encode_imports_by_module(&imports_by_module);
+
+        let cached = CachedImportsByModule::open(FileBytes::Owned(encoded), "data").unwrap();
+
+        for (module, direct_imports) in &imports_by_module {
+            assert_eq!(
+                cached.get(&module.name).unwrap().as_ref(),
+                Some(direct_imports)
+            );
+        }
+        assert_eq!(cached.get("mypackage").unwrap(), None);
+    }
+
+    #[test]
+    fn test_encoding_is_deterministic() {
+        let imports_by_module = make_imports_by_module();
+
+        assert_eq!(
+            encode_imports_by_module(&imports_by_module),
+            encode_imports_by_module(&imports_by_module.clone()),
+        );
+    }
+
+    fn make_parsed_imports() -> HashMap<Module, ParsedModule> {
+        HashMap::from([
+            (
+                Module {
+                    name: "mypackage".to_string(),
+                },
+                ParsedModule {
+                    is_package: true,
+                    imported_objects: vec![
+                        ImportedObject {
+                            name: ".foo".to_string(),
+                            line_number: 1,
+                            line_contents: "from . import foo".to_string(),
+                            typechecking_only: false,
+                        },
+                        ImportedObject {
+                            name: "os".to_string(),
+                            line_number: 4,
+                            line_contents: "import os".to_string(),
+                            typechecking_only: true,
+                        },
+                    ],
+                },
+            ),
+            (
+                Module {
+                    name: "mypackage.foo".to_string(),
+                },
+                ParsedModule {
+                    is_package: false,
+                    imported_objects: vec![],
+                },
+            ),
+        ])
+    }
+
+    #[test]
+    fn test_parsed_imports_round_trip() {
+        let parsed_imports = make_parsed_imports();
+        let encoded = encode_parsed_imports(&parsed_imports);
+
+        assert_eq!(
+            decode_parsed_imports(&encoded, "parsed").unwrap(),
+            parsed_imports
+        );
+    }
+
+    #[test]
+    fn test_truncated_parse_file_is_corrupt() {
+        let mut encoded = encode_parsed_imports(&make_parsed_imports());
+        encoded.truncate(encoded.len() - 1);
+
+        assert!(matches!(
+            decode_parsed_imports(&encoded, "parsed"),
+            Err(GrimpError::CorruptCache(_))
+        ));
+    }
+
+    #[test]
+    fn test_truncated_file_is_corrupt() {
+        let mut encoded = encode_imports_by_module(&make_imports_by_module());
+        encoded.truncate(30);
+
+        assert!(matches!(
+            CachedImportsByModule::open(FileBytes::Owned(encoded), "data"),
+            Err(GrimpError::CorruptCache(_))
+        ));
+    }
+}
@@ -36,6 +36,9 @@ pub enum GrimpError {
 
     #[error("Could not use corrupt cache file {0}.")]
     CorruptCache(String),
+
+    #[error("Could not read module: {0}")]
+    UnreadableModule(#[source] PyErr),
 }
 
 pub type GrimpResult<T> = Result<T, GrimpError>;
@@ -55,6 +58,8 @@ impl From<GrimpError> for PyErr {
                 line_number, text, ..
             } => PyErr::new::<exceptions::ParseError, _>((line_number, text)),
             GrimpError::CorruptCache(_) => exceptions::CorruptCache::new_err(value.to_string()),
+            // Raise the error from reading the module, e.g. FileNotFoundError if it was removed.
+            GrimpError::UnreadableModule(error) => error,
         }
     }
 }
@@ -1,18 +1,24 @@
 use itertools::Itertools;
+use memmap2::Mmap;
 use pyo3::exceptions::{PyFileNotFoundError, PyTypeError, PyUnicodeDecodeError};
 use pyo3::prelude::*;
-use regex::Regex;
+use pyo3::types::PyTuple;
+use regex::bytes::Regex;
 use std::collections::HashMap;
 use std::ffi::OsStr;
 use std::fs;
 use std::fs::File;
 use std::io::prelude::*;
+use std::ops::Deref;
 use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicUsize, Ordering};
 use std::sync::{Arc, LazyLock, Mutex};
+use std::time::{SystemTime, UNIX_EPOCH};
 use unindent::unindent;
 
+// Matches on raw bytes, so that the coding line can be found before the file is decoded.
 static ENCODING_RE: LazyLock<Regex> =
-    LazyLock::new(|| Regex::new(r"^[ \t\f]*#.*?coding[:=][ \t]*([-_.a-zA-Z0-9]+)").unwrap());
+    LazyLock::new(|| Regex::new(r"(?-u)^[ \t\f]*#.*?coding[:=][ \t]*([-_.a-zA-Z0-9]+)").unwrap());
 
 pub trait FileSystem: Send + Sync {
     fn sep(&self) -> &str;
@@ -25,7 +31,186 @@ pub trait FileSystem: Send + Sync {
 
     fn read(&self, file_name: &str) -> PyResult<String>;
 
+    /// Reads a Python source file, avoiding copying it where possible.
+    fn read_source(&self, file_name: &str) -> PyResult<SourceText> {
+        self.read(file_name).map(SourceText::Decoded)
+    }
+
     fn write(&mut self, file_name: &str, contents: &str) -> PyResult<()>;
+
+    /// Reads a file's raw bytes, memory-mapping it where the file system supports that.
+    fn read_bytes(&self, file_name: &str) -> PyResult<FileBytes>;
+
+    /// Reads a file's raw bytes into memory, for files that may be modified while they're read.
+    fn read_bytes_into_memory(&self, file_name: &str) -> PyResult<Vec<u8>> {
+        self.read_bytes(file_name).map(|bytes| bytes.to_vec())
+    }
+
+    fn write_bytes(&mut self, file_name: &str, contents: &[u8]) -> PyResult<()>;
+
+    /// Returns the names of the entries in a directory.
+    fn listdir(&self, directory_name: &str) -> PyResult<Vec<String>>;
+
+    /// Returns the size of a file in bytes, and its mtime.
+    fn stat(&self, file_name: &str) -> PyResult<(u64, f64)>;
+
+    fn remove(&mut self, file_name: &str) -> PyResult<()>;
+
+    /// Sets a file's mtime to now.
+    fn touch(&mut self, file_name: &str) -> PyResult<()>;
+
+    /// Takes an exclusive advisory lock on the file, creating it if necessary.
+    ///
+    /// Blocks until the lock is available. The lock is held until the returned FileLock is
+    /// released or dropped.
+    fn lock(&self, file_name: &str) -> PyResult<FileLock>;
+}
+
+/// An advisory lock on a file.
+///
+/// Can be used as a context manager from Python.
+#[pyclass]
+pub struct FileLock {
+    // None if the file system doesn't need locking, or once the lock has been released.
+    file: Option<File>,
+}
+
+#[pymethods]
+impl FileLock {
+    fn __enter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    #[pyo3(signature = (*_args))]
+    fn __exit__(&mut self, _args: &Bound<'_, PyTuple>) {
+        self.release();
+    }
+
+    fn release(&mut self) {
+        // Closing the file releases the lock.
+        self.file = None;
+    }
+}
+
+/// The raw contents of a file, either memory-mapped or read into memory.
+pub enum FileBytes {
+    Mapped(Mmap),
+    Owned(Vec<u8>),
+}
+
+impl Deref for FileBytes {
+    type Target = [u8];
+
+    fn deref(&self) -> &[u8] {
+        match self {
+            FileBytes::Mapped(mmap) => mmap,
+            FileBytes::Owned(bytes) => bytes,
+        }
+    }
+}
+
+/// The decoded contents of a Python source file.
+pub enum SourceText {
+    /// The file's own bytes, which have been checked to be valid UTF-8.
+    Utf8(FileBytes),
+    /// The file's contents, decoded from another encoding.
+    Decoded(String),
+}
+
+impl SourceText {
+    /// Decodes a source file, using the encoding given by its coding line if it has one.
+    ///
+    /// See https://peps.python.org/pep-0263/.
+    fn decode(file_name: &str, bytes: FileBytes) -> PyResult<Self> {
+        // Python files are assumed UTF-8 by default (PEP 686), but they can specify an
+        // alternative encoding. The coding line needs to be in the first two lines, or it's
+        // ignored.
+        let enc_name = bytes
+            .split(|byte| *byte == b'\n')
+            .take(2)
+            .find_map(|line| ENCODING_RE.captures(line)?.get(1))
+            .map(|encoding_name| String::from_utf8_lossy(encoding_name.as_bytes()).into_owned());
+
+        let Some(enc_name) = enc_name else {
+            return match std::str::from_utf8(&bytes) {
+                Ok(_) => Ok(SourceText::Utf8(bytes)),
+                Err(e) => Err(PyUnicodeDecodeError::new_err(format!(
+                    "Failed to decode file {file_name} as UTF-8: {e}"
+                ))),
+            };
+        };
+
+        let encoding = encoding_rs::Encoding::for_label(enc_name.as_bytes()).ok_or_else(|| {
+            PyUnicodeDecodeError::new_err(format!(
+                "Failed to decode file {file_name} (unknown encoding '{enc_name}')"
+            ))
+        })?;
+        // Decoding strips any byte order mark, so only UTF-8 files without one can be used as
+        // they are.
+        if encoding == encoding_rs::UTF_8
+            && !bytes.starts_with(b"\xEF\xBB\xBF")
+            && std::str::from_utf8(&bytes).is_ok()
+        {
+            return Ok(SourceText::Utf8(bytes));
+        }
+        let (decoded_s, _, had_errors) = encoding.decode(&bytes);
+        if had_errors {
+            Err(PyUnicodeDecodeError::new_err(format!(
+                "Failed to decode file {file_name} with encoding '{enc_name}'"
+            )))
+        } else {
+            Ok(SourceText::Decoded(decoded_s.into_owned()))
+        }
+    }
+
+    pub fn as_str(&self) -> &str {
+        match self {
+            // Safety: the bytes were checked to be valid UTF-8 when the SourceText was created.
+            SourceText::Utf8(bytes) => unsafe { std::str::from_utf8_unchecked(bytes) },
+            SourceText::Decoded(contents) => contents,
+        }
+    }
+
+    pub fn into_string(self) -> String {
+        match self {
+            // Safety: as for as_str.
+            SourceText::Utf8(FileBytes::Owned(bytes)) => unsafe {
+                String::from_utf8_unchecked(bytes)
+            },
+            SourceText::Decoded(contents) => contents,
+            mapped => mapped.as_str().to_string(),
+        }
+    }
+}
+
+impl Deref for SourceText {
+    type Target = str;
+
+    fn deref(&self) -> &str {
+        self.as_str()
+    }
+}
+
+/// Reads a file's raw bytes into memory.
+fn read_file(file_name: &str) -> PyResult<Vec<u8>> {
+    fs::read(file_name)
+        .map_err(|e| PyFileNotFoundError::new_err(format!("Failed to read file {file_name}: {e}")))
+}
+
+/// Reads a file's raw bytes, memory-mapping it.
+fn map_file(file_name: &str) -> PyResult<FileBytes> {
+    let file = File::open(file_name).map_err(|e| {
+        PyFileNotFoundError::new_err(format!("Failed to read file {file_name}: {e}"))
+    })?;
+    // Mapping an empty file isn't supported on all platforms.
+    if file.metadata()?.len() == 0 {
+        return Ok(FileBytes::Owned(vec![]));
+    }
+    // Safety: the mapping is only valid while nothing modifies the file. Only files that Grimp
+    // writes itself are mapped, and it replaces them rather than modifying them (see
+    // write_bytes).
+    let mmap = unsafe { Mmap::map(&file)? };
+    Ok(FileBytes::Mapped(mmap))
 }
 
 #[derive(Clone)]
@@ -84,67 +269,105 @@ impl FileSystem for RealBasicFileSystem {
     }
 
     fn read(&self, file_name: &str) -> PyResult<String> {
-        // Python files are assumed UTF-8 by default (PEP 686), but they can specify an alternative
-        // encoding, which we need to take into account here.
-        // See https://peps.python.org/pep-0263/
+        self.read_source(file_name).map(SourceText::into_string)
+    }
 
-        // This method was authored primarily by an LLM.
+    fn read_source(&self, file_name: &str) -> PyResult<SourceText> {
+        // Source files are read into memory rather than mapped, as they may be edited while
+        // they're being scanned, and truncating a mapped file crashes the process.
+        SourceText::decode(file_name, FileBytes::Owned(read_file(file_name)?))
+    }
 
-        let path = Path::new(file_name);
-        let bytes = fs::read(path).map_err(|e| {
-            PyFileNotFoundError::new_err(format!("Failed to read file {file_name}: {e}"))
-        })?;
+    fn read_bytes_into_memory(&self, file_name: &str) -> PyResult<Vec<u8>> {
+        read_file(file_name)
+    }
 
-        let s = String::from_utf8_lossy(&bytes);
+    fn write(&mut self, file_name: &str, contents: &str) -> PyResult<()> {
+        self.write_bytes(file_name, contents.as_bytes())
+    }
 
-        let mut detected_encoding: Option<String> = None;
+    fn read_bytes(&self, file_name: &str) -> PyResult<FileBytes> {
+        // Windows doesn't allow a mapped file to be replaced, which would stop other processes
+        // from writing to the cache while this one has it open.
+        if cfg!(windows) {
+            return read_file(file_name).map(FileBytes::Owned);
+        }
+        map_file(file_name)
+    }
 
-        // Coding specification needs to be in the first two lines, or it's ignored.
-        for line in s.lines().take(2) {
-            if let Some(captures) = ENCODING_RE.captures(line)
-                && let Some(encoding_name) = captures.get(1)
-            {
-                detected_encoding = Some(encoding_name.as_str().to_string());
-                break;
-            }
+    fn write_bytes(&mut self, file_name: &str, contents: &[u8]) -> PyResult<()> {
+        let file_path: PathBuf = file_name.into();
+        if let Some(patent_dir) = file_path.parent() {
+            fs::create_dir_all(patent_dir)?;
         }
+        // Write to a temporary file and then rename it into place, so that anything reading the
+        // file (including via a memory map) never sees it partially written.
+        let temp_file_path = make_temp_file_path(&file_path);
+        let result = File::create(&temp_file_path)
+            .and_then(|mut file| file.write_all(contents))
+            .and_then(|_| fs::rename(&temp_file_path, &file_path));
+        if result.is_err() {
+            let _ = fs::remove_file(&temp_file_path);
+        }
+        result.map_err(Into::into)
+    }
 
-        if let Some(enc_name) = detected_encoding {
-            let encoding =
-                encoding_rs::Encoding::for_label(enc_name.as_bytes()).ok_or_else(|| {
-                    PyUnicodeDecodeError::new_err(format!(
-                        "Failed to decode file {file_name} (unknown encoding '{enc_name}')"
-                    ))
-                })?;
-            let (decoded_s, _, had_errors) = encoding.decode(&bytes);
-            if had_errors {
-                Err(PyUnicodeDecodeError::new_err(format!(
-                    "Failed to decode file {file_name} with encoding '{enc_name}'"
-                )))
-            } else {
-                Ok(decoded_s.into_owned())
+    fn listdir(&self, directory_name: &str) -> PyResult<Vec<String>> {
+        let mut names = vec![];
+        for entry in fs::read_dir(directory_name)? {
+            // Names that aren't valid unicode can't be Grimp's.
+            if let Ok(name) = entry?.file_name().into_string() {
+                names.push(name);
             }
-        } else {
-            // Default to UTF-8 if no encoding is specified
-            String::from_utf8(bytes).map_err(|e| {
-                PyUnicodeDecodeError::new_err(format!(
-                    "Failed to decode file {file_name} as UTF-8: {e}"
-                ))
-            })
         }
+        Ok(names)
     }
 
-    fn write(&mut self, file_name: &str, contents: &str) -> PyResult<()> {
-        let file_path: PathBuf = file_name.into();
-        if let Some(patent_dir) = file_path.parent() {
-            fs::create_dir_all(patent_dir)?;
+    fn stat(&self, file_name: &str) -> PyResult<(u64, f64)> {
+        let metadata = fs::metadata(file_name)?;
+        let mtime = metadata
+            .modified()?
+            .duration_since(UNIX_EPOCH)
+            .map_or(0.0, |duration| duration.as_secs_f64());
+        Ok((metadata.len(), mtime))
+    }
+
+    fn remove(&mut self, file_name: &str) -> PyResult<()> {
+        fs::remove_file(file_name).map_err(Into::into)
+    }
+
+    fn touch(&mut self, file_name: &str) -> PyResult<()> {
+        let file = File::options().write(true).open(file_name)?;
+        file.set_modified(SystemTime::now()).map_err(Into::into)
+    }
+
+    fn lock(&self, file_name: &str) -> PyResult<FileLock> {
+        let file_path = Path::new(file_name);
+        if let Some(parent_dir) = file_path.parent() {
+            fs::create_dir_all(parent_dir)?;
         }
-        File::create(file_path)?
-            .write_all(contents.as_bytes())
-            .map_err(Into::into)
+        let file = File::options()
+            .create(true)
+            .truncate(false)
+            .write(true)
+            .open(file_path)?;
+        file.lock()?;
+        Ok(FileLock { file: Some(file) })
     }
 }
 
+/// Returns a path, unique to this process, for a temporary file alongside the supplied one.
+fn make_temp_file_path(file_path: &Path) -> PathBuf {
+    static COUNTER: AtomicUsize = AtomicUsize::new(0);
+    let mut file_name = file_path.file_name().unwrap_or_default().to_os_string();
+    file_name.push(format!(
+        ".{}.{}.tmp",
+        std::process::id(),
+        COUNTER.fetch_add(1, Ordering::Relaxed)
+    ));
+    file_path.with_file_name(file_name)
+}
+
 #[pymethods]
 impl PyRealBasicFileSystem {
     #[new]
@@ -179,13 +402,40 @@ impl PyRealBasicFileSystem {
     fn write(&mut self, file_name: &str, contents: &str) -> PyResult<()> {
         self.inner.write(file_name, contents)
     }
+
+    fn listdir(&self, directory_name: &str) -> PyResult<Vec<String>> {
+        self.inner.listdir(directory_name)
+    }
+
+    fn stat(&self, file_name: &str) -> PyResult<(u64, f64)> {
+        self.inner.stat(file_name)
+    }
+
+    fn remove(&mut self, file_name: &str) -> PyResult<()> {
+        self.inner.remove(file_name)
+    }
+
+    fn touch(&mut self, file_name: &str) -> PyResult<()> {
+        self.inner.touch(file_name)
+    }
+
+    fn lock(&self, py: Python<'_>, file_name: &str) -> PyResult<FileLock> {
+        let inner = self.inner.clone();
+        py.detach(|| inner.lock(file_name))
+    }
 }
 
 type FileSystemContents = HashMap<String, String>;
+type BinaryFileSystemContents = HashMap<String, Vec<u8>>;
 
 #[derive(Clone)]
 struct FakeBasicFileSystem {
     contents: Arc<Mutex<FileSystemContents>>,
+    // Files written as bytes, which needn't be valid UTF-8, are kept separately.
+    binary_contents: Arc<Mutex<BinaryFileSystemContents>>,
+    // The mtime of each file that has been written or touched. The clock ticks once for each
+    // of these, so that the order of changes is always recorded.
+    mtimes: Arc<Mutex<HashMap<String, f64>>>,
 }
 
 // Implements BasicFileSystem (defined in grimp.application.ports.filesystem.BasicFileSystem).
@@ -209,8 +459,20 @@ impl FakeBasicFileSystem {
         };
         Ok(FakeBasicFileSystem {
             contents: Arc::new(Mutex::new(parsed_contents)),
+            binary_contents: Arc::new(Mutex::new(HashMap::new())),
+            mtimes: Arc::new(Mutex::new(HashMap::new())),
         })
     }
+
+    fn record_mtime(&self, file_name: &str) {
+        let mut mtimes = self.mtimes.lock().unwrap();
+        let now = mtimes.values().copied().fold(0.0, f64::max) + 1.0;
+        mtimes.insert(file_name.to_string(), now);
+    }
+
+    fn file_not_found(file_name: &str) -> PyErr {
+        PyFileNotFoundError::new_err(format!("No such file: {file_name}"))
+    }
 }
 
 impl FileSystem for FakeBasicFileSystem {
@@ -251,6 +513,7 @@ impl FileSystem for FakeBasicFileSystem {
     /// Checks if a file or directory exists within the file system.
     fn exists(&self, file_name: &str) -> bool {
         self.contents.lock().unwrap().contains_key(file_name)
+            || self.binary_contents.lock().unwrap().contains_key(file_name)
     }
 
     fn read(&self, file_name: &str) -> PyResult<String> {
@@ -265,10 +528,91 @@ impl FileSystem for FakeBasicFileSystem {
 
     #[allow(unused_variables)]
     fn write(&mut self, file_name: &str, contents: &str) -> PyResult<()> {
+        self.binary_contents.lock().unwrap().remove(file_name);
         let mut contents_mut = self.contents.lock().unwrap();
         contents_mut.insert(file_name.to_string(), contents.to_string());
+        self.record_mtime(file_name);
         Ok(())
     }
+
+    fn read_bytes(&self, file_name: &str) -> PyResult<FileBytes> {
+        if let Some(file_contents) = self.binary_contents.lock().unwrap().get(file_name) {
+            return Ok(FileBytes::Owned(file_contents.clone()));
+        }
+        self.read(file_name)
+            .map(|file_contents| FileBytes::Owned(file_contents.into_bytes()))
+    }
+
+    fn write_bytes(&mut self, file_name: &str, contents: &[u8]) -> PyResult<()> {
+        self.contents.lock().unwrap().remove(file_name);
+        let mut binary_contents_mut = self.binary_contents.lock().unwrap();
+        binary_contents_mut.insert(file_name.to_string(), contents.to_vec());
+        self.record_mtime(file_name);
+        Ok(())
+    }
+
+    fn listdir(&self, directory_name: &str) -> PyResult<Vec<String>> {
+        // Directories only exist in the fake file system as the prefixes of files.
+        let prefix = format!("{}/", directory_name.trim_end_matches('/'));
+        let contents = self.contents.lock().unwrap();
+        let binary_contents = self.binary_contents.lock().unwrap();
+        let names: Vec<String> = contents
+            .keys()
+            .chain(binary_contents.keys())
+            .filter_map(|file_name| file_name.strip_prefix(&prefix))
+            .map(|relative_name| relative_name.split('/').next().unwrap().to_string())
+            .unique()
+            .collect();
+        if names.is_empty() {
+            return Err(PyFileNotFoundError::new_err(format!(
+                "No such directory: {directory_name}"
+            )));
+        }
+        Ok(names)
+    }
+
+    fn stat(&self, file_name: &str) -> PyResult<(u64, f64)> {
+        let size = match self.contents.lock().unwrap().get(file_name) {
+            Some(file_contents) => file_contents.len(),
+            None => self
+                .binary_contents
+                .lock()
+                .unwrap()
+                .get(file_name)
+                .ok_or_else(|| Self::file_not_found(file_name))?
+                .len(),
+        };
+        let mtime = self.mtimes.lock().unwrap().get(file_name).copied();
+        Ok((size as u64, mtime.unwrap_or(0.0)))
+    }
+
+    fn remove(&mut self, file_name: &str) -> PyResult<()> {
+        let removed = self.contents.lock().unwrap().remove(file_name).is_some()
+            | self
+                .binary_contents
+                .lock()
+                .unwrap()
+                .remove(file_name)
+                .is_some();
+        if !removed {
+            return Err(Self::file_not_found(file_name));
+        }
+        self.mtimes.lock().unwrap().remove(file_name);
+        Ok(())
+    }
+
+    fn touch(&mut self, file_name: &str) -> PyResult<()> {
+        if !self.exists(file_name) {
+            return Err(Self::file_not_found(file_name));
+        }
+        self.record_mtime(file_name);
+        Ok(())
+    }
+
+    fn lock(&self, _file_name: &str) -> PyResult<FileLock> {
+        // Nothing else can access the fake file system concurrently.
+        Ok(FileLock { file: None })
+    }
 }
 
 #[pymethods]
@@ -308,6 +652,26 @@ impl PyFakeBasicFileSystem {
         self.inner.write(file_name, contents)
     }
 
+    fn listdir(&self, directory_name: &str) -> PyResult<Vec<String>> {
+        self.inner.listdir(directory_name)
+    }
+
+    fn stat(&self, file_name: &str) -> PyResult<(u64, f64)> {
+        self.inner.stat(file_name)
+    }
+
+    fn remove(&mut self, file_name: &str) -> PyResult<()> {
+        self.inner.remove(file_name)
+    }
+
+    fn touch(&mut self, file_name: &str) -> PyResult<()> {
+        self.inner.touch(file_name)
+    }
+
+    fn lock(&self, file_name: &str) -> PyResult<FileLock> {
+        self.inner.lock(file_name)
+    }
+
     // Temporary workaround method for Python tests.
     fn convert_to_basic(&self) -> PyResult<Self> {
         Ok(PyFakeBasicFileSystem {
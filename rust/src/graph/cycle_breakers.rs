@@ -102,8 +102,8 @@ impl Graph {
                             }
                             Ordering::Equal => {
                                 // Tie breaker - choose the earlier one alphabetically.
-                                let incumbent_name = self.get_module(incumbent).unwrap().name();
-                                let candidate_name = self.get_module(candidate).unwrap().name();
+                                let incumbent_name = self.get_module(incumbent).unwrap().name(self);
+                                let candidate_name = self.get_module(candidate).unwrap().name(self);
 
                                 if candidate_name < incumbent_name {
                                     highest_difference_so_far = Some(difference);
@@ -1,7 +1,7 @@
 use crate::errors::{GrimpError, GrimpResult};
+use crate::graph::hierarchy_intervals::HierarchyIntervals;
 use crate::graph::{
-    EMPTY_IMPORT_DETAILS, EMPTY_MODULE_TOKENS, ExtendWithDescendants, Graph, MODULE_NAMES,
-    ModuleToken, PyImportDetails,
+    EMPTY_IMPORT_DETAILS, EMPTY_MODULE_TOKENS, Graph, ModuleToken, PyImportDetails,
 };
 use crate::module_expressions::ModuleExpression;
 use rustc_hash::FxHashSet;
@@ -17,22 +17,23 @@ impl Graph {
         imported: ModuleToken,
         as_packages: bool,
     ) -> GrimpResult<bool> {
-        let mut importers: FxHashSet<_> = importer.into();
-        let mut importeds: FxHashSet<_> = imported.into();
-        if as_packages {
-            importers.extend_with_descendants(self);
-            importeds.extend_with_descendants(self);
-            if !(&importers & &importeds).is_empty() {
-                return Err(GrimpError::SharedDescendants);
-            }
+        if !as_packages {
+            return Ok(self
+                .modules_directly_imported_by(importer)
+                .contains(&imported));
         }
 
-        let direct_imports = importers
+        let hierarchy_intervals = self.check_packages_are_separate(importer, imported)?;
+        Ok(hierarchy_intervals
+            .self_and_descendants(importer)
             .iter()
-            .flat_map(|importer_module| self.imports.get(*importer_module).unwrap().iter().cloned())
-            .collect::<FxHashSet<ModuleToken>>();
-
-        Ok(!(&direct_imports & &importeds).is_empty())
+            .any(|importer_module| {
+                self.modules_directly_imported_by(*importer_module)
+                    .iter()
+                    .any(|imported_module| {
+                        hierarchy_intervals.is_within(*imported_module, imported)
+                    })
+            }))
     }
 
     pub fn find_direct_imports_between(
@@ -41,30 +42,46 @@ impl Graph {
         imported: ModuleToken,
         as_packages: bool,
     ) -> GrimpResult<FxHashSet<(ModuleToken, ModuleToken)>> {
-        let mut all_imports: FxHashSet<(ModuleToken, ModuleToken)> = FxHashSet::default();
-
-        let mut importers: FxHashSet<_> = importer.into();
-        let mut importeds: FxHashSet<_> = imported.into();
-        if as_packages {
-            importers.extend_with_descendants(self);
-            importeds.extend_with_descendants(self);
-            if !(&importers & &importeds).is_empty() {
-                return Err(GrimpError::SharedDescendants);
-            }
+        if !as_packages {
+            return Ok(
+                match self
+                    .modules_directly_imported_by(importer)
+                    .contains(&imported)
+                {
+                    true => FxHashSet::from_iter([(importer, imported)]),
+                    false => FxHashSet::default(),
+                },
+            );
         }
 
-        for importer_module in importers.iter() {
-            if let Some(all_imports_imported_by_this_one) = self.imports.get(*importer_module) {
-                let imports_of_supplied_package: FxHashSet<_> = all_imports_imported_by_this_one
+        let hierarchy_intervals = self.check_packages_are_separate(importer, imported)?;
+        Ok(hierarchy_intervals
+            .self_and_descendants(importer)
+            .iter()
+            .flat_map(|importer_module| {
+                self.modules_directly_imported_by(*importer_module)
                     .iter()
-                    .filter(|candidate| importeds.contains(*candidate))
+                    .filter(|imported_module| {
+                        hierarchy_intervals.is_within(**imported_module, imported)
+                    })
                     .map(|imported_module| (*importer_module, *imported_module))
-                    .collect();
-                all_imports.extend(imports_of_supplied_package);
-            }
-        }
+            })
+            .collect())
+    }
 
-        Ok(all_imports)
+    /// Returns the hierarchy intervals, or an error if one package is within the other.
+    fn check_packages_are_separate(
+        &self,
+        importer: ModuleToken,
+        imported: ModuleToken,
+    ) -> GrimpResult<&HierarchyIntervals> {
+        let hierarchy_intervals = self.hierarchy_intervals();
+        if hierarchy_intervals.is_within(importer, imported)
+            || hierarchy_intervals.is_within(imported, importer)
+        {
+            return Err(GrimpError::SharedDescendants);
+        }
+        Ok(hierarchy_intervals)
     }
 
     pub fn modules_directly_imported_by(&self, importer: ModuleToken) -> &FxHashSet<ModuleToken> {
@@ -93,7 +110,6 @@ impl Graph {
         importer_expression: &ModuleExpression,
         imported_expression: &ModuleExpression,
     ) -> FxHashSet<(ModuleToken, ModuleToken)> {
-        let interner = MODULE_NAMES.read().unwrap();
         self.imports
             .iter()
             .flat_map(|(importer, imports)| {
@@ -104,9 +120,9 @@ impl Graph {
             })
             .filter(|(importer, imported)| {
                 let importer = self.get_module(*importer).unwrap();
-                let importer_name = interner.resolve(importer.interned_name).unwrap();
+                let importer_name = importer.name(self);
                 let imported = self.get_module(*imported).unwrap();
-                let imported_name = interner.resolve(imported.interned_name).unwrap();
+                let imported_name = imported.name(self);
                 importer_expression.is_match(importer_name)
                     && imported_expression.is_match(imported_name)
             })
@@ -0,0 +1,474 @@
+//! A compact, read-only layout of a graph's imports, for traversing them quickly.
+//!
+//! Each module is given a dense index, and the modules it imports (and is imported by) are stored
+//! in compressed sparse row form: one array of offsets, and one array of all the neighbours, so
+//! that a module's neighbours are contiguous in memory. Searches track the modules they have
+//! visited in flat arrays indexed by module, rather than in hash maps.
+
+use crate::graph::shared::SharedModuleSets;
+use crate::graph::{Graph, ModuleToken};
+use rustc_hash::{FxHashMap, FxHashSet};
+use slotmap::SecondaryMap;
+use std::cell::RefCell;
+use std::sync::Arc;
+
+/// A module's position in the frozen layout.
+type Index = u32;
+
+const NO_INDEX: Index = Index::MAX;
+
+thread_local! {
+    static SEARCH_SPACE: RefCell<SearchSpace> = RefCell::new(SearchSpace::default());
+}
+
+#[derive(Debug)]
+pub(crate) struct FrozenImports {
+    tokens: Vec<ModuleToken>,
+    indices: SecondaryMap<ModuleToken, Index>,
+    imports: Adjacency,
+    reverse_imports: Adjacency,
+}
+
+impl Graph {
+    /// Lays out the imports for fast traversal, until the graph is next changed.
+    pub fn freeze(&mut self) {
+        if self.frozen_imports.is_none() {
+            let frozen_imports = FrozenImports::new(self);
+            self.frozen_imports = Some(Arc::new(frozen_imports));
+        }
+    }
+
+    pub fn is_frozen(&self) -> bool {
+        self.frozen_imports.is_some()
+    }
+
+    /// Discards the frozen layout, as the graph is about to change.
+    pub(crate) fn thaw(&mut self) {
+        self.frozen_imports = None;
+    }
+}
+
+impl FrozenImports {
+    fn new(graph: &Graph) -> Self {
+        let tokens: Vec<ModuleToken> = graph.modules.keys().collect();
+        let mut indices = SecondaryMap::with_capacity(tokens.len());
+        for (index, token) in tokens.iter().enumerate() {
+            indices.insert(*token, index as Index);
+        }
+        let imports = Adjacency::new(&tokens, &indices, &graph.imports);
+        let reverse_imports = Adjacency::new(&tokens, &indices, &graph.reverse_imports);
+        FrozenImports {
+            tokens,
+            indices,
+            imports,
+            reverse_imports,
+        }
+    }
+
+    /// The modules imported by the supplied modules, directly or indirectly.
+    pub(crate) fn find_upstream_modules(
+        &self,
+        from_modules: &FxHashSet<ModuleToken>,
+    ) -> FxHashSet<ModuleToken> {
+        self.find_reach(&self.imports, from_modules)
+    }
+
+    /// The modules that import the supplied modules, directly or indirectly.
+    pub(crate) fn find_downstream_modules(
+        &self,
+        from_modules: &FxHashSet<ModuleToken>,
+    ) -> FxHashSet<ModuleToken> {
+        self.find_reach(&self.reverse_imports, from_modules)
+    }
+
+    fn find_reach(
+        &self,
+        adjacency: &Adjacency,
+        from_modules: &FxHashSet<ModuleToken>,
+    ) -> FxHashSet<ModuleToken> {
+        SEARCH_SPACE.with_borrow_mut(|space| {
+            let SearchSpace {
+                forwards,
+                forwards_queue: queue,
+                ..
+            } = space;
+            forwards.start(self.tokens.len());
+            queue.clear();
+            for module in from_modules {
+                let module = self.indices[*module];
+                if forwards.visit(module, NO_INDEX) {
+                    queue.push(module);
+                }
+            }
+
+            let from_module_count = queue.len();
+            let mut i = 0;
+            while i < queue.len() {
+                let module = queue[i];
+                for &next_module in adjacency.neighbours(module) {
+                    if forwards.visit(next_module, module) {
+                        queue.push(next_module);
+                    }
+                }
+                i += 1;
+            }
+
+            queue[from_module_count..]
+                .iter()
+                .map(|module| self.tokens[*module as usize])
+                .collect()
+        })
+    }
+
+    /// Finds the shortest path, via a bidirectional BFS.
+    ///
+    /// The same search as `pathfinding::find_shortest_path`, which checks the supplied modules
+    /// don't overlap.
+    pub(crate) fn find_shortest_path(
+        &self,
+        from_modules: &FxHashSet<ModuleToken>,
+        to_modules: &FxHashSet<ModuleToken>,
+        excluded_modules: &FxHashSet<ModuleToken>,
+        excluded_imports: &FxHashMap<ModuleToken, FxHashSet<ModuleToken>>,
+    ) -> Option<Vec<ModuleToken>> {
+        let excluded_imports: FxHashSet<(Index, Index)> = excluded_imports
+            .iter()
+            .flat_map(|(importer, importeds)| {
+                let importer = self.indices[*importer];
+                importeds
+                    .iter()
+                    .map(move |imported| (importer, self.indices[*imported]))
+            })
+            .collect();
+
+        SEARCH_SPACE.with_borrow_mut(|space| {
+            let SearchSpace {
+                forwards,
+                backwards,
+                excluded,
+                forwards_queue,
+                backwards_queue,
+            } = space;
+            let module_count = self.tokens.len();
+            excluded.start(module_count);
+            for module in excluded_modules {
+                excluded.mark(self.indices[*module]);
+            }
+            let import_is_excluded = |importer: Index, imported: Index| {
+                excluded.contains(imported)
+                    || (!excluded_imports.is_empty()
+                        && excluded_imports.contains(&(importer, imported)))
+            };
+
+            forwards.start(module_count);
+            forwards_queue.clear();
+            for module in from_modules {
+                let module = self.indices[*module];
+                forwards.visit(module, NO_INDEX);
+                forwards_queue.push(module);
+            }
+            backwards.start(module_count);
+            backwards_queue.clear();
+            for module in to_modules {
+                let module = self.indices[*module];
+                backwards.visit(module, NO_INDEX);
+                backwards_queue.push(module);
+            }
+
+            let mut i_forwards = 0;
+            let mut i_backwards = 0;
+            let middle = 'l: loop {
+                for _ in 0..(forwards_queue.len() - i_forwards) {
+                    let module = forwards_queue[i_forwards];
+                    for &next_module in self.imports.neighbours(module) {
+                        if import_is_excluded(module, next_module) {
+                            continue;
+                        }
+                        if forwards.visit(next_module, module) {
+                            forwards_queue.push(next_module);
+                        }
+                        if backwards.contains(next_module) {
+                            break 'l Some(next_module);
+                        }
+                    }
+                    i_forwards += 1;
+                }
+
+                for _ in 0..(backwards_queue.len() - i_backwards) {
+                    let module = backwards_queue[i_backwards];
+                    for &next_module in self.reverse_imports.neighbours(module) {
+                        if import_is_excluded(next_module, module) {
+                            continue;
+                        }
+                        if backwards.visit(next_module, module) {
+                            backwards_queue.push(next_module);
+                        }
+                        if forwards.contains(next_module) {
+                            break 'l Some(next_module);
+                        }
+                    }
+                    i_backwards += 1;
+                }
+
+                if i_forwards == forwards_queue.len() && i_backwards == backwards_queue.len() {
+                    break 'l None;
+                }
+            };
+
+            middle.map(|middle| {
+                let mut path = vec![];
+                let mut module = middle;
+                while module != NO_INDEX {
+                    path.push(self.tokens[module as usize]);
+                    module = forwards.previous(module);
+                }
+                path.reverse();
+                let mut module = backwards.previous(middle);
+                while module != NO_INDEX {
+                    path.push(self.tokens[module as usize]);
+                    module = backwards.previous(module);
+                }
+                path
+            })
+        })
+    }
+}
+
+/// Neighbour lists in compressed sparse row form: the neighbours of the module at index `i` are
+/// `neighbours[offsets[i]..offsets[i + 1]]`, in ascending order.
+#[derive(Debug)]
+struct Adjacency {
+    offsets: Vec<u32>,
+    neighbours: Vec<Index>,
+}
+
+impl Adjacency {
+    fn new(
+        tokens: &[ModuleToken],
+        indices: &SecondaryMap<ModuleToken, Index>,
+        imports_map: &SharedModuleSets,
+    ) -> Self {
+        let mut offsets = Vec::with_capacity(tokens.len() + 1);
+        let mut neighbours = Vec::new();
+        offsets.push(0);
+        for token in tokens {
+            let start = neighbours.len();
+            neighbours.extend(
+                imports_map
+                    .get(*token)
+                    .into_iter()
+                    .flatten()
+                    .map(|neighbour| indices[*neighbour]),
+            );
+            neighbours[start..].sort_unstable();
+            offsets.push(neighbours.len() as u32);
+        }
+        Adjacency {
+            offsets,
+            neighbours,
+        }
+    }
+
+    fn neighbours(&self, module: Index) -> &[Index] {
+        let module = module as usize;
+        &self.neighbours[self.offsets[module] as usize..self.offsets[module + 1] as usize]
+    }
+}
+
+/// The arrays used by searches, kept per thread so that each search doesn't allocate them again.
+#[derive(Default)]
+struct SearchSpace {
+    forwards: Visits,
+    backwards: Visits,
+    excluded: Marks,
+    forwards_queue: Vec<Index>,
+    backwards_queue: Vec<Index>,
+}
+
+/// A set of modules, cleared in constant time when a new search starts.
+///
+/// A module is only in the set if it was marked during the current search, so the array doesn't
+/// need clearing between searches.
+#[derive(Default)]
+struct Marks {
+    search: u32,
+    marked_in_search: Vec<u32>,
+}
+
+impl Marks {
+    fn start(&mut self, module_count: usize) {
+        self.search = self.search.wrapping_add(1);
+        if self.search == 0 {
+            self.marked_in_search.fill(0);
+            self.search = 1;
+        }
+        if self.marked_in_search.len() < module_count {
+            self.marked_in_search.resize(module_count, 0);
+        }
+    }
+
+    fn contains(&self, module: Index) -> bool {
+        self.marked_in_search[module as usize] == self.search
+    }
+
+    /// Adds the module to the set, returning whether it wasn't already present.
+    fn mark(&mut self, module: Index) -> bool {
+        let marked_in_search = &mut self.marked_in_search[module as usize];
+        if *marked_in_search == self.search {
+            return false;
+        }
+        *marked_in_search = self.search;
+        true
+    }
+}
+
+/// The modules visited by a search, with the module each was first reached from.
+#[derive(Default)]
+struct Visits {
+    visited: Marks,
+    previous: Vec<Index>,
+}
+
+impl Visits {
+    fn start(&mut self, module_count: usize) {
+        self.visited.start(module_count);
+        if self.previous.len() < module_count {
+            self.previous.resize(module_count, NO_INDEX);
+        }
+    }
+
+    fn contains(&self, module: Index) -> bool {
+        self.visited.contains(module)
+    }
+
+    /// Records the module as visited, returning whether it hadn't been already.
+    fn visit(&mut self, module: Index, previous: Index) -> bool {
+        if !self.visited.mark(module) {
+            return false;
+        }
+        self.previous[module as usize] = previous;
+        true
+    }
+
+    fn previous(&self, module: Index) -> Index {
+        self.previous[module as usize]
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::graph::pathfinding::find_reach;
+    use parameterized::parameterized;
+
+    fn make_graph() -> Graph {
+        let mut graph = Graph::default();
+        let imports = [
+            ("mypackage.a", "mypackage.b"),
+            ("mypackage.a", "mypackage.c"),
+            ("mypackage.b", "mypackage.d"),
+            ("mypackage.c", "mypackage.d"),
+            ("mypackage.d", "mypackage.e"),
+            ("mypackage.e", "mypackage.f.one"),
+            ("mypackage.f.two", "mypackage.a"),
+            ("mypackage.g", "mypackage.e"),
+        ];
+        for (importer, imported) in imports {
+            let importer = graph.get_or_add_module(importer).token();
+            let imported = graph.get_or_add_module(imported).token();
+            graph.add_import(importer, imported);
+        }
+        graph
+    }
+
+    fn tokens(graph: &Graph, names: &[&str]) -> FxHashSet<ModuleToken> {
+        names
+            .iter()
+            .map(|name| graph.get_module_by_name(name).unwrap().token())
+            .collect()
+    }
+
+    #[parameterized(
+        leaf = { &["mypackage.f.one"] },
+        middle = { &["mypackage.d"] },
+        several = { &["mypackage.b", "mypackage.g"] },
+        cycle = { &["mypackage.f.two", "mypackage.e"] },
+    )]
+    fn test_reach_matches_unfrozen_graph(modules: &[&str]) {
+        let mut graph = make_graph();
+        let from_modules = tokens(&graph, modules);
+        graph.freeze();
+        let frozen = graph.frozen_imports.as_ref().unwrap();
+
+        assert_eq!(
+            frozen.find_upstream_modules(&from_modules),
+            find_reach(&graph.imports, &from_modules)
+        );
+        assert_eq!(
+            frozen.find_downstream_modules(&from_modules),
+            find_reach(&graph.reverse_imports, &from_modules)
+        );
+    }
+
+    #[parameterized(
+        direct = { &["mypackage.d"], &["mypackage.e"], &[], Some(vec!["mypackage.d", "mypackage.e"]) },
+        indirect = { &["mypackage.g"], &["mypackage.f.one"], &[], Some(vec!["mypackage.g", "mypackage.e", "mypackage.f.one"]) },
+        excluded = { &["mypackage.a"], &["mypackage.d"], &["mypackage.b", "mypackage.c"], None },
+        no_path = { &["mypackage.e"], &["mypackage.g"], &[], None },
+    )]
+    fn test_find_shortest_path(
+        from_modules: &[&str],
+        to_modules: &[&str],
+        excluded_modules: &[&str],
+        expected_path: Option<Vec<&str>>,
+    ) {
+        let mut graph = make_graph();
+        graph.freeze();
+        let frozen = graph.frozen_imports.as_ref().unwrap();
+
+        let path = frozen.find_shortest_path(
+            &tokens(&graph, from_modules),
+            &tokens(&graph, to_modules),
+            &tokens(&graph, excluded_modules),
+            &FxHashMap::default(),
+        );
+
+        assert_eq!(
+            path.map(|path| {
+                path.into_iter()
+                    .map(|module| graph.get_module(module).unwrap().name(&graph).to_owned())
+                    .collect::<Vec<_>>()
+            }),
+            expected_path.map(|path| path.into_iter().map(str::to_owned).collect())
+        );
+    }
+
+    #[test]
+    fn test_find_shortest_chains_matches_unfrozen_graph() {
+        let mut graph = make_graph();
+        let a = graph.get_module_by_name("mypackage.a").unwrap().token();
+        let d = graph.get_module_by_name("mypackage.d").unwrap().token();
+        let expected_chains = graph.find_shortest_chains(a, d, false).unwrap();
+
+        graph.freeze();
+
+        assert_eq!(
+            graph.find_shortest_chains(a, d, false).unwrap(),
+            expected_chains
+        );
+        assert_eq!(expected_chains.len(), 2);
+    }
+
+    #[test]
+    fn test_changing_the_graph_thaws_it() {
+        let mut graph = make_graph();
+        graph.freeze();
+        let e = graph.get_module_by_name("mypackage.e").unwrap().token();
+        let g = graph.get_module_by_name("mypackage.g").unwrap().token();
+
+        graph.add_import(e, g);
+
+        assert!(!graph.is_frozen());
+        assert!(graph.chain_exists(e, g, false).unwrap());
+    }
+}
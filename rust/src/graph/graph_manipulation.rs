@@ -1,8 +1,9 @@
-use crate::graph::{
-    Graph, IMPORT_LINE_CONTENTS, MODULE_NAMES, Module, ModuleIterator, ModuleToken, PyImportDetails,
-};
+use crate::graph::{Graph, Module, ModuleIterator, ModuleToken, PyImportDetails};
 use rustc_hash::FxHashSet;
-use slotmap::secondary::Entry;
+use std::mem;
+use std::sync::Arc;
+use string_interner::StringInterner;
+use string_interner::backend::StringBackend;
 
 impl Graph {
     /// `foo.bar.baz => [foo.bar.baz, foo.bar, foo]`
@@ -15,30 +16,37 @@ impl Graph {
     }
 
     pub fn get_or_add_module(&mut self, name: &str) -> &Module {
+        self.thaw();
         if let Some(module) = self.get_module_by_name(name) {
-            let module = self.modules.get_mut(module.token).unwrap();
-            module.is_invisible = false;
-            return module;
+            let module = module.token;
+            if self.modules[module].is_invisible {
+                Arc::make_mut(&mut self.modules)[module].is_invisible = false;
+            }
+            return &self.modules[module];
         }
 
         let mut ancestor_names = self.module_name_to_self_and_ancestors(name);
 
+        self.invalidate_hierarchy_intervals();
         {
-            let mut interner = MODULE_NAMES.write().unwrap();
+            let interner = Arc::make_mut(&mut self.module_names);
+            let modules_by_name = Arc::make_mut(&mut self.modules_by_name);
+            let modules = Arc::make_mut(&mut self.modules);
+            let module_parents = Arc::make_mut(&mut self.module_parents);
             let mut parent: Option<ModuleToken> = None;
             while let Some(name) = ancestor_names.pop() {
                 let name = interner.get_or_intern(name);
-                if let Some(module) = self.modules_by_name.get_by_left(&name) {
+                if let Some(module) = modules_by_name.get_by_left(&name) {
                     parent = Some(*module)
                 } else {
-                    let module = self.modules.insert_with_key(|token| Module {
+                    let module = modules.insert_with_key(|token| Module {
                         token,
                         interned_name: name,
                         is_invisible: !ancestor_names.is_empty(),
                         is_squashed: false,
                     });
-                    self.modules_by_name.insert(name, module);
-                    self.module_parents.insert(module, parent);
+                    modules_by_name.insert(name, module);
+                    module_parents.insert(module, parent);
                     self.module_children.insert(module, FxHashSet::default());
                     self.imports.insert(module, FxHashSet::default());
                     self.reverse_imports.insert(module, FxHashSet::default());
@@ -53,6 +61,207 @@ impl Graph {
         self.get_module_by_name(name).unwrap()
     }
 
+    /// Adds the imports found by scanning some packages to the graph, in a single pass.
+    ///
+    /// `imports_by_importer` yields each scanned module, together with the
+    /// (imported module, line number, line contents) of each of its imports.
+    /// Any imported module that is neither one of the `package_names` nor a descendant of
+    /// one is treated as external, and added as a squashed module.
+    pub fn add_scanned_imports<'a, I, J>(
+        &mut self,
+        imports_by_importer: I,
+        package_names: &FxHashSet<&str>,
+    ) where
+        I: IntoIterator<Item = (&'a str, J)>,
+        J: IntoIterator<Item = (&'a str, u32, &'a str)>,
+    {
+        self.thaw();
+        // Take the strings out of the graph for the pass, so that modules can be added while
+        // interning into them.
+        let mut module_names = mem::take(&mut self.module_names);
+        let mut import_line_contents = mem::take(&mut self.import_line_contents);
+        let module_names_interner = Arc::make_mut(&mut module_names);
+        let import_line_contents_interner = Arc::make_mut(&mut import_line_contents);
+
+        for (importer_name, imports) in imports_by_importer {
+            let importer =
+                self.get_or_add_module_interned(module_names_interner, importer_name, false);
+            for (imported_name, line_number, line_contents) in imports {
+                let imported =
+                    self.get_or_add_module_interned(module_names_interner, imported_name, false);
+                if !is_within_packages(imported_name, package_names)
+                    && self.module_children[imported].is_empty()
+                {
+                    Arc::make_mut(&mut self.modules)[imported].is_squashed = true;
+                }
+
+                self.imports[importer].insert(imported);
+                self.reverse_imports[imported].insert(importer);
+                let line_contents = import_line_contents_interner.get_or_intern(line_contents);
+                self.import_details
+                    .get_mut_or_default((importer, imported))
+                    .insert(PyImportDetails::new(line_number, line_contents));
+            }
+        }
+
+        self.module_names = module_names;
+        self.import_line_contents = import_line_contents;
+    }
+
+    /// Replaces the imports of some modules that have been scanned again, and removes the
+    /// modules that no longer exist, leaving the graph as if it had been built from scratch.
+    ///
+    /// `imports_by_importer` is as for `add_scanned_imports`. Modules whose imports are unchanged
+    /// are left untouched. Besides the `removed_modules`, any external modules that are no longer
+    /// imported, and any invisible ancestors left without children, are removed too.
+    ///
+    /// Returns the names of the modules whose imports changed, including those removed.
+    pub fn replace_scanned_imports<'a, I, J>(
+        &mut self,
+        imports_by_importer: I,
+        removed_modules: &FxHashSet<&str>,
+        package_names: &FxHashSet<&str>,
+    ) -> FxHashSet<String>
+    where
+        I: IntoIterator<Item = (&'a str, J)>,
+        J: IntoIterator<Item = (&'a str, u32, &'a str)>,
+    {
+        let mut changed_modules = FxHashSet::default();
+        // Modules that may no longer belong in the graph, once the imports have been replaced.
+        let mut unneeded_module_candidates = vec![];
+
+        let mut replacements = vec![];
+        for (importer_name, imports) in imports_by_importer {
+            let imports: FxHashSet<(&str, u32, &str)> = imports.into_iter().collect();
+            if let Some(importer) = self
+                .get_module_by_name(importer_name)
+                .filter(|module| !module.is_invisible())
+                .map(|module| module.token())
+            {
+                if self.scanned_imports_match(importer, &imports) {
+                    continue;
+                }
+                for imported in self.modules_directly_imported_by(importer).clone() {
+                    self.remove_import(importer, imported);
+                    unneeded_module_candidates.push(imported);
+                }
+            }
+            changed_modules.insert(importer_name.to_owned());
+            replacements.push((importer_name, imports));
+        }
+
+        for module_name in removed_modules {
+            let Some(module) = self
+                .get_module_by_name(module_name)
+                .map(|module| module.token())
+            else {
+                continue;
+            };
+            for imported in self.modules_directly_imported_by(module).clone() {
+                self.remove_import(module, imported);
+                unneeded_module_candidates.push(imported);
+            }
+            // A module with children that still exist stays in the hierarchy, as it would if
+            // the children had been added by themselves.
+            if self.module_children[module].is_empty() {
+                unneeded_module_candidates.extend(self.module_parents[module]);
+                self.remove_module(module);
+            } else {
+                Arc::make_mut(&mut self.modules)[module].is_invisible = true;
+            }
+            changed_modules.insert(module_name.to_string());
+        }
+
+        self.add_scanned_imports(
+            replacements
+                .iter()
+                .map(|(importer_name, imports)| (*importer_name, imports.iter().copied())),
+            package_names,
+        );
+
+        while let Some(module) = unneeded_module_candidates.pop() {
+            let Some(module) = self.get_module(module) else {
+                // Already removed.
+                continue;
+            };
+            let has_no_children = self.module_children[module.token()].is_empty();
+            let is_unimported_external_module = !module.is_invisible()
+                && self.modules_that_directly_import(module.token()).is_empty()
+                && !is_within_packages(module.name(self), package_names);
+            if has_no_children && (module.is_invisible() || is_unimported_external_module) {
+                let module = module.token();
+                unneeded_module_candidates.extend(self.module_parents[module]);
+                self.remove_module(module);
+            }
+        }
+
+        changed_modules
+    }
+
+    /// Whether the imports of the module are exactly those supplied, with the same details.
+    fn scanned_imports_match(
+        &self,
+        importer: ModuleToken,
+        imports: &FxHashSet<(&str, u32, &str)>,
+    ) -> bool {
+        let mut import_count = 0;
+        for imported in self.modules_directly_imported_by(importer) {
+            let imported_name = self.get_module(*imported).unwrap().name(self);
+            for details in self.get_import_details(importer, *imported) {
+                if !imports.contains(&(
+                    imported_name,
+                    details.line_number(),
+                    details.line_contents(self),
+                )) {
+                    return false;
+                }
+                import_count += 1;
+            }
+        }
+        import_count == imports.len()
+    }
+
+    /// Like `get_or_add_module`, but using the module name interner taken out of the graph.
+    ///
+    /// Ancestors are only looked up (and added, as invisible modules) if the module
+    /// is not already in the graph.
+    fn get_or_add_module_interned(
+        &mut self,
+        interner: &mut StringInterner<StringBackend>,
+        name: &str,
+        is_invisible: bool,
+    ) -> ModuleToken {
+        let interned_name = interner.get_or_intern(name);
+        if let Some(module) = self.modules_by_name.get_by_left(&interned_name) {
+            let module = *module;
+            if !is_invisible && self.modules[module].is_invisible {
+                Arc::make_mut(&mut self.modules)[module].is_invisible = false;
+            }
+            return module;
+        }
+
+        let parent = name
+            .rsplit_once(".")
+            .map(|(parent_name, _)| self.get_or_add_module_interned(interner, parent_name, true));
+
+        self.invalidate_hierarchy_intervals();
+        let module = Arc::make_mut(&mut self.modules).insert_with_key(|token| Module {
+            token,
+            interned_name,
+            is_invisible,
+            is_squashed: false,
+        });
+        Arc::make_mut(&mut self.modules_by_name).insert(interned_name, module);
+        Arc::make_mut(&mut self.module_parents).insert(module, parent);
+        self.module_children.insert(module, FxHashSet::default());
+        self.imports.insert(module, FxHashSet::default());
+        self.reverse_imports.insert(module, FxHashSet::default());
+        if let Some(parent) = parent {
+            self.module_children[parent].insert(module);
+        }
+        module
+    }
+
     pub fn get_or_add_squashed_module(&mut self, module: &str) -> &Module {
         let module = self.get_or_add_module(module).token();
         self.mark_module_squashed(module);
@@ -60,7 +269,7 @@ impl Graph {
     }
 
     fn mark_module_squashed(&mut self, module: ModuleToken) {
-        let module = self.modules.get_mut(module).unwrap();
+        let module = Arc::make_mut(&mut self.modules).get_mut(module).unwrap();
         if !self.module_children[module.token].is_empty() {
             panic!("cannot mark a module with children as squashed")
         }
@@ -68,11 +277,13 @@ impl Graph {
     }
 
     pub fn remove_module(&mut self, module: ModuleToken) {
+        self.thaw();
         let module = self.get_module(module);
         if module.is_none() {
             return;
         }
         let module = module.unwrap().token();
+        self.invalidate_hierarchy_intervals();
 
         // TODO(peter) Remove children automatically here, or raise an error?
         if !self.module_children[module].is_empty() {
@@ -85,9 +296,9 @@ impl Graph {
         if let Some(parent) = self.module_parents[module] {
             self.module_children[parent].remove(&module);
         }
-        self.modules_by_name.remove_by_right(&module);
-        self.modules.remove(module);
-        self.module_parents.remove(module);
+        Arc::make_mut(&mut self.modules_by_name).remove_by_right(&module);
+        Arc::make_mut(&mut self.modules).remove(module);
+        Arc::make_mut(&mut self.module_parents).remove(module);
         self.module_children.remove(module);
 
         // Update imports.
@@ -102,15 +313,10 @@ impl Graph {
     }
 
     pub fn add_import(&mut self, importer: ModuleToken, imported: ModuleToken) {
-        self.imports
-            .entry(importer)
-            .unwrap()
-            .or_default()
-            .insert(imported);
+        self.thaw();
+        self.imports.get_mut_or_default(importer).insert(imported);
         self.reverse_imports
-            .entry(imported)
-            .unwrap()
-            .or_default()
+            .get_mut_or_default(imported)
             .insert(importer);
     }
 
@@ -121,43 +327,38 @@ impl Graph {
         line_number: u32,
         line_contents: &str,
     ) {
-        self.imports
-            .entry(importer)
-            .unwrap()
-            .or_default()
-            .insert(imported);
+        self.thaw();
+        self.imports.get_mut_or_default(importer).insert(imported);
         self.reverse_imports
-            .entry(imported)
-            .unwrap()
-            .or_default()
+            .get_mut_or_default(imported)
             .insert(importer);
-        {
-            let mut interner = IMPORT_LINE_CONTENTS.write().unwrap();
-            let line_contents = interner.get_or_intern(line_contents);
-            self.import_details
-                .entry((importer, imported))
-                .or_default()
-                .insert(PyImportDetails::new(line_number, line_contents));
-        }
+        let line_contents =
+            Arc::make_mut(&mut self.import_line_contents).get_or_intern(line_contents);
+        self.import_details
+            .get_mut_or_default((importer, imported))
+            .insert(PyImportDetails::new(line_number, line_contents));
     }
 
     pub fn remove_import(&mut self, importer: ModuleToken, imported: ModuleToken) {
-        match self.imports.entry(importer).unwrap() {
-            Entry::Occupied(mut entry) => {
-                entry.get_mut().remove(&imported);
-            }
-            Entry::Vacant(_) => {}
-        };
-        match self.reverse_imports.entry(imported).unwrap() {
-            Entry::Occupied(mut entry) => {
-                entry.get_mut().remove(&importer);
-            }
-            Entry::Vacant(_) => {}
-        };
+        self.thaw();
+        // Only touch the sets that change, so that clones don't copy any others.
+        if self
+            .modules_directly_imported_by(importer)
+            .contains(&imported)
+        {
+            self.imports[importer].remove(&imported);
+        }
+        if self
+            .modules_that_directly_import(imported)
+            .contains(&importer)
+        {
+            self.reverse_imports[imported].remove(&importer);
+        }
         self.import_details.remove(&(importer, imported));
     }
 
     pub fn squash_module(&mut self, module: ModuleToken) {
+        self.thaw();
         // Get descendants and their imports.
         let descendants: FxHashSet<_> = self.get_module_descendants(module).tokens().collect();
 
@@ -196,6 +397,206 @@ impl Graph {
     }
 }
 
+/// Whether the module is one of the packages, or a descendant of one.
+fn is_within_packages(name: &str, package_names: &FxHashSet<&str>) -> bool {
+    let mut candidate = name;
+    loop {
+        if package_names.contains(candidate) {
+            return true;
+        }
+        match candidate.rsplit_once(".") {
+            Some((parent, _)) => candidate = parent,
+            None => return false,
+        }
+    }
+}
+
 fn parent_name(name: &str) -> Option<String> {
     name.rsplit_once(".").map(|(base, _)| base.to_owned())
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_add_scanned_imports() {
+        let mut graph = Graph::default();
+        let package_names = FxHashSet::from_iter(["mypackage"]);
+
+        graph.add_scanned_imports(
+            [
+                ("mypackage", vec![]),
+                (
+                    "mypackage.foo.one",
+                    vec![
+                        ("mypackage.bar", 1, "from mypackage import bar"),
+                        ("django", 2, "from django.db import models"),
+                    ],
+                ),
+                ("mypackage.bar", vec![]),
+            ],
+            &package_names,
+        );
+
+        let foo = graph.get_module_by_name("mypackage.foo").unwrap();
+        assert!(foo.is_invisible());
+        let one = graph
+            .get_module_by_name("mypackage.foo.one")
+            .unwrap()
+            .token();
+        let bar = graph.get_module_by_name("mypackage.bar").unwrap().token();
+        let django = graph.get_module_by_name("django").unwrap();
+        assert!(django.is_squashed());
+        assert!(!graph.get_module(bar).unwrap().is_squashed());
+        assert_eq!(
+            graph.modules_directly_imported_by(one),
+            &FxHashSet::from_iter([bar, django.token()])
+        );
+        assert_eq!(
+            graph
+                .get_import_details(one, bar)
+                .iter()
+                .map(|details| (details.line_number(), details.line_contents(&graph)))
+                .collect::<Vec<_>>(),
+            vec![(1, "from mypackage import bar")]
+        );
+    }
+
+    #[test]
+    fn test_clones_share_names_until_one_adds_a_module() {
+        let mut graph = Graph::default();
+        graph.get_or_add_module("mypackage.foo");
+        let mut clone = graph.clone();
+        clone.get_or_add_module("mypackage.foo");
+        assert!(Arc::ptr_eq(&graph.module_names, &clone.module_names));
+
+        clone.get_or_add_module("mypackage.bar");
+
+        assert!(!Arc::ptr_eq(&graph.module_names, &clone.module_names));
+        assert!(graph.get_module_by_name("mypackage.bar").is_none());
+        for name in ["mypackage.foo", "mypackage.bar"] {
+            assert_eq!(clone.get_module_by_name(name).unwrap().name(&clone), name);
+        }
+    }
+
+    fn make_scanned_graph() -> Graph {
+        let mut graph = Graph::default();
+        graph.add_scanned_imports(
+            [
+                ("mypackage", vec![]),
+                (
+                    "mypackage.foo",
+                    vec![("mypackage.bar", 1, "from mypackage import bar")],
+                ),
+                (
+                    "mypackage.bar",
+                    vec![("django", 1, "from django.db import models")],
+                ),
+                ("mypackage.baz.one", vec![]),
+            ],
+            &FxHashSet::from_iter(["mypackage"]),
+        );
+        graph
+    }
+
+    fn get_imports(graph: &Graph) -> Vec<(String, String, u32, String)> {
+        let mut imports: Vec<_> = graph
+            .all_modules()
+            .flat_map(|importer| {
+                graph
+                    .modules_directly_imported_by(importer.token())
+                    .iter()
+                    .flat_map(move |imported| {
+                        graph
+                            .get_import_details(importer.token(), *imported)
+                            .iter()
+                            .map(move |details| {
+                                (
+                                    importer.name(graph).to_owned(),
+                                    graph.get_module(*imported).unwrap().name(graph).to_owned(),
+                                    details.line_number(),
+                                    details.line_contents(graph).to_owned(),
+                                )
+                            })
+                    })
+            })
+            .collect();
+        imports.sort();
+        imports
+    }
+
+    #[test]
+    fn test_replace_scanned_imports_leaves_unchanged_modules_untouched() {
+        let mut graph = make_scanned_graph();
+
+        let changed_modules = graph.replace_scanned_imports(
+            [(
+                "mypackage.foo",
+                vec![("mypackage.bar", 1, "from mypackage import bar")],
+            )],
+            &FxHashSet::default(),
+            &FxHashSet::from_iter(["mypackage"]),
+        );
+
+        assert!(changed_modules.is_empty());
+        assert_eq!(get_imports(&graph), get_imports(&make_scanned_graph()));
+    }
+
+    #[test]
+    fn test_replace_scanned_imports_matches_a_graph_built_from_scratch() {
+        let mut graph = make_scanned_graph();
+
+        let changed_modules = graph.replace_scanned_imports(
+            [
+                (
+                    "mypackage.foo",
+                    vec![("mypackage.new", 2, "from mypackage import new")],
+                ),
+                ("mypackage.bar", vec![]),
+                ("mypackage.new", vec![("flask", 1, "import flask")]),
+            ],
+            &FxHashSet::from_iter(["mypackage.baz.one"]),
+            &FxHashSet::from_iter(["mypackage"]),
+        );
+
+        let mut expected_graph = Graph::default();
+        expected_graph.add_scanned_imports(
+            [
+                ("mypackage", vec![]),
+                (
+                    "mypackage.foo",
+                    vec![("mypackage.new", 2, "from mypackage import new")],
+                ),
+                ("mypackage.bar", vec![]),
+                ("mypackage.new", vec![("flask", 1, "import flask")]),
+            ],
+            &FxHashSet::from_iter(["mypackage"]),
+        );
+        assert_eq!(
+            changed_modules,
+            FxHashSet::from_iter(
+                [
+                    "mypackage.foo",
+                    "mypackage.bar",
+                    "mypackage.new",
+                    "mypackage.baz.one"
+                ]
+                .map(str::to_owned)
+            )
+        );
+        assert_eq!(get_imports(&graph), get_imports(&expected_graph));
+        let mut module_names: Vec<_> = graph
+            .all_modules()
+            .map(|module| module.name(&graph))
+            .collect();
+        module_names.sort();
+        let mut expected_module_names: Vec<_> = expected_graph
+            .all_modules()
+            .map(|module| module.name(&expected_graph))
+            .collect();
+        expected_module_names.sort();
+        assert_eq!(module_names, expected_module_names);
+        assert!(graph.get_module_by_name("flask").unwrap().is_squashed());
+    }
+}
@@ -0,0 +1,177 @@
+//! A pre-order numbering of the module hierarchy.
+//!
+//! Each module is followed by all of its descendants, so a package and its descendants occupy a
+//! contiguous range of positions. Whether a module is within a package is then a comparison of
+//! positions, and a package's descendants can be read as a slice rather than collected by walking
+//! the hierarchy.
+
+use crate::graph::{Graph, ModuleToken};
+use slotmap::SecondaryMap;
+use std::sync::{Arc, OnceLock};
+
+#[derive(Debug)]
+pub(crate) struct HierarchyIntervals {
+    /// Every module, each followed by its descendants.
+    preorder: Vec<ModuleToken>,
+    /// For each module, its position in `preorder`, and the position after its last descendant.
+    intervals: SecondaryMap<ModuleToken, (u32, u32)>,
+}
+
+impl Graph {
+    /// The numbering of the hierarchy, built the first time it's needed after modules are added
+    /// or removed.
+    pub(crate) fn hierarchy_intervals(&self) -> &HierarchyIntervals {
+        self.hierarchy_intervals
+            .get_or_init(|| Arc::new(HierarchyIntervals::new(self)))
+    }
+
+    /// Discards the numbering, as modules are about to be added or removed.
+    pub(crate) fn invalidate_hierarchy_intervals(&mut self) {
+        self.hierarchy_intervals = OnceLock::new();
+    }
+}
+
+impl HierarchyIntervals {
+    fn new(graph: &Graph) -> Self {
+        let mut preorder = Vec::with_capacity(graph.modules.len());
+        let mut intervals = SecondaryMap::with_capacity(graph.modules.len());
+
+        // Modules still to visit, and whether all their descendants have been visited.
+        let mut stack: Vec<(ModuleToken, bool)> = graph
+            .modules
+            .keys()
+            .filter(|module| graph.module_parents[*module].is_none())
+            .map(|module| (module, false))
+            .collect();
+        while let Some((module, descendants_visited)) = stack.pop() {
+            if descendants_visited {
+                intervals[module].1 = preorder.len() as u32;
+                continue;
+            }
+            intervals.insert(module, (preorder.len() as u32, 0));
+            preorder.push(module);
+            stack.push((module, true));
+            stack.extend(
+                graph.module_children[module]
+                    .iter()
+                    .map(|child| (*child, false)),
+            );
+        }
+
+        HierarchyIntervals {
+            preorder,
+            intervals,
+        }
+    }
+
+    /// The module followed by its descendants, with parents before their children.
+    pub(crate) fn self_and_descendants(&self, module: ModuleToken) -> &[ModuleToken] {
+        match self.intervals.get(module) {
+            Some((start, end)) => &self.preorder[*start as usize..*end as usize],
+            None => &[],
+        }
+    }
+
+    /// The module's descendants, with parents before their children.
+    pub(crate) fn descendants(&self, module: ModuleToken) -> &[ModuleToken] {
+        match self.self_and_descendants(module) {
+            [] => &[],
+            [_, descendants @ ..] => descendants,
+        }
+    }
+
+    /// Whether the module is the package, or one of its descendants.
+    pub(crate) fn is_within(&self, module: ModuleToken, package: ModuleToken) -> bool {
+        let (start, end) = self.intervals[package];
+        let position = self.intervals[module].0;
+        start <= position && position < end
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::graph::ModuleIterator;
+    use rustc_hash::FxHashSet;
+
+    fn make_graph() -> Graph {
+        let mut graph = Graph::default();
+        for name in [
+            "mypackage.foo.one",
+            "mypackage.foo.two.green",
+            "mypackage.bar",
+            "otherpackage.baz",
+        ] {
+            graph.get_or_add_module(name);
+        }
+        graph
+    }
+
+    fn names(graph: &Graph, modules: &[ModuleToken]) -> Vec<String> {
+        modules
+            .iter()
+            .map(|module| graph.get_module(*module).unwrap().name(graph).to_owned())
+            .collect()
+    }
+
+    #[test]
+    fn test_descendants() {
+        let graph = make_graph();
+        let foo = graph.get_module_by_name("mypackage.foo").unwrap().token();
+
+        let mut descendants = names(&graph, graph.hierarchy_intervals().descendants(foo));
+
+        // Parents come before their children.
+        let two_position = descendants
+            .iter()
+            .position(|name| name == "mypackage.foo.two");
+        let green_position = descendants
+            .iter()
+            .position(|name| name == "mypackage.foo.two.green");
+        assert!(two_position < green_position);
+        descendants.sort();
+        assert_eq!(
+            descendants,
+            vec![
+                "mypackage.foo.one",
+                "mypackage.foo.two",
+                "mypackage.foo.two.green"
+            ]
+        );
+    }
+
+    #[test]
+    fn test_is_within() {
+        let graph = make_graph();
+        let token = |name| graph.get_module_by_name(name).unwrap().token();
+        let intervals = graph.hierarchy_intervals();
+
+        assert!(intervals.is_within(token("mypackage.foo.two.green"), token("mypackage")));
+        assert!(intervals.is_within(token("mypackage.foo"), token("mypackage.foo")));
+        assert!(!intervals.is_within(token("mypackage.foo"), token("mypackage.foo.one")));
+        assert!(!intervals.is_within(token("mypackage.bar"), token("mypackage.foo")));
+        assert!(!intervals.is_within(token("otherpackage.baz"), token("mypackage")));
+    }
+
+    #[test]
+    fn test_intervals_are_rebuilt_when_modules_change() {
+        let mut graph = make_graph();
+        let foo = graph.get_module_by_name("mypackage.foo").unwrap().token();
+        assert_eq!(graph.hierarchy_intervals().descendants(foo).len(), 3);
+
+        graph.get_or_add_module("mypackage.foo.three");
+        let two = graph
+            .get_module_by_name("mypackage.foo.two")
+            .unwrap()
+            .token();
+        graph.remove_module(two);
+
+        assert_eq!(
+            graph
+                .get_module_descendants(foo)
+                .names(&graph)
+                .collect::<FxHashSet<_>>(),
+            FxHashSet::from_iter(["mypackage.foo.one", "mypackage.foo.three"].map(str::to_owned))
+        );
+    }
+}
@@ -1,11 +1,10 @@
-use crate::graph::{Graph, MODULE_NAMES, Module, ModuleIterator, ModuleToken};
+use crate::graph::{Graph, Module, ModuleIterator, ModuleToken};
 use crate::module_expressions::ModuleExpression;
 use rustc_hash::FxHashSet;
 
 impl Graph {
     pub fn get_module_by_name(&self, name: &str) -> Option<&Module> {
-        let interner = MODULE_NAMES.read().unwrap();
-        let name = interner.get(name)?;
+        let name = self.module_names.get(name)?;
         match self.modules_by_name.get_by_left(&name) {
             Some(token) => self.get_module(*token),
             None => None,
@@ -43,22 +42,20 @@ impl Graph {
     ///
     /// Parent modules will be yielded before their child modules.
     pub fn get_module_descendants(&self, module: ModuleToken) -> impl ModuleIterator<'_> {
-        let mut descendants = self.get_module_children(module).collect::<Vec<_>>();
-        for child in descendants.clone() {
-            descendants.extend(self.get_module_descendants(child.token).collect::<Vec<_>>())
-        }
-        descendants.into_iter()
+        self.hierarchy_intervals()
+            .descendants(module)
+            .iter()
+            .map(|descendant| self.get_module(*descendant).unwrap())
     }
 
     pub fn find_matching_modules(
         &self,
         expression: &ModuleExpression,
     ) -> impl ModuleIterator<'_> + use<'_> {
-        let interner = MODULE_NAMES.read().unwrap();
         let modules: FxHashSet<_> = self
             .modules
             .values()
-            .filter(|m| expression.is_match(interner.resolve(m.interned_name).unwrap()))
+            .filter(|m| expression.is_match(m.name(self)))
             .collect();
         modules.into_iter()
     }
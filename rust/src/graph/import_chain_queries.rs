@@ -16,7 +16,10 @@ impl Graph {
             from_modules.extend_with_descendants(self);
         }
 
-        find_reach(&self.reverse_imports, &from_modules)
+        match &self.frozen_imports {
+            Some(frozen_imports) => frozen_imports.find_downstream_modules(&from_modules),
+            None => find_reach(&self.reverse_imports, &from_modules),
+        }
     }
 
     pub fn find_upstream_modules(
@@ -29,7 +32,10 @@ impl Graph {
             from_modules.extend_with_descendants(self);
         }
 
-        find_reach(&self.imports, &from_modules)
+        match &self.frozen_imports {
+            Some(frozen_imports) => frozen_imports.find_upstream_modules(&from_modules),
+            None => find_reach(&self.imports, &from_modules),
+        }
     }
 
     pub fn find_shortest_chain(
@@ -5,33 +5,36 @@ use itertools::Itertools;
 use pyo3::IntoPyObjectExt;
 use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
-use pyo3::types::{IntoPyDict, PyDict, PyFrozenSet, PyList, PySet, PyString, PyTuple};
+use pyo3::types::{IntoPyDict, PyBytes, PyDict, PyFrozenSet, PyList, PySet, PyString, PyTuple};
 use rayon::prelude::*;
-use rustc_hash::{FxHashMap, FxHashSet};
+use rustc_hash::FxHashSet;
 use slotmap::{SecondaryMap, SlotMap, new_key_type};
 use std::collections::HashSet;
-use std::sync::{LazyLock, RwLock};
+use std::sync::{Arc, LazyLock, OnceLock};
 use string_interner::backend::StringBackend;
 use string_interner::{DefaultSymbol, StringInterner};
 
 use crate::errors::{GrimpError, GrimpResult, ModuleNotPresent};
 use crate::graph::higher_order_queries::Level;
 use crate::graph::higher_order_queries::PackageDependency as PyPackageDependency;
+use crate::graph::shared::{SharedImportDetails, SharedModuleSets};
+use crate::import_scanning::ImportsByModule;
 use crate::module_expressions::ModuleExpression;
+use crate::workers;
 
 pub mod direct_import_queries;
+pub(crate) mod frozen;
 pub mod graph_manipulation;
+pub(crate) mod hierarchy_intervals;
 pub mod hierarchy_queries;
 pub mod higher_order_queries;
 pub mod import_chain_queries;
+pub mod snapshot;
 
 pub mod cycle_breakers;
 pub(crate) mod pathfinding;
+pub(crate) mod shared;
 
-static MODULE_NAMES: LazyLock<RwLock<StringInterner<StringBackend>>> =
-    LazyLock::new(|| RwLock::new(StringInterner::default()));
-static IMPORT_LINE_CONTENTS: LazyLock<RwLock<StringInterner<StringBackend>>> =
-    LazyLock::new(|| RwLock::new(StringInterner::default()));
 static EMPTY_MODULE_TOKENS: LazyLock<FxHashSet<ModuleToken>> = LazyLock::new(FxHashSet::default);
 static EMPTY_IMPORT_DETAILS: LazyLock<FxHashSet<PyImportDetails>> =
     LazyLock::new(FxHashSet::default);
@@ -55,23 +58,31 @@ pub struct Module {
 }
 
 impl Module {
-    pub fn name(&self) -> String {
-        let interner = MODULE_NAMES.read().unwrap();
-        interner.resolve(self.interned_name).unwrap().to_owned()
+    pub fn name<'a>(&self, graph: &'a Graph) -> &'a str {
+        graph.module_names.resolve(self.interned_name).unwrap()
     }
 }
 
+// Every collection is shared with clones of the graph until one of them changes it, so cloning a
+// graph is cheap.
 #[derive(Default, Clone)]
 pub struct Graph {
     // Hierarchy
-    modules_by_name: BiMap<DefaultSymbol, ModuleToken>,
-    modules: SlotMap<ModuleToken, Module>,
-    module_parents: SecondaryMap<ModuleToken, Option<ModuleToken>>,
-    module_children: SecondaryMap<ModuleToken, FxHashSet<ModuleToken>>,
+    modules_by_name: Arc<BiMap<DefaultSymbol, ModuleToken>>,
+    modules: Arc<SlotMap<ModuleToken, Module>>,
+    module_parents: Arc<SecondaryMap<ModuleToken, Option<ModuleToken>>>,
+    module_children: SharedModuleSets,
+    // A numbering of the hierarchy for descendant queries, until modules are next added or removed.
+    hierarchy_intervals: OnceLock<Arc<hierarchy_intervals::HierarchyIntervals>>,
     // Imports
-    imports: SecondaryMap<ModuleToken, FxHashSet<ModuleToken>>,
-    reverse_imports: SecondaryMap<ModuleToken, FxHashSet<ModuleToken>>,
-    import_details: FxHashMap<(ModuleToken, ModuleToken), FxHashSet<PyImportDetails>>,
+    imports: SharedModuleSets,
+    reverse_imports: SharedModuleSets,
+    import_details: SharedImportDetails,
+    // Strings
+    module_names: Arc<StringInterner<StringBackend>>,
+    import_line_contents: Arc<StringInterner<StringBackend>>,
+    // A compact copy of the imports for traversal, until the graph next changes.
+    frozen_imports: Option<Arc<frozen::FrozenImports>>,
 }
 
 #[pyclass(name = "Graph")]
@@ -81,6 +92,14 @@ pub struct GraphWrapper {
 }
 
 impl GraphWrapper {
+    pub(crate) fn from_graph(graph: Graph) -> Self {
+        GraphWrapper { _graph: graph }
+    }
+
+    pub(crate) fn graph(&self) -> &Graph {
+        &self._graph
+    }
+
     fn get_visible_module_by_name(&self, name: &str) -> Result<&Module, ModuleNotPresent> {
         self._graph
             .get_module_by_name(name)
@@ -108,7 +127,10 @@ impl GraphWrapper {
     ) -> Vec<Vec<Level>> {
         let containers = match containers.is_empty() {
             true => vec![None],
-            false => containers.iter().map(|c| Some(c.name())).collect(),
+            false => containers
+                .iter()
+                .map(|c| Some(c.name(&self._graph).to_owned()))
+                .collect(),
         };
 
         let mut levels_by_container: Vec<Vec<Level>> = vec![];
@@ -211,7 +233,11 @@ impl GraphWrapper {
     }
 
     pub fn get_modules(&self) -> HashSet<String> {
-        self._graph.all_modules().visible().names().collect()
+        self._graph
+            .all_modules()
+            .visible()
+            .names(&self._graph)
+            .collect()
     }
 
     pub fn contains_module(&self, name: &str) -> bool {
@@ -248,6 +274,79 @@ impl GraphWrapper {
         Ok(())
     }
 
+    /// Adds the imports found by scanning the supplied packages, in a single pass.
+    ///
+    /// Any imported module that is not within one of the packages is added as a
+    /// squashed module.
+    #[pyo3(signature = (imports_by_module, *, package_names))]
+    fn add_imports_by_module(
+        &mut self,
+        py: Python<'_>,
+        imports_by_module: PyRef<'_, ImportsByModule>,
+        package_names: HashSet<String>,
+    ) {
+        let imports_by_module = imports_by_module.as_map();
+        let graph = &mut self._graph;
+        py.detach(|| {
+            let package_names: FxHashSet<&str> = package_names.iter().map(String::as_str).collect();
+            graph.add_scanned_imports(
+                imports_by_module.iter().map(|(module, direct_imports)| {
+                    (
+                        module.name.as_str(),
+                        direct_imports.iter().map(|direct_import| {
+                            (
+                                direct_import.imported.as_str(),
+                                direct_import.line_number as u32,
+                                direct_import.line_contents.as_str(),
+                            )
+                        }),
+                    )
+                }),
+                &package_names,
+            )
+        });
+    }
+
+    /// Replaces the imports of some modules that have been scanned again, and removes the
+    /// modules that no longer exist.
+    ///
+    /// Returns the names of the modules whose imports changed, including those removed.
+    #[pyo3(signature = (imports_by_module, *, removed_modules, package_names))]
+    fn replace_imports_by_module(
+        &mut self,
+        py: Python<'_>,
+        imports_by_module: PyRef<'_, ImportsByModule>,
+        removed_modules: HashSet<String>,
+        package_names: HashSet<String>,
+    ) -> HashSet<String> {
+        let imports_by_module = imports_by_module.as_map();
+        let graph = &mut self._graph;
+        py.detach(|| {
+            let removed_modules: FxHashSet<&str> =
+                removed_modules.iter().map(String::as_str).collect();
+            let package_names: FxHashSet<&str> = package_names.iter().map(String::as_str).collect();
+            graph
+                .replace_scanned_imports(
+                    imports_by_module.iter().map(|(module, direct_imports)| {
+                        (
+                            module.name.as_str(),
+                            direct_imports.iter().map(|direct_import| {
+                                (
+                                    direct_import.imported.as_str(),
+                                    direct_import.line_number as u32,
+                                    direct_import.line_contents.as_str(),
+                                )
+                            }),
+                        )
+                    }),
+                    &removed_modules,
+                    &package_names,
+                )
+                .into_iter()
+                .collect()
+        })
+    }
+
     pub fn remove_module(&mut self, module: &str) {
         if let Some(module) = self._graph.get_module_by_name(module) {
             self._graph.remove_module(module.token())
@@ -310,7 +409,7 @@ impl GraphWrapper {
             ._graph
             .get_module_children(module.token())
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -323,7 +422,7 @@ impl GraphWrapper {
             ._graph
             .get_module_descendants(module.token())
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -333,7 +432,7 @@ impl GraphWrapper {
             ._graph
             .find_matching_modules(&expression)
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -359,7 +458,7 @@ impl GraphWrapper {
             .iter()
             .into_module_iterator(&self._graph)
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -371,7 +470,7 @@ impl GraphWrapper {
             .iter()
             .into_module_iterator(&self._graph)
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -398,10 +497,10 @@ impl GraphWrapper {
                 .iter()
                 .map(|import_details| {
                     ImportDetails::new(
-                        importer.name(),
-                        imported.name(),
+                        importer.name(&self._graph).to_owned(),
+                        imported.name(&self._graph).to_owned(),
                         import_details.line_number(),
-                        import_details.line_contents(),
+                        import_details.line_contents(&self._graph).to_owned(),
                     )
                 })
                 .sorted()
@@ -445,7 +544,10 @@ impl GraphWrapper {
                 .map(|(importer, imported)| {
                     let importer = self._graph.get_module(importer).unwrap();
                     let imported = self._graph.get_module(imported).unwrap();
-                    Import::new(importer.name(), imported.name())
+                    Import::new(
+                        importer.name(&self._graph).to_owned(),
+                        imported.name(&self._graph).to_owned(),
+                    )
                 })
                 .sorted()
                 .map(|import| {
@@ -473,7 +575,7 @@ impl GraphWrapper {
             .iter()
             .into_module_iterator(&self._graph)
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -491,7 +593,7 @@ impl GraphWrapper {
             .iter()
             .into_module_iterator(&self._graph)
             .visible()
-            .names()
+            .names(&self._graph)
             .collect())
     }
 
@@ -511,7 +613,7 @@ impl GraphWrapper {
                 chain
                     .iter()
                     .into_module_iterator(&self._graph)
-                    .names()
+                    .names(&self._graph)
                     .collect()
             }))
     }
@@ -548,7 +650,7 @@ impl GraphWrapper {
                     chain
                         .iter()
                         .into_module_iterator(&self._graph)
-                        .names()
+                        .names(&self._graph)
                         .collect::<Vec<_>>(),
                 )
                 .unwrap()
@@ -556,40 +658,51 @@ impl GraphWrapper {
         PySet::new(py, chains)
     }
 
-    #[pyo3(signature = (layers, containers))]
+    #[pyo3(signature = (layers, containers, workers=None))]
     pub fn find_illegal_dependencies_for_layers<'py>(
         &self,
         py: Python<'py>,
         layers: &Bound<'py, PyTuple>,
         containers: HashSet<String>,
+        workers: Option<usize>,
     ) -> PyResult<Bound<'py, PyTuple>> {
         let containers = self.parse_containers(&containers)?;
         let levels_by_container = self.parse_levels_by_container(layers, &containers);
 
-        let illegal_dependencies = levels_by_container
-            .into_iter()
-            .par_bridge()
-            .try_fold(
-                Vec::new,
-                |mut v: Vec<PyPackageDependency>, levels| -> GrimpResult<_> {
-                    v.extend(self._graph.find_illegal_dependencies_for_layers(&levels)?);
-                    Ok(v)
-                },
-            )
-            .try_reduce(
-                Vec::new,
-                |mut v: Vec<PyPackageDependency>, package_dependencies| {
-                    v.extend(package_dependencies);
-                    Ok(v)
-                },
-            )?;
+        let illegal_dependencies = workers::install(workers, || {
+            levels_by_container
+                .into_iter()
+                .par_bridge()
+                .try_fold(
+                    Vec::new,
+                    |mut v: Vec<PyPackageDependency>, levels| -> GrimpResult<_> {
+                        v.extend(self._graph.find_illegal_dependencies_for_layers(&levels)?);
+                        Ok(v)
+                    },
+                )
+                .try_reduce(
+                    Vec::new,
+                    |mut v: Vec<PyPackageDependency>, package_dependencies| {
+                        v.extend(package_dependencies);
+                        Ok(v)
+                    },
+                )
+        })??;
 
         let illegal_dependencies = illegal_dependencies
             .into_iter()
             .map(|dep| {
                 PackageDependency::new(
-                    self._graph.get_module(*dep.importer()).unwrap().name(),
-                    self._graph.get_module(*dep.imported()).unwrap().name(),
+                    self._graph
+                        .get_module(*dep.importer())
+                        .unwrap()
+                        .name(&self._graph)
+                        .to_owned(),
+                    self._graph
+                        .get_module(*dep.imported())
+                        .unwrap()
+                        .name(&self._graph)
+                        .to_owned(),
                     dep.routes()
                         .iter()
                         .map(|route| {
@@ -597,17 +710,20 @@ impl GraphWrapper {
                                 route
                                     .heads()
                                     .iter()
-                                    .map(|m| self._graph.get_module(*m).unwrap().name())
+                                    .into_module_iterator(&self._graph)
+                                    .names(&self._graph)
                                     .collect(),
                                 route
                                     .middle()
                                     .iter()
-                                    .map(|m| self._graph.get_module(*m).unwrap().name())
+                                    .into_module_iterator(&self._graph)
+                                    .names(&self._graph)
                                     .collect(),
                                 route
                                     .tails()
                                     .iter()
-                                    .map(|m| self._graph.get_module(*m).unwrap().name())
+                                    .into_module_iterator(&self._graph)
+                                    .names(&self._graph)
                                     .collect(),
                             )
                         })
@@ -634,7 +750,10 @@ impl GraphWrapper {
                 .map(|(importer, imported)| {
                     let importer = self._graph.get_module(importer).unwrap();
                     let imported = self._graph.get_module(imported).unwrap();
-                    Import::new(importer.name(), imported.name())
+                    Import::new(
+                        importer.name(&self._graph).to_owned(),
+                        imported.name(&self._graph).to_owned(),
+                    )
                 })
                 .map(|import| {
                     PyTuple::new(
@@ -649,10 +768,31 @@ impl GraphWrapper {
         )
     }
 
+    /// Lays out the imports for fast traversal, until the graph is next changed.
+    pub fn freeze(&mut self, py: Python<'_>) {
+        let graph = &mut self._graph;
+        py.detach(|| graph.freeze());
+    }
+
     #[pyo3(name = "clone")]
     pub fn clone_py(&self) -> GraphWrapper {
         self.clone()
     }
+
+    /// Encodes the graph as bytes, which from_bytes decodes.
+    pub fn to_bytes<'py>(&self, py: Python<'py>) -> Bound<'py, PyBytes> {
+        let graph = &self._graph;
+        let bytes = py.detach(|| graph.encode_snapshot(&[]));
+        PyBytes::new(py, &bytes)
+    }
+
+    #[staticmethod]
+    pub fn from_bytes(py: Python<'_>, bytes: &[u8]) -> PyResult<GraphWrapper> {
+        let graph = py
+            .detach(|| Graph::decode_snapshot(bytes))
+            .ok_or_else(|| PyValueError::new_err("Could not decode graph from bytes."))?;
+        Ok(GraphWrapper::from_graph(graph))
+    }
 }
 
 #[derive(Debug, Clone, PartialEq, Eq, PartialOrd, Ord, new)]
@@ -700,9 +840,9 @@ pub trait ExtendWithDescendants:
 {
     /// Extend this collection of module tokens with all descendant items.
     fn extend_with_descendants(&mut self, graph: &Graph) {
+        let hierarchy_intervals = graph.hierarchy_intervals();
         for item in self.clone().into_iter() {
-            let descendants = graph.get_module_descendants(item).map(|item| item.token());
-            self.extend(descendants);
+            self.extend(hierarchy_intervals.descendants(item).iter().copied());
         }
     }
 
@@ -727,9 +867,8 @@ pub trait ModuleIterator<'a>: Iterator<Item = &'a Module> + Sized {
         self.map(|m| m.interned_name)
     }
 
-    fn names(self) -> impl Iterator<Item = String> {
-        let interner = MODULE_NAMES.read().unwrap();
-        self.map(move |m| interner.resolve(m.interned_name).unwrap().to_owned())
+    fn names(self, graph: &Graph) -> impl Iterator<Item = String> {
+        self.map(move |m| m.name(graph).to_owned())
     }
 
     fn visible(self) -> impl ModuleIterator<'a> {
@@ -757,11 +896,10 @@ pub struct PyImportDetails {
 }
 
 impl PyImportDetails {
-    pub fn line_contents(&self) -> String {
-        let interner = IMPORT_LINE_CONTENTS.read().unwrap();
-        interner
+    pub fn line_contents<'a>(&self, graph: &'a Graph) -> &'a str {
+        graph
+            .import_line_contents
             .resolve(self.interned_line_contents)
             .unwrap()
-            .to_owned()
     }
 }
@@ -1,15 +1,15 @@
 use crate::errors::{GrimpError, GrimpResult};
+use crate::graph::shared::SharedModuleSets;
 use crate::graph::{EMPTY_MODULE_TOKENS, Graph, ModuleToken};
 use indexmap::{IndexMap, IndexSet};
 use rustc_hash::{FxHashMap, FxHashSet, FxHasher};
-use slotmap::SecondaryMap;
 use std::hash::BuildHasherDefault;
 
 type FxIndexSet<K> = IndexSet<K, BuildHasherDefault<FxHasher>>;
 type FxIndexMap<K, V> = IndexMap<K, V, BuildHasherDefault<FxHasher>>;
 
 pub fn find_reach(
-    imports_map: &SecondaryMap<ModuleToken, FxHashSet<ModuleToken>>,
+    imports_map: &SharedModuleSets,
     from_modules: &FxHashSet<ModuleToken>,
 ) -> FxHashSet<ModuleToken> {
     let mut seen = FxIndexSet::default();
@@ -39,6 +39,14 @@ pub fn find_shortest_path(
     if !(from_modules & to_modules).is_empty() {
         return Err(GrimpError::SharedDescendants);
     }
+    if let Some(frozen_imports) = &graph.frozen_imports {
+        return Ok(frozen_imports.find_shortest_path(
+            from_modules,
+            to_modules,
+            excluded_modules,
+            excluded_imports,
+        ));
+    }
 
     let mut predecessors: FxIndexMap<ModuleToken, Option<ModuleToken>> = from_modules
         .clone()
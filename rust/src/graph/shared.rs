@@ -0,0 +1,115 @@
+//! Collections of sets that clones of a graph share, copying only what they change.
+//!
+//! Cloning one of these is O(1). The first change after a clone copies the outer map, which holds
+//! pointers to the sets rather than the sets themselves, and a set is only copied once it is
+//! itself changed.
+
+use crate::graph::{ModuleToken, PyImportDetails};
+use rustc_hash::{FxHashMap, FxHashSet};
+use slotmap::SecondaryMap;
+use std::ops::{Index, IndexMut};
+use std::sync::Arc;
+
+/// A set of modules for each module: the modules it imports, say, or its children.
+#[derive(Default, Clone)]
+pub(crate) struct SharedModuleSets(Arc<SecondaryMap<ModuleToken, Arc<FxHashSet<ModuleToken>>>>);
+
+impl SharedModuleSets {
+    pub(crate) fn get(&self, module: ModuleToken) -> Option<&FxHashSet<ModuleToken>> {
+        self.0.get(module).map(|modules| &**modules)
+    }
+
+    pub(crate) fn iter(&self) -> impl Iterator<Item = (ModuleToken, &FxHashSet<ModuleToken>)> {
+        self.0.iter().map(|(module, modules)| (module, &**modules))
+    }
+
+    pub(crate) fn values(&self) -> impl Iterator<Item = &FxHashSet<ModuleToken>> {
+        self.0.values().map(|modules| &**modules)
+    }
+
+    pub(crate) fn insert(&mut self, module: ModuleToken, modules: FxHashSet<ModuleToken>) {
+        Arc::make_mut(&mut self.0).insert(module, Arc::new(modules));
+    }
+
+    pub(crate) fn remove(&mut self, module: ModuleToken) {
+        if self.0.contains_key(module) {
+            Arc::make_mut(&mut self.0).remove(module);
+        }
+    }
+
+    /// The module's set, to change, adding an empty one if there isn't one yet.
+    pub(crate) fn get_mut_or_default(
+        &mut self,
+        module: ModuleToken,
+    ) -> &mut FxHashSet<ModuleToken> {
+        let sets = Arc::make_mut(&mut self.0);
+        Arc::make_mut(sets.entry(module).unwrap().or_default())
+    }
+}
+
+impl Index<ModuleToken> for SharedModuleSets {
+    type Output = FxHashSet<ModuleToken>;
+
+    fn index(&self, module: ModuleToken) -> &Self::Output {
+        &self.0[module]
+    }
+}
+
+impl IndexMut<ModuleToken> for SharedModuleSets {
+    fn index_mut(&mut self, module: ModuleToken) -> &mut Self::Output {
+        Arc::make_mut(&mut Arc::make_mut(&mut self.0)[module])
+    }
+}
+
+/// The details of each import, keyed by (importer, imported).
+#[derive(Default, Clone)]
+pub(crate) struct SharedImportDetails(
+    Arc<FxHashMap<(ModuleToken, ModuleToken), Arc<FxHashSet<PyImportDetails>>>>,
+);
+
+impl SharedImportDetails {
+    pub(crate) fn get(
+        &self,
+        import: &(ModuleToken, ModuleToken),
+    ) -> Option<&FxHashSet<PyImportDetails>> {
+        self.0.get(import).map(|details| &**details)
+    }
+
+    pub(crate) fn remove(&mut self, import: &(ModuleToken, ModuleToken)) {
+        if self.0.contains_key(import) {
+            Arc::make_mut(&mut self.0).remove(import);
+        }
+    }
+
+    /// The import's details, to change, adding an empty set if there isn't one yet.
+    pub(crate) fn get_mut_or_default(
+        &mut self,
+        import: (ModuleToken, ModuleToken),
+    ) -> &mut FxHashSet<PyImportDetails> {
+        Arc::make_mut(Arc::make_mut(&mut self.0).entry(import).or_default())
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use slotmap::SlotMap;
+
+    #[test]
+    fn test_clones_only_copy_the_sets_that_change() {
+        let mut tokens: SlotMap<ModuleToken, ()> = SlotMap::with_key();
+        let [a, b, c] = [(); 3].map(|_| tokens.insert(()));
+        let mut sets = SharedModuleSets::default();
+        sets.insert(a, FxHashSet::from_iter([b]));
+        sets.insert(b, FxHashSet::from_iter([c]));
+
+        let mut clone = sets.clone();
+        assert!(Arc::ptr_eq(&sets.0, &clone.0));
+        clone[a].insert(c);
+
+        assert_eq!(sets[a], FxHashSet::from_iter([b]));
+        assert_eq!(clone[a], FxHashSet::from_iter([b, c]));
+        assert!(!Arc::ptr_eq(&sets.0[a], &clone.0[a]));
+        assert!(Arc::ptr_eq(&sets.0[b], &clone.0[b]));
+    }
+}
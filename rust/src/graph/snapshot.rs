@@ -0,0 +1,312 @@
+//! Snapshots of a whole graph, so that it can be stored, or sent to another process, and loaded
+//! without being rebuilt.
+//!
+//! Module names and line contents are interned by the graph, so the snapshot refers to them by
+//! their strings rather than their symbols, and they are interned again when it is loaded.
+
+use crate::binary_format::{Decoder, Encoder, HEADER_SIZE, StringTableBuilder};
+use crate::graph::{Graph, Module, ModuleToken, PyImportDetails};
+use rustc_hash::{FxHashMap, FxHashSet};
+use std::sync::Arc;
+
+const SNAPSHOT_FILE_MAGIC: &[u8; 8] = b"GRIMPGRF";
+const SNAPSHOT_FILE_VERSION: u32 = 1;
+// Module records and import records are three u32s; import details are two.
+const RECORD_SIZE: usize = 12;
+const DETAILS_RECORD_SIZE: usize = 8;
+
+const INVISIBLE_FLAG: u32 = 1;
+const SQUASHED_FLAG: u32 = 2;
+
+impl Graph {
+    /// Encodes the graph, together with some fingerprints identifying what it was built from.
+    ///
+    /// The file is laid out as:
+    /// - header: magic string, version;
+    /// - fingerprint count, then the id of each fingerprint;
+    /// - module count, import count, import details count;
+    /// - modules, sorted by name so that parents precede their children:
+    ///   (name id, parent index + 1 or 0 if it has no parent, flags);
+    /// - imports, sorted by importer: (importer index, imported index, import details count);
+    /// - import details, grouped by import: (line number, line contents id);
+    /// - string table.
+    pub fn encode_snapshot(&self, fingerprints: &[String]) -> Vec<u8> {
+        let mut modules: Vec<(&str, &Module)> = self
+            .modules
+            .values()
+            .map(|module| (module.name(self), module))
+            .collect();
+        modules.sort_unstable_by_key(|(name, _)| *name);
+        let indexes: FxHashMap<ModuleToken, usize> = modules
+            .iter()
+            .enumerate()
+            .map(|(index, (_, module))| (module.token, index))
+            .collect();
+
+        let mut imports: Vec<(usize, usize, Vec<(u32, &str)>)> = self
+            .imports
+            .iter()
+            .flat_map(|(importer, imported_modules)| {
+                imported_modules
+                    .iter()
+                    .map(move |imported| (importer, *imported))
+            })
+            .map(|(importer, imported)| {
+                let mut details: Vec<(u32, &str)> = self
+                    .import_details
+                    .get(&(importer, imported))
+                    .into_iter()
+                    .flatten()
+                    .map(|details| (details.line_number, details.line_contents(self)))
+                    .collect();
+                details.sort_unstable();
+                (indexes[&importer], indexes[&imported], details)
+            })
+            .collect();
+        imports.sort_unstable_by_key(|(importer, imported, _)| (*importer, *imported));
+
+        let mut strings = StringTableBuilder::default();
+        let mut encoder = Encoder::new(SNAPSHOT_FILE_MAGIC, SNAPSHOT_FILE_VERSION);
+        encoder.put_usize(fingerprints.len());
+        for fingerprint in fingerprints {
+            encoder.put_u32(strings.intern(fingerprint));
+        }
+        encoder.put_usize(modules.len());
+        encoder.put_usize(imports.len());
+        encoder.put_usize(imports.iter().map(|(_, _, details)| details.len()).sum());
+
+        for (name, module) in &modules {
+            encoder.put_u32(strings.intern(name));
+            encoder.put_usize(match self.module_parents[module.token] {
+                Some(parent) => indexes[&parent] + 1,
+                None => 0,
+            });
+            let mut flags = 0;
+            if module.is_invisible {
+                flags |= INVISIBLE_FLAG;
+            }
+            if module.is_squashed {
+                flags |= SQUASHED_FLAG;
+            }
+            encoder.put_u32(flags);
+        }
+        for (importer, imported, details) in &imports {
+            encoder.put_usize(*importer);
+            encoder.put_usize(*imported);
+            encoder.put_usize(details.len());
+        }
+        for (_, _, details) in &imports {
+            for (line_number, line_contents) in details {
+                encoder.put_u32(*line_number);
+                encoder.put_u32(strings.intern(line_contents));
+            }
+        }
+        encoder.put_string_table(&strings);
+        encoder.finish()
+    }
+
+    /// Decodes a graph encoded by encode_snapshot, returning None if the bytes are invalid.
+    pub fn decode_snapshot(bytes: &[u8]) -> Option<Graph> {
+        let layout = SnapshotLayout::read(bytes)?;
+        let decoder = Decoder::new(bytes);
+        let strings = decoder.string_table_at(layout.strings_start)?;
+        let mut graph = Graph::default();
+
+        let mut tokens: Vec<ModuleToken> = Vec::with_capacity(layout.module_count);
+        {
+            let module_names = Arc::make_mut(&mut graph.module_names);
+            let modules_by_name = Arc::make_mut(&mut graph.modules_by_name);
+            let modules = Arc::make_mut(&mut graph.modules);
+            let module_parents = Arc::make_mut(&mut graph.module_parents);
+            for index in 0..layout.module_count {
+                let offset = layout.modules_start + index * RECORD_SIZE;
+                let interned_name =
+                    module_names.get_or_intern(strings.get(decoder.u32_at(offset)?)?);
+                let parent = match decoder.usize_at(offset + 4)? {
+                    0 => None,
+                    // Parents are encoded before their children.
+                    parent_index => Some(*tokens.get(parent_index - 1)?),
+                };
+                let flags = decoder.u32_at(offset + 8)?;
+                if modules_by_name.contains_left(&interned_name) {
+                    return None;
+                }
+
+                let module = modules.insert_with_key(|token| Module {
+                    token,
+                    interned_name,
+                    is_invisible: flags & INVISIBLE_FLAG != 0,
+                    is_squashed: flags & SQUASHED_FLAG != 0,
+                });
+                modules_by_name.insert(interned_name, module);
+                module_parents.insert(module, parent);
+                graph.module_children.insert(module, FxHashSet::default());
+                graph.imports.insert(module, FxHashSet::default());
+                graph.reverse_imports.insert(module, FxHashSet::default());
+                if let Some(parent) = parent {
+                    graph.module_children[parent].insert(module);
+                }
+                tokens.push(module);
+            }
+        }
+
+        let import_line_contents = Arc::make_mut(&mut graph.import_line_contents);
+        let mut details_index = 0;
+        for index in 0..layout.import_count {
+            let offset = layout.imports_start + index * RECORD_SIZE;
+            let importer = *tokens.get(decoder.usize_at(offset)?)?;
+            let imported = *tokens.get(decoder.usize_at(offset + 4)?)?;
+            let details_count = decoder.usize_at(offset + 8)?;
+
+            graph.imports[importer].insert(imported);
+            graph.reverse_imports[imported].insert(importer);
+            for _ in 0..details_count {
+                if details_index >= layout.details_count {
+                    return None;
+                }
+                let offset = layout.details_start + details_index * DETAILS_RECORD_SIZE;
+                let line_number = decoder.u32_at(offset)?;
+                let line_contents =
+                    import_line_contents.get_or_intern(strings.get(decoder.u32_at(offset + 4)?)?);
+                graph
+                    .import_details
+                    .get_mut_or_default((importer, imported))
+                    .insert(PyImportDetails::new(line_number, line_contents));
+                details_index += 1;
+            }
+        }
+
+        Some(graph)
+    }
+}
+
+/// Returns the fingerprints stored in a snapshot, without decoding the graph.
+pub fn decode_snapshot_fingerprints(bytes: &[u8]) -> Option<Vec<String>> {
+    let layout = SnapshotLayout::read(bytes)?;
+    let decoder = Decoder::new(bytes);
+    let strings = decoder.string_table_at(layout.strings_start)?;
+    (0..layout.fingerprint_count)
+        .map(|index| {
+            let id = decoder.u32_at(HEADER_SIZE + 4 + index * 4)?;
+            Some(strings.get(id)?.to_string())
+        })
+        .collect()
+}
+
+/// Where each section of a snapshot starts, checked against the length of the file.
+struct SnapshotLayout {
+    fingerprint_count: usize,
+    module_count: usize,
+    import_count: usize,
+    details_count: usize,
+    modules_start: usize,
+    imports_start: usize,
+    details_start: usize,
+    strings_start: usize,
+}
+
+impl SnapshotLayout {
+    fn read(bytes: &[u8]) -> Option<Self> {
+        let decoder = Decoder::new(bytes);
+        if !decoder.has_header(SNAPSHOT_FILE_MAGIC, SNAPSHOT_FILE_VERSION) {
+            return None;
+        }
+        let fingerprint_count = decoder.usize_at(HEADER_SIZE)?;
+        let counts_start = fingerprint_count
+            .checked_mul(4)?
+            .checked_add(HEADER_SIZE + 4)?;
+        let module_count = decoder.usize_at(counts_start)?;
+        let import_count = decoder.usize_at(counts_start + 4)?;
+        let details_count = decoder.usize_at(counts_start + 8)?;
+        let modules_start = counts_start + 12;
+        let imports_start = module_count
+            .checked_mul(RECORD_SIZE)?
+            .checked_add(modules_start)?;
+        let details_start = import_count
+            .checked_mul(RECORD_SIZE)?
+            .checked_add(imports_start)?;
+        let strings_start = details_count
+            .checked_mul(DETAILS_RECORD_SIZE)?
+            .checked_add(details_start)?;
+        decoder.string_table_at(strings_start)?;
+
+        Some(SnapshotLayout {
+            fingerprint_count,
+            module_count,
+            import_count,
+            details_count,
+            modules_start,
+            imports_start,
+            details_start,
+            strings_start,
+        })
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn make_graph() -> Graph {
+        let mut graph = Graph::default();
+        graph.add_scanned_imports(
+            [
+                ("mypackage", vec![]),
+                (
+                    "mypackage.foo.one",
+                    vec![
+                        ("mypackage.bar", 1, "from mypackage import bar"),
+                        ("mypackage.bar", 5, "import mypackage.bar"),
+                        ("django", 2, "from django.db import models"),
+                    ],
+                ),
+                ("mypackage.bar", vec![]),
+            ],
+            &FxHashSet::from_iter(["mypackage"]),
+        );
+        let bar = graph.get_module_by_name("mypackage.bar").unwrap().token();
+        let one = graph
+            .get_module_by_name("mypackage.foo.one")
+            .unwrap()
+            .token();
+        // An import without details.
+        graph.add_import(bar, one);
+        graph
+    }
+
+    #[test]
+    fn test_round_trip() {
+        let graph = make_graph();
+        let fingerprints = vec!["abc".to_string(), "def".to_string()];
+
+        let encoded = graph.encode_snapshot(&fingerprints);
+        let decoded = Graph::decode_snapshot(&encoded).unwrap();
+
+        assert_eq!(
+            decode_snapshot_fingerprints(&encoded).unwrap(),
+            fingerprints
+        );
+        // Encoding is deterministic, so the decoded graph is the same if it encodes the same.
+        assert_eq!(decoded.encode_snapshot(&fingerprints), encoded);
+        let foo = decoded.get_module_by_name("mypackage.foo").unwrap();
+        assert!(foo.is_invisible());
+        assert!(decoded.get_module_by_name("django").unwrap().is_squashed());
+        let one = decoded
+            .get_module_by_name("mypackage.foo.one")
+            .unwrap()
+            .token();
+        let bar = decoded.get_module_by_name("mypackage.bar").unwrap().token();
+        assert_eq!(decoded.get_module_parent(one).unwrap().token(), foo.token());
+        assert_eq!(decoded.count_imports(), 3);
+        assert_eq!(decoded.get_import_details(one, bar).len(), 2);
+        assert!(decoded.get_import_details(bar, one).is_empty());
+    }
+
+    #[test]
+    fn test_truncated_snapshot_is_invalid() {
+        let mut encoded = make_graph().encode_snapshot(&[]);
+        encoded.truncate(encoded.len() - 1);
+
+        assert!(Graph::decode_snapshot(&encoded).is_none());
+    }
+}
@@ -0,0 +1,664 @@
+//! A fast alternative to import_parsing, which finds the imports in Python source code by
+//! tokenizing it, without building a syntax tree.
+//!
+//! It only understands as much of Python's lexical structure as it needs to find import
+//! statements and `if TYPE_CHECKING:` blocks: strings, comments, brackets, line continuations and
+//! indentation. Whenever it meets something it doesn't understand, it gives up, so that the code
+//! can be parsed in full instead. Unlike the full parser, it doesn't detect syntax errors outside
+//! import statements.
+
+use crate::import_parsing::ImportedObject;
+
+/// Returns the objects imported by the code, or None if the code needs parsing in full.
+///
+/// The results are the same as those of import_parsing::parse_imports_from_code.
+pub fn lex_imports_from_code(code: &str) -> Option<Vec<ImportedObject>> {
+    if !code.contains("import") {
+        // There can't be any import statements.
+        return Some(vec![]);
+    }
+
+    let mut lexer = Lexer::new(code);
+    let mut tokens = vec![];
+    let mut imported_objects = vec![];
+    // Mirror the full parser's visitor, which flags everything within an `if TYPE_CHECKING:`
+    // statement (including its elif and else clauses), and clears the flag on leaving one.
+    let mut typechecking_only = false;
+    let mut typechecking_indents: Vec<usize> = vec![];
+    while let Some(indent) = lexer.next_logical_line(&mut tokens)? {
+        let first_token = tokens[0].kind;
+        while let Some(&typechecking_indent) = typechecking_indents.last() {
+            let continues_if_statement = indent == typechecking_indent
+                && matches!(first_token, TokenKind::Name("elif" | "else"));
+            if indent > typechecking_indent || continues_if_statement {
+                break;
+            }
+            typechecking_indents.pop();
+            typechecking_only = false;
+        }
+        if first_token == TokenKind::Name("if") && is_typechecking_guard(&tokens)? {
+            typechecking_only = true;
+            typechecking_indents.push(indent);
+        }
+
+        extract_imports_from_line(&lexer, &tokens, typechecking_only, &mut imported_objects)?;
+    }
+    Some(imported_objects)
+}
+
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+enum TokenKind<'a> {
+    Name(&'a str),
+    Punctuation(u8),
+    // Strings and numbers.
+    Literal,
+}
+
+#[derive(Debug, Clone, Copy)]
+struct Token<'a> {
+    kind: TokenKind<'a>,
+    // Byte offset of the start of the token.
+    offset: usize,
+}
+
+/// Returns whether an `if` statement's header is a TYPE_CHECKING guard.
+///
+/// As with the full parser, the test must be `TYPE_CHECKING` or an attribute named
+/// `TYPE_CHECKING`. Returns None if it's unclear.
+fn is_typechecking_guard(tokens: &[Token]) -> Option<bool> {
+    let mut depth = 0;
+    let colon_index = tokens.iter().position(|token| {
+        match token.kind {
+            TokenKind::Punctuation(b'(' | b'[' | b'{') => depth += 1,
+            TokenKind::Punctuation(b')' | b']' | b'}') => depth -= 1,
+            TokenKind::Punctuation(b':') if depth == 0 => return true,
+            _ => {}
+        };
+        false
+    })?;
+    let test = &tokens[1..colon_index];
+    if !test
+        .iter()
+        .any(|token| token.kind == TokenKind::Name("TYPE_CHECKING"))
+    {
+        return Some(false);
+    }
+
+    // Only accept `TYPE_CHECKING` or a dotted name ending in `.TYPE_CHECKING`.
+    let is_dotted_name = test.len() % 2 == 1
+        && test
+            .iter()
+            .enumerate()
+            .all(|(index, token)| match index % 2 {
+                0 => matches!(token.kind, TokenKind::Name(_)),
+                _ => token.kind == TokenKind::Punctuation(b'.'),
+            });
+    if is_dotted_name && test.last()?.kind == TokenKind::Name("TYPE_CHECKING") {
+        Some(true)
+    } else {
+        None
+    }
+}
+
+/// Adds the objects imported by any import statements in the logical line.
+fn extract_imports_from_line(
+    lexer: &Lexer,
+    tokens: &[Token],
+    typechecking_only: bool,
+    imported_objects: &mut Vec<ImportedObject>,
+) -> Option<()> {
+    let mut depth = 0;
+    let mut previous_kind: Option<TokenKind> = None;
+    let mut index = 0;
+    while index < tokens.len() {
+        let token = tokens[index];
+        let is_statement_start = depth == 0
+            && matches!(
+                previous_kind,
+                None | Some(TokenKind::Punctuation(b';' | b':'))
+            );
+        match token.kind {
+            TokenKind::Name("import" | "from") if is_statement_start => {
+                let (names, end_index) = parse_import_statement(tokens, index)?;
+                let (line_number, line_contents) = lexer.line_at(token.offset);
+                imported_objects.extend(names.into_iter().map(|name| ImportedObject {
+                    name,
+                    line_number,
+                    line_contents: line_contents.to_string(),
+                    typechecking_only,
+                }));
+                previous_kind = None;
+                index = end_index;
+                if index < tokens.len() {
+                    // The statement must be followed by a semicolon.
+                    previous_kind = Some(tokens[index].kind);
+                    index += 1;
+                }
+                continue;
+            }
+            // The import keyword can't appear anywhere else.
+            TokenKind::Name("import") => return None,
+            TokenKind::Punctuation(b'(' | b'[' | b'{') => depth += 1,
+            TokenKind::Punctuation(b')' | b']' | b'}') => depth -= 1,
+            _ => {}
+        }
+        previous_kind = Some(token.kind);
+        index += 1;
+    }
+    Some(())
+}
+
+/// Parses an import statement starting at the supplied index, returning the names of the
+/// imported objects and the index of the token after the statement, which must be a semicolon
+/// (or the end of the line).
+fn parse_import_statement(tokens: &[Token], start_index: usize) -> Option<(Vec<String>, usize)> {
+    let mut index = start_index + 1;
+    let mut names = vec![];
+    if tokens[start_index].kind == TokenKind::Name("import") {
+        loop {
+            let (name, after_name) = parse_dotted_name(tokens, index)?;
+            names.push(name);
+            index = skip_alias(tokens, after_name)?;
+            if kind_at(tokens, index) != Some(TokenKind::Punctuation(b',')) {
+                break;
+            }
+            index += 1;
+        }
+    } else {
+        let mut prefix = String::new();
+        while kind_at(tokens, index) == Some(TokenKind::Punctuation(b'.')) {
+            prefix.push('.');
+            index += 1;
+        }
+        if kind_at(tokens, index) != Some(TokenKind::Name("import")) {
+            let (module, after_module) = parse_dotted_name(tokens, index)?;
+            prefix.push_str(&module);
+            prefix.push('.');
+            index = after_module;
+        } else if prefix.is_empty() {
+            return None;
+        }
+        if kind_at(tokens, index) != Some(TokenKind::Name("import")) {
+            return None;
+        }
+        index += 1;
+
+        if kind_at(tokens, index) == Some(TokenKind::Punctuation(b'*')) {
+            names.push(format!("{prefix}*"));
+            index += 1;
+        } else {
+            let is_parenthesized = kind_at(tokens, index) == Some(TokenKind::Punctuation(b'('));
+            if is_parenthesized {
+                index += 1;
+            }
+            loop {
+                names.push(format!("{prefix}{}", parse_identifier(tokens, index)?));
+                index = skip_alias(tokens, index + 1)?;
+                if kind_at(tokens, index) != Some(TokenKind::Punctuation(b',')) {
+                    break;
+                }
+                index += 1;
+                // A trailing comma is only allowed within parentheses.
+                if is_parenthesized && kind_at(tokens, index) == Some(TokenKind::Punctuation(b')'))
+                {
+                    break;
+                }
+            }
+            if is_parenthesized {
+                if kind_at(tokens, index) != Some(TokenKind::Punctuation(b')')) {
+                    return None;
+                }
+                index += 1;
+            }
+        }
+    }
+
+    match kind_at(tokens, index) {
+        None | Some(TokenKind::Punctuation(b';')) => Some((names, index)),
+        _ => None,
+    }
+}
+
+fn kind_at<'a>(tokens: &[Token<'a>], index: usize) -> Option<TokenKind<'a>> {
+    tokens.get(index).map(|token| token.kind)
+}
+
+/// Returns an identifier that can be part of an imported name.
+fn parse_identifier<'a>(tokens: &[Token<'a>], index: usize) -> Option<&'a str> {
+    match kind_at(tokens, index)? {
+        // The full parser normalizes non-ASCII identifiers, so leave those to it.
+        TokenKind::Name(name) if name.is_ascii() && !matches!(name, "import" | "from" | "as") => {
+            Some(name)
+        }
+        _ => None,
+    }
+}
+
+fn parse_dotted_name(tokens: &[Token], start_index: usize) -> Option<(String, usize)> {
+    let mut name = parse_identifier(tokens, start_index)?.to_string();
+    let mut index = start_index + 1;
+    while kind_at(tokens, index) == Some(TokenKind::Punctuation(b'.')) {
+        name.push('.');
+        name.push_str(parse_identifier(tokens, index + 1)?);
+        index += 2;
+    }
+    Some((name, index))
+}
+
+/// Skips an `as` clause, if there is one.
+fn skip_alias(tokens: &[Token], index: usize) -> Option<usize> {
+    if kind_at(tokens, index) == Some(TokenKind::Name("as")) {
+        parse_identifier(tokens, index + 1)?;
+        Some(index + 2)
+    } else {
+        Some(index)
+    }
+}
+
+/// Splits code into logical lines of tokens.
+struct Lexer<'a> {
+    code: &'a str,
+    bytes: &'a [u8],
+    position: usize,
+    // Byte offsets of the start of each physical line.
+    line_starts: Vec<usize>,
+}
+
+impl<'a> Lexer<'a> {
+    fn new(code: &'a str) -> Self {
+        let bytes = code.as_bytes();
+        let mut line_starts = vec![0];
+        let mut position = 0;
+        while position < bytes.len() {
+            match bytes[position] {
+                b'\r' if bytes.get(position + 1) == Some(&b'\n') => {
+                    position += 1;
+                    line_starts.push(position + 1);
+                }
+                b'\r' | b'\n' => line_starts.push(position + 1),
+                _ => {}
+            }
+            position += 1;
+        }
+        Lexer {
+            code,
+            bytes,
+            // Skip any byte order mark.
+            position: if code.starts_with('\u{feff}') { 3 } else { 0 },
+            line_starts,
+        }
+    }
+
+    /// Returns the (one-based) line number and trimmed contents of the line containing the
+    /// offset.
+    fn line_at(&self, offset: usize) -> (usize, &'a str) {
+        let line_index = self.line_starts.partition_point(|start| *start <= offset) - 1;
+        let start = self.line_starts[line_index];
+        let end = self
+            .line_starts
+            .get(line_index + 1)
+            .copied()
+            .unwrap_or(self.bytes.len());
+        let line = self.code[start..end].trim_end_matches(['\r', '\n']);
+        (line_index + 1, line.trim())
+    }
+
+    fn peek(&self, ahead: usize) -> Option<u8> {
+        self.bytes.get(self.position + ahead).copied()
+    }
+
+    /// Reads the tokens of the next logical line that has any, returning its indentation, or
+    /// Some(None) at the end of the code. Returns None if the code can't be tokenized.
+    fn next_logical_line(&mut self, tokens: &mut Vec<Token<'a>>) -> Option<Option<usize>> {
+        tokens.clear();
+        loop {
+            let indent = self.skip_indentation();
+            match self.peek(0) {
+                None => return Some(None),
+                Some(b'#' | b'\r' | b'\n') => {
+                    // A line without tokens.
+                    self.skip_comment();
+                    self.skip_newline();
+                }
+                Some(_) => {
+                    self.read_line_tokens(tokens)?;
+                    // The line may only have been a line continuation.
+                    if !tokens.is_empty() {
+                        return Some(Some(indent));
+                    }
+                }
+            }
+        }
+    }
+
+    fn skip_indentation(&mut self) -> usize {
+        let mut indent = 0;
+        loop {
+            match self.peek(0) {
+                Some(b' ') => indent += 1,
+                Some(b'\t') => indent = (indent / 8 + 1) * 8,
+                Some(b'\x0c') => indent = 0,
+                _ => return indent,
+            }
+            self.position += 1;
+        }
+    }
+
+    fn skip_comment(&mut self) {
+        if self.peek(0) == Some(b'#') {
+            while !matches!(self.peek(0), None | Some(b'\r' | b'\n')) {
+                self.position += 1;
+            }
+        }
+    }
+
+    /// Skips a newline, returning whether there was one.
+    fn skip_newline(&mut self) -> bool {
+        match self.peek(0) {
+            Some(b'\r') if self.peek(1) == Some(b'\n') => self.position += 2,
+            Some(b'\r' | b'\n') => self.position += 1,
+            _ => return false,
+        }
+        true
+    }
+
+    fn read_line_tokens(&mut self, tokens: &mut Vec<Token<'a>>) -> Option<()> {
+        let mut depth = 0usize;
+        loop {
+            let offset = self.position;
+            let Some(byte) = self.peek(0) else {
+                // Brackets must be closed by the end of the code.
+                return if depth == 0 { Some(()) } else { None };
+            };
+            match byte {
+                b' ' | b'\t' | b'\x0c' => self.position += 1,
+                b'#' => self.skip_comment(),
+                b'\r' | b'\n' => {
+                    self.skip_newline();
+                    // Lines are joined within brackets.
+                    if depth == 0 {
+                        return Some(());
+                    }
+                }
+                b'\\' => {
+                    self.position += 1;
+                    if !self.skip_newline() {
+                        return None;
+                    }
+                }
+                b'\'' | b'"' => {
+                    self.read_string("")?;
+                    tokens.push(Token {
+                        kind: TokenKind::Literal,
+                        offset,
+                    });
+                }
+                b'0'..=b'9' => {
+                    self.read_number();
+                    tokens.push(Token {
+                        kind: TokenKind::Literal,
+                        offset,
+                    });
+                }
+                b'.' if matches!(self.peek(1), Some(b'0'..=b'9')) => {
+                    self.read_number();
+                    tokens.push(Token {
+                        kind: TokenKind::Literal,
+                        offset,
+                    });
+                }
+                _ if is_identifier_byte(byte) => {
+                    let name = self.read_identifier();
+                    if matches!(self.peek(0), Some(b'\'' | b'"')) && is_string_prefix(name) {
+                        self.read_string(name)?;
+                        tokens.push(Token {
+                            kind: TokenKind::Literal,
+                            offset,
+                        });
+                    } else {
+                        tokens.push(Token {
+                            kind: TokenKind::Name(name),
+                            offset,
+                        });
+                    }
+                }
+                _ if byte.is_ascii() => {
+                    match byte {
+                        b'(' | b'[' | b'{' => depth += 1,
+                        b')' | b']' | b'}' => depth = depth.checked_sub(1)?,
+                        _ => {}
+                    }
+                    self.position += 1;
+                    tokens.push(Token {
+                        kind: TokenKind::Punctuation(byte),
+                        offset,
+                    });
+                }
+                _ => return None,
+            }
+        }
+    }
+
+    fn read_identifier(&mut self) -> &'a str {
+        let start = self.position;
+        while self
+            .peek(0)
+            .is_some_and(|byte| is_identifier_byte(byte) || byte.is_ascii_digit())
+        {
+            self.position += 1;
+        }
+        &self.code[start..self.position]
+    }
+
+    fn read_number(&mut self) {
+        while let Some(byte) = self.peek(0) {
+            let is_exponent_sign =
+                matches!(byte, b'+' | b'-') && matches!(self.bytes[self.position - 1], b'e' | b'E');
+            if !(byte.is_ascii_alphanumeric() || matches!(byte, b'_' | b'.') || is_exponent_sign) {
+                break;
+            }
+            self.position += 1;
+        }
+    }
+
+    /// Reads a string literal, starting at its opening quote.
+    fn read_string(&mut self, prefix: &str) -> Option<()> {
+        let is_formatted = prefix.contains(['f', 'F', 't', 'T']);
+        let quote = self.peek(0)?;
+        let is_triple_quoted = self.peek(1) == Some(quote) && self.peek(2) == Some(quote);
+        self.position += if is_triple_quoted { 3 } else { 1 };
+        loop {
+            match self.peek(0)? {
+                // In raw strings backslashes are kept, but they still escape quotes.
+                b'\\' => {
+                    self.position += 1;
+                    if !self.skip_newline() {
+                        self.position += 1;
+                    }
+                }
+                b'\r' | b'\n' if !is_triple_quoted => return None,
+                byte if byte == quote => {
+                    if !is_triple_quoted {
+                        self.position += 1;
+                        return Some(());
+                    }
+                    if self.peek(1) == Some(quote) && self.peek(2) == Some(quote) {
+                        self.position += 3;
+                        return Some(());
+                    }
+                    self.position += 1;
+                }
+                b'{' | b'}' if is_formatted && self.peek(1) == self.peek(0) => {
+                    self.position += 2;
+                }
+                b'{' if is_formatted => self.read_replacement_field()?,
+                _ => self.position += 1,
+            }
+        }
+    }
+
+    /// Reads a replacement field in a formatted string, starting at its opening brace.
+    fn read_replacement_field(&mut self) -> Option<()> {
+        self.position += 1;
+        let mut depth = 0usize;
+        loop {
+            let byte = self.peek(0)?;
+            match byte {
+                b'(' | b'[' | b'{' => {
+                    depth += 1;
+                    self.position += 1;
+                }
+                b'}' if depth == 0 => {
+                    self.position += 1;
+                    return Some(());
+                }
+                b')' | b']' | b'}' => {
+                    depth = depth.checked_sub(1)?;
+                    self.position += 1;
+                }
+                b':' if depth == 0 => return self.read_format_spec(),
+                b'\'' | b'"' => self.read_string("")?,
+                // Comments, backslashes and newlines are only allowed here by recent versions of
+                // Python, so are rare enough to leave to the full parser.
+                b'#' | b'\\' | b'\r' | b'\n' => return None,
+                _ if is_identifier_byte(byte) => {
+                    let name = self.read_identifier();
+                    if matches!(self.peek(0), Some(b'\'' | b'"')) && is_string_prefix(name) {
+                        self.read_string(name)?;
+                    }
+                }
+                _ => self.position += 1,
+            }
+        }
+    }
+
+    /// Reads the format spec of a replacement field, starting at its colon and ending after the
+    /// field's closing brace.
+    fn read_format_spec(&mut self) -> Option<()> {
+        self.position += 1;
+        loop {
+            match self.peek(0)? {
+                b'{' => self.read_replacement_field()?,
+                b'}' => {
+                    self.position += 1;
+                    return Some(());
+                }
+                b'\'' | b'"' | b'\\' | b'\r' | b'\n' => return None,
+                _ => self.position += 1,
+            }
+        }
+    }
+}
+
+fn is_identifier_byte(byte: u8) -> bool {
+    byte.is_ascii_alphabetic() || byte == b'_' || !byte.is_ascii()
+}
+
+fn is_string_prefix(name: &str) -> bool {
+    matches!(
+        name.to_ascii_lowercase().as_str(),
+        "r" | "u" | "b" | "br" | "rb" | "f" | "fr" | "rf" | "t" | "tr" | "rt"
+    )
+}
+
+#[cfg(test)]
+mod tests {
+    use super::lex_imports_from_code;
+    use parameterized::parameterized;
+
+    fn lex_names(code: &str) -> Option<Vec<(String, usize, bool)>> {
+        lex_imports_from_code(code).map(|imported_objects| {
+            imported_objects
+                .into_iter()
+                .map(|i| (i.name, i.line_number, i.typechecking_only))
+                .collect()
+        })
+    }
+
+    #[test]
+    fn test_code_without_imports_is_not_tokenized() {
+        assert_eq!(lex_names("x = '''"), Some(vec![]));
+    }
+
+    #[test]
+    fn test_line_contents() {
+        let imported_objects =
+            lex_imports_from_code("x = 1\r\n  import a; import b  # Comment\r\n").unwrap();
+        assert_eq!(
+            imported_objects
+                .into_iter()
+                .map(|i| i.line_contents)
+                .collect::<Vec<_>>(),
+            vec![
+                "import a; import b  # Comment",
+                "import a; import b  # Comment"
+            ]
+        );
+    }
+
+    fn check(case: (&str, &[(&str, usize, bool)])) {
+        let (code, expected) = case;
+        assert_eq!(
+            lex_names(code).unwrap(),
+            expected
+                .iter()
+                .map(|(name, line_number, typechecking_only)| (
+                    name.to_string(),
+                    *line_number,
+                    *typechecking_only
+                ))
+                .collect::<Vec<_>>()
+        );
+    }
+
+    #[parameterized(case = {
+        ("x = f'{a[\"import b\"]}'\nimport c", &[("c", 2, false)]),
+        ("x = f'{a:{b}>10}'\nimport c", &[("c", 2, false)]),
+        ("x = f'{{import b}}'\nimport c", &[("c", 2, false)]),
+        ("x = rb'\\'import b'\nimport c", &[("c", 2, false)]),
+        ("x = (\n    1,\n)\nimport c", &[("c", 4, false)]),
+        ("x = 1 if y else \\\n    2\nimport c", &[("c", 3, false)]),
+        ("raise X from Y\nimport c", &[("c", 2, false)]),
+        ("def f(): yield from x\nimport c", &[("c", 2, false)]),
+        ("class A: import b", &[("b", 1, false)]),
+    })]
+    fn test_skips_code_that_looks_like_imports(case: (&str, &[(&str, usize, bool)])) {
+        check(case);
+    }
+
+    #[parameterized(case = {
+        // Else clauses are part of the if statement.
+        ("if TYPE_CHECKING:\n    import a\nelse:\n    import b\nimport c",
+         &[("a", 2, true), ("b", 4, true), ("c", 5, false)]),
+        // Like the full parser's visitor, leaving a nested guard clears the flag.
+        ("if TYPE_CHECKING:\n    if TYPE_CHECKING:\n        import a\n    import b",
+         &[("a", 3, true), ("b", 4, false)]),
+        ("if x:\n    pass\nelif TYPE_CHECKING:\n    import a", &[("a", 4, false)]),
+        ("if TYPE_CHECKING:\n    def f():\n        import a\n\n    import b\nimport c",
+         &[("a", 3, true), ("b", 5, true), ("c", 6, false)]),
+        ("if a.b.TYPE_CHECKING: import a\nimport b", &[("a", 1, true), ("b", 2, false)]),
+    })]
+    fn test_typechecking_guards(case: (&str, &[(&str, usize, bool)])) {
+        check(case);
+    }
+
+    #[parameterized(case = {
+        "import (a)",
+        "from a import b,",
+        "from a import (b c)",
+        "from import b",
+        "import a b",
+        "x = import",
+        "import a\nx = '",
+        "import a\nx = (",
+        "import a\nx = )",
+        "import a\nx = 1 \\ 2",
+        "import a\nif not TYPE_CHECKING:\n    import b",
+        "import a\nif (TYPE_CHECKING):\n    import b",
+        "import a\nx = f'{a\n}'",
+        "import café",
+    })]
+    fn test_falls_back_for_code_it_does_not_understand(code: &str) {
+        assert_eq!(lex_names(code), None);
+    }
+}
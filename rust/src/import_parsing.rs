@@ -1,4 +1,5 @@
 use crate::errors::{GrimpError, GrimpResult};
+use crate::import_lexing::lex_imports_from_code;
 use ruff_python_ast::statement_visitor::{StatementVisitor, walk_body, walk_stmt};
 use ruff_python_ast::{Expr, Stmt};
 use ruff_python_parser::parse_module;
@@ -28,6 +29,29 @@ impl ImportedObject {
     }
 }
 
+/// How to find the imports in a module's code.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum ImportParser {
+    /// Parse the code into a syntax tree.
+    Full,
+    /// Tokenize the code, only parsing it in full if the tokens are ambiguous.
+    Lexer,
+}
+
+pub fn extract_imports_from_code(
+    code: &str,
+    module_filename: &str,
+    import_parser: ImportParser,
+) -> GrimpResult<Vec<ImportedObject>> {
+    match import_parser {
+        ImportParser::Full => parse_imports_from_code(code, module_filename),
+        ImportParser::Lexer => match lex_imports_from_code(code) {
+            Some(imported_objects) => Ok(imported_objects),
+            None => parse_imports_from_code(code, module_filename),
+        },
+    }
+}
+
 pub fn parse_imports_from_code(
     code: &str,
     module_filename: &str,
@@ -149,9 +173,22 @@ impl<'a> StatementVisitor<'a> for Visitor<'a> {
 
 #[cfg(test)]
 mod tests {
-    use super::parse_imports_from_code;
+    use super::{ImportParser, extract_imports_from_code, parse_imports_from_code};
     use parameterized::parameterized;
 
+    /// Parses the code, checking that the lexer finds the same imports as the full parser.
+    fn parse_imports_from_code_with_both_parsers(
+        code: &str,
+        module_filename: &str,
+    ) -> Vec<super::ImportedObject> {
+        let imports = parse_imports_from_code(code, module_filename).unwrap();
+        assert_eq!(
+            extract_imports_from_code(code, module_filename, ImportParser::Lexer).unwrap(),
+            imports
+        );
+        imports
+    }
+
     #[test]
     fn test_parse_empty_string() {
         let imports = parse_imports_from_code("", "some_filename.py").unwrap();
@@ -160,7 +197,7 @@ mod tests {
 
     fn parse_and_check(case: (&str, &[&str])) {
         let (code, expected_imports) = case;
-        let imports = parse_imports_from_code(code, "some_filename.py").unwrap();
+        let imports = parse_imports_from_code_with_both_parsers(code, "some_filename.py");
         assert_eq!(
             expected_imports,
             imports.into_iter().map(|i| i.name).collect::<Vec<_>>()
@@ -169,7 +206,7 @@ mod tests {
 
     fn parse_and_check_with_typechecking_only(case: (&str, &[(&str, bool)])) {
         let (code, expected_imports) = case;
-        let imports = parse_imports_from_code(code, "some_filename.py").unwrap();
+        let imports = parse_imports_from_code_with_both_parsers(code, "some_filename.py");
         assert_eq!(
             expected_imports
                 .iter()
@@ -517,15 +554,14 @@ import baz
 
     #[test]
     fn test_parse_line_numbers() {
-        let imports = parse_imports_from_code(
+        let imports = parse_imports_from_code_with_both_parsers(
             "
 import a
 from b import c
 from d import (e)
 from f import *",
             "some_filename.py",
-        )
-        .unwrap();
+        );
         assert_eq!(
             vec![
                 ("a".to_owned(), 2),
@@ -542,7 +578,7 @@ from f import *",
 
     #[test]
     fn test_parse_line_numbers_if_typechecking() {
-        let imports = parse_imports_from_code(
+        let imports = parse_imports_from_code_with_both_parsers(
             "
 import a
 if TYPE_CHECKING:
@@ -551,8 +587,7 @@ from d import (e)
 if TYPE_CHECKING:
     from f import *",
             "some_filename.py",
-        )
-        .unwrap();
+        );
         assert_eq!(
             vec![
                 ("a".to_owned(), 2, false),
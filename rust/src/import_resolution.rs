@@ -0,0 +1,334 @@
+//! Resolves the names of imported objects into the modules they belong to.
+//!
+//! The internal modules are indexed in a trie of their dotted name components, which is built
+//! once per scan and shared between threads. Names are looked up one component at a time, so
+//! resolving an import doesn't allocate anything beyond the name of the module it resolves to.
+
+use crate::module_finding::{FoundPackage, Module};
+use itertools::Itertools;
+use rustc_hash::FxHashMap;
+use std::collections::HashSet;
+
+const ROOT: usize = 0;
+
+/// A read-only index of the internal modules, for resolving imports.
+pub struct ResolutionIndex {
+    nodes: Vec<Node>,
+}
+
+#[derive(Default)]
+struct Node {
+    children: FxHashMap<String, usize>,
+    is_module: bool,
+    /// Whether this is a found package, or an ancestor of one.
+    contains_found_package: bool,
+    /// Whether this is a strict ancestor of a found package, e.g. a namespace package.
+    is_found_package_ancestor: bool,
+}
+
+impl ResolutionIndex {
+    pub fn new(found_packages: &HashSet<FoundPackage>) -> Self {
+        let mut index = ResolutionIndex {
+            nodes: vec![Node::default()],
+        };
+        for found_package in found_packages {
+            for module_file in &found_package.module_files {
+                let node = index.insert(&module_file.module.name);
+                index.nodes[node].is_module = true;
+            }
+            // The package usually has a module file for each component, but needn't.
+            let mut node = ROOT;
+            for component in found_package.name.split('.') {
+                index.nodes[node].is_found_package_ancestor = true;
+                node = index.get_or_insert_child(node, component);
+                index.nodes[node].contains_found_package = true;
+            }
+        }
+        index
+    }
+
+    fn insert(&mut self, name: &str) -> usize {
+        name.split('.').fold(ROOT, |node, component| {
+            self.get_or_insert_child(node, component)
+        })
+    }
+
+    fn get_or_insert_child(&mut self, node: usize, component: &str) -> usize {
+        match self.nodes[node].children.get(component) {
+            Some(child) => *child,
+            None => {
+                let child = self.nodes.len();
+                self.nodes.push(Node::default());
+                self.nodes[node]
+                    .children
+                    .insert(component.to_string(), child);
+                child
+            }
+        }
+    }
+
+    /// Returns the nodes for the leading components of the name that are in the index.
+    fn walk<'a>(&'a self, name: AbsoluteName<'a>) -> impl Iterator<Item = &'a Node> + 'a {
+        name.components()
+            .scan(ROOT, |node, component| {
+                *node = *self.nodes[*node].children.get(component)?;
+                Some(&self.nodes[*node])
+            })
+            .fuse()
+    }
+
+    /// Returns the module an imported object belongs to.
+    ///
+    /// Internal objects belong to the internal module with their name, or else their parent's. If
+    /// include_external_packages is true, external objects belong to the distilled external
+    /// module (see distill_external_module_component_count), otherwise they're ignored.
+    pub fn resolve(
+        &self,
+        importer: &Module,
+        is_package: bool,
+        imported_object_name: &str,
+        include_external_packages: bool,
+    ) -> Option<String> {
+        let name = AbsoluteName::new(importer, is_package, imported_object_name);
+        let component_count = match self.internal_module_component_count(name) {
+            Some(component_count) => component_count,
+            None if include_external_packages => {
+                self.distill_external_module_component_count(name)?
+            }
+            None => return None,
+        };
+        Some(name.join_components(component_count))
+    }
+
+    /// Returns how many of the name's components make up the internal module it belongs to.
+    fn internal_module_component_count(&self, name: AbsoluteName) -> Option<usize> {
+        let component_count = name.components().count();
+        let mut nodes = self.walk(name).skip(component_count.saturating_sub(2));
+        let parent = if component_count >= 2 {
+            nodes.next()
+        } else {
+            None
+        };
+        if nodes.next().is_some_and(|node| node.is_module) {
+            Some(component_count)
+        } else if parent.is_some_and(|node| node.is_module) {
+            Some(component_count - 1)
+        } else {
+            None
+        }
+    }
+
+    /// Given a name that we already know is external, returns how many of its components make
+    /// up the module to add to the graph.
+    //
+    //  The 'distillation' process involves removing any unwanted subpackages. For example,
+    //  django.models.db should be turned into simply django.
+    //  The process is more complex for potential namespace packages, as it's not possible to
+    //  determine the portion package simply from name. Rather than adding the overhead of a
+    //  filesystem read, we just get the shallowest component that does not clash with an
+    //  internal module namespace. Take, for example, foo.blue.alpha.one. If one of the found
+    //  packages is foo.blue.beta, the module will be distilled to foo.blue.alpha.
+    //  Alternatively, if the found package is foo.green, the distilled module will
+    //  be foo.blue.
+    fn distill_external_module_component_count(&self, name: AbsoluteName) -> Option<usize> {
+        let component_count = name.components().count();
+        let mut nodes = self.walk(name).peekable();
+        if !nodes
+            .peek()
+            .is_some_and(|root_node| root_node.is_found_package_ancestor)
+        {
+            return Some(1);
+        }
+
+        // Use the shallowest component that isn't in the namespace of a found package.
+        let mut namespace_component_count = 0;
+        for (depth, node) in nodes.enumerate() {
+            // If it's a parent of one of the internal packages, it doesn't make sense as an
+            // import, and is probably an import of a namespace package.
+            if depth + 1 == component_count && node.is_found_package_ancestor {
+                return None;
+            }
+            if !node.contains_found_package {
+                break;
+            }
+            namespace_component_count = depth + 1;
+        }
+        Some((namespace_component_count + 1).min(component_count))
+    }
+}
+
+/// The absolute name of an imported object, without copying it.
+///
+/// Relative names are represented by the package they are relative to and the rest of the name.
+#[derive(Clone, Copy)]
+struct AbsoluteName<'a> {
+    base: &'a str,
+    relative_name: Option<&'a str>,
+}
+
+impl<'a> AbsoluteName<'a> {
+    fn new(importer: &'a Module, is_package: bool, imported_object_name: &'a str) -> Self {
+        let relative_name = imported_object_name.trim_start_matches('.');
+        let leading_dots_count = imported_object_name.len() - relative_name.len();
+        if leading_dots_count == 0 {
+            return AbsoluteName {
+                base: imported_object_name,
+                relative_name: None,
+            };
+        }
+
+        // A single dot refers to the importer itself if it's a package, otherwise its parent.
+        let ancestor_count = if is_package {
+            leading_dots_count - 1
+        } else {
+            leading_dots_count
+        };
+        let base_component_count = importer
+            .name
+            .split('.')
+            .count()
+            .saturating_sub(ancestor_count);
+        let base_end = importer
+            .name
+            .match_indices('.')
+            .nth(base_component_count.wrapping_sub(1))
+            .map_or(importer.name.len(), |(index, _)| index);
+        AbsoluteName {
+            base: if base_component_count == 0 {
+                ""
+            } else {
+                &importer.name[..base_end]
+            },
+            relative_name: Some(relative_name),
+        }
+    }
+
+    fn components(self) -> impl Iterator<Item = &'a str> + 'a {
+        self.base.split('.').chain(
+            self.relative_name
+                .into_iter()
+                .flat_map(|name| name.split('.')),
+        )
+    }
+
+    fn join_components(self, component_count: usize) -> String {
+        self.components().take(component_count).join(".")
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::module_finding::ModuleFile;
+    use parameterized::parameterized;
+    use std::collections::BTreeSet;
+
+    fn make_index(packages: &[(&str, &[&str])]) -> ResolutionIndex {
+        let found_packages = packages
+            .iter()
+            .map(|(name, module_names)| FoundPackage {
+                name: name.to_string(),
+                directory: format!("/path/to/{name}"),
+                module_files: module_names
+                    .iter()
+                    .map(|module_name| ModuleFile {
+                        module: Module {
+                            name: module_name.to_string(),
+                        },
+                        path: None,
+                    })
+                    .collect::<BTreeSet<_>>(),
+            })
+            .collect();
+        ResolutionIndex::new(&found_packages)
+    }
+
+    fn resolve(
+        index: &ResolutionIndex,
+        importer: &str,
+        is_package: bool,
+        imported_object_name: &str,
+    ) -> Option<String> {
+        let importer = Module {
+            name: importer.to_string(),
+        };
+        index.resolve(&importer, is_package, imported_object_name, true)
+    }
+
+    #[parameterized(case = {
+        ("mypackage.foo", false, "mypackage.bar", Some("mypackage.bar")),
+        ("mypackage.foo", false, "mypackage.bar.some_function", Some("mypackage.bar")),
+        ("mypackage.foo", false, "mypackage.bar.one.two", Some("mypackage")),
+        ("mypackage.foo", false, "mypackage.foo.two", Some("mypackage.foo.two")),
+        ("mypackage.foo", false, "mypackage", Some("mypackage")),
+        ("mypackage.foo", false, ".bar", Some("mypackage.bar")),
+        ("mypackage.foo", false, ".bar.some_function", Some("mypackage.bar")),
+        ("mypackage.foo", false, ".", Some("mypackage")),
+        ("mypackage.foo", true, ".two", Some("mypackage.foo.two")),
+        ("mypackage.foo", true, "..bar", Some("mypackage.bar")),
+        ("mypackage.foo.two", false, "..bar", Some("mypackage.bar")),
+        ("mypackage.foo", false, "django.db.models", Some("django")),
+        ("mypackage.foo", false, "mypackage.missing.thing", Some("mypackage")),
+    })]
+    fn test_resolve(case: (&str, bool, &str, Option<&str>)) {
+        let (importer, is_package, imported_object_name, expected) = case;
+        let index = make_index(&[(
+            "mypackage",
+            &[
+                "mypackage",
+                "mypackage.foo",
+                "mypackage.foo.two",
+                "mypackage.bar",
+            ],
+        )]);
+
+        assert_eq!(
+            resolve(&index, importer, is_package, imported_object_name).as_deref(),
+            expected
+        );
+    }
+
+    #[test]
+    fn test_ignores_external_modules_unless_included() {
+        let index = make_index(&[("mypackage", &["mypackage", "mypackage.foo"])]);
+        let importer = Module {
+            name: "mypackage.foo".to_string(),
+        };
+
+        assert_eq!(index.resolve(&importer, false, "django.db", false), None);
+    }
+
+    #[test]
+    fn test_package_without_module_files() {
+        let index = make_index(&[("mypackage", &[]), ("otherpackage", &["otherpackage"])]);
+
+        assert_eq!(
+            resolve(&index, "otherpackage", true, "mypackage.foo").as_deref(),
+            Some("mypackage")
+        );
+        assert_eq!(
+            resolve(&index, "otherpackage", true, "otherpackage.foo").as_deref(),
+            Some("otherpackage")
+        );
+    }
+
+    #[parameterized(case = {
+        ("foo.blue.alpha.one", Some("foo.blue.alpha")),
+        ("foo.green.one", Some("foo.green")),
+        ("foo.blue", None),
+        ("foo", None),
+        ("bar.blue.beta", Some("bar")),
+    })]
+    fn test_distills_external_modules_in_a_namespace(case: (&str, Option<&str>)) {
+        let (imported_object_name, expected) = case;
+        let index = make_index(&[
+            ("foo.blue.beta", &["foo.blue.beta", "foo.blue.beta.one"]),
+            ("foo.red", &["foo.red"]),
+        ]);
+
+        assert_eq!(
+            resolve(&index, "foo.red", true, imported_object_name).as_deref(),
+            expected
+        );
+    }
+}
@@ -1,16 +1,20 @@
 use crate::errors::{GrimpError, GrimpResult};
 use crate::filesystem::{FileSystem, get_file_system_boxed};
-use crate::module_finding::{FoundPackage, Module};
+use crate::import_parsing::{ImportParser, ImportedObject};
+use crate::import_resolution::ResolutionIndex;
+use crate::module_finding::{FoundPackage, Module, ModuleFile};
+use crate::workers;
 use crate::{import_parsing, module_finding};
-use itertools::Itertools;
+use pyo3::exceptions::{PyBaseException, PyKeyError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::types::{PyDict, PySet};
 /// Statically analyses some Python modules for import statements within their shared package.
+use rayon::iter::Either;
 use rayon::prelude::*;
 use std::collections::{HashMap, HashSet};
 use std::io::{self, ErrorKind};
 
-#[derive(Debug, Hash, Eq, PartialEq)]
+#[derive(Debug, Clone, Hash, Eq, PartialEq)]
 pub struct DirectImport {
     pub importer: String,
     pub imported: String,
@@ -34,7 +38,236 @@ impl<'py> FromPyObject<'py> for DirectImport {
     }
 }
 
-fn py_found_packages_to_rust(py_found_packages: &Bound<'_, PyAny>) -> HashSet<FoundPackage> {
+impl<'py> FromPyObject<'py> for ImportParser {
+    fn extract_bound(ob: &Bound<'py, PyAny>) -> PyResult<Self> {
+        match ob.extract::<String>()?.as_str() {
+            "full" => Ok(ImportParser::Full),
+            "lexer" => Ok(ImportParser::Lexer),
+            other => Err(PyValueError::new_err(format!(
+                "import_parser must be one of full, lexer, got '{other}'."
+            ))),
+        }
+    }
+}
+
+/// The imports found by scanning some modules, keyed by importing module.
+///
+/// This stays in Rust as it passes between scanning, the cache and graph assembly, so the
+/// imports only need to be converted into Python objects if a caller explicitly asks for them.
+#[pyclass(name = "ImportsByModule")]
+#[derive(Debug, Default, Clone)]
+pub struct ImportsByModule {
+    inner: HashMap<Module, HashSet<DirectImport>>,
+}
+
+impl ImportsByModule {
+    pub fn new(inner: HashMap<Module, HashSet<DirectImport>>) -> Self {
+        ImportsByModule { inner }
+    }
+
+    pub fn as_map(&self) -> &HashMap<Module, HashSet<DirectImport>> {
+        &self.inner
+    }
+}
+
+#[pymethods]
+impl ImportsByModule {
+    #[new]
+    fn py_new() -> Self {
+        ImportsByModule::default()
+    }
+
+    /// Builds the container from a dict[Module, set[DirectImport]].
+    #[staticmethod]
+    fn from_dict(imports_by_module: &Bound<'_, PyDict>) -> PyResult<Self> {
+        let mut inner = HashMap::new();
+        for (py_module, py_direct_imports) in imports_by_module.iter() {
+            let module: Module = py_module.extract()?;
+            let direct_imports = py_direct_imports
+                .downcast::<PySet>()?
+                .iter()
+                .map(|py_direct_import| py_direct_import.extract::<DirectImport>())
+                .collect::<PyResult<HashSet<_>>>()?;
+            inner.insert(module, direct_imports);
+        }
+        Ok(ImportsByModule { inner })
+    }
+
+    /// Converts the container into a dict[Module, set[DirectImport]].
+    fn to_dict<'py>(&self, py: Python<'py>) -> PyResult<Bound<'py, PyDict>> {
+        imports_by_module_to_py(py, &self.inner)
+    }
+
+    /// Returns the set[DirectImport] for the supplied module.
+    ///
+    /// Raises KeyError if the module is not present.
+    fn direct_imports<'py>(
+        &self,
+        py: Python<'py>,
+        module_name: &str,
+    ) -> PyResult<Bound<'py, PySet>> {
+        match self.inner.get(module_name) {
+            Some(direct_imports) => {
+                to_py_direct_imports(py, &PyValueObjectClasses::import(py)?, direct_imports)
+            }
+            None => Err(PyKeyError::new_err(module_name.to_owned())),
+        }
+    }
+
+    fn module_names(&self) -> HashSet<String> {
+        self.inner
+            .keys()
+            .map(|module| module.name.clone())
+            .collect()
+    }
+
+    /// Returns a new container with just the supplied modules (where present).
+    fn subset(&self, module_names: HashSet<String>) -> Self {
+        ImportsByModule {
+            inner: module_names
+                .iter()
+                .filter_map(|module_name| self.inner.get_key_value(module_name.as_str()))
+                .map(|(module, direct_imports)| (module.clone(), direct_imports.clone()))
+                .collect(),
+        }
+    }
+
+    /// Adds the modules from another container, replacing any that are already present.
+    fn update(&mut self, other: PyRef<'_, ImportsByModule>) {
+        self.inner.extend(
+            other
+                .inner
+                .iter()
+                .map(|(module, direct_imports)| (module.clone(), direct_imports.clone())),
+        );
+    }
+
+    fn __len__(&self) -> usize {
+        self.inner.len()
+    }
+
+    fn __contains__(&self, module_name: &str) -> bool {
+        self.inner.contains_key(module_name)
+    }
+}
+
+/// The objects a module imports, as parsed from its source code, before they are resolved.
+///
+/// Unlike DirectImports, these don't depend on which packages are being analysed, or on the
+/// options used to build the graph.
+#[derive(Debug, Clone, PartialEq, Eq)]
+pub struct ParsedModule {
+    /// Whether the module is a package (an __init__.py file), which relative imports depend on.
+    pub is_package: bool,
+    pub imported_objects: Vec<ImportedObject>,
+}
+
+/// The imported objects parsed from some modules, keyed by importing module.
+///
+/// These can be resolved into an ImportsByModule for any set of packages and options.
+#[pyclass(name = "ParsedImportsByModule")]
+#[derive(Debug, Default, Clone)]
+pub struct ParsedImportsByModule {
+    inner: HashMap<Module, ParsedModule>,
+}
+
+impl ParsedImportsByModule {
+    pub fn new(inner: HashMap<Module, ParsedModule>) -> Self {
+        ParsedImportsByModule { inner }
+    }
+
+    pub fn as_map(&self) -> &HashMap<Module, ParsedModule> {
+        &self.inner
+    }
+}
+
+#[pymethods]
+impl ParsedImportsByModule {
+    #[new]
+    fn py_new() -> Self {
+        ParsedImportsByModule::default()
+    }
+
+    fn module_names(&self) -> HashSet<String> {
+        self.inner
+            .keys()
+            .map(|module| module.name.clone())
+            .collect()
+    }
+
+    /// Returns a new container with just the supplied modules (where present).
+    fn subset(&self, module_names: HashSet<String>) -> Self {
+        ParsedImportsByModule {
+            inner: module_names
+                .iter()
+                .filter_map(|module_name| self.inner.get_key_value(module_name.as_str()))
+                .map(|(module, parsed_module)| (module.clone(), parsed_module.clone()))
+                .collect(),
+        }
+    }
+
+    /// Adds the modules from another container, replacing any that are already present.
+    fn update(&mut self, other: PyRef<'_, ParsedImportsByModule>) {
+        self.inner.extend(
+            other
+                .inner
+                .iter()
+                .map(|(module, parsed_module)| (module.clone(), parsed_module.clone())),
+        );
+    }
+
+    /// Resolves the imported objects into the imports between modules.
+    ///
+    /// Python args:
+    ///
+    /// - found_packages:                Set of FoundPackages containing all the modules
+    ///                                  for analysis.
+    /// - include_external_packages:     Whether to include imports of external modules.
+    /// - exclude_type_checking_imports: If True, don't include imports behind TYPE_CHECKING
+    ///                                  guards.
+    ///
+    /// Returns ImportsByModule.
+    fn resolve(
+        &self,
+        py: Python<'_>,
+        found_packages: Bound<'_, PyAny>,
+        include_external_packages: bool,
+        exclude_type_checking_imports: bool,
+    ) -> PyResult<ImportsByModule> {
+        let found_packages_rust = py_found_packages_to_rust(&found_packages);
+        let imports_by_module = py.detach(|| {
+            let resolution_index = ResolutionIndex::new(&found_packages_rust);
+            workers::install(None, || {
+                self.inner
+                    .par_iter()
+                    .map(|(module, parsed_module)| {
+                        let imports = resolve_module_imports(
+                            module,
+                            parsed_module,
+                            &resolution_index,
+                            include_external_packages,
+                            exclude_type_checking_imports,
+                        );
+                        (module.clone(), imports)
+                    })
+                    .collect()
+            })
+        })?;
+        Ok(ImportsByModule::new(imports_by_module))
+    }
+
+    fn __len__(&self) -> usize {
+        self.inner.len()
+    }
+
+    fn __contains__(&self, module_name: &str) -> bool {
+        self.inner.contains_key(module_name)
+    }
+}
+
+pub(crate) fn py_found_packages_to_rust(
+    py_found_packages: &Bound<'_, PyAny>,
+) -> HashSet<FoundPackage> {
     let py_set = py_found_packages
         .downcast::<PySet>()
         .expect("Expected py_found_packages to be a Python set.");
@@ -52,22 +285,35 @@ fn py_found_packages_to_rust(py_found_packages: &Bound<'_, PyAny>) -> HashSet<Fo
     rust_found_packages
 }
 
-fn get_modules_from_found_packages(found_packages: &HashSet<FoundPackage>) -> HashSet<Module> {
-    let mut modules = HashSet::new();
-    for package in found_packages {
-        for module_file in &package.module_files {
-            modules.insert(module_file.module.clone());
+/// Builds a lookup table of the found package that each module belongs to.
+pub(crate) fn get_found_packages_by_module(
+    found_packages: &HashSet<FoundPackage>,
+) -> HashMap<&Module, &FoundPackage> {
+    let mut found_packages_by_module = HashMap::new();
+    for found_package in found_packages {
+        for module_file in &found_package.module_files {
+            found_packages_by_module.insert(&module_file.module, found_package);
         }
     }
-    modules
+    found_packages_by_module
 }
 
-fn count_leading_dots(s: &str) -> usize {
-    s.chars().take_while(|&c| c == '.').count()
-}
-
-fn module_is_descendant(module_name: &str, potential_ancestor: &str) -> bool {
-    module_name.starts_with(&format!("{potential_ancestor}."))
+/// Returns the filename of the module file.
+///
+/// Uses the path from the module finder if we have it, to avoid locating the file again.
+#[allow(clippy::borrowed_box)]
+pub(crate) fn get_module_file_filename(
+    module_file: &ModuleFile,
+    found_packages_by_module: &HashMap<&Module, &FoundPackage>,
+    file_system: &Box<dyn FileSystem + Send + Sync>,
+) -> io::Result<String> {
+    match &module_file.path {
+        Some(path) => Ok(path.clone()),
+        None => {
+            let found_package = found_packages_by_module[&module_file.module];
+            _determine_module_filename(&module_file.module, found_package, file_system)
+        }
+    }
 }
 
 /// Statically analyses the given module and returns a set of Modules that
@@ -77,31 +323,24 @@ fn scan_for_imports_no_py(
     file_system: &Box<dyn FileSystem + Send + Sync>,
     found_packages: &HashSet<FoundPackage>,
     include_external_packages: bool,
-    modules: &HashSet<Module>,
+    module_files: &HashSet<ModuleFile>,
     exclude_type_checking_imports: bool,
 ) -> GrimpResult<HashMap<Module, HashSet<DirectImport>>> {
-    let module_packages = get_modules_from_found_packages(found_packages);
-
-    // Assemble a lookup table so we only need to do this once.
-    let mut found_packages_by_module = HashMap::new();
-    for found_package in found_packages {
-        for module_file in &found_package.module_files {
-            found_packages_by_module.insert(&module_file.module, found_package);
-        }
-    }
-    let results: GrimpResult<Vec<(Module, HashSet<DirectImport>)>> = modules
+    // Assemble lookup tables so we only need to do this once.
+    let resolution_index = ResolutionIndex::new(found_packages);
+    let found_packages_by_module = get_found_packages_by_module(found_packages);
+    let results: GrimpResult<Vec<(Module, HashSet<DirectImport>)>> = module_files
         .par_iter()
-        .map(|module| {
+        .map(|module_file| {
             let imports = scan_for_imports_no_py_single_module(
-                module,
+                module_file,
                 file_system,
                 &found_packages_by_module,
-                found_packages,
-                &module_packages,
+                &resolution_index,
                 include_external_packages,
                 exclude_type_checking_imports,
             )?;
-            Ok((module.clone(), imports))
+            Ok((module_file.module.clone(), imports))
         })
         .collect();
 
@@ -110,92 +349,155 @@ fn scan_for_imports_no_py(
 
 #[allow(clippy::borrowed_box)]
 fn scan_for_imports_no_py_single_module(
-    module: &Module,
+    module_file: &ModuleFile,
     file_system: &Box<dyn FileSystem + Send + Sync>,
     found_packages_by_module: &HashMap<&Module, &FoundPackage>,
-    found_packages: &HashSet<FoundPackage>,
-    all_modules: &HashSet<Module>,
+    resolution_index: &ResolutionIndex,
     include_external_packages: bool,
     exclude_type_checking_imports: bool,
 ) -> GrimpResult<HashSet<DirectImport>> {
-    let mut imports: HashSet<DirectImport> = HashSet::new();
-    let found_package_for_module = found_packages_by_module[module];
+    let parsed_module = parse_module(
+        module_file,
+        file_system,
+        found_packages_by_module,
+        ImportParser::Full,
+    )?;
+    Ok(resolve_module_imports(
+        &module_file.module,
+        &parsed_module,
+        resolution_index,
+        include_external_packages,
+        exclude_type_checking_imports,
+    ))
+}
+
+/// Parses the imported objects from each of the given modules.
+///
+/// A module that can't be parsed doesn't stop the others from being parsed: the modules that
+/// could be parsed are returned along with the errors for those that couldn't, ordered by module.
+#[allow(clippy::borrowed_box)]
+fn parse_imports_no_py(
+    file_system: &Box<dyn FileSystem + Send + Sync>,
+    found_packages: &HashSet<FoundPackage>,
+    module_files: &[ModuleFile],
+    import_parser: ImportParser,
+) -> (HashMap<Module, ParsedModule>, Vec<GrimpError>) {
+    let found_packages_by_module = get_found_packages_by_module(found_packages);
+    let (parsed_modules, mut errors): (HashMap<Module, ParsedModule>, Vec<(&Module, GrimpError)>) =
+        module_files.par_iter().partition_map(|module_file| {
+            match parse_module(
+                module_file,
+                file_system,
+                &found_packages_by_module,
+                import_parser,
+            ) {
+                Ok(parsed_module) => Either::Left((module_file.module.clone(), parsed_module)),
+                Err(error) => Either::Right((&module_file.module, error)),
+            }
+        });
+    errors.sort_unstable_by(|(a, _), (b, _)| a.name.cmp(&b.name));
+    (
+        parsed_modules,
+        errors.into_iter().map(|(_, error)| error).collect(),
+    )
+}
+
+#[allow(clippy::borrowed_box)]
+fn parse_module(
+    module_file: &ModuleFile,
+    file_system: &Box<dyn FileSystem + Send + Sync>,
+    found_packages_by_module: &HashMap<&Module, &FoundPackage>,
+    import_parser: ImportParser,
+) -> GrimpResult<ParsedModule> {
+    // The module may have been removed, or be partway through being written, since it was found.
     let module_filename =
-        _determine_module_filename(module, found_package_for_module, file_system).unwrap();
-    let module_contents = file_system.read(&module_filename).unwrap();
-    let imported_objects =
-        import_parsing::parse_imports_from_code(&module_contents, &module_filename)?;
+        get_module_file_filename(module_file, found_packages_by_module, file_system)
+            .map_err(|error| GrimpError::UnreadableModule(error.into()))?;
+    let module_contents = file_system
+        .read_source(&module_filename)
+        .map_err(GrimpError::UnreadableModule)?;
+    let imported_objects = import_parsing::extract_imports_from_code(
+        module_contents.as_str(),
+        &module_filename,
+        import_parser,
+    )?;
+
+    Ok(ParsedModule {
+        is_package: _module_is_package(&module_filename, file_system),
+        imported_objects,
+    })
+}
 
-    let is_package = _module_is_package(&module_filename, file_system);
+/// Resolves the objects a module imports into the modules they belong to.
+fn resolve_module_imports(
+    module: &Module,
+    parsed_module: &ParsedModule,
+    resolution_index: &ResolutionIndex,
+    include_external_packages: bool,
+    exclude_type_checking_imports: bool,
+) -> HashSet<DirectImport> {
+    let mut imports: HashSet<DirectImport> = HashSet::new();
 
-    for imported_object in imported_objects {
+    for imported_object in &parsed_module.imported_objects {
         // Don't include type checking imports, if specified.
         if exclude_type_checking_imports && imported_object.typechecking_only {
             continue;
         }
 
-        // Resolve relative imports.
-        let imported_object_name =
-            _get_absolute_imported_object_name(module, is_package, &imported_object.name);
-
-        // Resolve imported module.
-        match _get_internal_module(&imported_object_name, all_modules) {
-            Some(imported_module) => {
-                // It's an internal import.
-                imports.insert(DirectImport {
-                    importer: module.name.to_string(),
-                    imported: imported_module.name.to_string(),
-                    line_number: imported_object.line_number,
-                    line_contents: imported_object.line_contents,
-                });
-            }
-            None => {
-                // It's an external import.
-                if include_external_packages
-                    && let Some(imported_module) =
-                        _distill_external_module(&imported_object_name, found_packages)
-                {
-                    imports.insert(DirectImport {
-                        importer: module.name.to_string(),
-                        imported: imported_module,
-                        line_number: imported_object.line_number,
-                        line_contents: imported_object.line_contents,
-                    });
-                }
-            }
+        if let Some(imported_module) = resolution_index.resolve(
+            module,
+            parsed_module.is_package,
+            &imported_object.name,
+            include_external_packages,
+        ) {
+            imports.insert(DirectImport {
+                importer: module.name.to_string(),
+                imported: imported_module,
+                line_number: imported_object.line_number,
+                line_contents: imported_object.line_contents.clone(),
+            });
         }
     }
 
-    Ok(imports)
+    imports
 }
 
-fn to_py_direct_imports<'a>(
-    py: Python<'a>,
-    rust_imports: &HashSet<DirectImport>,
-) -> Bound<'a, PySet> {
-    let valueobjects_pymodule = PyModule::import(py, "grimp.domain.valueobjects").unwrap();
-    let py_module_class = valueobjects_pymodule.getattr("Module").unwrap();
-    let py_direct_import_class = valueobjects_pymodule.getattr("DirectImport").unwrap();
+/// The Python classes needed to build Python value objects from Rust data.
+pub(crate) struct PyValueObjectClasses<'py> {
+    module: Bound<'py, PyAny>,
+    direct_import: Bound<'py, PyAny>,
+}
+
+impl<'py> PyValueObjectClasses<'py> {
+    pub(crate) fn import(py: Python<'py>) -> PyResult<Self> {
+        let valueobjects_pymodule = PyModule::import(py, "grimp.domain.valueobjects")?;
+        Ok(PyValueObjectClasses {
+            module: valueobjects_pymodule.getattr("Module")?,
+            direct_import: valueobjects_pymodule.getattr("DirectImport")?,
+        })
+    }
+}
 
-    let pyset = PySet::empty(py).unwrap();
+pub(crate) fn to_py_direct_imports<'py>(
+    py: Python<'py>,
+    classes: &PyValueObjectClasses<'py>,
+    rust_imports: &HashSet<DirectImport>,
+) -> PyResult<Bound<'py, PySet>> {
+    let pyset = PySet::empty(py)?;
 
     for rust_import in rust_imports {
-        let importer = py_module_class.call1((&rust_import.importer,)).unwrap();
-        let imported = py_module_class.call1((&rust_import.imported,)).unwrap();
+        let importer = classes.module.call1((&rust_import.importer,))?;
+        let imported = classes.module.call1((&rust_import.imported,))?;
         let kwargs = PyDict::new(py);
-        kwargs.set_item("importer", &importer).unwrap();
-        kwargs.set_item("imported", &imported).unwrap();
-        kwargs
-            .set_item("line_number", rust_import.line_number)
-            .unwrap();
-        kwargs
-            .set_item("line_contents", &rust_import.line_contents)
-            .unwrap();
-        let py_direct_import = py_direct_import_class.call((), Some(&kwargs)).unwrap();
-        pyset.add(&py_direct_import).unwrap();
+        kwargs.set_item("importer", &importer)?;
+        kwargs.set_item("imported", &imported)?;
+        kwargs.set_item("line_number", rust_import.line_number)?;
+        kwargs.set_item("line_contents", &rust_import.line_contents)?;
+        let py_direct_import = classes.direct_import.call((), Some(&kwargs))?;
+        pyset.add(&py_direct_import)?;
     }
 
-    pyset
+    Ok(pyset)
 }
 
 #[allow(clippy::borrowed_box)]
@@ -223,7 +525,7 @@ fn _determine_module_filename(
     }
     Err(io::Error::new(
         ErrorKind::NotFound,
-        "Could not find module {module}.",
+        format!("Could not find module {}.", module.name),
     ))
 }
 
@@ -235,136 +537,20 @@ fn _module_is_package(
     file_system.split(module_filename).1 == "__init__.py"
 }
 
-fn _get_absolute_imported_object_name(
-    module: &Module,
-    is_package: bool,
-    imported_object_name: &str,
-) -> String {
-    let leading_dots_count = count_leading_dots(imported_object_name);
-    if leading_dots_count == 0 {
-        return imported_object_name.to_string();
-    }
-    let imported_object_name_base: String;
-    if is_package {
-        if leading_dots_count == 1 {
-            imported_object_name_base = module.name.clone();
-        } else {
-            let parts: Vec<&str> = module.name.split('.').collect();
-            imported_object_name_base = parts[0..parts.len() - leading_dots_count + 1].join(".");
-        }
-    } else {
-        let parts: Vec<&str> = module.name.split('.').collect();
-        imported_object_name_base = parts[0..parts.len() - leading_dots_count].join(".");
-    }
-
-    format!(
-        "{}.{}",
-        imported_object_name_base,
-        &imported_object_name[leading_dots_count..]
-    )
-}
-
-fn _get_internal_module(
-    imported_object_name: &str,
-    all_modules: &HashSet<Module>,
-) -> Option<Module> {
-    let candidate_module = Module {
-        name: imported_object_name.to_string(),
-    };
-    if all_modules.contains(&candidate_module) {
-        return Some(candidate_module);
-    }
-    if let Some((parent_name, _)) = imported_object_name.rsplit_once('.') {
-        let parent = Module {
-            name: parent_name.to_string(),
-        };
-        if all_modules.contains(&parent) {
-            return Some(parent);
-        }
-    }
-    None
-}
-
-/// Given a module that we already know is external, turn it into a module to add to the graph.
-//
-//  The 'distillation' process involves removing any unwanted subpackages. For example,
-//  django.models.db should be turned into simply django.
-//  The process is more complex for potential namespace packages, as it's not possible to
-//  determine the portion package simply from name. Rather than adding the overhead of a
-//  filesystem read, we just get the shallowest component that does not clash with an internal
-//  module namespace. Take, for example, foo.blue.alpha.one. If one of the found
-//  packages is foo.blue.beta, the module will be distilled to foo.blue.alpha.
-//  Alternatively, if the found package is foo.green, the distilled module will
-//  be foo.blue.
-fn _distill_external_module(
-    module_name: &str,
-    found_packages: &HashSet<FoundPackage>,
-) -> Option<String> {
-    let module_root = module_name.split(".").next().unwrap();
-    // If it's a module that is a parent of one of the internal packages, return None
-    // as it doesn't make sense and is probably an import of a namespace package.
-    for package in found_packages {
-        if module_is_descendant(&package.name, module_name) {
-            return None;
-        }
-    }
-
-    // If it shares a namespace with an internal module, get the shallowest component that does
-    // not clash with an internal module namespace.
-    let mut candidate_portions: HashSet<Module> = HashSet::new();
-    let mut sorted_found_packages: Vec<&FoundPackage> = found_packages.iter().collect();
-    sorted_found_packages.sort_by_key(|package| &package.name);
-    sorted_found_packages.reverse();
-
-    for found_package in sorted_found_packages {
-        let root_module = &found_package.name;
-        if module_is_descendant(root_module, module_root) {
-            let mut internal_path_components: Vec<&str> = root_module.split(".").collect();
-            let mut external_path_components: Vec<&str> = module_name.split(".").collect();
-            let mut external_namespace_components: Vec<&str> = vec![];
-            while external_path_components[0] == internal_path_components[0] {
-                external_namespace_components.push(external_path_components.remove(0));
-                internal_path_components.remove(0);
-            }
-            external_namespace_components.push(external_path_components[0]);
-
-            candidate_portions.insert(Module {
-                name: external_namespace_components.join("."),
-            });
-        }
-    }
-
-    if !candidate_portions.is_empty() {
-        // If multiple found packages share a namespace with this module, use the deepest one
-        // as we know that that will be a namespace too.
-        let deepest_candidate_portion = candidate_portions
-            .iter()
-            .sorted_by_key(|portion| portion.name.split(".").collect::<Vec<_>>().len())
-            .next_back()
-            .unwrap();
-        Some(deepest_candidate_portion.name.clone())
-    } else {
-        Some(module_name.split('.').next().unwrap().to_string())
-    }
-}
-
 /// Convert the rust data structure into a Python dict[Module, set[DirectImport]].
-pub fn imports_by_module_to_py(
-    py: Python,
-    imports_by_module: HashMap<module_finding::Module, HashSet<DirectImport>>,
-) -> Bound<PyDict> {
-    let valueobjects_pymodule = PyModule::import(py, "grimp.domain.valueobjects").unwrap();
-    let py_module_class = valueobjects_pymodule.getattr("Module").unwrap();
+fn imports_by_module_to_py<'py>(
+    py: Python<'py>,
+    imports_by_module: &HashMap<Module, HashSet<DirectImport>>,
+) -> PyResult<Bound<'py, PyDict>> {
+    let classes = PyValueObjectClasses::import(py)?;
 
     let imports_by_module_py = PyDict::new(py);
     for (module, imports) in imports_by_module.iter() {
-        let py_module_instance = py_module_class.call1((module.name.clone(),)).unwrap();
-        let py_imports = to_py_direct_imports(py, imports);
-        imports_by_module_py
-            .set_item(py_module_instance, py_imports)
-            .unwrap();
+        let py_module_instance = classes.module.call1((&module.name,))?;
+        let py_imports = to_py_direct_imports(py, &classes, imports)?;
+        imports_by_module_py.set_item(py_module_instance, py_imports)?;
     }
-    imports_by_module_py
+    Ok(imports_by_module_py)
 }
 
 /// Statically analyses the given module and returns a set of Modules that
@@ -380,7 +566,7 @@ pub fn imports_by_module_to_py(
 /// - exclude_type_checking_imports: If True, don't include imports behind TYPE_CHECKING guards.
 /// - file_system:                   The file system interface to use. (A BasicFileSystem.)
 ///
-/// Returns dict[Module, set[DirectImport]].
+/// Returns ImportsByModule.
 #[pyfunction]
 pub fn scan_for_imports<'py>(
     py: Python<'py>,
@@ -389,53 +575,100 @@ pub fn scan_for_imports<'py>(
     include_external_packages: bool,
     exclude_type_checking_imports: bool,
     file_system: Bound<'py, PyAny>,
-) -> PyResult<Bound<'py, PyDict>> {
+) -> PyResult<ImportsByModule> {
     let file_system_boxed = get_file_system_boxed(&file_system)?;
     let found_packages_rust = py_found_packages_to_rust(&found_packages);
-    let modules_rust: HashSet<module_finding::Module> = module_files
+    let module_files_rust: HashSet<module_finding::ModuleFile> = module_files
         .iter()
-        .map(|module_file| {
-            module_file
-                .getattr("module")
-                .unwrap()
-                .extract::<module_finding::Module>()
-                .unwrap()
-        })
+        .map(|module_file| module_file.extract::<module_finding::ModuleFile>().unwrap())
         .collect();
 
     let imports_by_module_result = py.detach(|| {
-        scan_for_imports_no_py(
-            &file_system_boxed,
-            &found_packages_rust,
-            include_external_packages,
-            &modules_rust,
-            exclude_type_checking_imports,
-        )
-    });
+        workers::install(None, || {
+            scan_for_imports_no_py(
+                &file_system_boxed,
+                &found_packages_rust,
+                include_external_packages,
+                &module_files_rust,
+                exclude_type_checking_imports,
+            )
+        })
+    })?;
+
+    let imports_by_module = imports_by_module_result.map_err(|e| scanning_error_to_py(py, e))?;
+
+    Ok(ImportsByModule::new(imports_by_module))
+}
 
-    match imports_by_module_result {
-        Err(GrimpError::ParseError {
+/// Parses the given modules, without resolving the objects they import.
+///
+/// The results can be cached and then resolved for any set of packages and options, via
+/// ParsedImportsByModule.resolve.
+///
+/// Modules with syntax errors are left out of the results, rather than stopping the others from
+/// being parsed, so that the modules that could be parsed can still be cached.
+///
+/// Python args:
+///
+/// - module_files:   The modules to parse.
+/// - found_packages: Set of FoundPackages containing the modules.
+/// - file_system:    The file system interface to use. (A BasicFileSystem.)
+/// - import_parser:  How to find the imports: "full" parses each module, while "lexer" only
+///                   tokenizes it, parsing it in full if the tokens are ambiguous.
+///
+/// Returns a tuple of the ParsedImportsByModule and a list of a SourceSyntaxError for each
+/// module that couldn't be parsed, ordered by module.
+#[pyfunction]
+#[pyo3(signature = (module_files, found_packages, file_system, import_parser=ImportParser::Full))]
+pub fn parse_imports<'py>(
+    py: Python<'py>,
+    module_files: Vec<ModuleFile>,
+    found_packages: Bound<'py, PyAny>,
+    file_system: Bound<'py, PyAny>,
+    import_parser: ImportParser,
+) -> PyResult<(ParsedImportsByModule, Vec<Py<PyBaseException>>)> {
+    let file_system_boxed = get_file_system_boxed(&file_system)?;
+    let found_packages_rust = py_found_packages_to_rust(&found_packages);
+
+    let (parsed_imports, errors) = py.detach(|| {
+        workers::install(None, || {
+            parse_imports_no_py(
+                &file_system_boxed,
+                &found_packages_rust,
+                &module_files,
+                import_parser,
+            )
+        })
+    })?;
+    let syntax_errors = errors
+        .into_iter()
+        .map(|error| match error {
+            GrimpError::ParseError { .. } => Ok(scanning_error_to_py(py, error).into_value(py)),
+            error => Err(PyErr::from(error)),
+        })
+        .collect::<PyResult<_>>()?;
+
+    Ok((ParsedImportsByModule::new(parsed_imports), syntax_errors))
+}
+
+/// Converts an error from scanning into the exception to raise, which for syntax errors in
+/// the scanned code is a SourceSyntaxError.
+fn scanning_error_to_py(py: Python<'_>, error: GrimpError) -> PyErr {
+    match error {
+        GrimpError::ParseError {
             module_filename,
             line_number,
             text,
             ..
-        }) => {
+        } => {
             // TODO: define SourceSyntaxError using pyo3.
             let exceptions_pymodule = PyModule::import(py, "grimp.exceptions").unwrap();
             let py_exception_class = exceptions_pymodule.getattr("SourceSyntaxError").unwrap();
             let exception = py_exception_class
                 .call1((module_filename, line_number, text))
                 .unwrap();
-            return Err(PyErr::from_value(exception));
-        }
-        Err(e) => {
-            return Err(e.into());
+            PyErr::from_value(exception)
         }
-        _ => (),
+        e => e.into(),
     }
-    let imports_by_module = imports_by_module_result.unwrap();
-
-    let imports_by_module_py = imports_by_module_to_py(py, imports_by_module);
-
-    Ok(imports_by_module_py)
 }
@@ -1,31 +1,55 @@
+mod binary_format;
 mod caching;
 pub mod errors;
 pub mod exceptions;
 mod filesystem;
 pub mod graph;
+mod import_lexing;
 pub mod import_parsing;
+mod import_resolution;
 mod import_scanning;
 pub mod module_expressions;
 mod module_finding;
+mod workers;
 
 use pyo3::prelude::*;
 
 #[pymodule]
 mod _rustgrimp {
     #[pymodule_export]
-    use crate::import_scanning::scan_for_imports;
+    use crate::import_scanning::{
+        ImportsByModule, ParsedImportsByModule, parse_imports, scan_for_imports,
+    };
+
+    #[pymodule_export]
+    use crate::module_finding::find_module_files;
 
     #[pymodule_export]
-    use crate::caching::read_cache_data_map_file;
+    use crate::caching::{CachedImportsByModule, read_cache_data_map_file};
 
     #[pymodule_export]
     use crate::caching::write_cache_data_map_file;
 
+    #[pymodule_export]
+    use crate::caching::compute_content_digests;
+
+    #[pymodule_export]
+    use crate::caching::{decode_module_imports, encode_module_imports};
+
+    #[pymodule_export]
+    use crate::caching::{read_parse_cache_file, write_parse_cache_file};
+
+    #[pymodule_export]
+    use crate::caching::{GraphSnapshot, open_graph_snapshot, write_graph_snapshot};
+
     #[pymodule_export]
     use crate::graph::GraphWrapper;
 
     #[pymodule_export]
-    use crate::filesystem::{PyFakeBasicFileSystem, PyRealBasicFileSystem};
+    use crate::workers::{WorkersOverride, get_workers, override_workers, set_workers};
+
+    #[pymodule_export]
+    use crate::filesystem::{FileLock, PyFakeBasicFileSystem, PyRealBasicFileSystem};
 
     #[pymodule_export]
     use crate::exceptions::{
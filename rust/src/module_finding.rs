@@ -1,10 +1,19 @@
+use crate::workers;
 use pyo3::{prelude::*, types::PyFrozenSet};
+use rayon::prelude::*;
+use rustc_hash::FxHashMap;
+use serde::{Deserialize, Serialize};
+use std::borrow::Borrow;
 use std::collections::BTreeSet;
 use std::fmt;
+use std::fs::{self, Metadata};
+use std::path::Path;
 
 #[derive(Debug, Clone, PartialEq, Eq, Hash, PartialOrd, Ord, FromPyObject)]
 pub struct ModuleFile {
     pub module: Module,
+    /// The path to the module's file, if the module finder supplied it.
+    pub path: Option<String>,
 }
 
 /// A Python module.
@@ -14,6 +23,13 @@ pub struct Module {
     pub name: String,
 }
 
+// Allows looking up modules by name, without allocating a new Module.
+impl Borrow<str> for Module {
+    fn borrow(&self) -> &str {
+        &self.name
+    }
+}
+
 impl fmt::Display for Module {
     fn fmt(&self, f: &mut fmt::Formatter) -> fmt::Result {
         write!(f, "{}", self.name)
@@ -58,3 +74,380 @@ impl<'py> FromPyObject<'py> for FoundPackage {
         })
     }
 }
+
+/// A module file found on disk: (module name, path, mtime, size in bytes).
+type DiscoveredModuleFile = (String, String, f64, u64);
+
+/// How recently (in seconds) a directory can have been modified for its listing to be cached.
+///
+/// Some file systems only record mtimes to the second, so an entry added within the same
+/// second as the directory was listed wouldn't change its mtime.
+const RACY_LISTING_PERIOD: f64 = 2.0;
+
+/// The entries in a directory that matter for finding modules, as of the directory's mtime.
+///
+/// A directory's mtime changes whenever an entry is added, removed or renamed, but not when
+/// the contents of a file in it change, so only the entries are cached, not their metadata.
+#[derive(Debug, Clone, PartialEq, Serialize, Deserialize)]
+struct DirectoryListing {
+    mtime: f64,
+    is_package: bool,
+    python_file_names: Vec<String>,
+    subdirectory_names: Vec<String>,
+}
+
+/// Directory listings, by the path of the directory.
+type DirectoryListings = FxHashMap<String, DirectoryListing>;
+
+/// Finds the Python modules inside a package on the real file system.
+///
+/// Subdirectories are walked in parallel, and the mtime and size of each file are read
+/// while listing its directory, so no further stat calls are needed per module.
+///
+/// If the directory listings from a previous call are supplied (as JSON), any directory whose
+/// mtime hasn't changed since isn't listed again: only its Python files and subdirectories
+/// are stat-ed.
+///
+/// Returns a tuple of:
+/// - the module files, as (module name, path, mtime, size) tuples;
+/// - the paths of any Python files skipped because they have too many dots in the name;
+/// - the directory listings to supply next time (as JSON), or None if they haven't changed.
+#[pyfunction]
+#[pyo3(signature = (package_name, package_directory, directory_listings=None))]
+pub fn find_module_files(
+    py: Python<'_>,
+    package_name: &str,
+    package_directory: &str,
+    directory_listings: Option<&str>,
+) -> PyResult<(Vec<DiscoveredModuleFile>, Vec<String>, Option<String>)> {
+    // Listings that can't be read are treated as missing, as they're only a cache.
+    let previous_listings: DirectoryListings = directory_listings
+        .and_then(|directory_listings| serde_json::from_str(directory_listings).ok())
+        .unwrap_or_default();
+    py.detach(|| {
+        workers::install(None, || {
+            let discovery = discover_package_directory(
+                Path::new(package_directory),
+                package_name,
+                &previous_listings,
+                now() - RACY_LISTING_PERIOD,
+            );
+            let listings: DirectoryListings = discovery.listings.into_iter().collect();
+            let listings_json = (directory_listings.is_none() || listings != previous_listings)
+                .then(|| serde_json::to_string(&listings).unwrap());
+            (
+                discovery.module_files,
+                discovery.skipped_filenames,
+                listings_json,
+            )
+        })
+    })
+}
+
+#[derive(Default)]
+struct Discovery {
+    module_files: Vec<DiscoveredModuleFile>,
+    skipped_filenames: Vec<String>,
+    listings: Vec<(String, DirectoryListing)>,
+}
+
+impl Discovery {
+    fn merge(mut self, other: Discovery) -> Discovery {
+        self.module_files.extend(other.module_files);
+        self.skipped_filenames.extend(other.skipped_filenames);
+        self.listings.extend(other.listings);
+        self
+    }
+}
+
+/// Finds the modules in the directory, and its subdirectories.
+///
+/// Listings of directories last modified before `cacheable_before` (a timestamp) are
+/// included in the discovery, for caching.
+fn discover_package_directory(
+    directory: &Path,
+    module_name: &str,
+    previous_listings: &DirectoryListings,
+    cacheable_before: f64,
+) -> Discovery {
+    let Some(directory_key) = directory.to_str() else {
+        return Discovery::default();
+    };
+    let Ok(directory_metadata) = fs::metadata(directory) else {
+        return Discovery::default();
+    };
+    let mtime = mtime_as_float(&directory_metadata);
+
+    let (listing, mut python_file_metadata) = match previous_listings.get(directory_key) {
+        Some(listing) if listing.mtime == mtime => (listing.clone(), FxHashMap::default()),
+        _ => match list_directory(directory, mtime) {
+            Some(listing_and_metadata) => listing_and_metadata,
+            None => return Discovery::default(),
+        },
+    };
+
+    let mut discovery = Discovery::default();
+    // Don't include directories that aren't Python packages, nor their subdirectories.
+    if listing.is_package {
+        for file_name in &listing.python_file_names {
+            let path = directory.join(file_name);
+            let Some(path_str) = path.to_str() else {
+                continue;
+            };
+            // Ignore files like some.module.py.
+            if file_name.matches('.').count() > 1 {
+                discovery.skipped_filenames.push(path_str.to_owned());
+                continue;
+            }
+            let metadata = match python_file_metadata.remove(file_name) {
+                Some(metadata) => metadata,
+                None => match fs::metadata(&path) {
+                    Ok(metadata) => metadata,
+                    Err(_) => continue,
+                },
+            };
+            let stem = &file_name[..file_name.len() - ".py".len()];
+            let file_module_name = if stem == "__init__" {
+                module_name.to_owned()
+            } else {
+                format!("{module_name}.{stem}")
+            };
+            discovery.module_files.push((
+                file_module_name,
+                path_str.to_owned(),
+                mtime_as_float(&metadata),
+                metadata.len(),
+            ));
+        }
+    }
+
+    let subdirectory_names = if listing.is_package {
+        listing.subdirectory_names.clone()
+    } else {
+        vec![]
+    };
+    if mtime < cacheable_before {
+        discovery.listings.push((directory_key.to_owned(), listing));
+    }
+
+    subdirectory_names
+        .into_par_iter()
+        .map(|name| {
+            discover_package_directory(
+                &directory.join(&name),
+                &format!("{module_name}.{name}"),
+                previous_listings,
+                cacheable_before,
+            )
+        })
+        .reduce(Discovery::default, Discovery::merge)
+        .merge(discovery)
+}
+
+/// Lists the directory, returning its listing and the metadata of its Python files.
+fn list_directory(
+    directory: &Path,
+    mtime: f64,
+) -> Option<(DirectoryListing, FxHashMap<String, Metadata>)> {
+    let entries = fs::read_dir(directory).ok()?;
+
+    let mut listing = DirectoryListing {
+        mtime,
+        is_package: false,
+        python_file_names: vec![],
+        subdirectory_names: vec![],
+    };
+    let mut python_file_metadata = FxHashMap::default();
+    for entry in entries.flatten() {
+        let file_name = entry.file_name();
+        let Some(file_name) = file_name.to_str() else {
+            continue;
+        };
+        // Ignore hidden files and directories.
+        if file_name.starts_with('.') {
+            continue;
+        }
+        let metadata = match entry.file_type() {
+            // Follow symlinks.
+            Ok(file_type) if file_type.is_symlink() => fs::metadata(entry.path()),
+            _ => entry.metadata(),
+        };
+        let Ok(metadata) = metadata else {
+            continue;
+        };
+        if metadata.is_dir() {
+            listing.subdirectory_names.push(file_name.to_owned());
+        } else if file_name.ends_with(".py") {
+            if file_name == "__init__.py" {
+                listing.is_package = true;
+            }
+            listing.python_file_names.push(file_name.to_owned());
+            python_file_metadata.insert(file_name.to_owned(), metadata);
+        }
+    }
+    if !listing.is_package {
+        // Nothing else is needed for a directory that isn't a package.
+        listing.python_file_names.clear();
+        listing.subdirectory_names.clear();
+        python_file_metadata.clear();
+    }
+    Some((listing, python_file_metadata))
+}
+
+fn now() -> f64 {
+    std::time::SystemTime::now()
+        .duration_since(std::time::UNIX_EPOCH)
+        .map(|duration| duration.as_secs_f64())
+        .unwrap_or(0.0)
+}
+
+/// Returns the mtime as the same float that Python's os.path.getmtime would give.
+#[cfg(unix)]
+fn mtime_as_float(metadata: &Metadata) -> f64 {
+    use std::os::unix::fs::MetadataExt;
+    metadata.mtime() as f64 + metadata.mtime_nsec() as f64 * 1e-9
+}
+
+#[cfg(not(unix))]
+fn mtime_as_float(metadata: &Metadata) -> f64 {
+    metadata
+        .modified()
+        .ok()
+        .and_then(|modified| modified.duration_since(std::time::UNIX_EPOCH).ok())
+        .map(|duration| duration.as_secs_f64())
+        .unwrap_or(0.0)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_discover_package_directory() {
+        let root = std::env::temp_dir().join(format!("grimp-discovery-{}", std::process::id()));
+        let package = root.join("mypackage");
+        for directory in ["foo", "foo/bar", ".hidden", "not_a_package/baz"] {
+            fs::create_dir_all(package.join(directory)).unwrap();
+        }
+        for file in [
+            "__init__.py",
+            "one.py",
+            "some.module.py",
+            "README.md",
+            "foo/__init__.py",
+            "foo/two.py",
+            "foo/bar/__init__.py",
+            ".hidden/__init__.py",
+            "not_a_package/three.py",
+            "not_a_package/baz/__init__.py",
+        ] {
+            fs::write(package.join(file), "import os\n").unwrap();
+        }
+
+        let discovery = discover_package_directory(
+            &package,
+            "mypackage",
+            &DirectoryListings::default(),
+            f64::INFINITY,
+        );
+        fs::remove_dir_all(&root).unwrap();
+
+        let module_names: BTreeSet<&str> = discovery
+            .module_files
+            .iter()
+            .map(|(module_name, ..)| module_name.as_str())
+            .collect();
+        assert_eq!(
+            module_names,
+            BTreeSet::from([
+                "mypackage",
+                "mypackage.one",
+                "mypackage.foo",
+                "mypackage.foo.two",
+                "mypackage.foo.bar",
+            ])
+        );
+        let (_, path, _, size) = discovery
+            .module_files
+            .iter()
+            .find(|(module_name, ..)| module_name == "mypackage.foo.two")
+            .unwrap();
+        assert_eq!(path, package.join("foo/two.py").to_str().unwrap());
+        assert_eq!(*size, 10);
+        assert_eq!(
+            discovery.skipped_filenames,
+            vec![package.join("some.module.py").to_str().unwrap().to_owned()]
+        );
+    }
+
+    fn discovered_module_names(discovery: &Discovery) -> BTreeSet<&str> {
+        discovery
+            .module_files
+            .iter()
+            .map(|(module_name, ..)| module_name.as_str())
+            .collect()
+    }
+
+    #[test]
+    fn test_discover_package_directory_uses_listings_of_unchanged_directories() {
+        let root = std::env::temp_dir().join(format!("grimp-listings-{}", std::process::id()));
+        let package = root.join("mypackage");
+        fs::create_dir_all(package.join("foo")).unwrap();
+        for file in ["__init__.py", "one.py", "foo/__init__.py", "foo/two.py"] {
+            fs::write(package.join(file), "").unwrap();
+        }
+        let package_key = package.to_str().unwrap().to_owned();
+        let listings: DirectoryListings = discover_package_directory(
+            &package,
+            "mypackage",
+            &DirectoryListings::default(),
+            f64::INFINITY,
+        )
+        .listings
+        .into_iter()
+        .collect();
+        assert_eq!(listings.len(), 2);
+
+        // The file's metadata is still read, as changing it doesn't change the directory's mtime.
+        fs::write(package.join("foo/two.py"), "import os\n").unwrap();
+        // Remove one.py from the listing, so we can tell whether the listing was used.
+        let mut edited_listings = listings.clone();
+        edited_listings
+            .get_mut(&package_key)
+            .unwrap()
+            .python_file_names
+            .retain(|file_name| file_name != "one.py");
+        let discovery =
+            discover_package_directory(&package, "mypackage", &edited_listings, f64::INFINITY);
+        assert_eq!(
+            discovered_module_names(&discovery),
+            BTreeSet::from(["mypackage", "mypackage.foo", "mypackage.foo.two"])
+        );
+        let (.., size) = discovery
+            .module_files
+            .iter()
+            .find(|(module_name, ..)| module_name == "mypackage.foo.two")
+            .unwrap();
+        assert_eq!(*size, 10);
+
+        // A directory whose mtime has changed is listed again.
+        edited_listings.get_mut(&package_key).unwrap().mtime = 0.0;
+        let discovery =
+            discover_package_directory(&package, "mypackage", &edited_listings, f64::INFINITY);
+        assert_eq!(
+            discovered_module_names(&discovery),
+            BTreeSet::from([
+                "mypackage",
+                "mypackage.one",
+                "mypackage.foo",
+                "mypackage.foo.two"
+            ])
+        );
+
+        // Recently modified directories aren't cached.
+        let discovery =
+            discover_package_directory(&package, "mypackage", &listings, f64::NEG_INFINITY);
+        fs::remove_dir_all(&root).unwrap();
+        assert!(discovery.listings.is_empty());
+    }
+}
@@ -0,0 +1,243 @@
+//! The pool of threads that Grimp runs parallel work on.
+//!
+//! Rather than using rayon's global pool, which sizes itself from the host's CPU count, work runs
+//! on a dedicated pool sized from (in order of precedence):
+//! - the workers passed for a particular call;
+//! - the workers set for the current thread, using override_workers;
+//! - the workers set for the process, using set_workers;
+//! - the number of CPUs available to the process, taking any cgroup CPU quota into account.
+//!
+//! The most recently used pools are kept, so that a pool of the usual size is only built once.
+
+use pyo3::exceptions::{PyRuntimeError, PyValueError};
+use pyo3::prelude::*;
+use pyo3::types::PyTuple;
+use rayon::{ThreadPool, ThreadPoolBuilder};
+use std::cell::Cell;
+use std::fs;
+use std::path::{Path, PathBuf};
+use std::sync::{Arc, LazyLock, Mutex};
+
+const CGROUP_ROOT: &str = "/sys/fs/cgroup";
+// The period cgroups use if cpu.max doesn't give one.
+const DEFAULT_CPU_PERIOD: f64 = 100_000.0;
+// Far more threads than are useful, but few enough that asking for too many can't exhaust the
+// process. Must match MAX_WORKERS in grimp.application.workers.
+const MAX_WORKERS: usize = 1024;
+// How many pools to keep. Callers can ask for any number of workers (including the clients of
+// grimp serve), so pools of unusual sizes are dropped once they haven't been used for a while.
+const MAX_KEPT_POOLS: usize = 4;
+
+static DEFAULT_WORKERS: LazyLock<usize> = LazyLock::new(detect_available_cpus);
+static PROCESS_WORKERS: Mutex<Option<usize>> = Mutex::new(None);
+// The kept pools and their sizes, the most recently used last.
+static POOLS: Mutex<Vec<(usize, Arc<ThreadPool>)>> = Mutex::new(Vec::new());
+
+thread_local! {
+    static THREAD_WORKERS: Cell<Option<usize>> = const { Cell::new(None) };
+}
+
+/// Runs the operation on a pool with the supplied number of workers, or the configured number.
+pub fn install<R: Send>(workers: Option<usize>, op: impl FnOnce() -> R + Send) -> PyResult<R> {
+    let workers = resolve_workers(validate_workers(workers)?);
+    Ok(get_pool(workers)?.install(op))
+}
+
+fn resolve_workers(workers: Option<usize>) -> usize {
+    workers
+        .or_else(|| THREAD_WORKERS.get())
+        .or_else(|| *PROCESS_WORKERS.lock().unwrap())
+        .unwrap_or(*DEFAULT_WORKERS)
+}
+
+fn get_pool(workers: usize) -> PyResult<Arc<ThreadPool>> {
+    let mut pools = POOLS.lock().unwrap();
+    let pool = match pools.iter().position(|(size, _)| *size == workers) {
+        Some(index) => pools.remove(index).1,
+        None => {
+            let pool = ThreadPoolBuilder::new()
+                .num_threads(workers)
+                .thread_name(|index| format!("grimp-worker-{index}"))
+                .build()
+                .map_err(|e| {
+                    PyRuntimeError::new_err(format!("Could not start worker threads: {e}"))
+                })?;
+            Arc::new(pool)
+        }
+    };
+    pools.push((workers, pool.clone()));
+    if pools.len() > MAX_KEPT_POOLS {
+        // The pool's threads exit once any work still running on it finishes.
+        pools.remove(0);
+    }
+    Ok(pool)
+}
+
+fn validate_workers(workers: Option<usize>) -> PyResult<Option<usize>> {
+    match workers {
+        Some(0) => Err(PyValueError::new_err("workers must be at least 1.")),
+        Some(workers) if workers > MAX_WORKERS => Err(PyValueError::new_err(format!(
+            "workers must be at most {MAX_WORKERS}."
+        ))),
+        workers => Ok(workers),
+    }
+}
+
+/// Returns the number of CPUs the process can use.
+///
+/// RAYON_NUM_THREADS is respected if it's set, as it was when Grimp used rayon's global pool.
+fn detect_available_cpus() -> usize {
+    if let Some(workers) = std::env::var("RAYON_NUM_THREADS")
+        .ok()
+        .and_then(|value| value.parse::<usize>().ok())
+        .filter(|workers| *workers > 0)
+    {
+        return workers;
+    }
+    let cpus = std::thread::available_parallelism().map_or(1, |cpus| cpus.get());
+    match cgroup_cpu_limit() {
+        Some(limit) => cpus.min(limit),
+        None => cpus,
+    }
+}
+
+/// Returns the CPU limit of the process's cgroup (v2) and its ancestors, if there is one.
+fn cgroup_cpu_limit() -> Option<usize> {
+    let cgroups = fs::read_to_string("/proc/self/cgroup").ok()?;
+    let cgroup = cgroups.lines().find_map(|line| line.strip_prefix("0::"))?;
+    let root = Path::new(CGROUP_ROOT);
+    let mut directory: PathBuf = root.join(cgroup.trim_start_matches('/'));
+    let mut limit: Option<usize> = None;
+    loop {
+        if let Some(directory_limit) = fs::read_to_string(directory.join("cpu.max"))
+            .ok()
+            .and_then(|contents| parse_cpu_max(&contents))
+        {
+            limit = Some(limit.map_or(directory_limit, |limit| limit.min(directory_limit)));
+        }
+        if directory == root || !directory.pop() {
+            return limit;
+        }
+    }
+}
+
+/// Parses the contents of a cgroup's cpu.max file ("$MAX $PERIOD") into a number of CPUs,
+/// rounding up. Returns None if there's no limit.
+fn parse_cpu_max(contents: &str) -> Option<usize> {
+    let mut fields = contents.split_whitespace();
+    let quota: f64 = match fields.next()? {
+        "max" => return None,
+        quota => quota.parse().ok()?,
+    };
+    let period: f64 = match fields.next() {
+        Some(period) => period.parse().ok()?,
+        None => DEFAULT_CPU_PERIOD,
+    };
+    if quota <= 0.0 || period <= 0.0 {
+        return None;
+    }
+    Some((quota / period).ceil() as usize)
+}
+
+/// Sets the number of worker threads to use for parallel work in this process.
+///
+/// Pass None to go back to using the number of CPUs available to the process.
+#[pyfunction]
+#[pyo3(signature = (workers))]
+pub fn set_workers(workers: Option<usize>) -> PyResult<()> {
+    *PROCESS_WORKERS.lock().unwrap() = validate_workers(workers)?;
+    Ok(())
+}
+
+/// Returns the number of worker threads that parallel work on this thread would use.
+#[pyfunction]
+pub fn get_workers() -> usize {
+    resolve_workers(None)
+}
+
+/// Returns a context manager that sets the number of workers for the current thread.
+///
+/// Passing None leaves the number of workers unchanged.
+#[pyfunction]
+#[pyo3(signature = (workers))]
+pub fn override_workers(workers: Option<usize>) -> PyResult<WorkersOverride> {
+    Ok(WorkersOverride {
+        workers: validate_workers(workers)?,
+        previous: None,
+    })
+}
+
+#[pyclass]
+pub struct WorkersOverride {
+    workers: Option<usize>,
+    previous: Option<Option<usize>>,
+}
+
+#[pymethods]
+impl WorkersOverride {
+    fn __enter__(mut slf: PyRefMut<'_, Self>) -> PyRefMut<'_, Self> {
+        if let Some(workers) = slf.workers {
+            slf.previous = Some(THREAD_WORKERS.replace(Some(workers)));
+        }
+        slf
+    }
+
+    #[pyo3(signature = (*_args))]
+    fn __exit__(&mut self, _args: &Bound<'_, PyTuple>) {
+        if let Some(previous) = self.previous.take() {
+            THREAD_WORKERS.set(previous);
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use parameterized::parameterized;
+
+    #[parameterized(case = {
+        ("max 100000\n", None),
+        ("200000 100000\n", Some(2)),
+        ("150000 100000\n", Some(2)),
+        ("50000 100000\n", Some(1)),
+        ("300000\n", Some(3)),
+        ("", None),
+        ("nonsense 100000\n", None),
+    })]
+    fn test_parse_cpu_max(case: (&str, Option<usize>)) {
+        let (contents, expected) = case;
+        assert_eq!(parse_cpu_max(contents), expected);
+    }
+
+    #[test]
+    fn test_install_uses_requested_number_of_workers() {
+        let workers = install(Some(3), rayon::current_num_threads).unwrap();
+        assert_eq!(workers, 3);
+    }
+
+    #[test]
+    fn test_only_the_most_recently_used_pools_are_kept() {
+        for workers in 1..=MAX_KEPT_POOLS + 2 {
+            install(Some(workers), || ()).unwrap();
+        }
+        install(Some(3), || ()).unwrap();
+
+        // Other tests may use pools concurrently, but can't have evicted this one since.
+        let pools = POOLS.lock().unwrap();
+        assert!(pools.len() <= MAX_KEPT_POOLS);
+        assert!(pools.iter().any(|(size, _)| *size == 3));
+    }
+
+    #[test]
+    fn test_too_many_workers_is_an_error() {
+        assert!(install(Some(MAX_WORKERS + 1), || ()).is_err());
+    }
+
+    #[test]
+    fn test_thread_override_takes_precedence_over_process_setting() {
+        THREAD_WORKERS.set(Some(2));
+        assert_eq!(install(None, rayon::current_num_threads).unwrap(), 2);
+        assert_eq!(install(Some(1), rayon::current_num_threads).unwrap(), 1);
+        THREAD_WORKERS.set(None);
+    }
+}
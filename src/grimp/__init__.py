@@ -1,9 +1,19 @@
 __version__ = "3.13"
 
 from .application.graph import DetailedImport, ImportGraph, Import
+from .application.watching import GraphWatcher
 from .domain.analysis import PackageDependency, Route
 from .domain.valueobjects import DirectImport, Module, Layer
-from .main import build_graph
+from .main import (
+    GraphClient,
+    build_graph,
+    flush_cache,
+    get_workers,
+    inspect_cache,
+    prune_cache,
+    set_workers,
+    watch,
+)
 
 __all__ = [
     "Module",
@@ -11,8 +21,16 @@ __all__ = [
     "DirectImport",
     "Import",
     "ImportGraph",
+    "GraphWatcher",
+    "GraphClient",
     "PackageDependency",
     "Route",
     "build_graph",
+    "flush_cache",
+    "inspect_cache",
+    "prune_cache",
+    "set_workers",
+    "get_workers",
+    "watch",
     "Layer",
 ]
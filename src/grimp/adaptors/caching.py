@@ -2,18 +2,35 @@ import hashlib
 
 import json
 import logging
+import re
+from collections.abc import Iterable
 from typing import Optional
 
 from grimp.application.ports.filesystem import BasicFileSystem
 from grimp.application.ports.modulefinder import FoundPackage, ModuleFile
-from grimp.domain.valueobjects import DirectImport, Module
+from grimp.domain.valueobjects import DirectImport
 
 from ..application.ports.caching import Cache as AbstractCache
-from ..application.ports.caching import CacheMiss
+from ..application.ports.caching import (
+    CacheEntry,
+    CacheKey,
+    CacheMiss,
+    ImportsByModule,
+    ParsedImportsByModule,
+)
 from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
 
 logger = logging.getLogger(__name__)
 PrimitiveFormat = dict[str, list[tuple[str, Optional[int], str]]]
+# Meta files map module names to mtimes or, for content-keyed caches, [mtime, digest] pairs.
+MetaFormat = dict[str, float | list]
+# Cache files are grouped into entries by removing these suffixes (including those of any
+# temporary files left behind by an interrupted write), so that the files written for the
+# same package, or the same analysis, are evicted together.
+ENTRY_FILE_SUFFIX_PATTERN = re.compile(
+    r"\.(meta\.json|dirs\.json|parsed\.bin|data\.bin|data\.json|graph\.bin|sqlite3(-wal|-shm)?)"
+    r"(\.\d+\.\d+\.tmp)?$"
+)
 
 
 class CacheFileNamer:
@@ -21,6 +38,14 @@ class CacheFileNamer:
     def make_meta_file_name(cls, found_package: FoundPackage) -> str:
         return f"{found_package.name}.meta.json"
 
+    @classmethod
+    def make_directory_listings_file_name(cls, package_name: str) -> str:
+        return f"{package_name}.dirs.json"
+
+    @classmethod
+    def make_parse_file_name(cls, found_package: FoundPackage) -> str:
+        return f"{found_package.name}.parsed.bin"
+
     @classmethod
     def make_data_file_name(
         cls,
@@ -31,13 +56,19 @@ class CacheFileNamer:
         identifier = cls.make_data_file_unique_string(
             found_packages, include_external_packages, exclude_type_checking_imports
         )
+        return f"{cls._make_safe_identifier(identifier)}.data.bin"
 
-        bytes_identifier = identifier.encode()
-        # Use a hash algorithm with a limited size to avoid cache filenames that are too long
-        # the filesystem, which can happen if there are more than a few root packages
-        # being analyzed.
-        safe_unicode_identifier = hashlib.blake2b(bytes_identifier, digest_size=20).hexdigest()
-        return f"{safe_unicode_identifier}.data.json"
+    @classmethod
+    def make_graph_snapshot_file_name(
+        cls,
+        found_packages: set[FoundPackage],
+        include_external_packages: bool,
+        exclude_type_checking_imports: bool,
+    ) -> str:
+        identifier = cls.make_data_file_unique_string(
+            found_packages, include_external_packages, exclude_type_checking_imports
+        )
+        return f"{cls._make_safe_identifier(identifier)}.graph.bin"
 
     @classmethod
     def make_data_file_unique_string(
@@ -61,9 +92,18 @@ class CacheFileNamer:
             csv_packages + include_external_packages_option + exclude_type_checking_imports_option
         )
 
+    @classmethod
+    def _make_safe_identifier(cls, identifier: str) -> str:
+        # Use a hash algorithm with a limited size to avoid cache filenames that are too long
+        # the filesystem, which can happen if there are more than a few root packages
+        # being analyzed.
+        return hashlib.blake2b(identifier.encode(), digest_size=20).hexdigest()
+
 
 class Cache(AbstractCache):
     DEFAULT_CACHE_DIR = ".grimp_cache"
+    LOCK_FILE_NAME = "cache.lock"
+    MARKER_FILE_NAMES = (".gitignore", "CACHEDIR.TAG")
 
     def __init__(self, *args, namer: type[CacheFileNamer], **kwargs) -> None:
         """
@@ -71,7 +111,14 @@ class Cache(AbstractCache):
         """
         super().__init__(*args, **kwargs)
         self._mtime_map: dict[str, float] = {}
-        self._data_map: dict[Module, set[DirectImport]] = {}
+        self._digest_map: dict[str, str] = {}
+        # Digests known to match the current contents of the module files.
+        self._current_digests: dict[str, str] = {}
+        # Imports are only decoded from the data file for the modules that are read.
+        self._data_map: rust.CachedImportsByModule | ImportsByModule = ImportsByModule()
+        # Parsed imports, by package name. These are only read if the data file is missing
+        # some of the fresh modules.
+        self._parsed_maps: dict[str, ParsedImportsByModule] = {}
         self._namer = namer
 
     @classmethod
@@ -82,6 +129,9 @@ class Cache(AbstractCache):
         include_external_packages: bool,
         exclude_type_checking_imports: bool = False,
         cache_dir: str | None = None,
+        cache_key: CacheKey = "mtime",
+        max_size: int | None = None,
+        max_entries: int | None = None,
         namer: type[CacheFileNamer] = CacheFileNamer,
     ) -> "Cache":
         cache = cls(
@@ -90,9 +140,12 @@ class Cache(AbstractCache):
             include_external_packages=include_external_packages,
             exclude_type_checking_imports=exclude_type_checking_imports,
             cache_dir=cls.cache_dir_or_default(cache_dir),
+            cache_key=cache_key,
+            max_size=max_size,
+            max_entries=max_entries,
             namer=namer,
         )
-        cache._build_mtime_map()
+        cache._build_meta_maps()
         cache._build_data_map()
         assert cache.cache_dir
         return cache
@@ -101,66 +154,444 @@ class Cache(AbstractCache):
     def cache_dir_or_default(cls, cache_dir: str | None) -> str:
         return cache_dir or cls.DEFAULT_CACHE_DIR
 
+    @classmethod
+    def inspect(cls, file_system: BasicFileSystem, cache_dir: str | None) -> list[CacheEntry]:
+        # The last used time of each file is its mtime, which is updated whenever the file is
+        # read from the cache, as access times aren't reliably recorded by all file systems.
+        cache_dir = cls.cache_dir_or_default(cache_dir)
+        file_stats_by_entry: dict[str, list[tuple[str, int, float]]] = {}
+        try:
+            file_names = file_system.listdir(cache_dir)
+        except FileNotFoundError:
+            return []
+        for file_name in file_names:
+            if file_name in (cls.LOCK_FILE_NAME, *cls.MARKER_FILE_NAMES):
+                continue
+            path = file_system.join(cache_dir, file_name)
+            # Only files count towards the entries, not directories.
+            if not file_system.exists(path):
+                continue
+            try:
+                size, mtime = file_system.stat(path)
+            except FileNotFoundError:
+                # Removed by another process.
+                continue
+            file_stats_by_entry.setdefault(cls._get_entry_name(file_name), []).append(
+                (file_name, size, mtime)
+            )
+
+        entries = [
+            CacheEntry(
+                name=name,
+                file_names=frozenset(file_name for file_name, _, _ in file_stats),
+                size=sum(size for _, size, _ in file_stats),
+                last_used=max(mtime for _, _, mtime in file_stats),
+            )
+            for name, file_stats in file_stats_by_entry.items()
+        ]
+        return sorted(entries, key=lambda entry: (entry.last_used, entry.name))
+
+    @classmethod
+    def prune(
+        cls,
+        file_system: BasicFileSystem,
+        cache_dir: str | None,
+        *,
+        max_size: int | None = None,
+        max_entries: int | None = None,
+        keep: Iterable[str] = (),
+    ) -> list[CacheEntry]:
+        cache_dir = cls.cache_dir_or_default(cache_dir)
+        if not cls.inspect(file_system, cache_dir):
+            # Don't create the cache directory for the lock when there's nothing to evict.
+            return []
+        # Hold the lock so that no other process is writing to the entries being evicted.
+        with file_system.lock(file_system.join(cache_dir, cls.LOCK_FILE_NAME)):
+            entries = cls.inspect(file_system, cache_dir)
+            entries_to_evict = _select_entries_to_evict(
+                entries, max_size=max_size, max_entries=max_entries, keep=set(keep)
+            )
+            for entry in entries_to_evict:
+                for file_name in entry.file_names:
+                    try:
+                        file_system.remove(file_system.join(cache_dir, file_name))
+                    except FileNotFoundError:
+                        pass
+                logger.info(f"Evicted cache entry {entry.name} ({entry.size} bytes).")
+        return entries_to_evict
+
+    @classmethod
+    def _get_entry_name(cls, file_name: str) -> str:
+        return ENTRY_FILE_SUFFIX_PATTERN.sub("", file_name)
+
     def read_imports(self, module_file: ModuleFile) -> set[DirectImport]:
+        imports_by_module = self.read_all_imports([module_file])
         try:
-            cached_mtime = self._mtime_map[module_file.module.name]
+            return imports_by_module.direct_imports(module_file.module.name)
         except KeyError:
             raise CacheMiss
-        if cached_mtime != module_file.mtime:
-            raise CacheMiss
 
+    def read_all_imports(self, module_files: Iterable[ModuleFile]) -> ImportsByModule:
+        fresh_module_names = self._find_fresh_module_names(module_files)
+        # Any modules missing from the data map will be absent from the subset too.
         try:
-            return self._data_map[module_file.module]
-        except KeyError:
-            # While we would expect the module to be in here,
-            # there's no point in crashing if, for some reason, it's not.
-            raise CacheMiss
+            imports_by_module = self._data_map.subset(fresh_module_names)
+        except rust.CorruptCache:
+            self._handle_corrupt_data_file()
+            imports_by_module = ImportsByModule()
+
+        # The data file is specific to the packages and options being analysed, so may not
+        # have been written yet for this analysis. Fall back to resolving the parsed imports,
+        # which are shared between analyses. Modules missing from both are treated as misses.
+        unresolved_module_names = fresh_module_names - imports_by_module.module_names()
+        if unresolved_module_names:
+            imports_by_module.update(
+                self._get_parsed_imports(unresolved_module_names).resolve(
+                    found_packages=self.found_packages,
+                    include_external_packages=self.include_external_packages,
+                    exclude_type_checking_imports=self.exclude_type_checking_imports,
+                )
+            )
+        return imports_by_module
 
     def write(
         self,
-        imports_by_module: dict[Module, set[DirectImport]],
+        imports_by_module: ImportsByModule,
+        parsed_imports: ParsedImportsByModule | None = None,
     ) -> None:
+        if self._is_up_to_date(parsed_imports):
+            logger.info("Cache files are already up to date.")
+            return
         self._write_marker_files_if_not_already_there()
-        # Write data file.
-        data_cache_filename = self.file_system.join(
+        # Release the memory-mapped data file before it is replaced.
+        self._data_map = ImportsByModule()
+        # Other processes may be using the same cache, so hold the lock while reading the
+        # cache files back in and writing the merged results.
+        with self.file_system.lock(self._make_lock_filename()):
+            self._build_meta_maps()
+            merged_imports_by_module = self._merge_cached_imports(imports_by_module)
+
+            # Write data file.
+            data_cache_filename = self._make_data_cache_filename()
+            rust.write_cache_data_map_file(
+                filename=data_cache_filename,
+                imports_by_module=merged_imports_by_module,
+                file_system=self.file_system,
+            )
+            logger.info(f"Wrote data cache file {data_cache_filename}.")
+
+            # Write parse files.
+            if parsed_imports is not None:
+                for found_package in self.found_packages:
+                    self._write_parse_file(found_package, parsed_imports)
+
+            # Write meta files.
+            for found_package in self.found_packages:
+                meta_filename = self.file_system.join(
+                    self.cache_dir, self._namer.make_meta_file_name(found_package)
+                )
+                serialized_meta = json.dumps(self._make_meta(found_package))
+                self.file_system.write(meta_filename, serialized_meta)
+                logger.info(f"Wrote meta cache file {meta_filename}.")
+
+        self._evict_if_over_limits()
+
+    def read_graph_snapshot(self) -> rust.Graph | None:
+        snapshot_filename = self._make_graph_snapshot_filename()
+        try:
+            snapshot = rust.open_graph_snapshot(snapshot_filename, self.file_system)
+        except FileNotFoundError:
+            logger.info(f"No cache file: {snapshot_filename}.")
+            return None
+        except rust.CorruptCache:
+            logger.warning(f"Could not use corrupt cache file {snapshot_filename}.")
+            return None
+
+        if not self._graph_snapshot_is_fresh(snapshot.fingerprints):
+            logger.info(f"Graph snapshot file {snapshot_filename} is out of date.")
+            return None
+        try:
+            graph = snapshot.load()
+        except rust.CorruptCache:
+            logger.warning(f"Could not use corrupt cache file {snapshot_filename}.")
+            return None
+
+        self._mark_used(snapshot_filename)
+        logger.info(f"Used graph snapshot file {snapshot_filename}.")
+        return graph
+
+    def write_graph_snapshot(self, graph: rust.Graph) -> None:
+        snapshot_filename = self._make_graph_snapshot_filename()
+        rust.write_graph_snapshot(
+            filename=snapshot_filename,
+            graph=graph,
+            fingerprints=self._make_graph_snapshot_fingerprints(),
+            file_system=self.file_system,
+        )
+        logger.info(f"Wrote graph snapshot file {snapshot_filename}.")
+        self._evict_if_over_limits()
+
+    def _is_up_to_date(self, parsed_imports: ParsedImportsByModule | None) -> bool:
+        """
+        Return whether the cache files already hold the imports of every module.
+
+        This is the case if no module was scanned, and none has been added, removed or modified
+        since the meta files were written, and all of them are in the data file (rather than just
+        the parse files).
+        """
+        if parsed_imports or not self._mtime_map:
+            return False
+        module_mtimes = {
+            module_file.module.name: module_file.mtime for module_file in self._module_files
+        }
+        if module_mtimes != self._mtime_map:
+            return False
+        try:
+            return module_mtimes.keys() <= self._data_map.module_names()
+        except rust.CorruptCache:
+            return False
+
+    def _evict_if_over_limits(self) -> None:
+        if self.max_size is None and self.max_entries is None:
+            return
+        self.prune(
+            self.file_system,
             self.cache_dir,
+            max_size=self.max_size,
+            max_entries=self.max_entries,
+            # Never evict the files this cache is using.
+            keep={self._get_entry_name(file_name) for file_name in self._get_file_names()},
+        )
+
+    def _get_file_names(self) -> set[str]:
+        """
+        Return the names of the files in the cache directory used by this cache.
+        """
+        return {
             self._namer.make_data_file_name(
                 found_packages=self.found_packages,
                 include_external_packages=self.include_external_packages,
                 exclude_type_checking_imports=self.exclude_type_checking_imports,
             ),
+            self._namer.make_graph_snapshot_file_name(
+                found_packages=self.found_packages,
+                include_external_packages=self.include_external_packages,
+                exclude_type_checking_imports=self.exclude_type_checking_imports,
+            ),
+            *(
+                self._namer.make_meta_file_name(found_package)
+                for found_package in self.found_packages
+            ),
+            *(
+                self._namer.make_parse_file_name(found_package)
+                for found_package in self.found_packages
+            ),
+        }
+
+    def _mark_used(self, filename: str) -> None:
+        """
+        Record that a cache file has been read, so it isn't evicted ahead of unused ones.
+        """
+        try:
+            self.file_system.touch(filename)
+        except OSError:
+            # The file may have been removed since.
+            pass
+
+    def _graph_snapshot_is_fresh(self, fingerprints: list[str]) -> bool:
+        if self._make_mtime_fingerprint() in fingerprints:
+            return True
+        # For content-keyed caches, the snapshot is also fresh if no module's contents changed.
+        return self.cache_key == "content" and self._make_content_fingerprint() in fingerprints
+
+    def _make_graph_snapshot_fingerprints(self) -> list[str]:
+        fingerprints = [self._make_mtime_fingerprint()]
+        if self.cache_key == "content" and (
+            content_fingerprint := self._make_content_fingerprint()
+        ):
+            fingerprints.append(content_fingerprint)
+        return fingerprints
+
+    def _make_mtime_fingerprint(self) -> str:
+        return self._make_fingerprint(
+            {module_file.module.name: module_file.mtime for module_file in self._module_files}
         )
-        rust.write_cache_data_map_file(
-            filename=data_cache_filename,
-            imports_by_module=imports_by_module,
-            file_system=self.file_system,
+
+    def _make_content_fingerprint(self) -> str | None:
+        """
+        Return a fingerprint of the contents of all the modules, or None if any can't be read.
+        """
+        digests = self._get_current_digests(self._module_files)
+        if len(digests) < len(self._module_files):
+            return None
+        return self._make_fingerprint(digests)
+
+    def _make_fingerprint(self, module_states: dict[str, float] | dict[str, str]) -> str:
+        """
+        Return a fingerprint of the analysis parameters and the state of every module.
+        """
+        identifier = json.dumps(
+            [
+                self._namer.make_data_file_unique_string(
+                    found_packages=self.found_packages,
+                    include_external_packages=self.include_external_packages,
+                    exclude_type_checking_imports=self.exclude_type_checking_imports,
+                ),
+                sorted(module_states.items()),
+            ]
         )
+        return hashlib.blake2b(identifier.encode(), digest_size=20).hexdigest()
 
-        logger.info(f"Wrote data cache file {data_cache_filename}.")
+    @property
+    def _module_files(self) -> list[ModuleFile]:
+        return [
+            module_file
+            for found_package in self.found_packages
+            for module_file in found_package.module_files
+        ]
 
-        # Write meta files.
-        for found_package in self.found_packages:
-            meta_filename = self.file_system.join(
-                self.cache_dir, self._namer.make_meta_file_name(found_package)
+    def _merge_cached_imports(self, imports_by_module: ImportsByModule) -> ImportsByModule:
+        """
+        Add any fresh imports another process has cached for modules missing from those supplied.
+
+        Expects the meta maps to reflect the cache files as they are now.
+        """
+        missing_module_files = [
+            module_file
+            for found_package in self.found_packages
+            for module_file in found_package.module_files
+            if module_file.module.name not in imports_by_module
+        ]
+        if not missing_module_files:
+            return imports_by_module
+        try:
+            merged = self._read_data_map_file().subset(
+                self._find_fresh_module_names(missing_module_files)
             )
-            mtime_map = {
-                module_file.module.name: module_file.mtime
-                for module_file in found_package.module_files
+        except rust.CorruptCache:
+            return imports_by_module
+        merged.update(imports_by_module)
+        return merged
+
+    def _write_parse_file(
+        self, found_package: FoundPackage, parsed_imports: ParsedImportsByModule
+    ) -> None:
+        """
+        Add the supplied parsed imports to the package's parse file.
+
+        Expects the meta maps to reflect the cache files as they are now.
+        """
+        package_parsed_imports = parsed_imports.subset(
+            {module_file.module.name for module_file in found_package.module_files}
+        )
+        if not package_parsed_imports:
+            # None of the package's modules were scanned, so there's nothing to add.
+            return
+        # Keep the modules that are still fresh from the parse file already written.
+        merged_parsed_imports = self._read_parse_file(found_package).subset(
+            self._find_fresh_module_names(found_package.module_files)
+        )
+        merged_parsed_imports.update(package_parsed_imports)
+
+        parse_filename = self._make_parse_filename(found_package)
+        rust.write_parse_cache_file(
+            filename=parse_filename,
+            parsed_imports=merged_parsed_imports,
+            file_system=self.file_system,
+        )
+        self._parsed_maps[found_package.name] = merged_parsed_imports
+        logger.info(f"Wrote parse cache file {parse_filename}.")
+
+    def _make_meta(self, found_package: FoundPackage) -> MetaFormat:
+        meta: MetaFormat = {
+            module_file.module.name: module_file.mtime
+            for module_file in found_package.module_files
+        }
+        if self.cache_key == "content":
+            digests = self._get_current_digests(found_package.module_files)
+        else:
+            # Keep the digests written by content-keyed caches, if they are still valid.
+            digests = {
+                module_name: digest
+                for module_name, digest in self._digest_map.items()
+                if module_name in meta and self._mtime_map[module_name] == meta[module_name]
             }
-            serialized_meta = json.dumps(mtime_map)
-            self.file_system.write(meta_filename, serialized_meta)
-            logger.info(f"Wrote meta cache file {meta_filename}.")
+        for module_name, digest in digests.items():
+            meta[module_name] = [meta[module_name], digest]
+        return meta
+
+    def _find_fresh_module_names(self, module_files: Iterable[ModuleFile]) -> set[str]:
+        """
+        Return the names of the modules that haven't changed since they were cached.
+
+        The mtime is checked first. For content-keyed caches, any module whose mtime differs
+        is then checked by comparing a digest of its contents.
+        """
+        fresh_module_names: set[str] = set()
+        module_files_to_digest: list[ModuleFile] = []
+        for module_file in module_files:
+            module_name = module_file.module.name
+            if self._mtime_map.get(module_name) == module_file.mtime:
+                fresh_module_names.add(module_name)
+                if module_name in self._digest_map:
+                    self._current_digests[module_name] = self._digest_map[module_name]
+            elif self.cache_key == "content" and module_name in self._digest_map:
+                module_files_to_digest.append(module_file)
+
+        if module_files_to_digest:
+            digests = self._compute_digests(module_files_to_digest)
+            self._current_digests.update(digests)
+            fresh_module_names.update(
+                module_name
+                for module_name, digest in digests.items()
+                if self._digest_map[module_name] == digest
+            )
+        return fresh_module_names
+
+    def _get_current_digests(self, module_files: Iterable[ModuleFile]) -> dict[str, str]:
+        """
+        Return digests of the supplied modules' contents, computing any not already known.
+        """
+        module_files = list(module_files)
+        self._current_digests.update(
+            self._compute_digests(
+                [
+                    module_file
+                    for module_file in module_files
+                    if module_file.module.name not in self._current_digests
+                ]
+            )
+        )
+        return {
+            module_file.module.name: self._current_digests[module_file.module.name]
+            for module_file in module_files
+            if module_file.module.name in self._current_digests
+        }
+
+    def _compute_digests(self, module_files: list[ModuleFile]) -> dict[str, str]:
+        if not module_files:
+            return {}
+        return rust.compute_content_digests(
+            module_files=module_files,
+            found_packages=self.found_packages,
+            file_system=self.file_system,
+        )
 
-    def _build_mtime_map(self) -> None:
-        self._mtime_map = self._read_mtime_map_files()
+    def _build_meta_maps(self) -> None:
+        self._mtime_map, self._digest_map = {}, {}
+        for module_name, value in self._read_meta_files().items():
+            if not isinstance(value, list):
+                self._mtime_map[module_name] = value
+            elif len(value) == 2:
+                self._mtime_map[module_name], self._digest_map[module_name] = value
 
-    def _read_mtime_map_files(self) -> dict[str, float]:
-        all_mtimes: dict[str, float] = {}
+    def _read_meta_files(self) -> MetaFormat:
+        all_meta: MetaFormat = {}
         for found_package in self.found_packages:
-            all_mtimes.update(self._read_mtime_map_file(found_package))
-        return all_mtimes
+            all_meta.update(self._read_meta_file(found_package))
+        return all_meta
 
-    def _read_mtime_map_file(self, found_package: FoundPackage) -> dict[str, float]:
+    def _read_meta_file(self, found_package: FoundPackage) -> MetaFormat:
         meta_cache_filename = self.file_system.join(
             self.cache_dir, self._namer.make_meta_file_name(found_package)
         )
@@ -171,42 +602,99 @@ class Cache(AbstractCache):
             return {}
         try:
             deserialized = json.loads(serialized)
+            self._mark_used(meta_cache_filename)
             logger.info(f"Used cache meta file {meta_cache_filename}.")
             return deserialized
         except json.JSONDecodeError:
             logger.warning(f"Could not use corrupt cache file {meta_cache_filename}.")
             return {}
 
+    def _get_parsed_imports(self, module_names: set[str]) -> ParsedImportsByModule:
+        parsed_imports = ParsedImportsByModule()
+        for found_package in self.found_packages:
+            package_module_names = module_names & {
+                module_file.module.name for module_file in found_package.module_files
+            }
+            if not package_module_names:
+                continue
+            if found_package.name not in self._parsed_maps:
+                self._parsed_maps[found_package.name] = self._read_parse_file(found_package)
+            parsed_imports.update(
+                self._parsed_maps[found_package.name].subset(package_module_names)
+            )
+        return parsed_imports
+
+    def _read_parse_file(self, found_package: FoundPackage) -> ParsedImportsByModule:
+        parse_filename = self._make_parse_filename(found_package)
+        try:
+            parsed_imports = rust.read_parse_cache_file(parse_filename, self.file_system)
+        except FileNotFoundError:
+            logger.info(f"No cache file: {parse_filename}.")
+            return ParsedImportsByModule()
+        except rust.CorruptCache:
+            logger.warning(f"Could not use corrupt cache file {parse_filename}.")
+            return ParsedImportsByModule()
+
+        self._mark_used(parse_filename)
+        logger.info(f"Used cache parse file {parse_filename}.")
+        return parsed_imports
+
+    def _make_parse_filename(self, found_package: FoundPackage) -> str:
+        return self.file_system.join(
+            self.cache_dir, self._namer.make_parse_file_name(found_package)
+        )
+
     def _build_data_map(self) -> None:
         self._data_map = self._read_data_map_file()
 
-    def _read_data_map_file(self) -> dict[Module, set[DirectImport]]:
-        data_cache_filename = self.file_system.join(
-            self.cache_dir,
-            self._namer.make_data_file_name(
-                found_packages=self.found_packages,
-                include_external_packages=self.include_external_packages,
-                exclude_type_checking_imports=self.exclude_type_checking_imports,
-            ),
-        )
+    def _read_data_map_file(self) -> rust.CachedImportsByModule | ImportsByModule:
+        data_cache_filename = self._make_data_cache_filename()
         try:
             imports_by_module = rust.read_cache_data_map_file(
                 data_cache_filename, self.file_system
             )
         except FileNotFoundError:
             logger.info(f"No cache file: {data_cache_filename}.")
-            return {}
+            return ImportsByModule()
         except rust.CorruptCache:
             logger.warning(f"Could not use corrupt cache file {data_cache_filename}.")
-            return {}
+            return ImportsByModule()
 
+        self._mark_used(data_cache_filename)
         logger.info(f"Used cache data file {data_cache_filename}.")
         return imports_by_module
 
-    def _build_data_cache_filename(self, found_package: FoundPackage) -> str:
-        return self.file_system.join(self.cache_dir, f"{found_package.name}.data.json")
+    def _handle_corrupt_data_file(self) -> None:
+        # Parts of the data file are only decoded as they are needed, so corruption may only
+        # be detected after the file has been opened.
+        logger.warning(f"Could not use corrupt cache file {self._make_data_cache_filename()}.")
+        self._data_map = ImportsByModule()
+
+    def _make_data_cache_filename(self) -> str:
+        return self.file_system.join(
+            self.cache_dir,
+            self._namer.make_data_file_name(
+                found_packages=self.found_packages,
+                include_external_packages=self.include_external_packages,
+                exclude_type_checking_imports=self.exclude_type_checking_imports,
+            ),
+        )
+
+    def _make_graph_snapshot_filename(self) -> str:
+        return self.file_system.join(
+            self.cache_dir,
+            self._namer.make_graph_snapshot_file_name(
+                found_packages=self.found_packages,
+                include_external_packages=self.include_external_packages,
+                exclude_type_checking_imports=self.exclude_type_checking_imports,
+            ),
+        )
+
+    def _make_lock_filename(self) -> str:
+        return self.file_system.join(self.cache_dir, self.LOCK_FILE_NAME)
 
     def _write_marker_files_if_not_already_there(self) -> None:
+        # These must match MARKER_FILE_NAMES.
         marker_files_info = (
             (".gitignore", "# Automatically created by Grimp.\n*"),
             (
@@ -223,3 +711,30 @@ class Cache(AbstractCache):
             full_filename = self.file_system.join(self.cache_dir, filename)
             if not self.file_system.exists(full_filename):
                 self.file_system.write(full_filename, contents)
+
+
+def _select_entries_to_evict(
+    entries: list[CacheEntry],
+    max_size: int | None,
+    max_entries: int | None,
+    keep: set[str],
+) -> list[CacheEntry]:
+    """
+    Select the least recently used entries to evict to bring the others within the limits.
+
+    Expects the entries to be sorted least recently used first.
+    """
+    size = sum(entry.size for entry in entries)
+    entry_count = len(entries)
+    entries_to_evict = []
+    for entry in entries:
+        is_over_size = max_size is not None and size > max_size
+        is_over_entries = max_entries is not None and entry_count > max_entries
+        if not (is_over_size or is_over_entries):
+            break
+        if entry.name in keep:
+            continue
+        entries_to_evict.append(entry)
+        size -= entry.size
+        entry_count -= 1
+    return entries_to_evict
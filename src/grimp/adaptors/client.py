@@ -0,0 +1,116 @@
+"""
+A client for the graph server, mirroring the query methods of ImportGraph.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+from collections.abc import Callable
+from types import TracebackType
+from typing import Any
+
+from typing_extensions import Self
+
+from . import protocol
+from .protocol import GraphSpec
+
+
+class GraphClient:
+    """
+    A connection to a graph server started with `grimp serve`.
+
+    Usage:
+
+        with GraphClient() as client:
+            graph = client.build_graph("mypackage")
+            graph.find_shortest_chains(importer="mypackage.foo", imported="mypackage.bar")
+    """
+
+    def __init__(self, socket_path: str | None = None) -> None:
+        if not protocol.is_supported():
+            raise NotImplementedError(
+                "GraphClient needs Unix domain sockets, which aren't supported on this platform."
+            )
+        self._connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._connection.connect(socket_path or protocol.default_socket_path())
+        except BaseException:
+            self._connection.close()
+            raise
+        # Requests on the connection are made one at a time.
+        self._lock = threading.Lock()
+
+    def build_graph(
+        self, package_name: str, *additional_package_names: str, **options: Any
+    ) -> RemoteImportGraph:
+        """
+        Return the server's graph for the supplied package name(s), building it if needed.
+
+        The options are as for grimp.build_graph, apart from those that only affect how the
+        server does the work (such as workers).
+        """
+        graph_spec: GraphSpec = (
+            (package_name, *additional_package_names),
+            tuple(sorted(options.items())),
+        )
+        self.request(protocol.BUILD, graph_spec)
+        return RemoteImportGraph(self, graph_spec)
+
+    def request(
+        self,
+        kind: str,
+        graph_spec: GraphSpec,
+        method: str | None = None,
+        args: tuple = (),
+        kwargs: dict[str, Any] | None = None,
+    ) -> Any:
+        with self._lock:
+            protocol.send_message(self._connection, (kind, graph_spec, method, args, kwargs or {}))
+            succeeded, result = protocol.receive_message(self._connection)
+        if not succeeded:
+            raise result
+        return result
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+class RemoteImportGraph:
+    """
+    A graph held by a graph server, with the same query methods as ImportGraph.
+
+    Methods that change the graph aren't available, as the graph is shared with other clients.
+    """
+
+    def __init__(self, client: GraphClient, graph_spec: GraphSpec) -> None:
+        self._client = client
+        self._graph_spec = graph_spec
+
+    @property
+    def modules(self) -> set[str]:
+        return self._client.request(protocol.QUERY, self._graph_spec, "modules")
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name == "modules" or name not in protocol.QUERY_METHODS:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}.")
+
+        def query(*args: Any, **kwargs: Any) -> Any:
+            return self._client.request(protocol.QUERY, self._graph_spec, name, args, kwargs)
+
+        query.__name__ = name
+        return query
+
+    def __dir__(self) -> list[str]:
+        return sorted(set(super().__dir__()) | protocol.QUERY_METHODS)
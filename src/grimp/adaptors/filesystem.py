@@ -1,3 +1,4 @@
+import itertools
 import os
 import tokenize
 from collections.abc import Iterator
@@ -5,6 +6,9 @@ from collections.abc import Iterator
 from grimp.application.ports.filesystem import AbstractFileSystem, BasicFileSystem
 from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
 
+# Makes temporary file names unique within the process.
+_temp_file_counter = itertools.count()
+
 
 class FileSystem(AbstractFileSystem):
     """
@@ -43,8 +47,17 @@ class FileSystem(AbstractFileSystem):
         dirname = os.path.dirname(file_name)
         if not os.path.exists(dirname):
             os.makedirs(dirname)
-        with open(file_name, "w") as file:
-            print(contents, file=file)
+        # Write to a temporary file and then move it into place, so that concurrent readers
+        # never see a partially written file.
+        temp_file_name = f"{file_name}.{os.getpid()}.{next(_temp_file_counter)}.tmp"
+        try:
+            with open(temp_file_name, "w") as file:
+                print(contents, file=file)
+            os.replace(temp_file_name, file_name)
+        except OSError:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+            raise
 
     def convert_to_basic(self) -> BasicFileSystem:
         return rust.RealBasicFileSystem()
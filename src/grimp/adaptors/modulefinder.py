@@ -1,6 +1,10 @@
 import logging
+import os
 from collections.abc import Iterable
 
+from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
+from grimp.adaptors.caching import CacheFileNamer
+from grimp.adaptors.filesystem import FileSystem
 from grimp.application.ports import modulefinder
 from grimp.application.ports.filesystem import AbstractFileSystem
 from grimp.domain.valueobjects import Module
@@ -10,7 +14,11 @@ logger = logging.getLogger(__name__)
 
 class ModuleFinder(modulefinder.AbstractModuleFinder):
     def find_package(
-        self, package_name: str, package_directory: str, file_system: AbstractFileSystem
+        self,
+        package_name: str,
+        package_directory: str,
+        file_system: AbstractFileSystem,
+        cache_dir: str | None = None,
     ) -> modulefinder.FoundPackage:
         self.file_system = file_system
 
@@ -22,7 +30,9 @@ class ModuleFinder(modulefinder.AbstractModuleFinder):
             )
             module_mtime = self.file_system.get_mtime(module_filename)
             module_files.append(
-                modulefinder.ModuleFile(module=Module(module_name), mtime=module_mtime)
+                modulefinder.ModuleFile(
+                    module=Module(module_name), mtime=module_mtime, path=module_filename
+                )
             )
 
         return modulefinder.FoundPackage(
@@ -107,3 +117,74 @@ class ModuleFinder(modulefinder.AbstractModuleFinder):
         if components[-1] == "__init__":
             components.pop()
         return ".".join(components)
+
+
+class NativeModuleFinder(ModuleFinder):
+    """
+    Module finder that walks the package directories in parallel, in Rust.
+
+    The mtime, size and path of each module are all gathered during the walk. This only works
+    with the real file system: for any other file system it falls back to walking in Python.
+
+    If a cache directory is supplied, the listing of each directory is cached there, so that
+    directories that haven't changed (going by their mtimes) don't need listing again. The
+    files in them are still stat-ed, as editing a file doesn't change its directory's mtime.
+    """
+
+    def find_package(
+        self,
+        package_name: str,
+        package_directory: str,
+        file_system: AbstractFileSystem,
+        cache_dir: str | None = None,
+    ) -> modulefinder.FoundPackage:
+        if not isinstance(file_system, FileSystem):
+            return super().find_package(package_name, package_directory, file_system)
+
+        listings_filename = (
+            None
+            if cache_dir is None
+            else os.path.join(
+                cache_dir, CacheFileNamer.make_directory_listings_file_name(package_name)
+            )
+        )
+        found_module_files, skipped_filenames, listings = rust.find_module_files(
+            package_name,
+            package_directory,
+            (
+                _read_directory_listings(file_system, listings_filename)
+                if listings_filename
+                else None
+            ),
+        )
+        if listings_filename and listings is not None:
+            _write_directory_listings(file_system, listings_filename, listings)
+        for filename in skipped_filenames:
+            logger.warning(f"Warning: skipping module with too many dots in the name: {filename}")
+
+        return modulefinder.FoundPackage(
+            name=package_name,
+            directory=package_directory,
+            module_files=frozenset(
+                modulefinder.ModuleFile(
+                    module=Module(module_name), mtime=mtime, path=path, size=size
+                )
+                for module_name, path, mtime, size in found_module_files
+            ),
+        )
+
+
+def _read_directory_listings(file_system: FileSystem, filename: str) -> str | None:
+    # The listings are only a cache, so if they can't be read the directories are listed again.
+    try:
+        return file_system.read(filename)
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return None
+
+
+def _write_directory_listings(file_system: FileSystem, filename: str, listings: str) -> None:
+    # The listings are only a cache, so failing to write them shouldn't stop the build.
+    try:
+        file_system.write(filename, listings)
+    except OSError as error:
+        logger.warning(f"Could not write directory listings to {filename}: {error}")
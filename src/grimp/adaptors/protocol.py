@@ -0,0 +1,141 @@
+"""
+The protocol spoken between the graph server and its clients over a Unix domain socket.
+
+Each message is a pickle, prefixed by its length. Only the types that can appear in requests
+and responses can be unpickled, so that a message can't run arbitrary code.
+"""
+
+import builtins
+import io
+import os
+import pickle
+import socket
+import struct
+import tempfile
+from typing import Any
+
+# The ImportGraph methods that can be called remotely: those that don't change the graph.
+QUERY_METHODS = frozenset(
+    {
+        "modules",
+        "find_matching_modules",
+        "is_module_squashed",
+        "count_imports",
+        "find_children",
+        "find_descendants",
+        "direct_import_exists",
+        "find_modules_directly_imported_by",
+        "find_modules_that_directly_import",
+        "get_import_details",
+        "find_matching_direct_imports",
+        "find_downstream_modules",
+        "find_upstream_modules",
+        "find_shortest_chain",
+        "find_shortest_chains",
+        "chain_exists",
+        "find_illegal_dependencies_for_layers",
+        "nominate_cycle_breakers",
+    }
+)
+# The build_graph keyword arguments that a client can supply.
+BUILD_OPTIONS = frozenset(
+    {
+        "include_external_packages",
+        "exclude_type_checking_imports",
+        "cache_dir",
+        "cache_key",
+        "cache_backend",
+        "import_parser",
+    }
+)
+
+# The package names, and the build options as sorted (name, value) pairs.
+GraphSpec = tuple[tuple[str, ...], tuple[tuple[str, Any], ...]]
+
+# Request kinds.
+BUILD = "build"
+QUERY = "query"
+
+HEADER = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 1024**3
+
+_UNPICKLABLE_MODULES = frozenset(
+    {"grimp.domain.analysis", "grimp.domain.valueobjects", "grimp.exceptions"}
+)
+
+
+def default_socket_path() -> str:
+    """
+    Return the path of the socket to use if none is supplied, which is private to the user.
+    """
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"grimp-{os.getuid()}.sock")
+
+
+def is_supported() -> bool:
+    """
+    Return whether Unix domain sockets, and so the server and its clients, are available.
+    """
+    return hasattr(socket, "AF_UNIX")
+
+
+def send_message(connection: socket.socket, message: Any) -> None:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    connection.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def receive_message(connection: socket.socket) -> Any:
+    """
+    Receive a message, raising EOFError if the connection was closed before one started.
+    """
+    header = _receive_exactly(connection, HEADER.size)
+    if header is None:
+        raise EOFError
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise pickle.UnpicklingError(f"Message of {size} bytes is too large.")
+    payload = _receive_exactly(connection, size)
+    if payload is None:
+        raise ConnectionError("Connection closed in the middle of a message.")
+    return _RestrictedUnpickler(io.BytesIO(payload)).load()
+
+
+def sendable_exception(exception: Exception) -> Exception:
+    """
+    Return the exception, or an equivalent that can be unpickled if it can't be.
+    """
+    module = exception.__class__.__module__
+    if module in _UNPICKLABLE_MODULES or module == "builtins":
+        return exception
+    return RuntimeError(f"{exception.__class__.__name__}: {exception}")
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> bytes | None:
+    """
+    Receive the number of bytes, returning None if the connection was closed first.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        chunk_size = connection.recv_into(view[received:])
+        if chunk_size == 0:
+            if received:
+                raise ConnectionError("Connection closed in the middle of a message.")
+            return None
+        received += chunk_size
+    return bytes(buffer)
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str) -> Any:
+        if module in _UNPICKLABLE_MODULES:
+            cls = super().find_class(module, name)
+            if isinstance(cls, type):
+                return cls
+        elif module == "builtins":
+            # Only exceptions, as containers and primitives don't need to be looked up.
+            cls = getattr(builtins, name, None)
+            if isinstance(cls, type) and issubclass(cls, Exception):
+                return cls
+        raise pickle.UnpicklingError(f"Unpickling {module}.{name} is not allowed.")
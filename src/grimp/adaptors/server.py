@@ -0,0 +1,165 @@
+"""
+A server that keeps graphs warm, answering queries from short-lived clients over a Unix socket.
+
+This module can only be imported where Unix domain sockets are supported (see
+protocol.is_supported).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any
+
+from grimp.application.graph import ImportGraph
+from grimp.application.usecases import build_graph, watch
+from grimp.application.watching import GraphWatcher
+
+from . import protocol
+from .protocol import GraphSpec
+
+logger = logging.getLogger(__name__)
+
+
+class GraphServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves queries on graphs, building each graph the first time it's asked for.
+
+    Graphs are kept up to date by watching their packages for changes where that's supported,
+    or else by refreshing them before each query. Only processes run by the same user can
+    connect.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str) -> None:
+        _remove_stale_socket(socket_path)
+        self._warm_graphs: dict[GraphSpec, _WarmGraph] = {}
+        self._warm_graphs_lock = threading.Lock()
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.remove(self.server_address)  # type: ignore[arg-type]
+        except FileNotFoundError:
+            pass
+        with self._warm_graphs_lock:
+            for warm_graph in self._warm_graphs.values():
+                warm_graph.close()
+            self._warm_graphs.clear()
+
+    def verify_request(self, request: Any, client_address: Any) -> bool:
+        if not hasattr(socket, "SO_PEERCRED"):
+            # The socket file's permissions are all there is.
+            return True
+        credentials = request.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == os.getuid()
+
+    def get_warm_graph(self, graph_spec: GraphSpec) -> _WarmGraph:
+        package_names, options = graph_spec
+        for name, _ in options:
+            if name not in protocol.BUILD_OPTIONS:
+                raise TypeError(f"build_graph option {name} isn't supported by the server.")
+        with self._warm_graphs_lock:
+            if graph_spec not in self._warm_graphs:
+                self._warm_graphs[graph_spec] = _WarmGraph(package_names, dict(options))
+            return self._warm_graphs[graph_spec]
+
+
+class _WarmGraph:
+    """
+    A graph kept in memory for the server, built when it's first needed.
+    """
+
+    def __init__(self, package_names: tuple[str, ...], options: dict[str, Any]) -> None:
+        self._package_names = package_names
+        self._options = options
+        self._graph: ImportGraph | None = None
+        self._watcher: GraphWatcher | None = None
+        # Queries are answered one at a time, as refreshing may change the graph.
+        self._lock = threading.Lock()
+
+    def query(self, method: str | None, args: tuple, kwargs: dict[str, Any]) -> Any:
+        """
+        Call the method on the up to date graph. If method is None, just make sure it's built.
+        """
+        if method is not None and method not in protocol.QUERY_METHODS:
+            raise AttributeError(f"ImportGraph has no query method {method}.")
+        with self._lock:
+            graph = self._get_up_to_date_graph()
+            # The graph only changes when it's refreshed, so it's worth laying out for queries.
+            graph.freeze()
+            if method is None:
+                return None
+            if method == "modules":
+                return graph.modules
+            return getattr(graph, method)(*args, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._watcher is not None:
+                self._watcher.close()
+
+    def _get_up_to_date_graph(self) -> ImportGraph:
+        if self._watcher is not None:
+            self._watcher.refresh()
+            return self._watcher.graph
+        if self._graph is not None:
+            self._graph.refresh()
+            return self._graph
+
+        logger.info(f"Building graph for {', '.join(self._package_names)}.")
+        try:
+            self._watcher = watch(*self._package_names, **self._options)
+            return self._watcher.graph
+        except NotImplementedError:
+            self._graph = build_graph(*self._package_names, **self._options)
+            return self._graph
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    server: GraphServer
+
+    def handle(self) -> None:
+        while True:
+            try:
+                kind, graph_spec, method, args, kwargs = protocol.receive_message(self.request)
+            except EOFError:
+                return
+            try:
+                warm_graph = self.server.get_warm_graph(graph_spec)
+                if kind == protocol.BUILD:
+                    method = None
+                result = warm_graph.query(method, args, kwargs)
+            except Exception as exception:  # noqa: BLE001
+                # Any error is sent back for the client to raise, rather than ending the
+                # connection.
+                protocol.send_message(
+                    self.request, (False, protocol.sendable_exception(exception))
+                )
+            else:
+                protocol.send_message(self.request, (True, result))
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove the socket file left by a server that's no longer running, if there is one.
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+        else:
+            raise OSError(f"A server is already listening on {socket_path}.")
@@ -0,0 +1,229 @@
+import logging
+import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
+from grimp.application.ports.modulefinder import ModuleFile
+from grimp.domain.valueobjects import DirectImport
+
+from ..application.ports.caching import CacheMiss, ImportsByModule, ParsedImportsByModule
+from .caching import Cache
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteCache(Cache):
+    """
+    Cache that stores each module's imports as a row in a SQLite database.
+
+    Each row holds the module's fingerprint (its mtime and, for content-keyed caches, a digest
+    of its contents) and its encoded imports. Only the rows for modules that were rescanned are
+    written, so a build in which most modules are cached doesn't rewrite the whole cache.
+    """
+
+    DATABASE_FILE_NAME = "imports.sqlite3"
+    # Increment this whenever the schema or the encoding of the imports changes.
+    SCHEMA_VERSION = 1
+    # How long to wait, in seconds, for other processes writing to the database.
+    BUSY_TIMEOUT = 30.0
+
+    def read_imports(self, module_file: ModuleFile) -> set[DirectImport]:
+        module_name = module_file.module.name
+        if not self._find_fresh_module_names([module_file]):
+            raise CacheMiss
+        imports_by_module = self._read_imports(
+            "SELECT module, imports FROM modules WHERE analysis = ? AND module = ?",
+            (self._analysis, module_name),
+            module_names={module_name},
+        )
+        try:
+            return imports_by_module.direct_imports(module_name)
+        except KeyError:
+            raise CacheMiss
+
+    def read_all_imports(self, module_files: Iterable[ModuleFile]) -> ImportsByModule:
+        fresh_module_names = self._find_fresh_module_names(module_files)
+        if not fresh_module_names:
+            return ImportsByModule()
+        return self._read_imports(
+            "SELECT module, imports FROM modules WHERE analysis = ?",
+            (self._analysis,),
+            module_names=fresh_module_names,
+        )
+
+    def write(
+        self,
+        imports_by_module: ImportsByModule,
+        parsed_imports: ParsedImportsByModule | None = None,
+    ) -> None:
+        # Only the resolved imports are stored: the parsed imports are only shared between
+        # analyses by the files backend.
+        module_files_by_name = {
+            module_file.module.name: module_file
+            for found_package in self.found_packages
+            for module_file in found_package.module_files
+        }
+        # Rows need writing unless they were read from the cache with an unchanged mtime.
+        module_names_to_upsert = {
+            module_name
+            for module_name in imports_by_module.module_names()
+            if module_name in module_files_by_name
+            and self._mtime_map.get(module_name) != module_files_by_name[module_name].mtime
+        }
+        module_names_to_delete = self._mtime_map.keys() - module_files_by_name.keys()
+        if not (module_names_to_upsert or module_names_to_delete):
+            logger.info(f"Cache file {self._database_filename} is already up to date.")
+            return
+
+        digests = (
+            self._get_current_digests(
+                module_files_by_name[module_name] for module_name in module_names_to_upsert
+            )
+            if self.cache_key == "content"
+            else {}
+        )
+        rows = [
+            (
+                self._analysis,
+                module_name,
+                module_files_by_name[module_name].mtime,
+                digests.get(module_name),
+                imports,
+            )
+            for module_name, imports in rust.encode_module_imports(
+                imports_by_module, module_names_to_upsert
+            )
+        ]
+
+        try:
+            with self._connect() as connection, connection:
+                connection.executemany(
+                    """
+                    INSERT INTO modules (analysis, module, mtime, digest, imports)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (analysis, module) DO UPDATE SET
+                        mtime = excluded.mtime,
+                        digest = excluded.digest,
+                        imports = excluded.imports
+                    """,
+                    rows,
+                )
+                connection.executemany(
+                    "DELETE FROM modules WHERE analysis = ? AND module = ?",
+                    ((self._analysis, module_name) for module_name in module_names_to_delete),
+                )
+        except sqlite3.DatabaseError:
+            logger.warning(f"Could not write to corrupt cache file {self._database_filename}.")
+            return
+
+        logger.info(
+            f"Wrote {len(rows)} and deleted {len(module_names_to_delete)} modules "
+            f"in cache file {self._database_filename}."
+        )
+        self._evict_if_over_limits()
+
+    def _read_imports(
+        self, query: str, parameters: tuple, module_names: set[str]
+    ) -> ImportsByModule:
+        """
+        Decode the imports of the supplied modules, from the (module, imports) rows selected by
+        the query.
+        """
+        try:
+            with self._connect() as connection:
+                encoded_imports = [
+                    imports
+                    for module, imports in connection.execute(query, parameters)
+                    if module in module_names
+                ]
+            self._mark_used(self._database_filename)
+            return rust.decode_module_imports(self._database_filename, encoded_imports)
+        except (sqlite3.DatabaseError, rust.CorruptCache):
+            logger.warning(f"Could not use corrupt cache file {self._database_filename}.")
+            return ImportsByModule()
+
+    def _build_meta_maps(self) -> None:
+        self._mtime_map, self._digest_map = {}, {}
+        try:
+            with self._connect() as connection:
+                rows = connection.execute(
+                    "SELECT module, mtime, digest FROM modules WHERE analysis = ?",
+                    (self._analysis,),
+                )
+                for module_name, mtime, digest in rows:
+                    self._mtime_map[module_name] = mtime
+                    if digest is not None:
+                        self._digest_map[module_name] = digest
+        except sqlite3.DatabaseError:
+            logger.warning(f"Could not use corrupt cache file {self._database_filename}.")
+            self._mtime_map, self._digest_map = {}, {}
+            self._recreate_database()
+
+    def _build_data_map(self) -> None:
+        # Imports are read from the database as they're needed.
+        pass
+
+    def _get_file_names(self) -> set[str]:
+        return {*super()._get_file_names(), self.DATABASE_FILE_NAME}
+
+    @property
+    def _database_filename(self) -> str:
+        return self.file_system.join(self.cache_dir, self.DATABASE_FILE_NAME)
+
+    @property
+    def _analysis(self) -> str:
+        """
+        Identifies the analysis parameters, as modules' imports differ between them.
+        """
+        return self._namer.make_data_file_unique_string(
+            found_packages=self.found_packages,
+            include_external_packages=self.include_external_packages,
+            exclude_type_checking_imports=self.exclude_type_checking_imports,
+        )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Connect to the database for a single operation.
+
+        The connection is closed afterwards, so that long-lived processes don't keep one open
+        for every graph they've built.
+        """
+        # Creates the cache directory, so that SQLite can create the database in it.
+        self._write_marker_files_if_not_already_there()
+        connection = sqlite3.connect(self._database_filename, timeout=self.BUSY_TIMEOUT)
+        try:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._migrate(connection)
+            yield connection
+        finally:
+            connection.close()
+
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        (schema_version,) = connection.execute("PRAGMA user_version").fetchone()
+        if schema_version == self.SCHEMA_VERSION:
+            return
+        with connection:
+            connection.execute("DROP TABLE IF EXISTS modules")
+            connection.execute(
+                """
+                CREATE TABLE modules (
+                    analysis TEXT NOT NULL,
+                    module TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    digest TEXT,
+                    imports BLOB NOT NULL,
+                    PRIMARY KEY (analysis, module)
+                ) WITHOUT ROWID
+                """
+            )
+            connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _recreate_database(self) -> None:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                self.file_system.remove(self._database_filename + suffix)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,153 @@
+"""
+Watches directories using Linux's inotify API.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+from collections.abc import Iterable
+
+from grimp.application.ports.watching import AbstractFileWatcher, FileChanges
+
+logger = logging.getLogger(__name__)
+
+# Constants from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+# The same as O_NONBLOCK and O_CLOEXEC, which the os module doesn't define on every platform.
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Any of these change a file's mtime, or whether it exists.
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+# Changes to the directory tree itself, which may add or remove packages.
+DIRECTORY_CHANGE_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+# struct inotify_event: int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[len].
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+class InotifyFileWatcher(AbstractFileWatcher):
+    """
+    File watcher that subscribes to inotify events for every directory in the tree.
+
+    Only changes are read, so the cost of keeping up doesn't depend on the number of files
+    being watched. Only available on Linux.
+    """
+
+    def __init__(self, directories: Iterable[str]) -> None:
+        if not sys.platform.startswith("linux"):
+            raise NotImplementedError("Watching for changes is only supported on Linux.")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise self._error("Could not start watching for changes")
+        self._directories_by_watch: dict[int, str] = {}
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+        try:
+            for directory in directories:
+                self._watch_tree(directory)
+        except BaseException:
+            self.close()
+            raise
+
+    def read_changes(self, timeout: float | None = None) -> FileChanges | None:
+        if not self._poll.poll(None if timeout is None else timeout * 1000):
+            return None
+        paths: set[str] = set()
+        complete = True
+        while data := self._read():
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                if not self._handle_event(watch, mask, name, paths):
+                    complete = False
+        if not paths and complete:
+            return None
+        return FileChanges(paths=frozenset(paths), complete=complete)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _handle_event(self, watch: int, mask: int, name: str, paths: set[str]) -> bool:
+        """
+        Record the path that an event is for, returning False if other changes may be missed.
+        """
+        if mask & IN_Q_OVERFLOW:
+            logger.warning("Too many changes to keep track of: checking every file.")
+            return False
+        if mask & IN_IGNORED:
+            self._directories_by_watch.pop(watch, None)
+            return True
+        directory = self._directories_by_watch.get(watch)
+        if directory is None:
+            return True
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            return False
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(path)
+            return not mask & DIRECTORY_CHANGE_MASK
+        paths.add(path)
+        return True
+
+    def _watch_tree(self, directory: str) -> None:
+        for dirpath, dirnames, _ in os.walk(directory, followlinks=True):
+            # Hidden directories aren't searched for modules.
+            dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+            watch = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if watch < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    # Removed since it was found.
+                    continue
+                raise self._error(f"Could not watch {dirpath} for changes", error)
+            self._directories_by_watch[watch] = dirpath
+
+    def _read(self) -> bytes:
+        try:
+            return os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return b""
+
+    def _error(self, message: str, error: int | None = None) -> OSError:
+        if error is None:
+            error = ctypes.get_errno()
+        if error == errno.ENOSPC:
+            message += " (try increasing fs.inotify.max_user_watches)"
+        return OSError(error, f"{message}: {os.strerror(error)}")
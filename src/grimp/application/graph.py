@@ -1,8 +1,9 @@
 from __future__ import annotations
 from typing import TypedDict
-from collections.abc import Sequence
+from collections.abc import Callable, Iterable, Sequence
 from grimp.domain.analysis import PackageDependency, Route
 from grimp.domain.valueobjects import Layer
+from grimp.application.workers import validate_workers
 from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
 from grimp.exceptions import (
     ModuleNotPresent,
@@ -36,6 +37,9 @@ class ImportGraph:
         super().__init__()
         self._cached_modules: set[str] | None = None
         self._rustgraph = rust.Graph()
+        # Set by build_graph, to bring the graph up to date with the modules it was built from,
+        # optionally only checking the files at the supplied paths.
+        self._refresher: Callable[[ImportGraph, Iterable[str] | None], set[str]] | None = None
 
     # Mechanics
     # ---------
@@ -151,6 +155,86 @@ class ImportGraph:
             line_contents=line_contents,
         )
 
+    def _add_imports_by_module(
+        self,
+        imports_by_module: rust.ImportsByModule,
+        *,
+        package_names: set[str],
+    ) -> None:
+        """
+        Add the imports found by scanning the supplied packages, in a single pass.
+
+        Any imported module that is not within one of the packages is added as a squashed
+        module. This is much faster than adding each module and import individually.
+        """
+        self._cached_modules = None
+        self._rustgraph.add_imports_by_module(imports_by_module, package_names=package_names)
+
+    def _replace_imports_by_module(
+        self,
+        imports_by_module: rust.ImportsByModule,
+        *,
+        removed_modules: set[str],
+        package_names: set[str],
+    ) -> set[str]:
+        """
+        Replace the imports of some modules that have been scanned again, and remove the modules
+        that no longer exist.
+
+        Modules whose imports haven't changed are left untouched. Returns the names of the
+        modules whose imports changed, including those removed.
+        """
+        self._cached_modules = None
+        return self._rustgraph.replace_imports_by_module(
+            imports_by_module, removed_modules=removed_modules, package_names=package_names
+        )
+
+    def refresh(self) -> set[str]:
+        """
+        Update the graph to reflect any changes to the modules since it was built (or last
+        refreshed).
+
+        Only the modules whose last modified time has changed are scanned again. Only graphs
+        returned by build_graph can be refreshed (not copies of them), and any changes made to
+        the graph since are lost for the modules whose imports change.
+
+        Returns the names of the modules whose imports changed, including any that were added
+        or removed.
+        """
+        if self._refresher is None:
+            raise ValueError("Only graphs returned by build_graph can be refreshed.")
+        return self._refresher(self, None)
+
+    def freeze(self) -> None:
+        """
+        Lay out the imports in a compact form that makes finding chains between modules faster,
+        for graphs that won't be changed again.
+
+        The graph can still be changed afterwards, but that discards the compact form.
+        """
+        self._rustgraph.freeze()
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode the graph as bytes, so it can be stored or sent to another process without
+        being rebuilt. Decode them with ImportGraph.from_bytes.
+        """
+        return self._rustgraph.to_bytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> ImportGraph:
+        """
+        Decode a graph encoded by ImportGraph.to_bytes.
+
+        Like a copy, the decoded graph can't be refreshed, and it isn't frozen.
+
+        Raises:
+            ValueError if the bytes don't encode a graph.
+        """
+        graph = cls()
+        graph._rustgraph = rust.Graph.from_bytes(data)
+        return graph
+
     def remove_import(self, *, importer: str, imported: str) -> None:
         """
         Remove a direct import between two modules. Does not remove the modules themselves.
@@ -388,6 +472,7 @@ class ImportGraph:
         self,
         layers: Sequence[Layer | str | set[str]],
         containers: set[str] | None = None,
+        workers: int | None = None,
     ) -> set[PackageDependency]:
         """
         Find dependencies that don't conform to the supplied layered architecture.
@@ -419,6 +504,8 @@ class ImportGraph:
                       exist in the graph will be ignored.
         - containers: The parent modules of the layers, as absolute names that you could import,
                       such as "mypackage.foo". (Optional.)
+        - workers:    The number of threads to use. Defaults to the number set with set_workers,
+                      or else the number of CPUs available to the process. (Optional.)
 
         Returns the illegal dependencies in the form of a set of PackageDependency objects.
         Each package dependency is for a different permutation of two layers for which there
@@ -427,6 +514,7 @@ class ImportGraph:
 
         Raises NoSuchContainer if the container is not a module in the graph.
         """
+        validate_workers(workers)
         layers = _parse_layers(layers)
         try:
             result = self._rustgraph.find_illegal_dependencies_for_layers(
@@ -439,6 +527,7 @@ class ImportGraph:
                     for layer in layers
                 ),
                 containers=set(containers) if containers else set(),
+                workers=workers,
             )
         except rust.NoSuchContainer as e:
             raise NoSuchContainer(str(e))
@@ -480,6 +569,10 @@ class ImportGraph:
         new_graph._rustgraph = self._rustgraph.clone()
         return new_graph
 
+    def __reduce__(self) -> tuple[Callable[[bytes], ImportGraph], tuple[bytes]]:
+        # Pickle the graph in its encoded form, which is much faster than pickling its contents.
+        return self.__class__.from_bytes, (self.to_bytes(),)
+
 
 class _RustRoute(TypedDict):
     heads: frozenset[str]
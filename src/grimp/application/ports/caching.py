@@ -1,13 +1,56 @@
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Literal, TypeAlias
+
+from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
 from grimp.application.ports.modulefinder import FoundPackage, ModuleFile
 from grimp.domain.valueobjects import DirectImport, Module
 
 from .filesystem import BasicFileSystem
 
+# Rust-owned container of the imports found for each module. Python objects are only
+# produced from it on request, e.g. via to_dict() or direct_imports(module_name).
+ImportsByModule: TypeAlias = rust.ImportsByModule
+
+# Rust-owned container of the objects each module imports, as parsed from its source code.
+# Unlike ImportsByModule, it doesn't depend on the packages being analysed or the graph
+# building options: it can be resolved into an ImportsByModule for any of them.
+ParsedImportsByModule: TypeAlias = rust.ParsedImportsByModule
+
+# How the cache decides whether a module has changed since it was cached:
+# - "mtime": by the file's last modified time.
+# - "content": by a digest of the file's contents (checking the mtime first, as it's cheaper).
+CacheKey: TypeAlias = Literal["mtime", "content"]
+CACHE_KEYS: tuple[CacheKey, ...] = ("mtime", "content")
+
+# Where the cache is stored:
+# - "files": in data and meta files, using settings.CACHE_CLASS.
+# - "sqlite": in a SQLite database, using settings.SQLITE_CACHE_CLASS.
+CacheBackend: TypeAlias = Literal["files", "sqlite"]
+CACHE_BACKENDS: tuple[CacheBackend, ...] = ("files", "sqlite")
+
 
 class CacheMiss(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class CacheEntry:
+    """
+    A group of files in a cache directory that are used, and evicted, together.
+
+    For example, the files written for a package, or for an analysis of some packages with
+    particular options.
+    """
+
+    name: str
+    file_names: frozenset[str]
+    # The total size of the files, in bytes.
+    size: int
+    # When any of the files was last read or written, as a timestamp.
+    last_used: float
+
+
 class Cache:
     def __init__(
         self,
@@ -16,6 +59,9 @@ class Cache:
         exclude_type_checking_imports: bool,
         found_packages: set[FoundPackage],
         cache_dir: str,
+        cache_key: CacheKey = "mtime",
+        max_size: int | None = None,
+        max_entries: int | None = None,
     ) -> None:
         """
         Don't instantiate Cache directly; use Cache.setup().
@@ -25,6 +71,9 @@ class Cache:
         self.include_external_packages = include_external_packages
         self.exclude_type_checking_imports = exclude_type_checking_imports
         self.cache_dir = cache_dir
+        self.cache_key = cache_key
+        self.max_size = max_size
+        self.max_entries = max_entries
 
     @classmethod
     def setup(
@@ -35,6 +84,9 @@ class Cache:
         include_external_packages: bool,
         exclude_type_checking_imports: bool = False,
         cache_dir: str | None = None,
+        cache_key: CacheKey = "mtime",
+        max_size: int | None = None,
+        max_entries: int | None = None,
     ) -> "Cache":
         cache = cls(
             file_system=file_system,
@@ -42,16 +94,87 @@ class Cache:
             include_external_packages=include_external_packages,
             exclude_type_checking_imports=exclude_type_checking_imports,
             cache_dir=cls.cache_dir_or_default(cache_dir),
+            cache_key=cache_key,
+            max_size=max_size,
+            max_entries=max_entries,
         )
         return cache
 
     def read_imports(self, module_file: ModuleFile) -> set[DirectImport]:
         raise NotImplementedError
 
+    def read_all_imports(self, module_files: Iterable[ModuleFile]) -> ImportsByModule:
+        """
+        Return the cached imports for whichever of the supplied module files are fresh.
+
+        Any module missing from the returned container is a cache miss.
+
+        This default implementation calls read_imports for each module file; subclasses
+        should override it to avoid building Python objects for every import.
+        """
+        imports_by_module: dict[Module, set[DirectImport]] = {}
+        for module_file in module_files:
+            try:
+                imports_by_module[module_file.module] = self.read_imports(module_file)
+            except CacheMiss:
+                continue
+        return ImportsByModule.from_dict(imports_by_module)
+
     def write(
         self,
-        imports_by_module: dict[Module, set[DirectImport]],
+        imports_by_module: ImportsByModule,
+        parsed_imports: ParsedImportsByModule | None = None,
     ) -> None:
+        """
+        Write the imports of every module to the cache.
+
+        The parsed imports of any modules that were scanned may also be supplied, for caches
+        that share them between analyses with different packages or options.
+        """
+        raise NotImplementedError
+
+    def read_graph_snapshot(self) -> rust.Graph | None:
+        """
+        Return the snapshot of the graph built from the current module files, if there is one.
+
+        This default implementation never returns a snapshot.
+        """
+        return None
+
+    def write_graph_snapshot(self, graph: rust.Graph) -> None:
+        """
+        Store a snapshot of the graph built from the current module files.
+
+        This default implementation doesn't store anything.
+        """
+
+    @classmethod
+    def inspect(cls, file_system: BasicFileSystem, cache_dir: str | None) -> list[CacheEntry]:
+        """
+        Return the entries in the cache directory, least recently used first.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def prune(
+        cls,
+        file_system: BasicFileSystem,
+        cache_dir: str | None,
+        *,
+        max_size: int | None = None,
+        max_entries: int | None = None,
+        keep: Iterable[str] = (),
+    ) -> list[CacheEntry]:
+        """
+        Evict the least recently used entries until the cache directory is within the limits.
+
+        Args:
+            - max_size: the maximum total size of the entries, in bytes.
+            - max_entries: the maximum number of entries.
+            - keep: the names of entries that must not be evicted.
+        Returns:
+            The evicted entries.
+        """
         raise NotImplementedError
 
     @classmethod
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import abc
 from collections.abc import Iterator
+from contextlib import AbstractContextManager
 from typing import Protocol
 
 
@@ -112,3 +113,33 @@ class BasicFileSystem(Protocol):
     def write(self, file_name: str, contents: str) -> None: ...
 
     def exists(self, file_name: str) -> bool: ...
+
+    def listdir(self, directory_name: str) -> list[str]:
+        """
+        Return the names of the entries in a directory.
+
+        Raises FileNotFoundError if the directory does not exist.
+        """
+        ...
+
+    def stat(self, file_name: str) -> tuple[int, float]:
+        """
+        Return the size of a file in bytes, and its mtime.
+
+        Raises FileNotFoundError if the file does not exist.
+        """
+        ...
+
+    def remove(self, file_name: str) -> None: ...
+
+    def touch(self, file_name: str) -> None:
+        """
+        Set the mtime of a file to now.
+        """
+        ...
+
+    def lock(self, file_name: str) -> AbstractContextManager:
+        """
+        Take an exclusive advisory lock on the file, blocking until it is available.
+        """
+        ...
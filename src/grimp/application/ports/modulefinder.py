@@ -1,5 +1,5 @@
 import abc
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from grimp.domain.valueobjects import Module
 
@@ -8,8 +8,17 @@ from .filesystem import AbstractFileSystem
 
 @dataclass(frozen=True)
 class ModuleFile:
+    """
+    A Python file for a module, together with metadata.
+
+    The path and size are optional, as not every module finder supplies them. Where the path is
+    known, scanning can read the file without having to locate it again.
+    """
+
     module: Module
     mtime: float
+    path: str | None = field(default=None, compare=False)
+    size: int | None = field(default=None, compare=False)
 
 
 @dataclass(frozen=True)
@@ -30,9 +39,16 @@ class AbstractModuleFinder(abc.ABC):
 
     @abc.abstractmethod
     def find_package(
-        self, package_name: str, package_directory: str, file_system: AbstractFileSystem
+        self,
+        package_name: str,
+        package_directory: str,
+        file_system: AbstractFileSystem,
+        cache_dir: str | None = None,
     ) -> FoundPackage:
         """
         Searches the package for all importable Python modules.
+
+        If a cache directory is supplied, the finder may cache what it finds there, to speed up
+        searching the package next time.
         """
         raise NotImplementedError
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import abc
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class FileChanges:
+    """
+    The paths of files that have changed.
+
+    If complete is False, other changes may have been missed (for example because a directory
+    was moved), so every file should be checked again.
+    """
+
+    paths: frozenset[str]
+    complete: bool = True
+
+    def __or__(self, other: FileChanges) -> FileChanges:
+        return FileChanges(
+            paths=self.paths | other.paths, complete=self.complete and other.complete
+        )
+
+
+class AbstractFileWatcher(abc.ABC):
+    """
+    Watches directories, including their subdirectories, for changes to the files in them.
+    """
+
+    @abc.abstractmethod
+    def __init__(self, directories: Iterable[str]) -> None:
+        """
+        Start watching the directories.
+
+        Changes made from this point onwards are reported by read_changes.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def read_changes(self, timeout: float | None = None) -> FileChanges | None:
+        """
+        Return the changes made since the last call, waiting up to timeout seconds for some.
+
+        Return None if nothing changed within the timeout. A timeout of None waits indefinitely.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """
+        Stop watching the directories.
+        """
+        raise NotImplementedError
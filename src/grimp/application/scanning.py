@@ -1,11 +1,19 @@
 from collections.abc import Collection
+from typing import Literal, TypeAlias
 
 from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
-from grimp.domain.valueobjects import DirectImport, Module
+from grimp.domain.valueobjects import DirectImport
+from grimp.exceptions import SourceSyntaxError
 from grimp.application.config import settings
+from grimp.application.ports.caching import ImportsByModule, ParsedImportsByModule
 from grimp.application.ports.filesystem import AbstractFileSystem
 from grimp.application.ports.modulefinder import ModuleFile, FoundPackage
 
+# How to find the imports in each module: "full" parses it, while "lexer" only tokenizes it,
+# falling back to parsing it for code the tokenizer doesn't understand.
+ImportParser: TypeAlias = Literal["full", "lexer"]
+IMPORT_PARSERS: tuple[ImportParser, ...] = ("full", "lexer")
+
 
 def scan_imports(
     module_files: Collection[ModuleFile],
@@ -14,9 +22,33 @@ def scan_imports(
     include_external_packages: bool,
     exclude_type_checking_imports: bool,
 ) -> dict[ModuleFile, set[DirectImport]]:
+    imports_by_module = scan_imports_by_module(
+        module_files,
+        found_packages=found_packages,
+        include_external_packages=include_external_packages,
+        exclude_type_checking_imports=exclude_type_checking_imports,
+    )
+    return {
+        module_file: imports_by_module.direct_imports(module_file.module.name)
+        for module_file in module_files
+    }
+
+
+def scan_imports_by_module(
+    module_files: Collection[ModuleFile],
+    *,
+    found_packages: set[FoundPackage],
+    include_external_packages: bool,
+    exclude_type_checking_imports: bool,
+) -> ImportsByModule:
+    """
+    Like scan_imports, but return the imports in a Rust-owned container.
+
+    This avoids building Python objects for every import found.
+    """
     file_system: AbstractFileSystem = settings.FILE_SYSTEM
     basic_file_system = file_system.convert_to_basic()
-    imports_by_module: dict[Module, set[DirectImport]] = rust.scan_for_imports(
+    return rust.scan_for_imports(
         module_files=tuple(module_files),
         found_packages=found_packages,
         # Ensure that the passed exclude_type_checking_imports is definitely a boolean,
@@ -25,4 +57,27 @@ def scan_imports(
         exclude_type_checking_imports=exclude_type_checking_imports,
         file_system=basic_file_system,
     )
-    return {module_file: imports_by_module[module_file.module] for module_file in module_files}
+
+
+def parse_imports_by_module(
+    module_files: Collection[ModuleFile],
+    *,
+    found_packages: set[FoundPackage],
+    import_parser: ImportParser = "full",
+) -> tuple[ParsedImportsByModule, list[SourceSyntaxError]]:
+    """
+    Parse the objects imported by the supplied modules, without resolving them.
+
+    These can be resolved into imports for any set of options using ParsedImportsByModule.resolve.
+
+    Modules with syntax errors are left out, rather than raising, so that the others can still be
+    cached. Returns the parsed imports along with the errors, ordered by module.
+    """
+    file_system: AbstractFileSystem = settings.FILE_SYSTEM
+    basic_file_system = file_system.convert_to_basic()
+    return rust.parse_imports(
+        module_files=tuple(module_files),
+        found_packages=found_packages,
+        file_system=basic_file_system,
+        import_parser=import_parser,
+    )
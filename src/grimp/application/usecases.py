@@ -2,17 +2,35 @@
 Use cases handle application logic.
 """
 
-from typing import cast
-from collections.abc import Sequence, Iterable
-
-from .scanning import scan_imports
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import NoReturn, cast
+from collections.abc import Callable, Iterable, Sequence
+
+from . import scanning
+from .scanning import parse_imports_by_module
 from ..application.ports import caching
-from ..application.ports.filesystem import AbstractFileSystem, BasicFileSystem
+from ..application.ports.filesystem import AbstractFileSystem
 from ..application.graph import ImportGraph
 from ..application.ports.modulefinder import AbstractModuleFinder, FoundPackage, ModuleFile
 from ..application.ports.packagefinder import AbstractPackageFinder
-from ..domain.valueobjects import DirectImport, Module
+from ..application.ports.watching import AbstractFileWatcher
+from .watching import GraphWatcher
+from ..domain.valueobjects import Module
 from .config import settings
+from .workers import get_workers, override_workers, validate_workers
+from ..exceptions import SourceSyntaxError, SourceSyntaxErrors
+
+logger = logging.getLogger(__name__)
+
+# Cache writes run on a background thread, so that the graph can be used while they finish. As
+# there's only one thread, they happen in the order they were made.
+_cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grimp-cache-writer")
+_pending_cache_writes: list[Future] = []
+_pending_cache_writes_lock = threading.Lock()
 
 
 class NotSupplied:
@@ -25,6 +43,12 @@ def build_graph(
     include_external_packages: bool = False,
     exclude_type_checking_imports: bool = False,
     cache_dir: str | type[NotSupplied] | None = NotSupplied,
+    cache_key: caching.CacheKey = "mtime",
+    cache_backend: caching.CacheBackend = "files",
+    cache_max_size: int | None = None,
+    cache_max_entries: int | None = None,
+    import_parser: scanning.ImportParser = "full",
+    workers: int | None = None,
 ) -> ImportGraph:
     """
     Build and return an import graph for the supplied package name(s).
@@ -35,6 +59,19 @@ def build_graph(
         - include_external_packages: whether to include any external packages in the graph.
         - exclude_type_checking_imports: whether to exclude imports made in type checking guards.
         - cache_dir: The directory to use for caching the graph.
+        - cache_key: how the cache decides whether a module has changed: "mtime" (by its last
+          modified time) or "content" (by a digest of its contents).
+        - cache_backend: where to store the cache: "files" or "sqlite" (a SQLite database, which
+          only needs to write the modules that have changed).
+        - cache_max_size: if supplied, the least recently used entries in the cache directory are
+          evicted after writing to the cache, until their total size (in bytes) is within it.
+        - cache_max_entries: if supplied, the least recently used entries in the cache directory
+          are evicted after writing to the cache, until there are no more than this many.
+        - import_parser: how to find each module's imports: "full" (by parsing the module) or
+          "lexer" (by tokenizing it, which is faster, but doesn't detect syntax errors outside
+          import statements).
+        - workers: the number of threads to use for parallel work. Defaults to the number set
+          with set_workers, or else the number of CPUs available to the process.
     Examples:
 
         # Single package.
@@ -48,28 +85,209 @@ def build_graph(
             "mypackage", "anotherpackage", "onemore", include_external_packages=True,
         )
     """
-    file_system: AbstractFileSystem = settings.FILE_SYSTEM
+    _validate_cache_key(cache_key)
+    _validate_import_parser(import_parser)
+    validate_workers(workers)
+    cache_class = _get_cache_class(cache_backend)
 
-    found_packages = _find_packages(
-        file_system=file_system,
-        package_names=[package_name] + list(additional_package_names),
-    )
+    with override_workers(workers):
+        file_system: AbstractFileSystem = settings.FILE_SYSTEM
 
-    imports_by_module = _scan_packages(
-        found_packages=found_packages,
-        file_system=file_system.convert_to_basic(),
-        include_external_packages=include_external_packages,
-        exclude_type_checking_imports=exclude_type_checking_imports,
-        cache_dir=cache_dir,
+        cache_dir_if_supplied = None if cache_dir is NotSupplied else cast(str, cache_dir)
+        package_names = [package_name] + list(additional_package_names)
+        found_packages = _find_packages(
+            file_system=file_system,
+            package_names=package_names,
+            cache_dir=(
+                None
+                if cache_dir is None
+                else cache_class.cache_dir_or_default(cache_dir_if_supplied)
+            ),
+        )
+        refresher = _GraphRefresher(
+            package_names=package_names,
+            found_packages=found_packages,
+            include_external_packages=include_external_packages,
+            exclude_type_checking_imports=exclude_type_checking_imports,
+            import_parser=import_parser,
+            workers=workers,
+        )
+
+        cache: caching.Cache | None = None
+        if cache_dir is not None:
+            # The cache may still be being written from an earlier build.
+            flush_cache()
+            cache = cache_class.setup(
+                file_system=file_system.convert_to_basic(),
+                found_packages=found_packages,
+                include_external_packages=include_external_packages,
+                exclude_type_checking_imports=exclude_type_checking_imports,
+                cache_dir=cache_dir_if_supplied,
+                cache_key=cache_key,
+                max_size=cache_max_size,
+                max_entries=cache_max_entries,
+            )
+            # If no module has changed since the graph was last built, load it in one go.
+            rust_graph = cache.read_graph_snapshot()
+            if rust_graph is not None:
+                graph: ImportGraph = settings.IMPORT_GRAPH_CLASS()
+                graph._rustgraph = rust_graph
+                graph._refresher = refresher
+                return graph
+
+        imports_by_module = _scan_packages(
+            found_packages=found_packages,
+            include_external_packages=include_external_packages,
+            exclude_type_checking_imports=exclude_type_checking_imports,
+            cache=cache,
+            import_parser=import_parser,
+        )
+
+        graph = _assemble_graph(found_packages, imports_by_module)
+        graph._refresher = refresher
+
+        if cache is not None:
+            # Write a copy, so the graph can be changed while the snapshot is written.
+            _write_to_cache_in_background(cache.write_graph_snapshot, graph._rustgraph.clone())
+
+        return graph
+
+
+def watch(
+    package_name,
+    *additional_package_names,
+    include_external_packages: bool = False,
+    exclude_type_checking_imports: bool = False,
+    cache_dir: str | type[NotSupplied] | None = NotSupplied,
+    cache_key: caching.CacheKey = "mtime",
+    cache_backend: caching.CacheBackend = "files",
+    cache_max_size: int | None = None,
+    cache_max_entries: int | None = None,
+    import_parser: scanning.ImportParser = "full",
+    workers: int | None = None,
+    debounce: float = 0.05,
+) -> GraphWatcher:
+    """
+    Build an import graph for the supplied package name(s), and watch the packages for changes.
+
+    The graph is available as the returned watcher's graph attribute. Changes are applied to it
+    when the watcher's wait or refresh methods are called, rescanning only the modules that have
+    changed, without searching the packages again.
+
+    Args:
+        - As for build_graph, plus:
+        - debounce: the number of seconds to wait for further changes once a change is seen,
+          so that changes made together are applied together.
+    Examples:
+
+        with watch("mypackage") as watcher:
+            for changed_modules in watcher:
+                check_architecture(watcher.graph)
+    """
+    if debounce < 0:
+        raise ValueError(f"debounce must not be negative, got {debounce}.")
+    package_names = _validate_package_names_are_strings(
+        [package_name] + list(additional_package_names)
+    )
+    file_system: AbstractFileSystem = settings.FILE_SYSTEM
+    package_finder: AbstractPackageFinder = settings.PACKAGE_FINDER
+    # Start watching before building the graph, so that no changes are missed.
+    file_watcher: AbstractFileWatcher = settings.FILE_WATCHER_CLASS(
+        [
+            package_finder.determine_package_directory(
+                package_name=package_name, file_system=file_system
+            )
+            for package_name in package_names
+        ]
     )
+    try:
+        graph = build_graph(
+            *package_names,
+            include_external_packages=include_external_packages,
+            exclude_type_checking_imports=exclude_type_checking_imports,
+            cache_dir=cache_dir,
+            cache_key=cache_key,
+            cache_backend=cache_backend,
+            cache_max_size=cache_max_size,
+            cache_max_entries=cache_max_entries,
+            import_parser=import_parser,
+            workers=workers,
+        )
+    except BaseException:
+        file_watcher.close()
+        raise
+    return GraphWatcher(graph, file_watcher, debounce=debounce)
 
-    graph = _assemble_graph(found_packages, imports_by_module)
 
-    return graph
+def flush_cache() -> None:
+    """
+    Wait for any cache writes still running in the background to finish.
+
+    build_graph writes to the cache in the background, so that the graph can be used straight
+    away. This is called before the cache is next used, and when the interpreter exits, so
+    only needs calling to use the cache files by other means.
+    """
+    with _pending_cache_writes_lock:
+        pending_cache_writes = list(_pending_cache_writes)
+        _pending_cache_writes.clear()
+    for pending_cache_write in pending_cache_writes:
+        pending_cache_write.result()
+
+
+atexit.register(flush_cache)
+
+
+def inspect_cache(cache_dir: str | None = None) -> list[caching.CacheEntry]:
+    """
+    Return the entries in the cache directory, least recently used first.
+
+    Each entry is a group of files used together: those written for a package, or for an analysis
+    of some packages with particular options.
+
+    Args:
+        - cache_dir: the cache directory (defaults to the one used by build_graph).
+    """
+    flush_cache()
+    return settings.CACHE_CLASS.inspect(settings.FILE_SYSTEM.convert_to_basic(), cache_dir)
+
+
+def prune_cache(
+    cache_dir: str | None = None,
+    *,
+    max_size: int | None = None,
+    max_entries: int | None = None,
+) -> list[caching.CacheEntry]:
+    """
+    Evict the least recently used entries in the cache directory until it's within the limits.
+
+    Args:
+        - cache_dir: the cache directory (defaults to the one used by build_graph).
+        - max_size: the maximum total size of the entries, in bytes.
+        - max_entries: the maximum number of entries.
+    Returns:
+        The evicted entries.
+
+    Examples:
+
+        # Remove everything from the cache.
+        prune_cache(max_entries=0)
+
+        # Keep the cache within 100MB.
+        prune_cache(max_size=100 * 1024 * 1024)
+    """
+    flush_cache()
+    return settings.CACHE_CLASS.prune(
+        settings.FILE_SYSTEM.convert_to_basic(),
+        cache_dir,
+        max_size=max_size,
+        max_entries=max_entries,
+    )
 
 
 def _find_packages(
-    file_system: AbstractFileSystem, package_names: Sequence[object]
+    file_system: AbstractFileSystem,
+    package_names: Sequence[object],
+    cache_dir: str | None = None,
 ) -> set[FoundPackage]:
     package_names = _validate_package_names_are_strings(package_names)
 
@@ -86,6 +304,7 @@ def _find_packages(
             package_name=package_name,
             package_directory=package_directory,
             file_system=file_system,
+            cache_dir=cache_dir,
         )
         found_packages.add(found_package)
     return found_packages
@@ -100,98 +319,343 @@ def _validate_package_names_are_strings(
     return cast(Sequence[str], package_names)
 
 
+def _validate_cache_key(cache_key: object) -> None:
+    if cache_key not in caching.CACHE_KEYS:
+        raise ValueError(
+            f"cache_key must be one of {', '.join(caching.CACHE_KEYS)}, got {cache_key!r}."
+        )
+
+
+def _validate_import_parser(import_parser: object) -> None:
+    if import_parser not in scanning.IMPORT_PARSERS:
+        raise ValueError(
+            f"import_parser must be one of {', '.join(scanning.IMPORT_PARSERS)}, "
+            f"got {import_parser!r}."
+        )
+
+
+def _get_cache_class(cache_backend: object) -> type[caching.Cache]:
+    if cache_backend == "files":
+        return settings.CACHE_CLASS
+    if cache_backend == "sqlite":
+        return settings.SQLITE_CACHE_CLASS
+    raise ValueError(
+        f"cache_backend must be one of {', '.join(caching.CACHE_BACKENDS)}, got {cache_backend!r}."
+    )
+
+
 def _scan_packages(
     found_packages: set[FoundPackage],
-    file_system: BasicFileSystem,
     include_external_packages: bool,
     exclude_type_checking_imports: bool,
-    cache_dir: str | type[NotSupplied] | None,
-) -> dict[Module, set[DirectImport]]:
-    if cache_dir is not None:
-        cache_dir_if_supplied = cache_dir if cache_dir != NotSupplied else None
-        cache: caching.Cache = settings.CACHE_CLASS.setup(
-            file_system=file_system,
-            found_packages=found_packages,
-            include_external_packages=include_external_packages,
-            exclude_type_checking_imports=exclude_type_checking_imports,
-            cache_dir=cache_dir_if_supplied,
-        )
-
+    cache: caching.Cache | None,
+    import_parser: scanning.ImportParser = "full",
+) -> caching.ImportsByModule:
     module_files_to_scan = {
         module_file
         for found_package in found_packages
         for module_file in found_package.module_files
     }
 
-    imports_by_module_file: dict[ModuleFile, set[DirectImport]] = {}
-
-    if cache_dir is not None:
-        imports_by_module_file.update(_read_imports_from_cache(module_files_to_scan, cache=cache))
+    remaining_module_files_to_scan = module_files_to_scan
+    if cache is not None:
+        cached_imports_by_module = cache.read_all_imports(module_files_to_scan)
+        remaining_module_files_to_scan = {
+            module_file
+            for module_file in module_files_to_scan
+            if module_file.module.name not in cached_imports_by_module
+        }
+
+    # Parse and resolve the imports as separate steps, so that the parsed imports can be
+    # cached for analyses with other packages or options.
+    parsed_imports, syntax_errors = parse_imports_by_module(
+        remaining_module_files_to_scan,
+        found_packages=found_packages,
+        import_parser=import_parser,
+    )
+    if syntax_errors and cache is None:
+        _raise_syntax_errors(syntax_errors)
+    imports_by_module = parsed_imports.resolve(
+        found_packages=found_packages,
+        # Ensure that the passed include_external_packages is definitely a boolean,
+        # otherwise the Rust function will error.
+        include_external_packages=bool(include_external_packages),
+        exclude_type_checking_imports=exclude_type_checking_imports,
+    )
 
-    remaining_module_files_to_scan = module_files_to_scan.difference(imports_by_module_file)
-    if remaining_module_files_to_scan:
-        imports_by_module_file.update(
-            scan_imports(
-                remaining_module_files_to_scan,
-                found_packages=found_packages,
-                include_external_packages=include_external_packages,
-                exclude_type_checking_imports=exclude_type_checking_imports,
-            )
+    if cache is not None:
+        imports_by_module.update(cached_imports_by_module)
+        # Write the modules that could be parsed even if some couldn't, so that once they're
+        # fixed only they need parsing again.
+        _write_to_cache_in_background(
+            cache.write, imports_by_module, parsed_imports=parsed_imports
         )
-
-    imports_by_module: dict[Module, set[DirectImport]] = {
-        k.module: v for k, v in imports_by_module_file.items()
-    }
-
-    if cache_dir is not None:
-        cache.write(imports_by_module)
+        if syntax_errors:
+            _raise_syntax_errors(syntax_errors)
 
     return imports_by_module
 
 
-def _assemble_graph(
-    found_packages: set[FoundPackage],
-    imports_by_module: dict[Module, set[DirectImport]],
-) -> ImportGraph:
-    graph: ImportGraph = settings.IMPORT_GRAPH_CLASS()
+@dataclass(frozen=True)
+class _ModuleChanges:
+    found_packages: set[FoundPackage]
+    # The module files that were added, or whose mtime changed.
+    changed_module_files: set[ModuleFile]
+    removed_module_names: set[str]
 
-    package_modules = {Module(found_package.name) for found_package in found_packages}
 
-    for module, direct_imports in imports_by_module.items():
-        graph.add_module(module.name)
-        for direct_import in direct_imports:
-            # Before we add the import, check to see if the imported module is in fact an
-            # external module, and if so, tell the graph that it is a squashed module.
-            graph.add_module(
-                direct_import.imported.name,
-                is_squashed=_is_external(direct_import.imported, package_modules),
-            )
+class _GraphRefresher:
+    """
+    Brings a graph returned by build_graph up to date with the modules it was built from.
+    """
 
-            graph.add_import(
-                importer=direct_import.importer.name,
-                imported=direct_import.imported.name,
-                line_number=direct_import.line_number,
-                line_contents=direct_import.line_contents,
+    def __init__(
+        self,
+        *,
+        package_names: Sequence[str],
+        found_packages: set[FoundPackage],
+        include_external_packages: bool,
+        exclude_type_checking_imports: bool,
+        import_parser: scanning.ImportParser,
+        workers: int | None,
+    ) -> None:
+        self._package_names = package_names
+        # The packages as of the last refresh, recording the mtimes of the modules in the graph.
+        self._found_packages = found_packages
+        self._module_files_by_name = {
+            module_file.module.name: module_file
+            for found_package in found_packages
+            for module_file in found_package.module_files
+        }
+        self._include_external_packages = bool(include_external_packages)
+        self._exclude_type_checking_imports = exclude_type_checking_imports
+        self._import_parser = import_parser
+        self._workers = workers
+        # The parsed imports of every module. These are only needed once modules are added or
+        # removed, so they're not parsed until then.
+        self._parsed_imports: caching.ParsedImportsByModule | None = None
+
+    def __call__(self, graph: ImportGraph, changed_paths: Iterable[str] | None = None) -> set[str]:
+        """
+        Refresh the graph, returning the names of the modules whose imports changed.
+
+        If changed_paths is supplied, only those files are checked for changes, unless they
+        include the addition or removal of a package, in which case every file is.
+        """
+        with override_workers(self._workers):
+            previous_changes = None
+            while True:
+                changes = None
+                if changed_paths is not None:
+                    changes = self._find_changes_to_paths(changed_paths)
+                if changes is None:
+                    changes = self._find_all_changes()
+                if not (changes.changed_module_files or changes.removed_module_names):
+                    return set()
+
+                try:
+                    return self._apply_changes(graph, changes)
+                except FileNotFoundError:
+                    if changes == previous_changes:
+                        # The module is still there, so it can't be read.
+                        raise
+                    # A module was removed after the changes were found, so find them again.
+                    # The packages are searched, as the module may not be one that changed.
+                    previous_changes = changes
+                    changed_paths = None
+
+    def _apply_changes(self, graph: ImportGraph, changes: _ModuleChanges) -> set[str]:
+        """
+        Apply the changes to the graph, returning the names of the modules whose imports changed.
+
+        If a module can't be read, the graph and refresher are left as they were.
+        """
+        changed_parsed_imports, syntax_errors = parse_imports_by_module(
+            changes.changed_module_files,
+            found_packages=changes.found_packages,
+            import_parser=self._import_parser,
+        )
+        if syntax_errors:
+            # Leave the graph as it is, so that the modules are scanned again next time.
+            _raise_syntax_errors(syntax_errors)
+
+        changed_module_names = {
+            module_file.module.name for module_file in changes.changed_module_files
+        }
+        added_module_names = changed_module_names - self._module_files_by_name.keys()
+        if changes.removed_module_names or added_module_names:
+            # The unchanged modules' imports may now belong to different modules, e.g. to
+            # an added module rather than its parent, so all of them are resolved again.
+            if self._parsed_imports is None:
+                self._parsed_imports, syntax_errors = parse_imports_by_module(
+                    {
+                        module_file
+                        for name, module_file in self._module_files_by_name.items()
+                        if name not in changed_module_names
+                        and name not in changes.removed_module_names
+                    },
+                    found_packages=changes.found_packages,
+                    import_parser=self._import_parser,
+                )
+                if syntax_errors:
+                    self._parsed_imports = None
+                    _raise_syntax_errors(syntax_errors)
+            self._parsed_imports.update(changed_parsed_imports)
+            self._parsed_imports = self._parsed_imports.subset(
+                (self._module_files_by_name.keys() - changes.removed_module_names)
+                | added_module_names
             )
-    return graph
+            parsed_imports_to_resolve = self._parsed_imports
+        else:
+            if self._parsed_imports is not None:
+                self._parsed_imports.update(changed_parsed_imports)
+            parsed_imports_to_resolve = changed_parsed_imports
+
+        imports_by_module = parsed_imports_to_resolve.resolve(
+            found_packages=changes.found_packages,
+            include_external_packages=self._include_external_packages,
+            exclude_type_checking_imports=self._exclude_type_checking_imports,
+        )
+        changed_module_names = graph._replace_imports_by_module(
+            imports_by_module,
+            removed_modules=changes.removed_module_names,
+            package_names={found_package.name for found_package in changes.found_packages},
+        )
 
+        self._found_packages = changes.found_packages
+        for module_name in changes.removed_module_names:
+            del self._module_files_by_name[module_name]
+        for module_file in changes.changed_module_files:
+            self._module_files_by_name[module_file.module.name] = module_file
+        return changed_module_names
 
-def _is_external(module: Module, package_modules: set[Module]) -> bool:
-    return not any(
-        module.is_descendant_of(package_module) or module == package_module
-        for package_module in package_modules
-    )
+    def _find_all_changes(self) -> _ModuleChanges:
+        found_packages = _find_packages(
+            file_system=settings.FILE_SYSTEM, package_names=self._package_names
+        )
+        module_files = {
+            module_file
+            for found_package in found_packages
+            for module_file in found_package.module_files
+        }
+        return _ModuleChanges(
+            found_packages=found_packages,
+            # Module files compare equal if they have the same name and mtime.
+            changed_module_files=module_files - set(self._module_files_by_name.values()),
+            removed_module_names=self._module_files_by_name.keys()
+            - {module_file.module.name for module_file in module_files},
+        )
 
+    def _find_changes_to_paths(self, paths: Iterable[str]) -> _ModuleChanges | None:
+        """
+        Find the changes to the modules at the supplied paths, without searching the packages.
+
+        Return None if a package may have been added or removed, as then the modules in it need
+        to be found too.
+        """
+        file_system: AbstractFileSystem = settings.FILE_SYSTEM
+        changed_module_files_by_package: dict[FoundPackage, set[ModuleFile]] = {}
+        removed_module_names: set[str] = set()
+        for path in paths:
+            found_package = next(
+                (
+                    found_package
+                    for found_package in self._found_packages
+                    if path.startswith(found_package.directory + file_system.sep)
+                ),
+                None,
+            )
+            if found_package is None:
+                continue
+            *directory_names, filename = path[
+                len(found_package.directory) + len(file_system.sep) :
+            ].split(file_system.sep)
+            # As for the module finder, ignore hidden files and files like some.module.py.
+            if filename.startswith(".") or not filename.endswith(".py") or filename.count(".") > 1:
+                continue
+            is_package = filename == "__init__.py"
+            module_name = ".".join(
+                [found_package.name, *directory_names] + ([] if is_package else [filename[:-3]])
+            )
+            previous_module_file = self._module_files_by_name.get(module_name)
+            try:
+                mtime: float | None = file_system.get_mtime(path)
+            except FileNotFoundError:
+                mtime = None
+
+            if is_package and (mtime is None) != (previous_module_file is None):
+                return None
+            if mtime is None:
+                if previous_module_file is not None:
+                    removed_module_names.add(module_name)
+                    changed_module_files_by_package.setdefault(found_package, set())
+                continue
+            if previous_module_file is None and (
+                module_name.rpartition(".")[0] not in self._module_files_by_name
+            ):
+                # It's not within a Python package, so it isn't a module.
+                continue
+            module_file = ModuleFile(module=Module(module_name), mtime=mtime, path=path)
+            if module_file != previous_module_file:
+                changed_module_files_by_package.setdefault(found_package, set()).add(module_file)
+
+        stale_module_files = {
+            self._module_files_by_name[module_file.module.name]
+            for module_files in changed_module_files_by_package.values()
+            for module_file in module_files
+            if module_file.module.name in self._module_files_by_name
+        } | {self._module_files_by_name[module_name] for module_name in removed_module_names}
+        return _ModuleChanges(
+            found_packages={
+                FoundPackage(
+                    name=found_package.name,
+                    directory=found_package.directory,
+                    module_files=(found_package.module_files - stale_module_files)
+                    | changed_module_files_by_package[found_package],
+                )
+                if found_package in changed_module_files_by_package
+                else found_package
+                for found_package in self._found_packages
+            },
+            changed_module_files=set().union(*changed_module_files_by_package.values()),
+            removed_module_names=removed_module_names,
+        )
+
+
+def _write_to_cache_in_background(write: Callable[..., None], *args, **kwargs) -> None:
+    # The writer's thread doesn't share this thread's number of workers, so pass it on.
+    workers = get_workers()
 
-def _read_imports_from_cache(
-    module_files: Iterable[ModuleFile], *, cache: caching.Cache
-) -> dict[ModuleFile, set[DirectImport]]:
-    imports_by_module_file: dict[ModuleFile, set[DirectImport]] = {}
-    for module_file in module_files:
+    def write_or_warn() -> None:
         try:
-            direct_imports = cache.read_imports(module_file)
-        except caching.CacheMiss:
-            continue
-        else:
-            imports_by_module_file[module_file] = direct_imports
-    return imports_by_module_file
+            with override_workers(workers):
+                write(*args, **kwargs)
+        except Exception:
+            # The caller can't handle the error, and a build without caching still succeeds.
+            logger.warning("Could not write to the cache.", exc_info=True)
+
+    with _pending_cache_writes_lock:
+        _pending_cache_writes[:] = [
+            pending_cache_write
+            for pending_cache_write in _pending_cache_writes
+            if not pending_cache_write.done()
+        ]
+        _pending_cache_writes.append(_cache_writer.submit(write_or_warn))
+
+
+def _raise_syntax_errors(syntax_errors: Sequence[SourceSyntaxError]) -> NoReturn:
+    if len(syntax_errors) == 1:
+        raise syntax_errors[0]
+    raise SourceSyntaxErrors(syntax_errors)
+
+
+def _assemble_graph(
+    found_packages: set[FoundPackage],
+    imports_by_module: caching.ImportsByModule,
+) -> ImportGraph:
+    graph: ImportGraph = settings.IMPORT_GRAPH_CLASS()
+    graph._add_imports_by_module(
+        imports_by_module,
+        package_names={found_package.name for found_package in found_packages},
+    )
+    return graph
@@ -0,0 +1,123 @@
+"""
+Keeping graphs up to date as the files they were built from change.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from types import TracebackType
+
+from typing_extensions import Self
+
+from .graph import ImportGraph
+from .ports.watching import AbstractFileWatcher, FileChanges
+
+
+class GraphWatcher:
+    """
+    Keeps a graph returned by build_graph up to date, by rescanning only the modules that
+    change.
+
+    Changes are applied when refresh or wait is called, so the graph can be used safely in
+    between. Usage:
+
+        with grimp.watch("mypackage") as watcher:
+            for changed_modules in watcher:
+                check_architecture(watcher.graph)
+    """
+
+    def __init__(
+        self, graph: ImportGraph, file_watcher: AbstractFileWatcher, debounce: float
+    ) -> None:
+        if graph._refresher is None:
+            raise ValueError("Only graphs returned by build_graph can be watched.")
+        self._graph = graph
+        self._file_watcher = file_watcher
+        self._debounce = debounce
+        # Changes that have been read, but not yet applied to the graph.
+        self._pending_changes: FileChanges | None = None
+        self._closed = False
+
+    @property
+    def graph(self) -> ImportGraph:
+        """
+        The graph, as of the last time changes were applied.
+        """
+        return self._graph
+
+    def refresh(self) -> set[str]:
+        """
+        Apply any changes made so far, without waiting for more.
+
+        Returns the names of the modules whose imports changed, including any that were added
+        or removed.
+        """
+        return self.wait(timeout=0)
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        """
+        Wait for files to change, then apply the changes.
+
+        Once a change is seen, further changes are collected until none have been made for the
+        debounce period, so that saving several files at once results in a single update.
+
+        If a changed module has a syntax error, SourceSyntaxError is raised and the graph is
+        left as it was; the changes are applied the next time this is called.
+
+        Returns the names of the modules whose imports changed, including any that were added
+        or removed. This is empty if nothing changed within the timeout (None waits
+        indefinitely), or if no imports changed.
+        """
+        self._check_open()
+        changes = self._file_watcher.read_changes(timeout)
+        if changes is None and self._pending_changes is None:
+            return set()
+        while changes is not None:
+            self._add_pending_changes(changes)
+            changes = self._file_watcher.read_changes(self._debounce)
+
+        assert self._pending_changes is not None
+        assert self._graph._refresher is not None
+        changed_modules = self._graph._refresher(
+            self._graph,
+            self._pending_changes.paths if self._pending_changes.complete else None,
+        )
+        self._pending_changes = None
+        return changed_modules
+
+    def close(self) -> None:
+        """
+        Stop watching for changes. The graph remains usable.
+        """
+        if not self._closed:
+            self._closed = True
+            self._file_watcher.close()
+
+    def __iter__(self) -> Iterator[set[str]]:
+        """
+        Wait for changes indefinitely, yielding the names of the modules whose imports changed.
+        """
+        while not self._closed:
+            if changed_modules := self.wait():
+                yield changed_modules
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _add_pending_changes(self, changes: FileChanges) -> None:
+        if self._pending_changes is None:
+            self._pending_changes = changes
+        else:
+            self._pending_changes |= changes
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ValueError("The watcher has been closed.")
@@ -0,0 +1,49 @@
+"""
+Configuration of the threads Grimp uses for parallel work.
+"""
+
+from contextlib import AbstractContextManager
+
+from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
+
+# Far more threads than are useful, but few enough that asking for too many can't exhaust the
+# process. Must match MAX_WORKERS in rust/src/workers.rs.
+MAX_WORKERS = 1024
+
+
+def set_workers(workers: int | None) -> None:
+    """
+    Set the number of threads to use for parallel work in this process.
+
+    By default, as many threads are used as there are CPUs available to the process, taking
+    any cgroup CPU quota (for example in a container) into account. Pass None to restore this.
+    """
+    validate_workers(workers)
+    rust.set_workers(workers)
+
+
+def get_workers() -> int:
+    """
+    Return the number of threads that parallel work started from this thread would use.
+    """
+    return rust.get_workers()
+
+
+def override_workers(workers: int | None) -> AbstractContextManager:
+    """
+    Return a context manager that sets the number of threads to use for parallel work started
+    from this thread. If workers is None, the number is left unchanged.
+    """
+    validate_workers(workers)
+    return rust.override_workers(workers)
+
+
+def validate_workers(workers: object) -> None:
+    if workers is None:
+        return
+    if not isinstance(workers, int) or isinstance(workers, bool):
+        raise TypeError(f"workers must be an int or None, got {workers.__class__.__name__}.")
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    if workers > MAX_WORKERS:
+        raise ValueError(f"workers must be at most {MAX_WORKERS}, got {workers}.")
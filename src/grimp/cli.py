@@ -0,0 +1,77 @@
+"""
+The grimp command.
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import threading
+from collections.abc import Sequence
+
+from grimp.adaptors import protocol
+from grimp.application.workers import set_workers, validate_workers
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    if not protocol.is_supported():
+        print("grimp: Unix domain sockets aren't supported on this platform.", file=sys.stderr)
+        return 1
+    parser = argparse.ArgumentParser(prog="grimp")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Keep graphs in memory, answering queries from clients over a Unix socket.",
+    )
+    serve_parser.add_argument(
+        "--socket",
+        default=protocol.default_socket_path(),
+        help="The path of the socket to listen on (default: %(default)s).",
+    )
+    serve_parser.add_argument(
+        "--workers", type=_workers, help="The number of threads to use to build graphs."
+    )
+    arguments = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    return _serve(arguments.socket, arguments.workers)
+
+
+def _serve(socket_path: str, workers: int | None) -> int:
+    # Only importable where Unix domain sockets are supported.
+    from grimp.adaptors.server import GraphServer
+
+    set_workers(workers)
+    try:
+        server = GraphServer(socket_path)
+    except OSError as error:
+        print(f"grimp: {error}", file=sys.stderr)
+        return 1
+
+    def shut_down(signal_number: int, frame: object) -> None:
+        # shutdown waits for serve_forever to return, so it can't be called on its thread.
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shut_down)
+    logger.info(f"Listening on {socket_path}.")
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def _workers(value: str) -> int:
+    workers = int(value)
+    try:
+        validate_workers(workers)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from error
+    return workers
+
+
+if __name__ == "__main__":
+    sys.exit(main())
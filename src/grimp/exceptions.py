@@ -1,3 +1,6 @@
+from collections.abc import Sequence
+
+
 class GrimpException(Exception):
     """
     Base exception for all custom Grimp exceptions to inherit.
@@ -65,6 +68,35 @@ class SourceSyntaxError(GrimpException):
         return SourceSyntaxError, (self.filename, self.lineno, self.text)
 
 
+class SourceSyntaxErrors(SourceSyntaxError):
+    """
+    Indicates syntax errors in more than one module that was being statically analysed.
+
+    The filename, line number and text are those of the first error, so this can be handled
+    like a single SourceSyntaxError.
+    """
+
+    def __init__(self, errors: Sequence[SourceSyntaxError]) -> None:
+        """
+        Args:
+            errors: The error for each module, of which there must be at least one.
+        """
+        first_error = errors[0]
+        super().__init__(first_error.filename, first_error.lineno, first_error.text)
+        self.errors = list(errors)
+
+    def __str__(self):
+        return f"Syntax errors in {len(self.errors)} files:\n" + "\n".join(
+            str(error) for error in self.errors
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, SourceSyntaxErrors) and self.errors == other.errors
+
+    def __reduce__(self):
+        return SourceSyntaxErrors, (self.errors,)
+
+
 class InvalidModuleExpression(GrimpException):
     pass
 
@@ -1,19 +1,34 @@
-__all__ = ["build_graph"]
+__all__ = [
+    "GraphClient",
+    "build_graph",
+    "flush_cache",
+    "get_workers",
+    "inspect_cache",
+    "prune_cache",
+    "set_workers",
+    "watch",
+]
 
 from .adaptors.caching import Cache
+from .adaptors.client import GraphClient
 from .adaptors.filesystem import FileSystem
 from .application.graph import ImportGraph
-from .adaptors.modulefinder import ModuleFinder
+from .adaptors.modulefinder import NativeModuleFinder
 from .adaptors.packagefinder import ImportLibPackageFinder
+from .adaptors.sqlitecaching import SqliteCache
 from .adaptors.timing import SystemClockTimer
+from .adaptors.watching import InotifyFileWatcher
 from .application.config import settings
-from .application.usecases import build_graph
+from .application.usecases import build_graph, flush_cache, inspect_cache, prune_cache, watch
+from .application.workers import get_workers, set_workers
 
 settings.configure(
-    MODULE_FINDER=ModuleFinder(),
+    MODULE_FINDER=NativeModuleFinder(),
     FILE_SYSTEM=FileSystem(),
     IMPORT_GRAPH_CLASS=ImportGraph,
     PACKAGE_FINDER=ImportLibPackageFinder(),
     CACHE_CLASS=Cache,
+    SQLITE_CACHE_CLASS=SqliteCache,
     TIMER=SystemClockTimer(),
+    FILE_WATCHER_CLASS=InotifyFileWatcher,
 )
@@ -1,5 +1,6 @@
 from typing import Any
 from collections.abc import Generator
+from contextlib import AbstractContextManager, nullcontext
 
 import yaml
 
@@ -194,6 +195,10 @@ class FakeFileSystem(AbstractFileSystem):
         self.content_map[file_name] = contents
         self.mtime_map[file_name] = DEFAULT_MTIME
 
+    def lock(self, file_name: str) -> AbstractContextManager:
+        # Nothing else can access the fake file system concurrently.
+        return nullcontext()
+
     def convert_to_basic(self) -> BasicFileSystem:
         """
         Convert this file system to a BasicFileSystem.
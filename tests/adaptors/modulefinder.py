@@ -6,7 +6,11 @@ class BaseFakeModuleFinder(AbstractModuleFinder):
     module_files_by_package_name: dict[str, frozenset[ModuleFile]] = {}
 
     def find_package(
-        self, package_name: str, package_directory: str, file_system: AbstractFileSystem
+        self,
+        package_name: str,
+        package_directory: str,
+        file_system: AbstractFileSystem,
+        cache_dir: str | None = None,
     ) -> FoundPackage:
         return FoundPackage(
             name=package_name,
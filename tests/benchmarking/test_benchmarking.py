@@ -306,6 +306,15 @@ def test_build_django_uncached(benchmark):
     benchmark(grimp.build_graph, "django", cache_dir=None)
 
 
+def test_build_django_uncached_with_lexer(benchmark):
+    """
+    Benchmarks building a graph of real package - in this case Django.
+
+    In this benchmark, the cache is turned off and imports are found by tokenizing each module.
+    """
+    benchmark(grimp.build_graph, "django", cache_dir=None, import_parser="lexer")
+
+
 def test_build_django_from_cache_no_misses(benchmark):
     """
     Benchmarks building a graph of real package - in this case Django.
@@ -318,6 +327,7 @@ def test_build_django_from_cache_no_misses(benchmark):
     benchmark(grimp.build_graph, "django")
 
 
+@pytest.mark.parametrize("cache_backend", ("files", "sqlite"))
 @pytest.mark.parametrize(
     "number_of_misses",
     (
@@ -326,7 +336,7 @@ def test_build_django_from_cache_no_misses(benchmark):
         350,  # Around half the Django codebase.
     ),
 )
-def test_build_django_from_cache_a_few_misses(benchmark, number_of_misses: int):
+def test_build_django_from_cache_a_few_misses(benchmark, number_of_misses: int, cache_backend):
     """
     Benchmarks building a graph of real package - in this case Django.
 
@@ -364,7 +374,7 @@ def test_build_django_from_cache_a_few_misses(benchmark, number_of_misses: int):
     # turn off multiple runs, which could potentially be misleading when running locally.
 
     # Populate the cache first, before beginning the benchmark.
-    grimp.build_graph("django")
+    grimp.build_graph("django", cache_backend=cache_backend)
     # Add some modules which won't be in the cache.
     # (Use some real python, which will take time to parse.)
     django_path = Path(importlib.util.find_spec("django").origin).parent  # type: ignore
@@ -380,7 +390,13 @@ def test_build_django_from_cache_a_few_misses(benchmark, number_of_misses: int):
         hash_buster = f"\n# Hash busting comment: {uuid.uuid4()}"
         new_module.write_text(module_contents + hash_buster)
 
-    benchmark.pedantic(grimp.build_graph, ["django"], rounds=1, iterations=1)
+    benchmark.pedantic(
+        grimp.build_graph,
+        ["django"],
+        {"cache_backend": cache_backend},
+        rounds=1,
+        iterations=1,
+    )
 
     # Delete the modules we just created.
     for module in extra_modules:
@@ -13,6 +13,40 @@ def test_build_graph_on_real_package(package_name, snapshot):
     assert imports == snapshot
 
 
+@pytest.mark.parametrize(
+    "package_name",
+    ("django", "flask", "requests", "sqlalchemy", "google.cloud.audit"),
+)
+def test_lexer_finds_the_same_imports_as_the_full_parser(package_name):
+    full_graph = grimp.build_graph(package_name, cache_dir=None)
+    lexer_graph = grimp.build_graph(package_name, cache_dir=None, import_parser="lexer")
+
+    imports = full_graph.find_matching_direct_imports(import_expression="** -> **")
+    assert lexer_graph.find_matching_direct_imports(import_expression="** -> **") == imports
+    for import_ in imports:
+        assert lexer_graph.get_import_details(**import_) == full_graph.get_import_details(
+            **import_
+        )
+
+
+def test_build_graph_with_a_single_worker_finds_the_same_imports():
+    graph = grimp.build_graph("django", cache_dir=None)
+    single_worker_graph = grimp.build_graph("django", cache_dir=None, workers=1)
+
+    assert single_worker_graph.find_matching_direct_imports(
+        import_expression="** -> **"
+    ) == graph.find_matching_direct_imports(import_expression="** -> **")
+
+
+def test_set_workers():
+    try:
+        grimp.set_workers(2)
+        assert grimp.get_workers() == 2
+    finally:
+        grimp.set_workers(None)
+    assert grimp.get_workers() >= 1
+
+
 @pytest.mark.parametrize(
     "package_name",
     ("django", "django.db", "django.db.models"),
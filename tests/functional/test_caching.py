@@ -1,10 +1,13 @@
+import dataclasses
+import os
 import shutil
 import tempfile
 from pathlib import Path
 
 import pytest  # type: ignore
 
-from grimp import build_graph
+from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
+from grimp import build_graph, exceptions, flush_cache, inspect_cache, prune_cache
 
 """
 For ease of reference, these are the imports of all the files:
@@ -29,6 +32,14 @@ PACKAGE_COPY_SOURCE = CACHING_PATH / "cachingpackage_to_copy"
 PACKAGE_COPY_DESTINATION = CACHING_PATH / "cachingpackage"
 
 
+@pytest.fixture
+def cache_dir():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        yield cache_dir
+        # Wait for the cache to be written in the background before removing the directory.
+        flush_cache()
+
+
 @pytest.fixture
 def copied_cachingpackage():
     """
@@ -41,76 +52,260 @@ def copied_cachingpackage():
     shutil.rmtree(str(PACKAGE_COPY_DESTINATION))
 
 
-def test_build_graph_uses_cache(copied_cachingpackage):
-    with tempfile.TemporaryDirectory() as cache_dir:
-        graph = build_graph("cachingpackage", cache_dir=cache_dir)
-
-        real_import_details = [
-            {
-                "importer": "cachingpackage.two.alpha",
-                "imported": "cachingpackage.one.alpha",
-                "line_contents": "from ..one import alpha",
-                "line_number": 1,
-            },
-        ]
-        assert (
-            graph.get_import_details(
-                importer="cachingpackage.two.alpha",
-                imported="cachingpackage.one.alpha",
-            )
-            == real_import_details
+def test_build_graph_uses_cache(copied_cachingpackage, cache_dir):
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+    flush_cache()
+
+    real_import_details = [
+        {
+            "importer": "cachingpackage.two.alpha",
+            "imported": "cachingpackage.one.alpha",
+            "line_contents": "from ..one import alpha",
+            "line_number": 1,
+        },
+    ]
+    assert (
+        graph.get_import_details(
+            importer="cachingpackage.two.alpha",
+            imported="cachingpackage.one.alpha",
         )
+        == real_import_details
+    )
 
-        meta_file = Path(cache_dir) / "cachingpackage.meta.json"
-        # Blake2B 20-character hash of "cachingpackage".
-        data_file = Path(cache_dir) / "27aa562ad2a4745eb20ecf156430dbfeb0e90610.data.json"
-
-        assert meta_file.exists()
-        assert data_file.exists()
-
-        # Edit the contents of the cache.
-        snippet = "from ..one import alpha"
-        replacement = snippet + "  # Inserted by test"
-        _manipulate_data_file(data_file, snippet, replacement)
-
-        graph = build_graph("cachingpackage", cache_dir=cache_dir)
-
-        # Reloading the graph should use the cache.
-        manipulated_import_details = [
-            {
-                "importer": "cachingpackage.two.alpha",
-                "imported": "cachingpackage.one.alpha",
-                "line_contents": replacement,
-                "line_number": 1,
-            },
-        ]
-        assert (
-            graph.get_import_details(
-                importer="cachingpackage.two.alpha",
-                imported="cachingpackage.one.alpha",
-            )
-            == manipulated_import_details
+    meta_file = Path(cache_dir) / "cachingpackage.meta.json"
+    # Blake2B 20-character hash of "cachingpackage".
+    data_file = Path(cache_dir) / "27aa562ad2a4745eb20ecf156430dbfeb0e90610.data.bin"
+    graph_snapshot_file = Path(cache_dir) / "27aa562ad2a4745eb20ecf156430dbfeb0e90610.graph.bin"
+
+    assert meta_file.exists()
+    assert data_file.exists()
+    assert graph_snapshot_file.exists()
+
+    # Edit the contents of the cache.
+    snippet = "from ..one import alpha"
+    replacement = snippet + "  # Inserted by test"
+    _manipulate_data_file(data_file, snippet, replacement)
+    # Remove the graph snapshot, so that the graph is assembled from the cached imports.
+    graph_snapshot_file.unlink()
+
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+
+    # Reloading the graph should use the cache.
+    manipulated_import_details = [
+        {
+            "importer": "cachingpackage.two.alpha",
+            "imported": "cachingpackage.one.alpha",
+            "line_contents": replacement,
+            "line_number": 1,
+        },
+    ]
+    assert (
+        graph.get_import_details(
+            importer="cachingpackage.two.alpha",
+            imported="cachingpackage.one.alpha",
         )
+        == manipulated_import_details
+    )
 
-        # Touch the file in question.
-        (PACKAGE_COPY_DESTINATION / "two" / "alpha.py").touch()
+    # Touch the file in question.
+    (PACKAGE_COPY_DESTINATION / "two" / "alpha.py").touch()
 
-        # Now shouldn't use the cache.
-        graph = build_graph("cachingpackage", cache_dir=cache_dir)
-        assert (
-            graph.get_import_details(
-                importer="cachingpackage.two.alpha",
-                imported="cachingpackage.one.alpha",
-            )
-            == real_import_details
+    # Now shouldn't use the cache.
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+    assert (
+        graph.get_import_details(
+            importer="cachingpackage.two.alpha",
+            imported="cachingpackage.one.alpha",
         )
+        == real_import_details
+    )
+
+
+def test_build_graph_with_other_options_uses_parsed_imports(copied_cachingpackage, cache_dir):
+    build_graph("cachingpackage", cache_dir=cache_dir)
+    flush_cache()
+    assert (Path(cache_dir) / "cachingpackage.parsed.bin").exists()
+
+    # Change the contents of a file without changing its mtime, so we can tell whether it
+    # is parsed again.
+    alpha_file = PACKAGE_COPY_DESTINATION / "two" / "alpha.py"
+    mtime = alpha_file.stat().st_mtime_ns
+    alpha_file.write_text("from ..one import beta\n")
+    os.utime(alpha_file, ns=(mtime, mtime))
+
+    graph = build_graph("cachingpackage", cache_dir=cache_dir, include_external_packages=True)
+
+    # The imports are resolved for the new options from the cached parsed imports.
+    assert graph.direct_import_exists(
+        importer="cachingpackage.two.alpha", imported="cachingpackage.one.alpha"
+    )
+    assert not graph.direct_import_exists(
+        importer="cachingpackage.two.alpha", imported="cachingpackage.one.beta"
+    )
+    assert graph.direct_import_exists(importer="cachingpackage.one.alpha", imported="pytest")
+
+
+def test_build_graph_caches_other_modules_when_there_are_syntax_errors(
+    copied_cachingpackage, cache_dir
+):
+    beta_file = PACKAGE_COPY_DESTINATION / "one" / "beta.py"
+    gamma_file = PACKAGE_COPY_DESTINATION / "two" / "gamma.py"
+    beta_contents, gamma_contents = beta_file.read_text(), gamma_file.read_text()
+    beta_file.write_text("fromb . import alpha\n")
+    gamma_file.write_text("from .beta import\n")
+
+    with pytest.raises(exceptions.SourceSyntaxErrors) as excinfo:
+        build_graph("cachingpackage", cache_dir=cache_dir)
+
+    # Every broken module is reported, ordered by module.
+    assert [error.filename for error in excinfo.value.errors] == [
+        str(beta_file),
+        str(gamma_file),
+    ]
+
+    # Change the contents of a module that could be parsed without changing its mtime, so
+    # we can tell whether it is parsed again.
+    alpha_file = PACKAGE_COPY_DESTINATION / "two" / "alpha.py"
+    mtime = alpha_file.stat().st_mtime_ns
+    alpha_file.write_text("from ..one import beta\n")
+    os.utime(alpha_file, ns=(mtime, mtime))
+    beta_file.write_text(beta_contents)
+    gamma_file.write_text(gamma_contents)
+
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+
+    # Only the modules that were broken are parsed again.
+    assert graph.direct_import_exists(
+        importer="cachingpackage.two.alpha", imported="cachingpackage.one.alpha"
+    )
+    assert graph.direct_import_exists(
+        importer="cachingpackage.one.beta", imported="cachingpackage.one.alpha"
+    )
+    assert graph.direct_import_exists(
+        importer="cachingpackage.two.gamma", imported="cachingpackage.two.beta"
+    )
+
+
+def test_build_graph_uses_graph_snapshot_until_a_module_changes(copied_cachingpackage, cache_dir):
+    build_graph("cachingpackage", cache_dir=cache_dir)
+    flush_cache()
+    data_file = Path(cache_dir) / "27aa562ad2a4745eb20ecf156430dbfeb0e90610.data.bin"
+    snippet = "from ..one import alpha"
+    replacement = snippet + "  # Inserted by test"
+    _manipulate_data_file(data_file, snippet, replacement)
+
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+
+    # Nothing has changed, so the graph is loaded from the snapshot, not the cached imports.
+    assert graph.get_import_details(
+        importer="cachingpackage.two.alpha", imported="cachingpackage.one.alpha"
+    ) == [
+        {
+            "importer": "cachingpackage.two.alpha",
+            "imported": "cachingpackage.one.alpha",
+            "line_contents": snippet,
+            "line_number": 1,
+        },
+    ]
+    assert graph.find_children("cachingpackage") == {
+        "cachingpackage.one",
+        "cachingpackage.two",
+        "cachingpackage.utils",
+    }
+
+    # Touch a different file.
+    (PACKAGE_COPY_DESTINATION / "one" / "beta.py").touch()
+
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+
+    # The snapshot is out of date, so the graph is assembled from the cached imports.
+    assert graph.get_import_details(
+        importer="cachingpackage.two.alpha", imported="cachingpackage.one.alpha"
+    ) == [
+        {
+            "importer": "cachingpackage.two.alpha",
+            "imported": "cachingpackage.one.alpha",
+            "line_contents": replacement,
+            "line_number": 1,
+        },
+    ]
+
+
+def test_build_graph_lists_only_changed_directories(copied_cachingpackage, cache_dir):
+    # Directories modified in the last couple of seconds aren't cached, in case they change
+    # again within their mtime's resolution.
+    _set_directory_mtimes(PACKAGE_COPY_DESTINATION, mtime=1_000_000_000)
+    build_graph("cachingpackage", cache_dir=cache_dir)
+    listings_file = Path(cache_dir) / "cachingpackage.dirs.json"
+    assert str(PACKAGE_COPY_DESTINATION / "one") in listings_file.read_text()
+
+    # Adding a module changes its directory's mtime, so it's listed again.
+    (PACKAGE_COPY_DESTINATION / "one" / "epsilon.py").write_text("from . import alpha\n")
+    # Editing a module doesn't, but it's still rescanned.
+    (PACKAGE_COPY_DESTINATION / "two" / "alpha.py").write_text("from .. import utils\n")
+
+    graph = build_graph("cachingpackage", cache_dir=cache_dir)
+
+    assert graph.direct_import_exists(
+        importer="cachingpackage.one.epsilon", imported="cachingpackage.one.alpha"
+    )
+    assert graph.find_modules_directly_imported_by("cachingpackage.two.alpha") == {
+        "cachingpackage.utils"
+    }
+
+
+def test_build_graph_evicts_least_recently_used_cache_entries(copied_cachingpackage, cache_dir):
+    build_graph("cachingpackage", cache_dir=cache_dir)
+    build_graph("cachingpackage", cache_dir=cache_dir, include_external_packages=True)
+    # One entry for the package, and one for each analysis.
+    assert len(inspect_cache(cache_dir)) == 3
+
+    build_graph(
+        "cachingpackage",
+        cache_dir=cache_dir,
+        exclude_type_checking_imports=True,
+        cache_max_entries=2,
+    )
+
+    # The other analyses were less recently used than the package, which they all share.
+    (package_entry, analysis_entry) = sorted(
+        inspect_cache(cache_dir), key=lambda entry: entry.name != "cachingpackage"
+    )
+    assert package_entry.file_names == {
+        "cachingpackage.dirs.json",
+        "cachingpackage.meta.json",
+        "cachingpackage.parsed.bin",
+    }
+    assert not (Path(cache_dir) / "27aa562ad2a4745eb20ecf156430dbfeb0e90610.data.bin").exists()
+
+    evicted = prune_cache(cache_dir, max_entries=0)
+
+    assert {entry.name for entry in evicted} == {package_entry.name, analysis_entry.name}
+    assert inspect_cache(cache_dir) == []
+
+
+def _set_directory_mtimes(directory: Path, mtime: float) -> None:
+    for dirpath, _, _ in os.walk(directory):
+        os.utime(dirpath, (mtime, mtime))
 
 
 def _manipulate_data_file(data_file: Path, snippet: str, replacement: str) -> None:
-    with open(data_file) as file:
-        filedata = file.read()
+    file_system = rust.RealBasicFileSystem()
+    data = rust.read_cache_data_map_file(str(data_file), file_system)
 
-    filedata = filedata.replace(snippet, replacement)
+    imports_by_module = {
+        module: {
+            dataclasses.replace(
+                direct_import,
+                line_contents=direct_import.line_contents.replace(snippet, replacement),
+            )
+            for direct_import in direct_imports
+        }
+        for module, direct_imports in data.subset(data.module_names()).to_dict().items()
+    }
+    # Release the memory-mapped file before overwriting it.
+    del data
 
-    with open(data_file, "w") as file:
-        file.write(filedata)
+    rust.write_cache_data_map_file(
+        str(data_file), rust.ImportsByModule.from_dict(imports_by_module), file_system
+    )
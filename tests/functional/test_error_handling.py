@@ -6,14 +6,15 @@ import pytest  # type: ignore
 from grimp import build_graph, exceptions
 
 
-def test_syntax_error_includes_module():
+@pytest.mark.parametrize("import_parser", ("full", "lexer"))
+def test_syntax_error_includes_module(import_parser):
     dirname = os.path.dirname(__file__)
     filename = os.path.abspath(
         os.path.join(dirname, "..", "assets", "syntaxerrorpackage", "foo", "one.py")
     )
 
     with pytest.raises(exceptions.SourceSyntaxError) as excinfo:
-        build_graph("syntaxerrorpackage", cache_dir=None)
+        build_graph("syntaxerrorpackage", cache_dir=None, import_parser=import_parser)
 
     expected_exception = exceptions.SourceSyntaxError(
         filename=filename, lineno=5, text="fromb . import two"
@@ -0,0 +1,145 @@
+import os
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from grimp import ImportGraph, build_graph, exceptions
+from grimp.application import usecases
+
+PACKAGE_NAME = "refreshpackage"
+
+
+@pytest.fixture
+def package_path(tmp_path, monkeypatch):
+    """
+    Writes a package to a temporary directory on the Python path.
+
+    refreshpackage: None
+    refreshpackage.one: refreshpackage.two, logging
+    refreshpackage.two: refreshpackage.three.alpha
+    refreshpackage.three: None
+    refreshpackage.three.alpha: refreshpackage.three (from . import beta), decimal
+    """
+    package_path = tmp_path / PACKAGE_NAME
+    _write_files(
+        package_path,
+        {
+            "__init__.py": "",
+            "one.py": "from . import two\nimport logging\n",
+            "two.py": "from .three import alpha\n",
+            "three/__init__.py": "",
+            "three/alpha.py": "from . import beta\nimport decimal\n",
+        },
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return package_path
+
+
+def test_refresh_without_changes_leaves_graph_unchanged(package_path):
+    graph = build_graph(PACKAGE_NAME, cache_dir=None, include_external_packages=True)
+
+    assert graph.refresh() == set()
+
+    _assert_graphs_equal(
+        graph, build_graph(PACKAGE_NAME, cache_dir=None, include_external_packages=True)
+    )
+
+
+def test_refresh_rescans_changed_modules(package_path):
+    graph = build_graph(PACKAGE_NAME, cache_dir=None, include_external_packages=True)
+    _write_files(package_path, {"one.py": "from .three import alpha\nimport json\n"})
+    # Changing a module's contents without changing its imports doesn't count as a change.
+    _write_files(package_path, {"two.py": "from .three import alpha\n\n\nX = 1\n"})
+
+    changed_modules = graph.refresh()
+
+    assert changed_modules == {"refreshpackage.one"}
+    assert "logging" not in graph.modules
+    _assert_graphs_equal(
+        graph, build_graph(PACKAGE_NAME, cache_dir=None, include_external_packages=True)
+    )
+
+
+def test_refresh_adds_and_removes_modules(package_path):
+    graph = build_graph(PACKAGE_NAME, cache_dir=None, include_external_packages=True)
+    # The unchanged module refreshpackage.three.alpha imports beta, which now exists.
+    _write_files(package_path, {"three/beta.py": "import refreshpackage.one\n"})
+    (package_path / "two.py").unlink()
+
+    changed_modules = graph.refresh()
+
+    assert changed_modules == {
+        "refreshpackage.one",
+        "refreshpackage.two",
+        "refreshpackage.three.alpha",
+        "refreshpackage.three.beta",
+    }
+    assert graph.direct_import_exists(
+        importer="refreshpackage.three.alpha", imported="refreshpackage.three.beta"
+    )
+    assert graph.direct_import_exists(importer="refreshpackage.one", imported="refreshpackage")
+    _assert_graphs_equal(
+        graph, build_graph(PACKAGE_NAME, cache_dir=None, include_external_packages=True)
+    )
+
+
+def test_refresh_with_syntax_error_leaves_graph_unchanged(package_path):
+    graph = build_graph(PACKAGE_NAME, cache_dir=None)
+    _write_files(package_path, {"one.py": "fromb . import two\n"})
+
+    with pytest.raises(exceptions.SourceSyntaxError):
+        graph.refresh()
+
+    assert graph.direct_import_exists(importer="refreshpackage.one", imported="refreshpackage.two")
+
+    _write_files(package_path, {"one.py": "from .three import alpha\n"})
+
+    assert graph.refresh() == {"refreshpackage.one"}
+    _assert_graphs_equal(graph, build_graph(PACKAGE_NAME, cache_dir=None))
+
+
+def test_refresh_removes_module_removed_before_it_is_parsed(package_path, monkeypatch):
+    graph = build_graph(PACKAGE_NAME, cache_dir=None)
+    _write_files(package_path, {"two.py": "from . import one\n"})
+    parse_imports_by_module = usecases.parse_imports_by_module
+
+    def remove_module_then_parse(*args, **kwargs):
+        # The change to the module has been found, but it's removed before it's parsed.
+        (package_path / "two.py").unlink(missing_ok=True)
+        return parse_imports_by_module(*args, **kwargs)
+
+    monkeypatch.setattr(usecases, "parse_imports_by_module", remove_module_then_parse)
+
+    changed_modules = graph.refresh()
+
+    assert "refreshpackage.two" in changed_modules
+    assert "refreshpackage.two" not in graph.modules
+    _assert_graphs_equal(graph, build_graph(PACKAGE_NAME, cache_dir=None))
+    assert graph.refresh() == set()
+
+
+def test_graph_not_returned_by_build_graph_cannot_be_refreshed():
+    with pytest.raises(ValueError, match="Only graphs returned by build_graph can be refreshed."):
+        ImportGraph().refresh()
+
+
+def _write_files(directory: Path, contents_by_filename: dict[str, str]) -> None:
+    for filename, contents in contents_by_filename.items():
+        path = directory / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        previous_mtime_ns = path.stat().st_mtime_ns if path.exists() else 0
+        path.write_text(contents)
+        # Make sure the mtime changes, even on file systems with a coarse resolution.
+        mtime_ns = max(path.stat().st_mtime_ns, previous_mtime_ns + 1_000_000_000)
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _assert_graphs_equal(graph: ImportGraph, expected_graph: ImportGraph) -> None:
+    assert graph.modules == expected_graph.modules
+    for module in expected_graph.modules:
+        assert graph.is_module_squashed(module) == expected_graph.is_module_squashed(module)
+    imports = graph.find_matching_direct_imports(import_expression="** -> **")
+    expected_imports = expected_graph.find_matching_direct_imports(import_expression="** -> **")
+    assert sorted(imports, key=str) == sorted(expected_imports, key=str)
+    for import_ in expected_imports:
+        assert graph.get_import_details(**import_) == expected_graph.get_import_details(**import_)
@@ -0,0 +1,110 @@
+import socket
+import threading
+
+import pytest  # type: ignore
+
+from grimp import GraphClient, Layer, build_graph, exceptions
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets aren't supported."
+)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    from grimp.adaptors.server import GraphServer
+
+    socket_path = str(tmp_path / "grimp.sock")
+    server = GraphServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def client(socket_path):
+    with GraphClient(socket_path) as client:
+        yield client
+
+
+def test_queries_match_a_local_graph(client):
+    remote_graph = client.build_graph("testpackage", cache_dir=None)
+    local_graph = build_graph("testpackage", cache_dir=None)
+
+    assert remote_graph.modules == local_graph.modules
+    assert remote_graph.count_imports() == local_graph.count_imports()
+    assert remote_graph.find_upstream_modules("testpackage.one.beta") == (
+        local_graph.find_upstream_modules("testpackage.one.beta")
+    )
+    assert remote_graph.get_import_details(
+        importer="testpackage.utils", imported="testpackage.two.alpha"
+    ) == local_graph.get_import_details(
+        importer="testpackage.utils", imported="testpackage.two.alpha"
+    )
+    assert remote_graph.find_shortest_chains(
+        importer="testpackage.three", imported="testpackage.one"
+    ) == local_graph.find_shortest_chains(importer="testpackage.three", imported="testpackage.one")
+    layers = (Layer("three"), Layer("two"), Layer("one"))
+    assert remote_graph.find_illegal_dependencies_for_layers(
+        layers=layers, containers={"testpackage"}
+    ) == local_graph.find_illegal_dependencies_for_layers(
+        layers=layers, containers={"testpackage"}
+    )
+
+
+def test_graphs_are_kept_for_each_package_set_and_options(client):
+    graph = client.build_graph("testpackage", cache_dir=None)
+    graph_with_external_packages = client.build_graph(
+        "testpackage", cache_dir=None, include_external_packages=True
+    )
+
+    assert "pytest" not in graph.modules
+    assert "pytest" in graph_with_external_packages.modules
+
+
+def test_graphs_are_shared_between_clients(socket_path, client):
+    client.build_graph("testpackage", cache_dir=None)
+
+    with GraphClient(socket_path) as another_client:
+        graph = another_client.build_graph("testpackage", cache_dir=None)
+
+        assert graph.find_children("testpackage.one") == {
+            "testpackage.one.alpha",
+            "testpackage.one.beta",
+            "testpackage.one.gamma",
+            "testpackage.one.delta",
+        }
+
+
+def test_errors_are_raised_by_the_client(client):
+    graph = client.build_graph("testpackage", cache_dir=None)
+
+    with pytest.raises(exceptions.InvalidModuleExpression):
+        graph.find_matching_modules("testpackage.*one")
+
+
+def test_build_errors_are_raised_by_the_client(client):
+    with pytest.raises(exceptions.SourceSyntaxError):
+        client.build_graph("syntaxerrorpackage", cache_dir=None)
+
+
+def test_unsupported_options_are_rejected(client):
+    with pytest.raises(TypeError, match="build_graph option workers isn't supported"):
+        client.build_graph("testpackage", workers=2)
+
+
+def test_methods_that_change_the_graph_are_not_available(client):
+    graph = client.build_graph("testpackage", cache_dir=None)
+
+    with pytest.raises(AttributeError):
+        graph.add_import(importer="testpackage.one", imported="testpackage.two")
+
+
+def test_server_cannot_start_while_another_is_listening(socket_path):
+    from grimp.adaptors.server import GraphServer
+
+    with pytest.raises(OSError, match="A server is already listening"):
+        GraphServer(socket_path)
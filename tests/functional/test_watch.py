@@ -0,0 +1,109 @@
+import sys
+
+import pytest  # type: ignore
+
+from grimp import ImportGraph, build_graph, exceptions, watch
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="Watching is only supported on Linux."
+)
+
+PACKAGE_NAME = "watchpackage"
+TIMEOUT = 5
+
+
+@pytest.fixture
+def package_path(tmp_path, monkeypatch):
+    """
+    Writes a package to a temporary directory on the Python path.
+
+    watchpackage: None
+    watchpackage.one: watchpackage.two
+    watchpackage.two: watchpackage.three
+    watchpackage.three: None
+    """
+    package_path = tmp_path / PACKAGE_NAME
+    package_path.mkdir()
+    (package_path / "__init__.py").write_text("")
+    (package_path / "one.py").write_text("from . import two\n")
+    (package_path / "two.py").write_text("from . import three\n")
+    (package_path / "three.py").write_text("")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return package_path
+
+
+def test_watch_applies_changes_to_modules(package_path):
+    with watch(PACKAGE_NAME, cache_dir=None) as watcher:
+        (package_path / "one.py").write_text("from . import three\nimport logging\n")
+
+        assert watcher.wait(timeout=TIMEOUT) == {"watchpackage.one"}
+
+        assert watcher.graph.direct_import_exists(
+            importer="watchpackage.one", imported="watchpackage.three"
+        )
+        _assert_graphs_equal(watcher.graph, build_graph(PACKAGE_NAME, cache_dir=None))
+
+
+def test_watch_applies_added_and_removed_modules(package_path):
+    with watch(PACKAGE_NAME, cache_dir=None) as watcher:
+        (package_path / "four.py").write_text("from . import one\n")
+        (package_path / "three.py").unlink()
+
+        assert watcher.wait(timeout=TIMEOUT) == {
+            "watchpackage.two",
+            "watchpackage.three",
+            "watchpackage.four",
+        }
+
+        _assert_graphs_equal(watcher.graph, build_graph(PACKAGE_NAME, cache_dir=None))
+
+
+def test_watch_applies_added_subpackages(package_path):
+    with watch(PACKAGE_NAME, cache_dir=None) as watcher:
+        subpackage_path = package_path / "subpackage"
+        subpackage_path.mkdir()
+        (subpackage_path / "__init__.py").write_text("from .. import one\n")
+
+        assert watcher.wait(timeout=TIMEOUT) == {"watchpackage.subpackage"}
+
+        _assert_graphs_equal(watcher.graph, build_graph(PACKAGE_NAME, cache_dir=None))
+
+
+def test_watch_ignores_files_that_are_not_modules(package_path):
+    with watch(PACKAGE_NAME, cache_dir=None) as watcher:
+        (package_path / "notes.txt").write_text("from . import one\n")
+        (package_path / ".hidden.py").write_text("from . import one\n")
+
+        assert watcher.refresh() == set()
+
+
+def test_watch_applies_changes_once_syntax_errors_are_fixed(package_path):
+    with watch(PACKAGE_NAME, cache_dir=None) as watcher:
+        (package_path / "one.py").write_text("fromb . import three\n")
+        (package_path / "two.py").write_text("")
+
+        with pytest.raises(exceptions.SourceSyntaxError):
+            watcher.wait(timeout=TIMEOUT)
+        assert watcher.graph.direct_import_exists(
+            importer="watchpackage.two", imported="watchpackage.three"
+        )
+
+        (package_path / "one.py").write_text("from . import three\n")
+
+        assert watcher.wait(timeout=TIMEOUT) == {"watchpackage.one", "watchpackage.two"}
+        _assert_graphs_equal(watcher.graph, build_graph(PACKAGE_NAME, cache_dir=None))
+
+
+def test_closed_watcher_cannot_wait(package_path):
+    watcher = watch(PACKAGE_NAME, cache_dir=None)
+    watcher.close()
+
+    with pytest.raises(ValueError, match="The watcher has been closed."):
+        watcher.wait(timeout=0)
+
+
+def _assert_graphs_equal(graph: ImportGraph, expected_graph: ImportGraph) -> None:
+    assert graph.modules == expected_graph.modules
+    assert sorted(graph.find_matching_direct_imports(import_expression="** -> **"), key=str) == (
+        sorted(expected_graph.find_matching_direct_imports(import_expression="** -> **"), key=str)
+    )
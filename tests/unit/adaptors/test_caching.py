@@ -1,10 +1,11 @@
 import json
 import logging
+import os
 
 import pytest  # type: ignore
 
 from grimp.adaptors.caching import Cache, CacheFileNamer
-from grimp.application.ports.caching import CacheMiss
+from grimp.application.ports.caching import CacheEntry, CacheMiss
 from grimp.application.ports.modulefinder import FoundPackage, ModuleFile
 from grimp.domain.valueobjects import DirectImport, Module
 from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
@@ -46,25 +47,25 @@ class TestCacheFileNamer:
         "include_external_packages, exclude_type_checking_imports, expected",
         (
             # Blake2B 20-character hash of "hyphenated-package,underscore_package".
-            (False, False, "a857d066514de048b7f94fa8d385e8bd7b048406.data.json"),
+            (False, False, "a857d066514de048b7f94fa8d385e8bd7b048406.data.bin"),
             # Blake2B 20-character hash "hyphenated-package,underscore_package:external".
             (
                 True,
                 False,
-                "021977b6de56b09810ae52f5c9d067622c1ea30f.data.json",
+                "021977b6de56b09810ae52f5c9d067622c1ea30f.data.bin",
             ),
             # Blake2B 20-character hash
             # "hyphenated-package,underscore_package:external:no_type_checking".
             (
                 True,
                 True,
-                "4c2deb1d787161187915e159b5a17ea8b27cd0d4.data.json",
+                "4c2deb1d787161187915e159b5a17ea8b27cd0d4.data.bin",
             ),
             # Blake2B 20-character hash "hyphenated-package,underscore_package:no_type_checking".
             (
                 False,
                 True,
-                "815e7686179e2f3f817c130eec1121d53e62ff1c.data.json",
+                "815e7686179e2f3f817c130eec1121d53e62ff1c.data.bin",
             ),
         ),
     )
@@ -391,6 +392,34 @@ class TestCache:
             | expected_additional_imports
         )
 
+    def test_read_all_imports_only_includes_fresh_modules(self):
+        cache = Cache.setup(
+            file_system=self.FILE_SYSTEM,
+            found_packages=self.FOUND_PACKAGES,
+            namer=SimplisticFileNamer,
+            include_external_packages=False,
+        )
+
+        result = cache.read_all_imports(
+            {self.MODULE_FILE_UNMODIFIED, self.MODULE_FILE_MODIFIED, self.MODULE_FILE_NEW}
+        )
+
+        assert result.module_names() == {self.MODULE_FILE_UNMODIFIED.module.name}
+        assert result.direct_imports(self.MODULE_FILE_UNMODIFIED.module.name) == {
+            DirectImport(
+                importer=self.MODULE_FILE_UNMODIFIED.module,
+                imported=Module("yellow"),
+                line_number=11,
+                line_contents="import yellow",
+            ),
+            DirectImport(
+                importer=self.MODULE_FILE_UNMODIFIED.module,
+                imported=Module("brown"),
+                line_number=22,
+                line_contents="import brown",
+            ),
+        }
+
     def test_raises_cache_miss_for_missing_module_from_data(self):
         file_system = rust.FakeBasicFileSystem(
             contents="""
@@ -612,34 +641,34 @@ class TestCache:
             namer=SimplisticFileNamer,
         )
 
-        cache.write(
-            imports_by_module={
-                blue_one: {
-                    DirectImport(
-                        importer=blue_one,
-                        imported=blue_two,
-                        line_number=11,
-                        line_contents="from . import two",
-                    ),
-                    DirectImport(
-                        importer=blue_one,
-                        imported=Module("externalpackage"),
-                        line_number=22,
-                        line_contents="import externalpackage",
-                    ),
-                },
-                blue_two: set(),
-                green_one: set(),
-                green_two: {
-                    DirectImport(
-                        importer=green_two,
-                        imported=green_one,
-                        line_number=33,
-                        line_contents="from . import one",
-                    ),
-                },
+        imports_by_module = {
+            blue_one: {
+                DirectImport(
+                    importer=blue_one,
+                    imported=blue_two,
+                    line_number=11,
+                    line_contents="from . import two",
+                ),
+                DirectImport(
+                    importer=blue_one,
+                    imported=Module("externalpackage"),
+                    line_number=22,
+                    line_contents="import externalpackage",
+                ),
             },
-        )
+            blue_two: set(),
+            green_one: set(),
+            green_two: {
+                DirectImport(
+                    importer=green_two,
+                    imported=green_one,
+                    line_number=33,
+                    line_contents="from . import one",
+                ),
+            },
+        }
+
+        cache.write(imports_by_module=rust.ImportsByModule.from_dict(imports_by_module))
 
         # Assert the cache is written afterwards.
         expected_cache_dir = cache_dir.rstrip(file_system.sep) if cache_dir else ".grimp_cache"
@@ -660,22 +689,15 @@ class TestCache:
                 green_one.name: mtimes[green_one],
                 green_two.name: mtimes[green_two],
             },
-            f"{expected_cache_dir}/{expected_data_file_name}": {
-                blue_one.name: {
-                    (blue_two.name, 11, "from . import two"),
-                    ("externalpackage", 22, "import externalpackage"),
-                },
-                blue_two.name: set(),
-                green_one.name: set(),
-                green_two.name: {
-                    (green_one.name, 33, "from . import one"),
-                },
-            },
         }
         for filename, expected_deserialized in expected.items():
             serialized = file_system.read(filename)
-            deserialized = _unflake(json.loads(serialized))
+            deserialized = json.loads(serialized)
             assert deserialized == expected_deserialized
+        data = rust.read_cache_data_map_file(
+            f"{expected_cache_dir}/{expected_data_file_name}", file_system
+        )
+        assert data.subset(data.module_names()).to_dict() == imports_by_module
 
     def test_write_to_cache_adds_marker_files(self):
         some_cache_dir = "/tmp/some-cache-dir"
@@ -689,7 +711,7 @@ class TestCache:
         )
 
         cache.write(
-            imports_by_module={},
+            imports_by_module=rust.ImportsByModule(),
         )
 
         assert file_system.read(f"{some_cache_dir}/.gitignore") == (
@@ -701,15 +723,491 @@ class TestCache:
             "# For information about cache directory tags see https://bford.info/cachedir/"
         )
 
+    def test_write_keeps_modules_cached_by_another_process(self):
+        file_system = rust.FakeBasicFileSystem()
+        blue_one = Module(name="blue.one")
+        blue_two = Module(name="blue.two")
+        module_files = frozenset(
+            {ModuleFile(module=blue_one, mtime=1000.0), ModuleFile(module=blue_two, mtime=2000.0)}
+        )
+        found_packages = {FoundPackage(name="blue", module_files=module_files, directory="-")}
+        imports_by_module = {
+            module: {
+                DirectImport(
+                    importer=module,
+                    imported=Module("os"),
+                    line_number=1,
+                    line_contents="import os",
+                )
+            }
+            for module in (blue_one, blue_two)
+        }
+
+        def setup_cache():
+            return Cache.setup(
+                file_system=file_system,
+                found_packages=found_packages,
+                include_external_packages=False,
+                namer=SimplisticFileNamer,
+            )
+
+        # Both processes read the cache before either writes to it.
+        cache, concurrent_cache = setup_cache(), setup_cache()
+        concurrent_cache.write(rust.ImportsByModule.from_dict(imports_by_module))
+        cache.write(rust.ImportsByModule.from_dict({blue_one: imports_by_module[blue_one]}))
+
+        cached = setup_cache().read_all_imports(module_files)
+        assert cached.to_dict() == imports_by_module
+
+    @pytest.mark.parametrize(
+        "mtime, parsed_imports, expected_is_written",
+        (
+            (1000.0, None, False),
+            (1000.0, rust.ParsedImportsByModule(), False),
+            (2000.0, None, True),
+        ),
+    )
+    def test_write_is_skipped_if_nothing_has_changed(
+        self, mtime, parsed_imports, expected_is_written, caplog
+    ):
+        file_system = rust.FakeBasicFileSystem()
+        blue_one = Module(name="blue.one")
+        imports_by_module = rust.ImportsByModule.from_dict(
+            {
+                blue_one: {
+                    DirectImport(
+                        importer=blue_one,
+                        imported=Module("os"),
+                        line_number=1,
+                        line_contents="import os",
+                    )
+                }
+            }
+        )
+
+        def setup_cache(mtime):
+            module_files = frozenset({ModuleFile(module=blue_one, mtime=mtime)})
+            return Cache.setup(
+                file_system=file_system,
+                found_packages={
+                    FoundPackage(name="blue", module_files=module_files, directory="-")
+                },
+                include_external_packages=False,
+                namer=SimplisticFileNamer,
+            )
+
+        setup_cache(1000.0).write(imports_by_module)
+        cache = setup_cache(mtime)
+        caplog.set_level(logging.INFO, logger=Cache.__module__)
+
+        cache.write(imports_by_module, parsed_imports=parsed_imports)
+
+        assert ("Cache files are already up to date." not in caplog.messages) == (
+            expected_is_written
+        )
+        assert json.loads(file_system.read(".grimp_cache/blue.meta.json")) == {
+            blue_one.name: mtime
+        }
+
+    def test_resolves_parsed_imports_cached_for_other_options(self):
+        file_system = rust.FakeBasicFileSystem(
+            contents="""
+                /path/to/mypackage/
+                    __init__.py
+                    foo.py
+                    bar.py
+            """,
+            content_map={"/path/to/mypackage/foo.py": "import os\nfrom . import bar"},
+        )
+        foo = ModuleFile(module=Module("mypackage.foo"), mtime=1000.0)
+        module_files = frozenset(
+            {
+                ModuleFile(module=Module("mypackage"), mtime=1000.0),
+                foo,
+                ModuleFile(module=Module("mypackage.bar"), mtime=1000.0),
+            }
+        )
+        found_packages = {
+            FoundPackage(
+                name="mypackage", directory="/path/to/mypackage", module_files=module_files
+            )
+        }
+        parsed_imports, _ = rust.parse_imports(module_files, found_packages, file_system)
+        cache = Cache.setup(
+            file_system=file_system,
+            found_packages=found_packages,
+            include_external_packages=False,
+            namer=SimplisticFileNamer,
+        )
+        cache.write(
+            parsed_imports.resolve(
+                found_packages=found_packages,
+                include_external_packages=False,
+                exclude_type_checking_imports=False,
+            ),
+            parsed_imports=parsed_imports,
+        )
+
+        cache_with_other_options = Cache.setup(
+            file_system=file_system,
+            found_packages=found_packages,
+            include_external_packages=True,
+            namer=SimplisticFileNamer,
+        )
+
+        assert cache_with_other_options.read_imports(foo) == {
+            DirectImport(
+                importer=Module("mypackage.foo"),
+                imported=Module("os"),
+                line_number=1,
+                line_contents="import os",
+            ),
+            DirectImport(
+                importer=Module("mypackage.foo"),
+                imported=Module("mypackage.bar"),
+                line_number=2,
+                line_contents="from . import bar",
+            ),
+        }
+
+    def test_graph_snapshot_is_used_until_a_module_changes(self, caplog):
+        caplog.set_level(logging.INFO, logger=Cache.__module__)
+        file_system = rust.FakeBasicFileSystem()
+        module_files = frozenset(
+            {
+                ModuleFile(module=Module("mypackage"), mtime=1000.0),
+                ModuleFile(module=Module("mypackage.foo"), mtime=2000.0),
+            }
+        )
+        graph = rust.Graph()
+        graph.add_import(
+            importer="mypackage.foo",
+            imported="mypackage",
+            line_number=1,
+            line_contents="import mypackage",
+        )
+
+        def setup_cache(module_files):
+            return Cache.setup(
+                file_system=file_system,
+                found_packages={
+                    FoundPackage(name="mypackage", directory="-", module_files=module_files)
+                },
+                include_external_packages=False,
+            )
+
+        cache = setup_cache(module_files)
+        assert cache.read_graph_snapshot() is None
+        cache.write_graph_snapshot(graph)
+
+        snapshot = setup_cache(module_files).read_graph_snapshot()
+        assert snapshot.get_modules() == {"mypackage", "mypackage.foo"}
+        assert snapshot.get_import_details(importer="mypackage.foo", imported="mypackage") == [
+            {
+                "importer": "mypackage.foo",
+                "imported": "mypackage",
+                "line_number": 1,
+                "line_contents": "import mypackage",
+            }
+        ]
+
+        changed_module_files = frozenset(
+            {
+                ModuleFile(module=Module("mypackage"), mtime=1000.0),
+                ModuleFile(module=Module("mypackage.foo"), mtime=2001.0),
+            }
+        )
+        caplog.clear()
+        cache = setup_cache(changed_module_files)
+        assert cache.read_graph_snapshot() is None
+        assert caplog.messages[-1] == (
+            f"Graph snapshot file {cache._make_graph_snapshot_filename()} is out of date."
+        )
+
+
+class TestContentCacheKey:
+    @pytest.mark.parametrize(
+        "cache_key, expected_cached_module_names",
+        (
+            ("mtime", set()),
+            ("content", {"mypackage.unchanged"}),
+        ),
+    )
+    def test_uses_cache_for_modules_with_new_mtimes_but_same_contents(
+        self, cache_key, expected_cached_module_names
+    ):
+        file_system = rust.FakeBasicFileSystem(
+            contents="""
+                /path/to/mypackage/
+                    __init__.py
+                    unchanged.py
+                    changed.py
+            """,
+            content_map={
+                "/path/to/mypackage/unchanged.py": "import os",
+                "/path/to/mypackage/changed.py": "import os",
+            },
+        )
+        module_names = ("mypackage.unchanged", "mypackage.changed")
+        original_cache = Cache.setup(
+            file_system=file_system,
+            found_packages=self._make_found_packages(module_names, mtime=1000.0),
+            namer=SimplisticFileNamer,
+            include_external_packages=False,
+            cache_key=cache_key,
+        )
+        original_cache.write(
+            rust.ImportsByModule.from_dict(
+                {
+                    Module(module_name): {
+                        DirectImport(
+                            importer=Module(module_name),
+                            imported=Module("os"),
+                            line_number=1,
+                            line_contents="import os",
+                        )
+                    }
+                    for module_name in module_names
+                }
+            )
+        )
+        # Simulate a fresh checkout, in which every mtime changes but only one file's contents.
+        file_system.write("/path/to/mypackage/changed.py", "import sys")
+        found_packages = self._make_found_packages(module_names, mtime=2000.0)
+        cache = Cache.setup(
+            file_system=file_system,
+            found_packages=found_packages,
+            namer=SimplisticFileNamer,
+            include_external_packages=False,
+            cache_key=cache_key,
+        )
+
+        (found_package,) = found_packages
+        cached = cache.read_all_imports(found_package.module_files)
+
+        assert cached.module_names() == expected_cached_module_names
+
+    def test_digests_files_that_cannot_be_decoded(self, tmp_path):
+        file_path = tmp_path / "mypackage" / "legacy.py"
+        file_path.parent.mkdir()
+        # Not valid UTF-8, and no coding line.
+        file_path.write_bytes(b"x = '\xe9'\n")
+        module_file = ModuleFile(
+            module=Module("mypackage.legacy"), mtime=1000.0, path=str(file_path)
+        )
+        found_package = FoundPackage(
+            name="mypackage",
+            directory=str(file_path.parent),
+            module_files=frozenset({module_file}),
+        )
+
+        digests = rust.compute_content_digests(
+            [module_file], {found_package}, rust.RealBasicFileSystem()
+        )
+
+        assert set(digests) == {"mypackage.legacy"}
+
+    def test_mtime_keyed_write_keeps_digests_of_unchanged_modules(self):
+        file_system = rust.FakeBasicFileSystem(
+            contents="""
+                /path/to/mypackage/
+                    __init__.py
+                    unchanged.py
+            """,
+            content_map={"/path/to/mypackage/unchanged.py": "import os"},
+        )
+        module_names = ("mypackage.unchanged",)
+        imports_by_module = rust.ImportsByModule.from_dict(
+            {
+                Module("mypackage.unchanged"): {
+                    DirectImport(
+                        importer=Module("mypackage.unchanged"),
+                        imported=Module("os"),
+                        line_number=1,
+                        line_contents="import os",
+                    )
+                }
+            }
+        )
+        original_found_packages = self._make_found_packages(module_names, mtime=1000.0)
+        for cache_key in ("content", "mtime"):
+            Cache.setup(
+                file_system=file_system,
+                found_packages=original_found_packages,
+                namer=SimplisticFileNamer,
+                include_external_packages=False,
+                cache_key=cache_key,
+            ).write(imports_by_module)
+        found_packages = self._make_found_packages(module_names, mtime=2000.0)
+        cache = Cache.setup(
+            file_system=file_system,
+            found_packages=found_packages,
+            namer=SimplisticFileNamer,
+            include_external_packages=False,
+            cache_key="content",
+        )
+
+        (found_package,) = found_packages
+        cached = cache.read_all_imports(found_package.module_files)
 
-def _unflake(flakey_data):
-    # Takes the deserialized data that could come in any
-    # order and order it consistently, so the test isn't flakey.
-    non_flakey_data = {}
-    for key, value in flakey_data.items():
-        if isinstance(value, list):
-            non_flakey_value = {tuple(i) for i in value}
-        else:
-            non_flakey_value = value
-        non_flakey_data[key] = non_flakey_value
-    return non_flakey_data
+        assert cached.module_names() == {"mypackage.unchanged"}
+
+    @pytest.mark.parametrize("cache_key, is_snapshot_used", (("mtime", False), ("content", True)))
+    def test_uses_graph_snapshot_for_modules_with_new_mtimes_but_same_contents(
+        self, cache_key, is_snapshot_used
+    ):
+        file_system = rust.FakeBasicFileSystem(
+            contents="""
+                /path/to/mypackage/
+                    __init__.py
+                    foo.py
+            """,
+            content_map={"/path/to/mypackage/foo.py": "import os"},
+        )
+        module_names = ("mypackage.foo",)
+        Cache.setup(
+            file_system=file_system,
+            found_packages=self._make_found_packages(module_names, mtime=1000.0),
+            include_external_packages=False,
+            cache_key=cache_key,
+        ).write_graph_snapshot(rust.Graph())
+
+        cache = Cache.setup(
+            file_system=file_system,
+            found_packages=self._make_found_packages(module_names, mtime=2000.0),
+            include_external_packages=False,
+            cache_key=cache_key,
+        )
+
+        assert (cache.read_graph_snapshot() is not None) == is_snapshot_used
+
+    def _make_found_packages(
+        self, module_names: tuple[str, ...], mtime: float
+    ) -> set[FoundPackage]:
+        return {
+            FoundPackage(
+                name="mypackage",
+                directory="/path/to/mypackage",
+                module_files=frozenset(
+                    ModuleFile(module=Module(module_name), mtime=mtime)
+                    for module_name in module_names
+                ),
+            )
+        }
+
+
+class TestCacheEviction:
+    @pytest.fixture
+    def cache_dir(self, tmp_path):
+        file_sizes = {
+            # The marker and lock files are never evicted.
+            "CACHEDIR.TAG": 1,
+            "cache.lock": 0,
+            # Oldest first.
+            "mypackage.meta.json": 10,
+            "mypackage.parsed.bin": 20,
+            "aaa.data.bin": 100,
+            "aaa.graph.bin": 50,
+            "bbb.data.bin": 70,
+            "bbb.data.bin.123.0.tmp": 5,
+            "imports.sqlite3": 30,
+        }
+        for index, (file_name, size) in enumerate(file_sizes.items()):
+            path = tmp_path / file_name
+            path.write_bytes(b"x" * size)
+            os.utime(path, (1000 + index, 1000 + index))
+        return str(tmp_path)
+
+    def test_inspect_groups_files_into_entries(self, cache_dir):
+        result = Cache.inspect(rust.RealBasicFileSystem(), cache_dir)
+
+        assert result == [
+            CacheEntry(
+                name="mypackage",
+                file_names=frozenset({"mypackage.meta.json", "mypackage.parsed.bin"}),
+                size=30,
+                last_used=1003.0,
+            ),
+            CacheEntry(
+                name="aaa",
+                file_names=frozenset({"aaa.data.bin", "aaa.graph.bin"}),
+                size=150,
+                last_used=1005.0,
+            ),
+            CacheEntry(
+                name="bbb",
+                file_names=frozenset({"bbb.data.bin", "bbb.data.bin.123.0.tmp"}),
+                size=75,
+                last_used=1007.0,
+            ),
+            CacheEntry(
+                name="imports",
+                file_names=frozenset({"imports.sqlite3"}),
+                size=30,
+                last_used=1008.0,
+            ),
+        ]
+
+    @pytest.mark.parametrize(
+        "max_size, max_entries, expected_evicted",
+        (
+            (None, None, []),
+            (None, 2, ["mypackage", "aaa"]),
+            (200, None, ["mypackage", "aaa"]),
+            (300, 3, ["mypackage"]),
+            (0, None, ["mypackage", "aaa", "bbb", "imports"]),
+        ),
+    )
+    def test_prune_evicts_least_recently_used_entries(
+        self, cache_dir, max_size, max_entries, expected_evicted
+    ):
+        file_system = rust.RealBasicFileSystem()
+
+        evicted = Cache.prune(file_system, cache_dir, max_size=max_size, max_entries=max_entries)
+
+        assert [entry.name for entry in evicted] == expected_evicted
+        remaining_entry_names = {entry.name for entry in Cache.inspect(file_system, cache_dir)}
+        assert remaining_entry_names.isdisjoint(expected_evicted)
+        assert os.path.exists(os.path.join(cache_dir, "CACHEDIR.TAG"))
+
+    def test_prune_keeps_supplied_entries(self, cache_dir):
+        evicted = Cache.prune(rust.RealBasicFileSystem(), cache_dir, max_entries=1, keep={"aaa"})
+
+        assert [entry.name for entry in evicted] == ["mypackage", "bbb", "imports"]
+
+    def test_prune_with_fake_file_system(self):
+        file_system = rust.FakeBasicFileSystem()
+        for file_name in ("cache.lock", "aaa.data.bin", "bbb.data.bin", "bbb.graph.bin"):
+            file_system.write(f"/cache/{file_name}", "x")
+        # Reading an entry's files marks it as used.
+        file_system.touch("/cache/aaa.data.bin")
+
+        evicted = Cache.prune(file_system, "/cache", max_entries=1)
+
+        assert [entry.name for entry in evicted] == ["bbb"]
+        assert sorted(file_system.listdir("/cache")) == ["aaa.data.bin", "cache.lock"]
+
+    def test_write_evicts_other_entries_over_limits(self, cache_dir):
+        file_system = rust.RealBasicFileSystem()
+        module_files = frozenset({ModuleFile(module=Module("mypackage.foo"), mtime=1000.0)})
+        cache = Cache.setup(
+            file_system=file_system,
+            found_packages={
+                FoundPackage(name="mypackage", directory="-", module_files=module_files)
+            },
+            include_external_packages=False,
+            cache_dir=cache_dir,
+            max_entries=2,
+        )
+
+        cache.write(rust.ImportsByModule())
+
+        # The package's entry was the least recently used, but is in use by the cache.
+        assert {entry.name for entry in Cache.inspect(file_system, cache_dir)} == {
+            "mypackage",
+            CacheFileNamer.make_data_file_name(
+                found_packages=cache.found_packages,
+                include_external_packages=False,
+                exclude_type_checking_imports=False,
+            ).removesuffix(".data.bin"),
+        }
@@ -0,0 +1,12 @@
+import socket
+
+import pytest  # type: ignore
+
+from grimp.adaptors.client import GraphClient
+
+
+def test_unsupported_platforms_raise_not_implemented_error(monkeypatch):
+    monkeypatch.delattr(socket, "AF_UNIX", raising=False)
+
+    with pytest.raises(NotImplementedError, match="Unix domain sockets"):
+        GraphClient("/path/to/grimp.sock")
@@ -1,6 +1,7 @@
+import os
 from copy import copy
 import pytest  # type: ignore
-from grimp.application.ports.filesystem import BasicFileSystem
+from grimp.application.ports.filesystem import AbstractFileSystem, BasicFileSystem
 from tests.adaptors.filesystem import FakeFileSystem
 from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
 
@@ -10,7 +11,7 @@ class _Base:
     Tests for methods that AbstractFileSystem and BasicFileSystem share.
     """
 
-    file_system_cls: type[BasicFileSystem]
+    file_system_cls: type[AbstractFileSystem] | type[BasicFileSystem]
 
     @pytest.mark.parametrize("path", ("/path/to", "/path/to/"))
     def test_join(self, path):
@@ -237,3 +238,72 @@ class TestFakeFileSystem(_Base):
 
 class TestFakeBasicFileSystem(_Base):
     file_system_cls = rust.FakeBasicFileSystem
+
+
+class TestRealBasicFileSystem:
+    def test_write_replaces_file(self, tmp_path):
+        file_system = rust.RealBasicFileSystem()
+        file_name = str(tmp_path / "cache" / "some-file.txt")
+
+        file_system.write(file_name, "Old contents.")
+        file_system.write(file_name, "New contents.")
+
+        assert file_system.read(file_name) == "New contents."
+        # No temporary files are left behind.
+        assert [path.name for path in (tmp_path / "cache").iterdir()] == ["some-file.txt"]
+
+    @pytest.mark.parametrize(
+        "contents, expected",
+        (
+            (b"import os\n", "import os\n"),
+            (
+                # The coding line itself isn't valid UTF-8.
+                b"# caf\xe9 -*- coding: latin-1 -*-\nx = '\xe9'\n",
+                "# caf\xe9 -*- coding: latin-1 -*-\nx = '\xe9'\n",
+            ),
+            (
+                b"#!/usr/bin/env python\n# coding=utf-8\nx = '\xcf\x80'\n",
+                "#!/usr/bin/env python\n# coding=utf-8\nx = '\u03c0'\n",
+            ),
+            # Decoding with an explicit encoding strips the byte order mark.
+            (
+                b"\xef\xbb\xbf#!/usr/bin/env python\n# coding: utf-8\nx = 1\n",
+                "#!/usr/bin/env python\n# coding: utf-8\nx = 1\n",
+            ),
+            # Coding lines after the second line are ignored.
+            (b"\n\n# coding: latin-1\nx = '\xcf\x80'\n", "\n\n# coding: latin-1\nx = '\u03c0'\n"),
+        ),
+    )
+    def test_read_decodes_using_coding_line(self, tmp_path, contents, expected):
+        file_system = rust.RealBasicFileSystem()
+        file_path = tmp_path / "module.py"
+        file_path.write_bytes(contents)
+
+        assert file_system.read(str(file_path)) == expected
+
+    def test_listdir_stat_touch_and_remove(self, tmp_path):
+        file_system = rust.RealBasicFileSystem()
+        file_path = tmp_path / "some-file.txt"
+        file_path.write_bytes(b"12345")
+        os.utime(file_path, (1000, 1000))
+        (tmp_path / "subdirectory").mkdir()
+
+        assert sorted(file_system.listdir(str(tmp_path))) == ["some-file.txt", "subdirectory"]
+        assert file_system.stat(str(file_path)) == (5, 1000.0)
+        file_system.touch(str(file_path))
+        assert file_system.stat(str(file_path))[1] > 1000
+        file_system.remove(str(file_path))
+        assert file_system.listdir(str(tmp_path)) == ["subdirectory"]
+        with pytest.raises(FileNotFoundError):
+            file_system.stat(str(file_path))
+
+    def test_lock_can_be_reacquired_once_released(self, tmp_path):
+        file_system = rust.RealBasicFileSystem()
+        file_name = str(tmp_path / "cache" / "some.lock")
+
+        with file_system.lock(file_name):
+            pass
+        lock = file_system.lock(file_name)
+        lock.release()
+
+        assert file_system.exists(file_name)
@@ -1,4 +1,7 @@
-from grimp.adaptors.modulefinder import ModuleFinder
+from pathlib import Path
+
+from grimp.adaptors.filesystem import FileSystem
+from grimp.adaptors.modulefinder import ModuleFinder, NativeModuleFinder
 from grimp.application.ports.modulefinder import FoundPackage, ModuleFile
 from grimp.domain.valueobjects import Module
 from tests.adaptors.filesystem import DEFAULT_MTIME, FakeFileSystem
@@ -209,3 +212,84 @@ def test_ignores_hidden_directories():
             }
         ),
     )
+
+
+class TestNativeModuleFinder:
+    def test_finds_same_modules_as_python_finder(self):
+        package_directory = str(Path(__file__).parents[2] / "assets" / "testpackage")
+        file_system = FileSystem()
+
+        result = NativeModuleFinder().find_package(
+            package_name="testpackage",
+            package_directory=package_directory,
+            file_system=file_system,
+        )
+
+        expected = ModuleFinder().find_package(
+            package_name="testpackage",
+            package_directory=package_directory,
+            file_system=file_system,
+        )
+        assert result == expected
+        assert {(f.module, f.path) for f in result.module_files} == {
+            (f.module, f.path) for f in expected.module_files
+        }
+        assert all(f.size == Path(f.path).stat().st_size for f in result.module_files)
+
+    def test_falls_back_to_python_finder_for_other_file_systems(self):
+        file_system = FakeFileSystem(
+            contents="""
+            /path/to/mypackage/
+                __init__.py
+                foo.py
+            """
+        )
+
+        result = NativeModuleFinder().find_package(
+            package_name="mypackage",
+            package_directory="/path/to/mypackage",
+            file_system=file_system,
+        )
+
+        assert result.module_files == frozenset(
+            {
+                ModuleFile(Module("mypackage"), mtime=DEFAULT_MTIME),
+                ModuleFile(Module("mypackage.foo"), mtime=DEFAULT_MTIME),
+            }
+        )
+
+    def test_reads_and_writes_directory_listings_through_file_system(self, tmp_path):
+        package_directory = str(Path(__file__).parents[2] / "assets" / "testpackage")
+        cache_dir = str(tmp_path)
+
+        class RecordingFileSystem(FileSystem):
+            def __init__(self) -> None:
+                self.read_file_names: list[str] = []
+                self.written_file_names: list[str] = []
+
+            def read(self, file_name: str) -> str:
+                self.read_file_names.append(file_name)
+                return super().read(file_name)
+
+            def write(self, file_name: str, contents: str) -> None:
+                self.written_file_names.append(file_name)
+                super().write(file_name, contents)
+
+        file_system = RecordingFileSystem()
+        listings_file_name = str(tmp_path / "testpackage.dirs.json")
+
+        for _ in range(2):
+            result = NativeModuleFinder().find_package(
+                package_name="testpackage",
+                package_directory=package_directory,
+                file_system=file_system,
+                cache_dir=cache_dir,
+            )
+
+        assert file_system.read_file_names == [listings_file_name, listings_file_name]
+        assert file_system.written_file_names[0] == listings_file_name
+        assert result == ModuleFinder().find_package(
+            package_name="testpackage",
+            package_directory=package_directory,
+            file_system=file_system,
+        )
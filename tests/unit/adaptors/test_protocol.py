@@ -0,0 +1,68 @@
+import os
+import pickle
+import socket
+
+import pytest  # type: ignore
+
+from grimp import Layer, exceptions
+from grimp.adaptors import protocol
+
+
+@pytest.fixture
+def connections():
+    sender, receiver = socket.socketpair()
+    yield sender, receiver
+    sender.close()
+    receiver.close()
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        ("query", (("mypackage",), ()), "find_children", ("mypackage.foo",), {}),
+        (True, {"mypackage.foo", "mypackage.bar"}),
+        (True, [{"importer": "mypackage.foo", "imported": "mypackage.bar", "line_number": 1}]),
+        ("query", (("mypackage",), ()), "m", (), {"layers": (Layer("foo"), Layer("bar"))}),
+        (False, exceptions.ModuleNotPresent("mypackage.foo")),
+        (False, ValueError("Invalid.")),
+    ],
+)
+def test_messages_round_trip(connections, message):
+    sender, receiver = connections
+
+    protocol.send_message(sender, message)
+
+    assert repr(protocol.receive_message(receiver)) == repr(message)
+
+
+def test_receiving_arbitrary_objects_is_not_allowed(connections):
+    sender, receiver = connections
+    payload = pickle.dumps(os.system)
+    sender.sendall(protocol.HEADER.pack(len(payload)) + payload)
+
+    with pytest.raises(pickle.UnpicklingError, match="is not allowed"):
+        protocol.receive_message(receiver)
+
+
+def test_receive_raises_eof_error_when_connection_is_closed(connections):
+    sender, receiver = connections
+    sender.close()
+
+    with pytest.raises(EOFError):
+        protocol.receive_message(receiver)
+
+
+class CustomError(Exception):
+    pass
+
+
+@pytest.mark.parametrize(
+    "exception, expected",
+    [
+        (ValueError("Invalid."), ValueError("Invalid.")),
+        (exceptions.ModuleNotPresent("Not present."), exceptions.ModuleNotPresent("Not present.")),
+        (CustomError("Custom."), RuntimeError("CustomError: Custom.")),
+    ],
+)
+def test_sendable_exception(exception, expected):
+    assert repr(protocol.sendable_exception(exception)) == repr(expected)
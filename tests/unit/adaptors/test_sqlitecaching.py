@@ -0,0 +1,136 @@
+import logging
+import sqlite3
+
+import pytest  # type: ignore
+
+from grimp import _rustgrimp as rust  # type: ignore[attr-defined]
+from grimp.adaptors.sqlitecaching import SqliteCache
+from grimp.application.ports.caching import CacheMiss
+from grimp.application.ports.modulefinder import FoundPackage, ModuleFile
+from grimp.domain.valueobjects import DirectImport, Module
+
+BLUE = Module("mypackage.blue")
+GREEN = Module("mypackage.green")
+RED = Module("mypackage.red")
+
+
+def _make_found_packages(mtimes: dict[Module, float]) -> set[FoundPackage]:
+    return {
+        FoundPackage(
+            name="mypackage",
+            directory="/path/to/mypackage",
+            module_files=frozenset(
+                ModuleFile(module=module, mtime=mtime) for module, mtime in mtimes.items()
+            ),
+        )
+    }
+
+
+def _make_imports_by_module(*modules: Module) -> rust.ImportsByModule:
+    return rust.ImportsByModule.from_dict(
+        {
+            module: {
+                DirectImport(
+                    importer=module,
+                    imported=Module("os"),
+                    line_number=1,
+                    line_contents="import os",
+                )
+            }
+            for module in modules
+        }
+    )
+
+
+class TestSqliteCache:
+    @pytest.fixture
+    def setup_cache(self, tmp_path):
+        def setup_cache(mtimes: dict[Module, float]):
+            return SqliteCache.setup(
+                file_system=rust.RealBasicFileSystem(),
+                found_packages=_make_found_packages(mtimes),
+                include_external_packages=False,
+                cache_dir=str(tmp_path),
+            )
+
+        return setup_cache
+
+    def test_reads_modules_with_unchanged_mtimes(self, setup_cache):
+        original_mtimes = {BLUE: 1000.0, GREEN: 2000.0}
+        setup_cache(original_mtimes).write(_make_imports_by_module(BLUE, GREEN))
+
+        cache = setup_cache({BLUE: 1000.0, GREEN: 2001.0})
+        cached = cache.read_all_imports(
+            [ModuleFile(module=BLUE, mtime=1000.0), ModuleFile(module=GREEN, mtime=2001.0)]
+        )
+
+        assert cached.to_dict() == _make_imports_by_module(BLUE).to_dict()
+        assert cache.read_imports(ModuleFile(module=BLUE, mtime=1000.0)) == {
+            DirectImport(
+                importer=BLUE, imported=Module("os"), line_number=1, line_contents="import os"
+            )
+        }
+        with pytest.raises(CacheMiss):
+            cache.read_imports(ModuleFile(module=GREEN, mtime=2001.0))
+
+    def test_only_writes_changed_modules(self, setup_cache, caplog):
+        caplog.set_level(logging.INFO, logger=SqliteCache.__module__)
+        setup_cache({BLUE: 1000.0, GREEN: 2000.0}).write(_make_imports_by_module(BLUE, GREEN))
+
+        mtimes = {BLUE: 1000.0, GREEN: 2001.0, RED: 3000.0}
+        cache = setup_cache(mtimes)
+        cache.read_all_imports(
+            ModuleFile(module=module, mtime=mtime) for module, mtime in mtimes.items()
+        )
+        caplog.clear()
+        cache.write(_make_imports_by_module(BLUE, GREEN, RED))
+
+        assert caplog.messages == [
+            f"Wrote 2 and deleted 0 modules in cache file {cache._database_filename}."
+        ]
+
+    def test_skips_writing_when_nothing_changed(self, setup_cache, caplog):
+        caplog.set_level(logging.INFO, logger=SqliteCache.__module__)
+        mtimes = {BLUE: 1000.0, GREEN: 2000.0}
+        setup_cache(mtimes).write(_make_imports_by_module(BLUE, GREEN))
+
+        cache = setup_cache(mtimes)
+        caplog.clear()
+        cache.write(_make_imports_by_module(BLUE, GREEN))
+
+        assert caplog.messages == [f"Cache file {cache._database_filename} is already up to date."]
+
+    def test_deletes_removed_modules(self, setup_cache):
+        setup_cache({BLUE: 1000.0, GREEN: 2000.0}).write(_make_imports_by_module(BLUE, GREEN))
+
+        cache = setup_cache({BLUE: 1000.0})
+        cache.write(_make_imports_by_module(BLUE))
+
+        with sqlite3.connect(cache._database_filename) as connection:
+            rows = connection.execute("SELECT module FROM modules").fetchall()
+        assert rows == [(BLUE.name,)]
+
+    def test_recreates_corrupt_database(self, setup_cache, tmp_path, caplog):
+        (tmp_path / SqliteCache.DATABASE_FILE_NAME).write_text("Not a database.")
+        mtimes = {BLUE: 1000.0}
+
+        cache = setup_cache(mtimes)
+        cache.write(_make_imports_by_module(BLUE))
+
+        assert f"Could not use corrupt cache file {cache._database_filename}." in caplog.messages
+        assert setup_cache(mtimes).read_all_imports(
+            [ModuleFile(module=BLUE, mtime=1000.0)]
+        ).module_names() == {BLUE.name}
+
+    def test_leaves_no_connection_open(self, setup_cache, tmp_path):
+        mtimes = {BLUE: 1000.0}
+        setup_cache(mtimes).write(_make_imports_by_module(BLUE))
+
+        cache = setup_cache(mtimes)
+        cache.read_all_imports([ModuleFile(module=BLUE, mtime=1000.0)])
+
+        # SQLite removes the write-ahead log once the last connection to the database closes.
+        database_filename = tmp_path / SqliteCache.DATABASE_FILE_NAME
+        assert database_filename.exists()
+        assert not (tmp_path / f"{SqliteCache.DATABASE_FILE_NAME}-wal").exists()
+        assert not (tmp_path / f"{SqliteCache.DATABASE_FILE_NAME}-shm").exists()
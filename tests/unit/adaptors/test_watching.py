@@ -0,0 +1,67 @@
+import sys
+
+import pytest  # type: ignore
+
+from grimp.adaptors.watching import InotifyFileWatcher
+from grimp.application.ports.watching import FileChanges
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is only available on Linux."
+)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / "subpackage").mkdir()
+    (tmp_path / ".hidden").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def watcher(directory):
+    watcher = InotifyFileWatcher([str(directory)])
+    yield watcher
+    watcher.close()
+
+
+def test_returns_none_if_nothing_changes(watcher):
+    assert watcher.read_changes(timeout=0) is None
+
+
+def test_reports_changed_files(directory, watcher):
+    (directory / "foo.py").write_text("import bar\n")
+    (directory / "subpackage" / "bar.py").write_text("")
+
+    assert watcher.read_changes(timeout=1) == FileChanges(
+        paths=frozenset({str(directory / "foo.py"), str(directory / "subpackage" / "bar.py")})
+    )
+    assert watcher.read_changes(timeout=0) is None
+
+
+def test_reports_removed_files(directory, watcher):
+    (directory / "foo.py").write_text("")
+    watcher.read_changes(timeout=1)
+
+    (directory / "foo.py").unlink()
+
+    assert watcher.read_changes(timeout=1) == FileChanges(
+        paths=frozenset({str(directory / "foo.py")})
+    )
+
+
+def test_ignores_hidden_directories(directory, watcher):
+    (directory / ".hidden" / "foo.py").write_text("")
+
+    assert watcher.read_changes(timeout=0) is None
+
+
+def test_added_directories_are_incomplete_changes_and_are_watched(directory, watcher):
+    (directory / "new").mkdir()
+
+    assert watcher.read_changes(timeout=1) == FileChanges(paths=frozenset(), complete=False)
+
+    (directory / "new" / "foo.py").write_text("")
+
+    assert watcher.read_changes(timeout=1) == FileChanges(
+        paths=frozenset({str(directory / "new" / "foo.py")})
+    )
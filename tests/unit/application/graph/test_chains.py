@@ -14,7 +14,8 @@ from grimp.application.graph import ImportGraph
         ("bar", False, {"foo.a.d", "foo.b.e"}),
     ),
 )
-def test_find_downstream_modules(module, as_package, expected_result):
+@pytest.mark.parametrize("frozen", (False, True))
+def test_find_downstream_modules(module, as_package, expected_result, frozen):
     graph = ImportGraph()
     a, b, c = "foo.a", "foo.b", "foo.c"
     d, e, f = "foo.a.d", "foo.b.e", "foo.a.f"
@@ -31,6 +32,9 @@ def test_find_downstream_modules(module, as_package, expected_result):
     graph.add_import(importer=g, imported=f)
     graph.add_import(importer=d, imported=external)
 
+    if frozen:
+        graph.freeze()
+
     assert expected_result == graph.find_downstream_modules(module, as_package=as_package)
 
 
@@ -46,7 +50,8 @@ def test_find_downstream_modules(module, as_package, expected_result):
         ("bar", False, {"foo.a.f", "foo.b.g"}),
     ),
 )
-def test_find_upstream_modules(module, as_package, expected_result):
+@pytest.mark.parametrize("frozen", (False, True))
+def test_find_upstream_modules(module, as_package, expected_result, frozen):
     graph = ImportGraph()
     a, b, c = "foo.a", "foo.d.b", "foo.d.c"
     d, e, f = "foo.d", "foo.c.e", "foo.a.f"
@@ -63,6 +68,9 @@ def test_find_upstream_modules(module, as_package, expected_result):
     graph.add_import(importer=f, imported=g)
     graph.add_import(importer=external, imported=f)
 
+    if frozen:
+        graph.freeze()
+
     assert expected_result == graph.find_upstream_modules(module, as_package=as_package)
 
 
@@ -603,7 +611,8 @@ class TestFindShortestChains:
         ("a", "squashed", True, True),  # Package involving squashed module.
     ),
 )
-def test_chain_exists(importer, imported, as_packages, expected_result):
+@pytest.mark.parametrize("frozen", (False, True))
+def test_chain_exists(importer, imported, as_packages, expected_result, frozen):
     """
     Build a graph to analyse for chains. This is much easier to debug visually,
     so here is the dot syntax for the graph, which can be viewed using a dot file viewer.
@@ -683,6 +692,8 @@ def test_chain_exists(importer, imported, as_packages, expected_result):
         (a_three, squashed),
     ):
         graph.add_import(importer=_importer, imported=_imported)
+    if frozen:
+        graph.freeze()
 
     kwargs = dict(imported=imported, importer=importer)
     if as_packages is not None:
@@ -693,3 +704,26 @@ def test_chain_exists(importer, imported, as_packages, expected_result):
             graph.chain_exists(**kwargs)
     else:
         assert expected_result == graph.chain_exists(**kwargs)
+
+
+def test_frozen_graph_can_still_be_changed():
+    graph = ImportGraph()
+    graph.add_import(importer="foo.a", imported="foo.b")
+    graph.add_import(importer="foo.b", imported="foo.c")
+    graph.freeze()
+    assert graph.find_shortest_chain(importer="foo.a", imported="foo.c") == (
+        "foo.a",
+        "foo.b",
+        "foo.c",
+    )
+
+    graph.remove_import(importer="foo.b", imported="foo.c")
+    graph.add_import(importer="foo.a", imported="foo.d")
+    graph.add_import(importer="foo.d", imported="foo.c")
+
+    assert graph.find_shortest_chain(importer="foo.a", imported="foo.c") == (
+        "foo.a",
+        "foo.d",
+        "foo.c",
+    )
+    assert graph.find_upstream_modules("foo.a") == {"foo.c", "foo.d"}
@@ -84,3 +84,33 @@ class TestCopy:
         graph.squash_module("foo")
 
         assert not copied_graph.is_module_squashed("foo")
+
+    def test_changing_copy_doesnt_affect_original(self):
+        graph = ImportGraph()
+        graph.add_module("foo")
+        graph.add_import(
+            importer="foo.green", imported="bar", line_number=1, line_contents="import bar"
+        )
+        graph.add_import(importer="bar", imported="baz.blue")
+        copied_graph = deepcopy(graph)
+
+        copied_graph.squash_module("foo")
+        copied_graph.remove_import(importer="bar", imported="baz.blue")
+        copied_graph.add_import(importer="baz.blue", imported="qux")
+
+        assert graph.modules == {"foo", "foo.green", "bar", "baz.blue"}
+        assert graph.find_shortest_chain(importer="foo.green", imported="baz.blue") == (
+            "foo.green",
+            "bar",
+            "baz.blue",
+        )
+        assert graph.get_import_details(importer="foo.green", imported="bar") == [
+            {
+                "importer": "foo.green",
+                "imported": "bar",
+                "line_number": 1,
+                "line_contents": "import bar",
+            }
+        ]
+        assert copied_graph.modules == {"foo", "bar", "baz.blue", "qux"}
+        assert copied_graph.find_shortest_chain(importer="foo", imported="baz.blue") is None
@@ -0,0 +1,68 @@
+import pickle
+
+import pytest
+
+from grimp.application.graph import ImportGraph
+
+
+def _make_graph() -> ImportGraph:
+    graph = ImportGraph()
+    graph.add_module("mypackage")
+    graph.add_import(
+        importer="mypackage.foo.one",
+        imported="mypackage.bar",
+        line_number=3,
+        line_contents="from mypackage import bar",
+    )
+    graph.add_import(importer="mypackage.bar", imported="django", line_number=1, line_contents="")
+    graph.add_import(importer="mypackage.bar", imported="mypackage.baz")
+    graph.squash_module("django")
+    return graph
+
+
+class TestSerialization:
+    @pytest.mark.parametrize(
+        "round_trip",
+        [
+            pytest.param(lambda graph: ImportGraph.from_bytes(graph.to_bytes()), id="bytes"),
+            pytest.param(lambda graph: pickle.loads(pickle.dumps(graph)), id="pickle"),
+        ],
+    )
+    def test_round_trip(self, round_trip):
+        graph = _make_graph()
+
+        decoded = round_trip(graph)
+
+        assert isinstance(decoded, ImportGraph)
+        assert decoded.modules == graph.modules
+        assert decoded.count_imports() == graph.count_imports()
+        assert decoded.find_children("mypackage") == {"mypackage.bar", "mypackage.baz"}
+        assert decoded.is_module_squashed("django")
+        assert decoded.get_import_details(
+            importer="mypackage.foo.one", imported="mypackage.bar"
+        ) == [
+            {
+                "importer": "mypackage.foo.one",
+                "imported": "mypackage.bar",
+                "line_number": 3,
+                "line_contents": "from mypackage import bar",
+            }
+        ]
+        assert decoded.get_import_details(importer="mypackage.bar", imported="mypackage.baz") == []
+        assert decoded.find_shortest_chain(importer="mypackage.foo.one", imported="django") == (
+            "mypackage.foo.one",
+            "mypackage.bar",
+            "django",
+        )
+
+    def test_decoded_graph_is_independent(self):
+        graph = _make_graph()
+        decoded = ImportGraph.from_bytes(graph.to_bytes())
+
+        decoded.remove_import(importer="mypackage.foo.one", imported="mypackage.bar")
+
+        assert graph.direct_import_exists(importer="mypackage.foo.one", imported="mypackage.bar")
+
+    def test_invalid_bytes(self):
+        with pytest.raises(ValueError):
+            ImportGraph.from_bytes(b"not a graph")
@@ -938,6 +938,25 @@ def test_exclude_type_checking_imports(
     assert {module_foo_one_file: expected_result} == result
 
 
+@pytest.mark.parametrize("path", (None, "/path/to/foo/two.py"))
+def test_parsing_a_module_that_was_removed_raises_file_not_found_error(path):
+    # The module was found, but removed before it was parsed.
+    module_file = ModuleFile(module=Module("foo.two"), mtime=100933.4, path=path)
+    file_system = rust.FakeBasicFileSystem(content_map={"/path/to/foo/__init__.py": ""})
+
+    with override_settings(FILE_SYSTEM=file_system), pytest.raises(FileNotFoundError):
+        scanning.parse_imports_by_module(
+            {module_file},
+            found_packages={
+                FoundPackage(
+                    name="foo",
+                    directory="/path/to/foo",
+                    module_files=frozenset({_module_to_module_file(Module("foo")), module_file}),
+                )
+            },
+        )
+
+
 def _module_to_module_file(module: Module) -> ModuleFile:
     some_mtime = 100933.4
     return ModuleFile(module=module, mtime=some_mtime)
@@ -1,10 +1,10 @@
 from unittest.mock import sentinel
 import pytest  # type: ignore
 
-from grimp.application import usecases
-from grimp.application.ports.caching import Cache
+from grimp.application import usecases, workers as grimp_workers
+from grimp.application.ports.caching import Cache, ImportsByModule, ParsedImportsByModule
 from grimp.application.ports.modulefinder import ModuleFile
-from grimp.domain.valueobjects import DirectImport, Module
+from grimp.domain.valueobjects import DirectImport
 from tests.adaptors.filesystem import FakeFileSystem
 from tests.adaptors.packagefinder import BaseFakePackageFinder
 from tests.config import override_settings
@@ -78,6 +78,38 @@ class TestBuildGraph:
         with pytest.raises(TypeError, match="Package names must be strings, got bool."):
             usecases.build_graph("mypackage", True)
 
+    def test_invalid_cache_key_raises_value_error(self):
+        with pytest.raises(
+            ValueError, match="cache_key must be one of mtime, content, got 'size'."
+        ):
+            usecases.build_graph("mypackage", cache_key="size")  # type: ignore[arg-type]
+
+    def test_invalid_cache_backend_raises_value_error(self):
+        with pytest.raises(
+            ValueError, match="cache_backend must be one of files, sqlite, got 'redis'."
+        ):
+            usecases.build_graph("mypackage", cache_backend="redis")  # type: ignore[arg-type]
+
+    def test_invalid_import_parser_raises_value_error(self):
+        with pytest.raises(
+            ValueError, match="import_parser must be one of full, lexer, got 'regex'."
+        ):
+            usecases.build_graph("mypackage", import_parser="regex")  # type: ignore[arg-type]
+
+    @pytest.mark.parametrize(
+        "workers, exception, message",
+        (
+            (0, ValueError, "workers must be at least 1, got 0."),
+            (-2, ValueError, "workers must be at least 1, got -2."),
+            (1025, ValueError, "workers must be at most 1024, got 1025."),
+            ("4", TypeError, "workers must be an int or None, got str."),
+            (True, TypeError, "workers must be an int or None, got bool."),
+        ),
+    )
+    def test_invalid_workers_raises_error(self, workers, exception, message):
+        with pytest.raises(exception, match=message):
+            usecases.build_graph("mypackage", workers=workers)
+
     @pytest.mark.parametrize(
         "supplied_cache_dir", ("/path/to/somewhere", None, sentinel.not_supplied)
     )
@@ -114,7 +146,8 @@ class TestBuildGraph:
 
             def write(
                 self,
-                imports_by_module: dict[Module, set[DirectImport]],
+                imports_by_module: ImportsByModule,
+                parsed_imports: ParsedImportsByModule | None = None,
             ) -> None:
                 pass
 
@@ -130,6 +163,47 @@ class TestBuildGraph:
                 kwargs["cache_dir"] = supplied_cache_dir
             usecases.build_graph("mypackage", **kwargs)
 
+    def test_cache_is_written_using_the_supplied_number_of_workers(self):
+        file_system = FakeFileSystem(
+            contents="""
+                /path/to/mypackage/
+                    __init__.py
+            """,
+        )
+
+        package_finder = BaseFakePackageFinder()
+        package_finder.directory_map = {"mypackage": "/path/to/mypackage"}
+
+        workers_used_to_write = []
+
+        class RecordingCache(Cache):
+            @classmethod
+            def cache_dir_or_default(cls, cache_dir: str | None) -> str:
+                return cache_dir or ".some_default"
+
+            def read_imports(self, module_file: ModuleFile) -> set[DirectImport]:
+                return set()
+
+            def write(
+                self,
+                imports_by_module: ImportsByModule,
+                parsed_imports: ParsedImportsByModule | None = None,
+            ) -> None:
+                workers_used_to_write.append(grimp_workers.get_workers())
+
+            def write_graph_snapshot(self, graph) -> None:
+                workers_used_to_write.append(grimp_workers.get_workers())
+
+        with override_settings(
+            FILE_SYSTEM=file_system,
+            PACKAGE_FINDER=package_finder,
+            CACHE_CLASS=RecordingCache,
+        ):
+            usecases.build_graph("mypackage", workers=3)
+            usecases.flush_cache()
+
+        assert workers_used_to_write == [3, 3]
+
     def test_forgives_wrong_type_being_passed_to_include_external_packages(self):
         file_system = FakeFileSystem(
             contents="""
@@ -0,0 +1,14 @@
+import socket
+
+import pytest  # type: ignore
+
+from grimp.cli import main
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets aren't supported.")
+def test_workers_must_be_at_least_one(capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        main(["serve", "--workers", "0"])
+
+    assert exc_info.value.code == 2
+    assert "must be at least 1, got 0" in capsys.readouterr().err
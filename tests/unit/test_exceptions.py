@@ -1,3 +1,5 @@
+import pickle
+
 from grimp import exceptions
 
 
@@ -54,3 +56,45 @@ class TestSourceSyntaxError:
             lineno=3,
             text="something else wrong",
         )
+
+
+class TestSourceSyntaxErrors:
+    ERRORS = (
+        exceptions.SourceSyntaxError(
+            filename="path/to/somefile.py", lineno=3, text="something wrong"
+        ),
+        exceptions.SourceSyntaxError(filename="path/to/anotherfile.py", lineno=None, text=None),
+    )
+
+    def test_str(self):
+        assert str(exceptions.SourceSyntaxErrors(self.ERRORS)) == (
+            "Syntax errors in 2 files:\n"
+            "Syntax error in path/to/somefile.py, line 3: something wrong\n"
+            "Syntax error in path/to/anotherfile.py, line ?: <unavailable>"
+        )
+
+    def test_is_a_source_syntax_error_for_the_first_error(self):
+        error = exceptions.SourceSyntaxErrors(self.ERRORS)
+
+        assert isinstance(error, exceptions.SourceSyntaxError)
+        assert (error.filename, error.lineno, error.text) == (
+            "path/to/somefile.py",
+            3,
+            "something wrong",
+        )
+
+    def test_same_errors_are_equal(self):
+        assert exceptions.SourceSyntaxErrors(self.ERRORS) == exceptions.SourceSyntaxErrors(
+            list(self.ERRORS)
+        )
+
+    def test_different_errors_are_not_equal(self):
+        assert exceptions.SourceSyntaxErrors(self.ERRORS) != exceptions.SourceSyntaxErrors(
+            self.ERRORS[:1]
+        )
+        assert exceptions.SourceSyntaxErrors(self.ERRORS) != self.ERRORS[0]
+
+    def test_can_be_pickled(self):
+        error = exceptions.SourceSyntaxErrors(self.ERRORS)
+
+        assert pickle.loads(pickle.dumps(error)) == error